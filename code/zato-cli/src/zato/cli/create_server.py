@@ -161,6 +161,8 @@ zeromq_connect_sleep=0.1
 aws_host=
 fifo_response_buffer_size=0.2 # In MB
 jwt_secret=zato+secret://zato.server_conf.misc.jwt_secret
+jwt_use_verified_cache=True
+jwt_needs_odb=True
 enforce_service_invokes=False
 return_tracebacks=True
 default_error_message="An error has occurred"
@@ -169,6 +171,8 @@ return_json_schema_errors=False
 sftp_genkey_command=dropbearkey
 posix_ipc_skip_platform=darwin
 service_invoker_allow_internal="pub.zato.ping", "/zato/api/invoke/service_name"
+use_config_snapshot=True
+config_snapshot_max_age=120 # In seconds
 
 [events]
 fs_data_path = {{events_fs_data_path}}
@@ -296,6 +300,7 @@ heartbeat=3
 workers_pool_initial = 10
 workers_pool_mult = 2
 workers_pool_max = 250
+max_pending_requests = 10000
 
 [updates]
 notify_major_versions=True
@@ -412,6 +417,10 @@ name=
 [hash_secret]
 rounds=120000
 salt_size=64 # In bytes = 512 bits
+pool_size= # How many threads compute hashes, by default, one per CPU
+max_queue_size=100
+queue_timeout=5 # In seconds
+max_per_key=3 # How many hashes can be verified at a time for a single username or remote address
 
 [apps]
 all=CRM
@@ -442,6 +451,8 @@ email_from=hello@example.com
 [session]
 expiry=60 # In minutes
 expiry_hook= # Name of a service that will return expiry value each time it is needed
+use_cache=True
+renew_flush_interval=5 # In seconds
 
 [password]
 expiry=730 # In days, 365 days * 2 years = 730 days
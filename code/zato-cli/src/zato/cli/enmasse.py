@@ -9,11 +9,13 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 # stdlib
 import os
 from collections import namedtuple
+from contextlib import contextmanager
 from copy import deepcopy
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from heapq import heapify, heappop, heappush
 from itertools import chain
-from time import sleep
+from time import monotonic, sleep
 from uuid import uuid4
 
 # Zato
@@ -31,7 +33,7 @@ if 0:
     from logging import Logger
     from zato.client import APIClient
     from zato.common.typing_ import any_, anydict, anylist, dictlist, list_, stranydict, strdict, strdictnone, strdictdict, \
-        strstrdict, strlist, strlistdict, strnone
+        iterator_, strstrdict, strlist, strlistdict, strnone
 
     APIClient = APIClient
     Logger = Logger
@@ -127,6 +129,16 @@ class ModuleCtx:
     # An indicator that this is an include directive
     Item_Type_Include = 'include'
 
+    # A server-side service that creates many objects of the same type in one call
+    Import_Object_List_Service = 'zato.common.import-object-list'
+
+    # How many objects at most are sent to the server in one call
+    Import_Batch_Size = 100
+
+    # Attributes that are never compared during incremental imports. Secrets are not compared either
+    # because the server does not return their actual values.
+    Diff_Ignored_Keys = {'id', 'cluster_id', 'is_source_external'}
+
     # Maps enmasse definition types to include types
     Enmasse_Type = cast_('strdict', None)
 
@@ -721,6 +733,56 @@ def dict_match(item_type, item, fields): # type: ignore
 
 # ################################################################################################################################
 
+class ObjectIndex:
+    """ Finds objects by the values of their fields, as dict_match does, but without going through all the objects
+    of a given type each time. An index for each combination of a type and field names is built when it is first needed.
+    """
+    def __init__(self) -> 'None':
+
+        # (item_type, field names) -> field values -> the first item with these values
+        self._index = {} # type: dict
+
+# ################################################################################################################################
+
+    def clear(self, item_type:'str'='') -> 'None':
+        """ Clears indexes of a given type, e.g. after its objects were changed, or all of them if no type is given.
+        """
+        if item_type:
+            for key in [key for key in self._index if key[0] == item_type]:
+                del self._index[key]
+        else:
+            self._index.clear()
+
+# ################################################################################################################################
+
+    def find(self, item_type:'str', items:'any_', fields:'strdict') -> 'any_':
+
+        names = tuple(sorted(fields))
+        key = (item_type, names)
+
+        try:
+            values = tuple(fields[name] for name in names)
+            hash(values)
+        except TypeError:
+            # Values that cannot be hashed can be still looked up one by one
+            return find_first(items, lambda item: dict_match(item_type, item, fields)) # type: ignore
+
+        by_values = self._index.get(key)
+
+        if by_values is None:
+            by_values = self._index[key] = {}
+            for item in items:
+                item_values = tuple(item.get(name) for name in names)
+                try:
+                    _ = by_values.setdefault(item_values, item)
+                except TypeError:
+                    # This item cannot be indexed but it cannot match a hashable value either
+                    pass
+
+        return by_values.get(values)
+
+# ################################################################################################################################
+
 #: List of zato services we explicitly don't support.
 IGNORE_PREFIXES = {
     'zato.kvdb.data-dict.dictionary',
@@ -1216,6 +1278,202 @@ class Results:
 # ################################################################################################################################
 # ################################################################################################################################
 
+class _ImportResponse:
+    """ A response regarding a single object imported through the import-object-list service.
+    It has the same attributes that responses from the client do.
+    """
+    def __init__(self, data:'strdict') -> 'None':
+        self.ok = data['ok']
+        self.data = data['data']
+        self.details = data['details']
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class PhaseTimer:
+    """ Measures how long each phase of an import or export takes.
+    """
+    def __init__(self) -> 'None':
+        self.phases = {} # type: dict[str, float]
+
+    @contextmanager
+    def phase(self, name:'str') -> 'iterator_[None]':
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + monotonic() - start
+
+    def report(self, logger:'Logger') -> 'None':
+        total = sum(self.phases.values())
+        phases = ', '.join('{} -> {:.3f}s'.format(name, value) for name, value in self.phases.items())
+        logger.info('Enmasse phases: %s; total -> %.3fs', phases, total)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_import_plan(item_types:'strlist', priority:'strlist') -> 'strlist':
+    """ Returns item types sorted in such a way that each type comes after all the types that it depends on.
+    Among types that do not depend on each other, the ones from the priority list come first, in the order
+    from that list, followed by all the other ones in the order given on input.
+    """
+
+    # Item types as they are given on input, e.g. from enmasse files, may be different from the names of their services
+    service_names = {item_type: _replace_item_type(True, item_type) for item_type in item_types}
+
+    # Security definitions are all the types that 'def_sec' dependencies may refer to
+    sec_types = [item_type for item_type in item_types if item_type in _All_Sec_Def_Types]
+
+    by_service_name = {} # type: dict[str, strlist]
+    for item_type, service_name in service_names.items():
+        by_service_name.setdefault(service_name, []).append(item_type)
+
+    # Item type -> types that it depends on
+    depends_on = {} # type: dict[str, set[str]]
+
+    for item_type in item_types:
+
+        deps = depends_on[item_type] = set()
+        service_info = SERVICE_BY_NAME.get(service_names[item_type])
+
+        if not service_info:
+            continue
+
+        for dep_info in service_info.object_dependencies.values(): # type: ignore
+            dep_type = dep_info['dependent_type']
+            if dep_type == 'def_sec':
+                deps.update(sec_types)
+            else:
+                deps.update(by_service_name.get(dep_type, []))
+
+        deps.discard(item_type)
+
+    # Priority of each type - lower values come first
+    order = {}
+    for idx, item_type in enumerate(chain(priority, item_types)):
+        _ = order.setdefault(item_type, idx)
+
+    out = [] # type: strlist
+    ready = [(order[item_type], item_type) for item_type in item_types if not depends_on[item_type]]
+    heapify(ready)
+
+    # Item type -> types that depend on it
+    needed_by = {} # type: dict[str, strlist]
+    for item_type, deps in depends_on.items():
+        for dep in deps:
+            needed_by.setdefault(dep, []).append(item_type)
+
+    while ready:
+        _, item_type = heappop(ready)
+        out.append(item_type)
+
+        for dependent in needed_by.get(item_type, []):
+            deps = depends_on[dependent]
+            deps.discard(item_type)
+            if not deps:
+                heappush(ready, (order[dependent], dependent))
+
+    # Types with circular dependencies, if any, are added in the order of their priority
+    if len(out) < len(item_types):
+        remaining = set(item_types) - set(out)
+        out.extend(sorted(remaining, key=order.__getitem__))
+
+    return out
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_object_key(item_type:'str', item:'any_') -> 'any_':
+    """ Returns what uniquely identifies an object of a given type, the same way that the import looks it up.
+    """
+    if item_type == 'http_soap':
+        return (item_type, item.get('connection'), item.get('transport'), item.get('name'))
+    else:
+        return (item_type, item.get('name'))
+
+# ################################################################################################################################
+
+def _normalize_diff_value(value:'any_') -> 'any_':
+
+    # Values that are not given at all are the same as empty ones ..
+    if value is None:
+        return ''
+
+    # .. lists are kept on the server as strings with one element per line ..
+    elif isinstance(value, (list, tuple)):
+        return '\n'.join(str(_normalize_diff_value(elem)) for elem in value)
+
+    # .. and numbers may have been given as strings.
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+
+    return value
+
+# ################################################################################################################################
+
+def get_changed_fields(attrs:'any_', existing:'any_', ignored:'any_'=()) -> 'strlist':
+    """ Returns names of attributes whose values on input are different from the ones that an object already has.
+    Attributes that the server does not return for an object cannot be compared, which is why they are skipped.
+    """
+    # Zato
+    from zato.common.const import SECRETS
+
+    out = [] # type: strlist
+
+    for key, value in attrs.items():
+
+        if key in ModuleCtx.Diff_Ignored_Keys or key in SECRETS.PARAMS or key in ignored:
+            continue
+
+        if key not in existing:
+            continue
+
+        if _normalize_diff_value(value) != _normalize_diff_value(existing[key]):
+            out.append(key)
+
+    return sorted(out)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ImportDiff:
+    """ Differences between objects on input and the ones that a server already has, used by incremental imports.
+    """
+    def __init__(self) -> 'None':
+
+        # Keys of objects that do not exist yet
+        self.to_create = [] # type: anylist
+
+        # Keys of objects that exist but are different, along with the names of their changed attributes
+        self.to_update = [] # type: anylist
+
+        # Keys of objects that exist and are exactly the same as on input
+        self.unchanged = set() # type: set
+
+        # Item types and objects that exist only on the server
+        self.to_delete = [] # type: anylist
+
+    @property
+    def has_changes(self) -> 'bool':
+        return bool(self.to_create or self.to_update or self.to_delete)
+
+    def report(self, logger:'Logger') -> 'None':
+
+        for key in self.to_create:
+            logger.info('Diff -> create -> %s', key)
+
+        for key, changed in self.to_update:
+            logger.info('Diff -> update -> %s -> %s', key, ', '.join(changed))
+
+        for item_type, item in self.to_delete:
+            logger.info('Diff -> delete -> %s', get_object_key(item_type, item))
+
+        logger.info('Diff -> create:%s update:%s delete:%s unchanged:%s',
+            len(self.to_create), len(self.to_update), len(self.to_delete), len(self.unchanged))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 class InputValidator:
     def __init__(self, json): # type: ignore
         #: Validation result.
@@ -1266,6 +1524,7 @@ class DependencyScanner:
         self.is_export = is_export
         self.ignore_missing = ignore_missing
         self.missing = {}
+        self.index = ObjectIndex()
 
 # ################################################################################################################################
 
@@ -1287,9 +1546,7 @@ class DependencyScanner:
 
         items = self.json.get(item_type, ())
 
-        for item in items:
-            if dict_match(item_type, item, fields):
-                return item
+        return self.index.find(item_type, items, fields)
 
 # ################################################################################################################################
 
@@ -1392,7 +1649,8 @@ class ObjectImporter:
         is_import,  # type: bool
         is_export,  # type: bool
         ignore_missing, # type: bool
-        args            # type: any_
+        args,           # type: any_
+        timer=None,     # type: PhaseTimer | None
     ) -> 'None':
 
         # Bunch
@@ -1415,6 +1673,9 @@ class ObjectImporter:
         # Command-line arguments
         self.args = args
 
+        # Measures how long each phase of the import takes
+        self.timer = timer or PhaseTimer()
+
         self.is_import = is_import
         self.is_export = is_export
 
@@ -1582,6 +1843,62 @@ class ObjectImporter:
 
     def _import(self, item_type:'str', attrs:'any_', is_edit:'bool') -> 'None':
 
+        attrs, attrs_dict = self._prepare_import(item_type, attrs, is_edit)
+        response = self._import_object(item_type, attrs, is_edit)
+
+        return self._on_imported(item_type, attrs, attrs_dict, is_edit, response)
+
+# ################################################################################################################################
+
+    def _import_many(self, item_type:'str', attrs_list:'anylist') -> 'any_':
+        """ Creates new objects of the same type, sending them to the server in batches rather than one by one.
+        """
+        service_info = SERVICE_BY_NAME[item_type]
+
+        for idx in range(0, len(attrs_list), ModuleCtx.Import_Batch_Size):
+
+            prepared = []
+            service_name = None
+
+            for attrs in attrs_list[idx:idx + ModuleCtx.Import_Batch_Size]:
+                attrs, attrs_dict = self._prepare_import(item_type, attrs, False)
+                service_name = self._prepare_import_object(item_type, attrs, False)
+                prepared.append((attrs, attrs_dict))
+
+            # There is nothing to invoke for this type ..
+            if not (service_name and service_info.name != 'def_sec'):
+                response_list = [None] * len(prepared)
+
+            # .. otherwise, send all the objects in one call ..
+            else:
+                self.logger.info(f'Invoking -> import -> {service_name} for {service_info.name} ({item_type}) -> {len(prepared)}')
+
+                response = self.client.invoke(ModuleCtx.Import_Object_List_Service, {
+                    'service_name': service_name,
+                    'object_list': [dict(attrs) for attrs, _ in prepared],
+                })
+
+                # .. if the server could not handle it, e.g. because it is older, we import the objects one by one.
+                if not response.ok:
+                    self.logger.info('Importing objects one by one -> %s -> %s', service_name, response.details)
+                    response_list = [self.client.invoke(service_name, attrs) for attrs, _ in prepared]
+                else:
+                    response_list = [_ImportResponse(elem) for elem in response.data['object_list']]
+
+            # The response list may be shorter if the server stopped on an object that could not be imported
+            for (attrs, attrs_dict), response in zip(prepared, response_list):
+
+                if response and response.ok:
+                    self.logger.info('Created object `%s` with %s', attrs.name, service_name)
+
+                results = self._on_imported(item_type, attrs, attrs_dict, False, response)
+                if results:
+                    return results
+
+# ################################################################################################################################
+
+    def _prepare_import(self, item_type:'str', attrs:'any_', is_edit:'bool') -> 'any_':
+
         # First, resolve values pointing to parameter placeholders and environment variables ..
         attrs = self._resolve_attrs(item_type, attrs)
 
@@ -1644,7 +1961,18 @@ class ObjectImporter:
         attrs.cluster_id = self.client.cluster_id
         attrs.is_source_external = True
 
-        response = self._import_object(item_type, attrs, is_edit)
+        return attrs, attrs_dict
+
+# ################################################################################################################################
+
+    def _on_imported(
+        self,
+        item_type,  # type: str
+        attrs,      # type: any_
+        attrs_dict, # type: strdict
+        is_edit,    # type: bool
+        response    # type: any_
+    ) -> 'any_':
 
         if response and response.ok:
             if self._needs_change_password(item_type, attrs, is_edit):
@@ -1670,8 +1998,8 @@ class ObjectImporter:
             if self._needs_change_password(item_type, attrs, is_edit):
                 self._set_generic_connection_secret(attrs_dict['name'], attrs_dict['type_'], attrs_dict['secret'])
 
-        # We'll see how expensive this call is. Seems to be but let's see in practice if it's a burden.
-        self.object_mgr.populate_objects_by_type(item_type)
+        # Objects of this type will be read from the server again when they are next looked up
+        self.object_mgr.mark_stale(item_type)
 
 # ################################################################################################################################
 
@@ -1702,8 +2030,8 @@ class ObjectImporter:
                     connection:'any_' = item.get('connection')
                     transport:'any_' = item.get('transport')
 
-                    existing:'any_' = find_first(self.object_mgr.objects.http_soap,
-                        lambda item: connection == item.connection and transport == item.transport and name == item.name) # type: ignore
+                    existing:'any_' = self.object_mgr.find(item_type,
+                        {'connection': connection, 'transport': transport, 'name': name})
 
                     if existing is not None:
                         self.add_warning(results, item_type, item, existing)
@@ -1716,6 +2044,112 @@ class ObjectImporter:
 
         return results
 
+# ################################################################################################################################
+
+    def _get_changed_dependencies(self, item_type:'str', attrs:'any_', existing:'any_') -> 'strlist':
+        """ Returns names of attributes pointing to other objects, e.g. security definitions, that are different
+        from what an object already has. On input, they are names of these objects, whereas the server has their IDs.
+        """
+        out = [] # type: strlist
+        service_info = SERVICE_BY_NAME[item_type]
+
+        for field_name, info in service_info.object_dependencies.items(): # type: ignore
+
+            id_field = info.get('id_field')
+
+            if not id_field or field_name not in attrs or id_field not in existing:
+                continue
+
+            value = attrs[field_name]
+
+            if value in (None, '', info.get('empty_value')):
+                dep_id = None
+            else:
+                dep_obj = self.object_mgr.find(info['dependent_type'], {info['dependent_field']: value})
+                dep_id = dep_obj.id if dep_obj else _no_value1
+
+            if dep_id != existing[id_field]:
+                out.append(field_name)
+
+        return out
+
+# ################################################################################################################################
+
+    def get_import_diff(self, already_existing:'Results', delete_missing:'bool'=False) -> 'ImportDiff':
+        """ Compares objects on input with the ones that the server already has, as they were read in the last refresh.
+        """
+        diff = ImportDiff()
+
+        # Keys of all the objects on input that already exist
+        existing_keys = set()
+
+        for w in already_existing.warnings:
+
+            item_type, attrs = w.value_raw
+            key = get_object_key(item_type, attrs)
+            existing_keys.add(key)
+
+            if item_type == 'http_soap':
+                lookup_config = {'connection': attrs.connection, 'transport': attrs.transport, 'name': attrs.name}
+            else:
+                lookup_config = {'name': attrs.name}
+
+            existing = self.object_mgr.find(item_type, lookup_config)
+
+            # Values on input may point to environment variables so we need to resolve them first
+            attrs = self._resolve_attrs(item_type, dict(attrs))
+
+            dependencies = SERVICE_BY_NAME[item_type].object_dependencies # type: ignore
+            changed = get_changed_fields(attrs, existing, dependencies)
+            changed.extend(self._get_changed_dependencies(item_type, attrs, existing))
+
+            if changed:
+                diff.to_update.append((key, sorted(changed)))
+            else:
+                diff.unchanged.add(key)
+
+        # Keys of all the objects on input, by their type
+        input_keys = {} # type: dict[str, set]
+
+        for item_type, items in self.json.items(): # type: ignore
+            item_type = _replace_item_type(True, item_type)
+            keys = input_keys.setdefault(item_type, set())
+
+            for item in items: # type: ignore
+                key = get_object_key(item_type, item)
+                keys.add(key)
+
+                if key not in existing_keys:
+                    diff.to_create.append(key)
+
+        # Objects that exist only on the server are deleted only if they are of the types that are on input,
+        # and in the reverse order of how they would be imported, so that objects depending on others go first.
+        if delete_missing:
+
+            for item_type in reversed(get_import_plan(list(input_keys), [])):
+
+                service_info = SERVICE_BY_NAME.get(item_type)
+
+                if not service_info:
+                    continue
+
+                for item in self.object_mgr.objects.get(service_info.name, []):
+
+                    # Internal objects are never exported so they are not on input either
+                    if any(item.get(name) == value for name, value in service_info.export_filter.items()): # type: ignore
+                        continue
+
+                    if get_object_key(item_type, item) not in input_keys[item_type]:
+                        diff.to_delete.append((item_type, item))
+
+        return diff
+
+# ################################################################################################################################
+
+    def _delete_objects(self, to_delete:'anylist') -> 'None':
+        for item_type, item in to_delete:
+            self.object_mgr.delete(item_type, item)
+
 # ################################################################################################################################
 
     def may_be_dependency(self, item_type): # type: ignore
@@ -1871,14 +2305,12 @@ class ObjectImporter:
             'pubsub_endpoint',
         ]
 
-        # Do populate the dependencies first ..
-        for dep_name in dep_order:
-            self_json_ordered[dep_name] = self_json.get(dep_name, [])
+        # Each type is populated after all the types it depends on,
+        # with the potential dependencies above taking precedence over everything else.
+        item_types = dep_order + [key for key in self_json if key not in dep_order]
 
-        # .. now, populate everything that is not a dependency.
-        for key, value in self_json.items(): # type: ignore
-            if key not in dep_order:
-                self_json_ordered[key] = value
+        for item_type in get_import_plan(item_types, dep_order):
+            self_json_ordered[item_type] = self_json.get(item_type, [])
 
         for item_type, items in self_json_ordered.items(): # type: ignore
 
@@ -1940,7 +2372,7 @@ class ObjectImporter:
 
 # ################################################################################################################################
 
-    def import_objects(self, already_existing) -> 'Results': # type: ignore
+    def import_objects(self, already_existing, diff=None) -> 'Results': # type: ignore
 
         # stdlib
         from time import sleep
@@ -1948,42 +2380,50 @@ class ObjectImporter:
         rbac_sleep = getattr(self.args, 'rbac_sleep', 1)
         rbac_sleep = float(rbac_sleep)
 
-        existing_combined = self._build_existing_objects_to_edit_during_import(already_existing)
-        new_combined = self._build_new_objects_to_create_during_import(existing_combined)
+        with self.timer.phase('plan'):
+            existing_combined = self._build_existing_objects_to_edit_during_import(already_existing)
+            new_combined = self._build_new_objects_to_create_during_import(existing_combined)
 
-        # Extract and load Basic Auth definitions as a whole, before any other updates (edit)
-        basic_auth_edit = self._extract_basic_auth(existing_combined, is_edit=True)
-        self._import_basic_auth(basic_auth_edit, is_edit=True)
+            # In incremental imports, objects that have not changed are not edited
+            if diff:
+                existing_combined = [w for w in existing_combined if get_object_key(*w.value_raw) not in diff.unchanged]
 
-        # Extract and load Basic Auth definitions as a whole, before any other updates (create)
-        basic_auth_create = self._extract_basic_auth(new_combined, is_edit=False)
-        self._import_basic_auth(basic_auth_create, is_edit=False)
+        with self.timer.phase('basic_auth'):
 
-        self._trigger_sync_server_objects(sync_pubsub=False)
-        self.object_mgr.refresh_objects()
+            # Extract and load Basic Auth definitions as a whole, before any other updates (edit)
+            basic_auth_edit = self._extract_basic_auth(existing_combined, is_edit=True)
+            self._import_basic_auth(basic_auth_edit, is_edit=True)
 
-        for w in existing_combined:
+            # Extract and load Basic Auth definitions as a whole, before any other updates (create)
+            basic_auth_create = self._extract_basic_auth(new_combined, is_edit=False)
+            self._import_basic_auth(basic_auth_create, is_edit=False)
 
-            item_type, attrs = w.value_raw
+            self._trigger_sync_server_objects(sync_pubsub=False)
+            self.object_mgr.refresh_objects()
 
-            if self.should_skip_item(item_type, attrs, True):
-                continue
+        with self.timer.phase('edit'):
+            for w in existing_combined:
 
-            # Basic Auth definitions have been already handled above (edit)
-            if item_type == Sec_Def_Type.BASIC_AUTH:
-                continue
+                item_type, attrs = w.value_raw
 
-            # Skip pub/sub objects because they are handled separately (edit)
-            if item_type.startswith('pubsub'):
-                continue
+                if self.should_skip_item(item_type, attrs, True):
+                    continue
+
+                # Basic Auth definitions have been already handled above (edit)
+                if item_type == Sec_Def_Type.BASIC_AUTH:
+                    continue
 
-            results = self._import(item_type, attrs, True)
+                # Skip pub/sub objects because they are handled separately (edit)
+                if item_type.startswith('pubsub'):
+                    continue
+
+                results = self._import(item_type, attrs, True)
 
-            if 'rbac' in item_type:
-                sleep(rbac_sleep)
+                if 'rbac' in item_type:
+                    sleep(rbac_sleep)
 
-            if results:
-                return results
+                if results:
+                    return results
 
         #
         # Create new objects, again, definitions come first ..
@@ -1996,40 +2436,61 @@ class ObjectImporter:
             'pubsub_subscription': [],
         }
 
-        # Extract and load Basic Auth definitions as a whole, before any other updates (create)
-        self._trigger_sync_server_objects(sync_pubsub=False)
-        self.object_mgr.refresh_objects()
+        with self.timer.phase('create'):
 
-        for elem in new_combined:
-            for item_type, attr_list in elem.items():
-                for attrs in attr_list:
+            # Extract and load Basic Auth definitions as a whole, before any other updates (create)
+            self._trigger_sync_server_objects(sync_pubsub=False)
+            self.object_mgr.refresh_objects()
 
-                    if self.should_skip_item(item_type, attrs, False):
-                        continue
+            for elem in new_combined:
+                for item_type, attr_list in elem.items():
 
-                    # Basic Auth definitions have been already handled above (create)
-                    if item_type == Sec_Def_Type.BASIC_AUTH:
-                        continue
+                    # Objects of the same type that can be created in batches
+                    to_create = []
 
-                    # Pub/sub objects are handled separately at the end of this function (create)
-                    if item_type.startswith('pubsub'):
-                        container = pubsub_objects[item_type]
-                        container.append(attrs)
-                        continue
+                    for attrs in attr_list:
+
+                        if self.should_skip_item(item_type, attrs, False):
+                            continue
+
+                        # Basic Auth definitions have been already handled above (create)
+                        if item_type == Sec_Def_Type.BASIC_AUTH:
+                            continue
+
+                        # Pub/sub objects are handled separately at the end of this function (create)
+                        if item_type.startswith('pubsub'):
+                            container = pubsub_objects[item_type]
+                            container.append(attrs)
+                            continue
+
+                        # RBAC objects may depend on other objects of the same type so they are created one by one
+                        if 'rbac' in item_type:
+                            results = self._import(item_type, attrs, False)
+                            sleep(rbac_sleep)
 
-                    results = self._import(item_type, attrs, False)
+                            if results:
+                                return results
+                        else:
+                            to_create.append(attrs)
 
-                    if 'rbac' in item_type:
-                        sleep(rbac_sleep)
+                    if to_create:
+                        results = self._import_many(item_type, to_create)
 
-                    if results:
-                        return results
+                        if results:
+                            return results
 
         # Handle pub/sub objeccts as a whole here
-        self._import_pubsub_objects(pubsub_objects)
+        with self.timer.phase('pubsub'):
+            self._import_pubsub_objects(pubsub_objects)
+
+        # Objects that are no longer on input
+        if diff and diff.to_delete:
+            with self.timer.phase('delete'):
+                self._delete_objects(diff.to_delete)
 
         # Now, having imported all the objects, we can trigger their synchronization among the members of the cluster
-        self._trigger_sync_server_objects(sync_security=False)
+        with self.timer.phase('sync'):
+            self._trigger_sync_server_objects(sync_security=False)
 
         return self.results
 
@@ -2067,6 +2528,26 @@ class ObjectImporter:
 
     def _import_object(self, def_type, item, is_edit): # type: ignore
 
+        service_info = SERVICE_BY_NAME[def_type]
+        service_name = self._prepare_import_object(def_type, item, is_edit)
+
+        if service_name and service_info.name != 'def_sec':
+
+            self.logger.info(f'Invoking -> import -> {service_name} for {service_info.name} ({def_type})')
+            response = self.client.invoke(service_name, item)
+
+            if response.ok:
+                verb = 'Updated' if is_edit else 'Created'
+                self.logger.info('%s object `%s` with %s', verb, item.name, service_name)
+
+            return response
+
+# ################################################################################################################################
+
+    def _prepare_import_object(self, def_type, item, is_edit): # type: ignore
+        """ Resolves the IDs of an object's dependencies and returns the name of the service that will import it.
+        """
+
         # Python 2/3 compatibility
         from zato.common.ext.future.utils import iteritems
 
@@ -2117,16 +2598,7 @@ class ObjectImporter:
                     dep_obj:'any_' = self.object_mgr.find(item_type, criteria)
                     item[id_field] = dep_obj.id
 
-        if service_name and service_info.name != 'def_sec':
-
-            self.logger.info(f'Invoking -> import -> {service_name} for {service_info.name} ({def_type})')
-            response = self.client.invoke(service_name, item)
-
-            if response.ok:
-                verb = 'Updated' if is_edit else 'Created'
-                self.logger.info('%s object `%s` with %s', verb, item.name, service_name)
-
-            return response
+        return service_name
 
 # ################################################################################################################################
 
@@ -2162,6 +2634,10 @@ class ObjectManager:
     def __init__(self, client, logger): # type: ignore
         self.client = client # type: any_
         self.logger = logger # type: Logger
+        self.index = ObjectIndex()
+
+        # Types whose objects were changed and need to be read from the server again before they are looked up
+        self.stale_types = set() # type: set[str]
 
 # ################################################################################################################################
 
@@ -2173,9 +2649,21 @@ class ObjectManager:
 
         # This probably isn't necessary any more:
         item_type:'any_' = item_type.replace('-', '_')
+
+        if item_type in self.stale_types:
+            self.populate_objects_by_type(item_type)
+
         objects_by_type:'any_' = self.objects.get(item_type, ())
 
-        return find_first(objects_by_type, lambda item: dict_match(item_type, item, fields)) # type: ignore
+        return self.index.find(item_type, objects_by_type, fields)
+
+# ################################################################################################################################
+
+    def mark_stale(self, item_type:'str') -> 'None':
+        """ Indicates that objects of a given type were changed and they will be read from the server
+        the next time they are needed rather than right away.
+        """
+        self.stale_types.add(item_type)
 
 # ################################################################################################################################
 
@@ -2358,6 +2846,10 @@ class ObjectManager:
         if item_type in {'def_sec'}:
             return
 
+        # We are going to have the latest objects of this type so any previous index is no longer valid
+        self.stale_types.discard(item_type)
+        self.index.clear(item_type)
+
         # Bunch
         from bunch import Bunch
 
@@ -2434,6 +2926,9 @@ class ObjectManager:
         from bunch import Bunch
 
         self.objects = Bunch()
+        self.stale_types.clear()
+        self.index.clear()
+
         for service_info in sorted(SERVICES, key=attrgetter('name')):
 
             if sec_only:
@@ -2446,6 +2941,9 @@ class ObjectManager:
             for item in items: # type: ignore
                 self.fix_up_odb_object(item_type, item)
 
+        # Fixing the objects up changed their fields so the indexes built in the process are not valid anymore
+        self.index.clear()
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -3054,6 +3552,9 @@ class Enmasse(ManageCommand):
         {'name':'--exit-on-missing-file', 'help':'If input file does not exist, exit with status code 0', 'action':'store_true'},
         {'name':'--replace', 'help':'Force replacing already server objects during import', 'action':'store_true'},
         {'name':'--replace-odb-objects', 'help':'Same as --replace', 'action':'store_true'},
+        {'name':'--incremental', 'help':'Import only objects that are different from what the server already has', 'action':'store_true'},
+        {'name':'--dry-run', 'help':'Report what an incremental import would change, without changing anything', 'action':'store_true'},
+        {'name':'--delete-missing', 'help':'During an incremental import, delete objects of the imported types that are not in the input file', 'action':'store_true'}, # noqa: E501
         {'name':'--input', 'help':'Path to input file with objects to import'},
         {'name':'--initial-wait-time', 'help':'How many seconds to initially wait for a server', 'default':ModuleCtx.Initial_Wait_Time},
         {'name':'--missing-wait-time', 'help':'How many seconds to wait for missing objects', 'default':ModuleCtx.Missing_Wait_Time},
@@ -3111,6 +3612,11 @@ class Enmasse(ManageCommand):
         _ = populate_environment_from_file(env_path)
 
         self.replace_objects:'bool' = True
+
+        # Incremental imports change only what is different from what the server already has
+        self.is_dry_run:'bool' = getattr(args, 'dry_run', False)
+        self.is_incremental:'bool' = getattr(args, 'incremental', False) or self.is_dry_run
+        self.delete_missing:'bool' = getattr(args, 'delete_missing', False)
         self.export_odb:'bool' = getattr(args, 'export', False) or getattr(args, 'export_odb', False)
 
         # .. make sure the input file path is correct ..
@@ -4060,23 +4566,55 @@ class Enmasse(ManageCommand):
 
     def _run_import(self) -> 'anylist':
 
+        # This is how long each phase of the import takes
+        timer = PhaseTimer()
+
+        try:
+            return self._run_import_phases(timer)
+        finally:
+            timer.report(self.logger)
+
+# ################################################################################################################################
+
+    def _run_import_phases(self, timer:'PhaseTimer') -> 'anylist':
+
         # Make sure we have the latest state of information ..
-        self.object_mgr.refresh()
+        with timer.phase('refresh'):
+            self.object_mgr.refresh()
 
         # .. build an object that will import the definitions ..
         importer = ObjectImporter(self.client, self.logger, self.object_mgr, self.json,  # type: ignore
-            self.is_import, self.is_export, ignore_missing=self.args.ignore_missing_defs, args=self.args)
+            self.is_import, self.is_export, ignore_missing=self.args.ignore_missing_defs, args=self.args, timer=timer)
 
         # .. find channels and jobs that require services that do not exist ..
-        results = importer.validate_import_data()
+        with timer.phase('validate'):
+            results = importer.validate_import_data()
+
         if not results.ok:
             return [results]
 
-        already_existing = importer.find_already_existing_odb_objects()
+        with timer.phase('find_existing'):
+            already_existing = importer.find_already_existing_odb_objects()
+
         if not already_existing.ok and not self.replace_objects:
             return [already_existing]
 
-        results = importer.import_objects(already_existing)
+        # .. in incremental imports, find out what actually needs to be changed ..
+        if self.is_incremental:
+
+            with timer.phase('diff'):
+                diff = importer.get_import_diff(already_existing, delete_missing=self.delete_missing)
+
+            diff.report(self.logger)
+
+            # .. there is nothing else to do if this was only a dry run or if everything is already up to date ..
+            if self.is_dry_run or not diff.has_changes:
+                return []
+
+        else:
+            diff = None
+
+        results = importer.import_objects(already_existing, diff)
         if not results.ok:
             return [results]
 
@@ -39,6 +39,14 @@ class Cleanup(ZatoCommand):
             'help':'Whether to delete messages whose expiration time has been reached',
             'required':False, 'default':True},
 
+        {'name':'--strategy',
+            'help':'How to delete messages, either msg-list (read them in first) or id-range (delete them by ranges of IDs)',
+            'required':False, 'default':'msg-list'},
+
+        {'name':'--drop-partitions',
+            'help':'Whether to drop partitions of the message table if all of their messages have expired',
+            'required':False, 'default':False},
+
         {'name':'--path', 'help':'Local path to a Zato scheduler', 'required':True},
     ]
 
@@ -48,7 +56,7 @@ class Cleanup(ZatoCommand):
 
         # Zato
         from zato.common.util.api import as_bool
-        from zato.scheduler.cleanup.core import run_cleanup
+        from zato.scheduler.cleanup.core import CleanupStrategy, run_cleanup
 
         clean_up_subscriptions = getattr(args, 'subscriptions', True)
         clean_up_topics_without_subscribers = getattr(args, 'topics_without_subscribers', True)
@@ -60,12 +68,17 @@ class Cleanup(ZatoCommand):
         clean_up_topics_with_max_retention_reached = as_bool(clean_up_topics_with_max_retention_reached)
         clean_up_queues_with_expired_messages = as_bool(clean_up_queues_with_expired_messages)
 
+        strategy = getattr(args, 'strategy', None) or CleanupStrategy.MsgList
+        drop_partitions = as_bool(getattr(args, 'drop_partitions', False))
+
         _ = run_cleanup(
             clean_up_subscriptions,
             clean_up_topics_without_subscribers,
             clean_up_topics_with_max_retention_reached,
             clean_up_queues_with_expired_messages,
-            scheduler_path = args.path
+            scheduler_path = args.path,
+            strategy = strategy,
+            drop_partitions = drop_partitions,
         )
 
 # ################################################################################################################################
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from logging import getLogger
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.cli.enmasse import get_changed_fields, ObjectImporter, ObjectIndex, Results, WARNING_ALREADY_EXISTS_IN_ODB
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _ObjectManager:
+    """ Stands in for ObjectManager, with objects that would have been read from a server.
+    """
+    def __init__(self, objects:'anydict') -> 'None':
+        self.objects = Bunch(objects)
+        self.index = ObjectIndex()
+        self.deleted = []
+
+    def find(self, item_type:'str', fields:'anydict') -> 'any_':
+        return self.index.find(item_type, self.objects.get(item_type, []), fields)
+
+    def delete(self, item_type:'str', item:'any_') -> 'None':
+        self.deleted.append((item_type, item.name))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ChangedFieldsTestCase(TestCase):
+
+    def test_equal_values(self) -> 'None':
+
+        attrs = {'name': 'def.1', 'port': '5672', 'scopes': ['a', 'b'], 'host': None}
+        existing = {'name': 'def.1', 'port': 5672, 'scopes': 'a\nb', 'host': '', 'id': 123}
+
+        self.assertListEqual(get_changed_fields(attrs, existing), [])
+
+# ################################################################################################################################
+
+    def test_changed_values(self) -> 'None':
+
+        attrs = {'name': 'def.1', 'port': 5673, 'is_active': False, 'password': 'abc', 'extra': 'abc'}
+        existing = {'name': 'def.1', 'port': 5672, 'is_active': True, 'password': None}
+
+        # Secrets and attributes that the server does not return are not compared
+        self.assertListEqual(get_changed_fields(attrs, existing), ['is_active', 'port'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ImportDiffTestCase(TestCase):
+
+    def _get_importer(self, json:'anydict', objects:'anydict') -> 'ObjectImporter':
+        object_mgr = _ObjectManager(objects)
+        return ObjectImporter(None, logger, object_mgr, json, True, False, False, Bunch()) # type: ignore
+
+    def _get_already_existing(self, importer:'ObjectImporter') -> 'Results':
+        results = Results()
+        for item_type, items in importer.json.items():
+            for item in items:
+                if importer.object_mgr.find(item_type, {'name': item.name}):
+                    results.add_warning((item_type, item), WARNING_ALREADY_EXISTS_IN_ODB, '')
+        return results
+
+# ################################################################################################################################
+
+    def test_diff(self) -> 'None':
+
+        json = {
+            'outconn_redis': [
+                {'name': 'redis.1', 'host': 'localhost'},
+                {'name': 'redis.2', 'host': 'localhost'},
+                {'name': 'redis.3', 'host': 'localhost'},
+            ]
+        }
+
+        objects = {
+            'outconn_redis': [
+                Bunch(id=1, name='redis.1', host='localhost'),
+                Bunch(id=2, name='redis.2', host='example.com'),
+                Bunch(id=4, name='redis.4', host='localhost'),
+            ]
+        }
+
+        importer = self._get_importer(json, objects)
+        diff = importer.get_import_diff(self._get_already_existing(importer), delete_missing=True)
+
+        self.assertTrue(diff.has_changes)
+        self.assertSetEqual(diff.unchanged, {('outconn_redis', 'redis.1')})
+        self.assertListEqual(diff.to_update, [(('outconn_redis', 'redis.2'), ['host'])])
+        self.assertListEqual(diff.to_create, [('outconn_redis', 'redis.3')])
+        self.assertListEqual([item.name for _, item in diff.to_delete], ['redis.4'])
+
+# ################################################################################################################################
+
+    def test_no_changes(self) -> 'None':
+
+        json = {'outconn_redis': [{'name': 'redis.1', 'host': 'localhost'}]}
+        objects = {'outconn_redis': [Bunch(id=1, name='redis.1', host='localhost')]}
+
+        importer = self._get_importer(json, objects)
+        diff = importer.get_import_diff(self._get_already_existing(importer))
+
+        self.assertFalse(diff.has_changes)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.cli.enmasse import DependencyScanner, get_import_plan, ObjectIndex
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ObjectIndexTestCase(TestCase):
+
+    def test_find(self) -> 'None':
+
+        items = [
+            Bunch(name='conn.1', connection='channel', transport='plain_http'),
+            Bunch(name='conn.1', connection='outgoing', transport='plain_http'),
+            Bunch(name='conn.2', connection='channel', transport='plain_http'),
+        ]
+
+        index = ObjectIndex()
+
+        item = index.find('http_soap', items, {'name': 'conn.1', 'connection': 'outgoing'})
+        self.assertIs(item, items[1])
+
+        # The first matching item is returned, as it would be without an index
+        item = index.find('http_soap', items, {'name': 'conn.1'})
+        self.assertIs(item, items[0])
+
+        item = index.find('http_soap', items, {'name': 'conn.3'})
+        self.assertIsNone(item)
+
+# ################################################################################################################################
+
+    def test_clear(self) -> 'None':
+
+        items = [Bunch(name='conn.1')]
+
+        index = ObjectIndex()
+        self.assertIsNotNone(index.find('http_soap', items, {'name': 'conn.1'}))
+
+        # Until it is cleared, the index does not know about new items ..
+        items.append(Bunch(name='conn.2'))
+        self.assertIsNone(index.find('http_soap', items, {'name': 'conn.2'}))
+
+        # .. and afterwards, it does.
+        index.clear('http_soap')
+        self.assertIs(index.find('http_soap', items, {'name': 'conn.2'}), items[1])
+
+# ################################################################################################################################
+
+    def test_unhashable_values(self) -> 'None':
+
+        items = [Bunch(name='conn.1', data=['a']), Bunch(name='conn.2', data=['b'])]
+
+        index = ObjectIndex()
+        item = index.find('http_soap', items, {'data': ['b']})
+
+        self.assertIs(item, items[1])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DependencyScannerTestCase(TestCase):
+
+    def test_find(self) -> 'None':
+
+        json = {
+            'basic_auth': [{'name': 'sec.1'}],
+            'apikey': [{'name': 'sec.2'}],
+        }
+
+        scanner = DependencyScanner(json, is_import=True, is_export=False)
+
+        self.assertEqual(scanner.find('basic_auth', {'name': 'sec.1'}), {'name': 'sec.1'})
+        self.assertEqual(scanner.find('apikey', {'name': 'sec.2'}), {'name': 'sec.2'})
+
+        # Objects are looked up only among the ones of the same type
+        self.assertIsNone(scanner.find('basic_auth', {'name': 'sec.2'}))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ImportPlanTestCase(TestCase):
+
+    def test_dependencies_first(self) -> 'None':
+
+        plan = get_import_plan(['channel_amqp', 'def_amqp', 'http_soap', 'basic_auth'], [])
+
+        # Channels come after the definitions they use ..
+        self.assertLess(plan.index('def_amqp'), plan.index('channel_amqp'))
+        self.assertLess(plan.index('basic_auth'), plan.index('http_soap'))
+
+        # .. and types that do not depend on each other keep their order.
+        self.assertLess(plan.index('def_amqp'), plan.index('basic_auth'))
+
+# ################################################################################################################################
+
+    def test_priority(self) -> 'None':
+
+        plan = get_import_plan(['channel_amqp', 'def_amqp', 'basic_auth'], ['basic_auth'])
+        self.assertListEqual(plan, ['basic_auth', 'def_amqp', 'channel_amqp'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
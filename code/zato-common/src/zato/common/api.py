@@ -204,6 +204,12 @@ class ZMQ:
 
     MDP01_HUMAN = 'Majordomo 0.1 (MDP)'
 
+    class DEFAULT:
+        MAX_IN_FLIGHT = 100
+        RECV_BATCH_SIZE = 1
+        MDP_MAX_PENDING_REQUESTS = 10000
+        MDP_REQUEST_TIMEOUT = 60 # In seconds
+
     class POOL_STRATEGY_NAME:
         SINGLE = 'single'
         UNLIMITED = 'unlimited'
@@ -274,6 +280,12 @@ class SEARCH:
             PAGE_SIZE = 50
             PAGINATE_THRESHOLD = PAGE_SIZE + 1
 
+        # How to compute the total number of results
+        class TOTAL:
+            EXACT = 'exact'
+            APPROX = 'approx'
+            NONE = 'none'
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -427,6 +439,8 @@ class CACHE:
     class Default_Name:
         Main = 'default'
         Bearer_Token = 'zato.bearer.token'
+        JWT = 'zato.jwt.verified'
+        SSO_Session = 'zato.sso.session'
 
     API_USERNAME = 'pub.zato.cache'
 
@@ -1084,6 +1098,12 @@ class EMAIL:
         GET_CRITERIA = 'UNSEEN'
         FILTER_CRITERIA = 'isRead ne true'
         IMAP_DEBUG_LEVEL = 0
+        IMAP_POOL_SIZE = 1
+        IMAP_FETCH_BATCH_SIZE = 50
+        IMAP_IDLE_TIMEOUT = 1740 # In seconds, servers may log out clients idle for 30 minutes
+        IMAP_KEEPALIVE = 60      # In seconds, sessions not used for that long are checked before use
+        SMTP_POOL_SIZE = 1
+        SMTP_KEEPALIVE = 30      # In seconds, as above
 
     class IMAP:
 
@@ -1358,6 +1378,9 @@ class AMQP:
         POOL_SIZE = 10
         PRIORITY = 5
         PREFETCH_COUNT = 0
+        MAX_IN_FLIGHT = 10
+        ACK_BATCH_SIZE = 10
+        ACK_INTERVAL = 0.5 # In seconds
 
     class ACK_MODE:
         ACK = NameId('Ack', 'ack')
@@ -1366,6 +1389,13 @@ class AMQP:
         def __iter__(self):
             return iter((self.ACK, self.REJECT))
 
+    class PROCESSING_MODE:
+        ORDERED = NameId('Ordered', 'ordered')
+        UNORDERED = NameId('Unordered', 'unordered')
+
+        def __iter__(self):
+            return iter((self.ORDERED, self.UNORDERED))
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -1597,7 +1627,9 @@ class SFTP:
         BANDWIDTH_LIMIT = 10
         BUFFER_SIZE = 32768
         COMMAND_SFTP = 'sftp'
+        COMMAND_SSH = 'ssh'
         COMMAND_PING = 'ls .'
+        CONTROL_PERSIST = 600 # In seconds
         PORT = 22
 
     class LOG_LEVEL:
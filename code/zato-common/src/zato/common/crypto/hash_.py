@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from contextlib import contextmanager
+from logging import getLogger
+
+# gevent
+from gevent.lock import BoundedSemaphore, RLock
+from gevent.threadpool import ThreadPool
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, callable_, iterator_, strlist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ModuleCtx:
+
+    Default_Scheme = 'zato.default'
+
+    # How many hashes can be computed in parallel, by default, one per CPU
+    Default_Pool_Size = os.cpu_count() or 1
+
+    # How many hashing requests can wait for a thread before new ones are rejected
+    Default_Max_Queue_Size = 100
+
+    # How many seconds a hashing request can wait for a place in the queue
+    Default_Queue_Timeout = 5
+
+    # How many hashing requests for the same user or the same remote address can be in progress at a time
+    Default_Max_Per_Key = 3
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class HashPoolBusy(Exception):
+    """ Raised if a hashing request cannot be accepted because the pool is too busy or because there are already
+    too many requests for the same user or remote address in progress.
+    """
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class HashPool:
+    """ Computes and verifies password hashes in a pool of OS threads rather than in the calling greenlet.
+    Hashing functions, e.g. PBKDF2, release the GIL while they run, which means that other greenlets of the same worker
+    are not blocked until a hash is ready. The queue of requests waiting for a thread is bounded and, optionally,
+    there may be at most a given number of requests in progress for each user or remote address, so that a burst
+    of attempts with the same credentials cannot occupy the whole pool.
+    """
+    def __init__(
+        self,
+        crypto_manager, # type: any_
+        pool_size=ModuleCtx.Default_Pool_Size,           # type: int
+        max_queue_size=ModuleCtx.Default_Max_Queue_Size, # type: int
+        queue_timeout=ModuleCtx.Default_Queue_Timeout,   # type: float
+        max_per_key=ModuleCtx.Default_Max_Per_Key,       # type: int
+    ) -> 'None':
+
+        self.crypto_manager = crypto_manager
+        self.pool_size = pool_size
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self.max_per_key = max_per_key
+
+        # Threads do not survive a fork, and the pool may be created before gunicorn forks its workers,
+        # which is why each process creates its own threads, the first time that they are needed.
+        self._threadpool = None # type: ThreadPool | None
+        self._threadpool_pid = None # type: int | None
+
+        # Requests either being hashed or waiting for a thread
+        self.slots = BoundedSemaphore(self.pool_size + self.max_queue_size)
+
+        # Limit key -> how many requests with that key are in progress
+        self.in_progress = {} # type: dict[str, int]
+        self.lock = RLock()
+
+# ################################################################################################################################
+
+    @property
+    def threadpool(self) -> 'ThreadPool':
+
+        pid = os.getpid()
+
+        if self._threadpool is None or self._threadpool_pid != pid:
+            with self.lock:
+                if self._threadpool is None or self._threadpool_pid != pid:
+                    self._threadpool = ThreadPool(self.pool_size)
+                    self._threadpool_pid = pid
+
+        return self._threadpool
+
+# ################################################################################################################################
+
+    def _run(self, func:'callable_', *args:'any_') -> 'any_':
+
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise HashPoolBusy('Hashing queue is full ({} + {})'.format(self.pool_size, self.max_queue_size))
+
+        try:
+            return self.threadpool.apply(func, args)
+        finally:
+            self.slots.release()
+
+# ################################################################################################################################
+
+    @contextmanager
+    def limit(self, keys:'strlist') -> 'iterator_[None]':
+        """ Makes sure that there are not too many hashing requests in progress for any of the keys on input,
+        e.g. for a username or a remote address.
+        """
+        keys = [key for key in keys if key]
+
+        with self.lock:
+            for key in keys:
+                if self.in_progress.get(key, 0) >= self.max_per_key:
+                    raise HashPoolBusy('Too many hashing requests in progress for `{}`'.format(key))
+
+            for key in keys:
+                self.in_progress[key] = self.in_progress.get(key, 0) + 1
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                for key in keys:
+                    value = self.in_progress[key] - 1
+                    if value:
+                        self.in_progress[key] = value
+                    else:
+                        del self.in_progress[key]
+
+# ################################################################################################################################
+
+    def hash_secret(self, data:'any_', name:'str'=ModuleCtx.Default_Scheme) -> 'str':
+        return self._run(self.crypto_manager.hash_secret, data, name)
+
+# ################################################################################################################################
+
+    def verify_hash(
+        self,
+        given,    # type: any_
+        expected, # type: any_
+        name=ModuleCtx.Default_Scheme, # type: str
+        limit_keys=None # type: strlist | None
+    ) -> 'bool':
+
+        if limit_keys:
+            with self.limit(limit_keys):
+                return self._run(self.crypto_manager.verify_hash, given, expected, name)
+        else:
+            return self._run(self.crypto_manager.verify_hash, given, expected, name)
+
+# ################################################################################################################################
+
+    def needs_rehash(self, expected:'any_', name:'str'=ModuleCtx.Default_Scheme) -> 'bool':
+        """ Returns True if a hash was computed with parameters other than the ones currently configured,
+        e.g. with fewer rounds, in which case it should be computed again the next time its secret is known.
+        """
+        try:
+            return self.crypto_manager.hash_scheme[name].needs_update(expected)
+        except Exception:
+            logger.info('Could not check if hash needs to be updated (%s)', name)
+            return False
+
+# ################################################################################################################################
+
+    def close(self) -> 'None':
+        if self._threadpool is not None and self._threadpool_pid == os.getpid():
+            self._threadpool.kill()
+        self._threadpool = None
+
+# ################################################################################################################################
+# ################################################################################################################################
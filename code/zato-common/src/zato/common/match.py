@@ -10,9 +10,11 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+import re
+from collections import OrderedDict
 
 # globre
-from globre import match as globre_match
+from globre import compile as globre_compile, EXACT as globre_EXACT
 
 # Paste
 from paste.util.converters import asbool
@@ -22,17 +24,109 @@ from zato.common.api import FALSE_TRUE, TRUE_FALSE
 
 logger = logging.getLogger(__name__)
 
+# ################################################################################################################################
+
+class default:
+    cache_size = 10000
+
+# ################################################################################################################################
+
+class LRUCache(OrderedDict):
+    """ A dict that keeps at most max_size keys, evicting the least recently used ones first.
+    """
+    def __init__(self, max_size=default.cache_size):
+        super(LRUCache, self).__init__()
+        self.max_size = max_size
+
+    def __getitem__(self, key):
+        value = super(LRUCache, self).__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super(LRUCache, self).__setitem__(key, value)
+        self.move_to_end(key)
+
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+# ################################################################################################################################
+
+class PatternGroup:
+    """ All the patterns of a single order compiled into one matcher. Patterns without wildcards are kept in a set,
+    literal prefixes of all the other ones are kept in a trie and only values that start with one of them
+    are matched against a single regex combining all such patterns.
+    """
+    def __init__(self, patterns):
+        self.literals = set()
+        self.trie = {}
+        self.regex = None
+
+        expressions = []
+
+        for pattern in patterns:
+            prefix, regex = globre_compile(pattern, globre_EXACT, split_prefix=True)
+
+            if regex.pattern == '^' + re.escape(pattern) + '$':
+                self.literals.add(pattern)
+                continue
+
+            node = self.trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[None] = True
+
+            expressions.append('(?:{})'.format(regex.pattern))
+
+        if expressions:
+            self.regex = re.compile('|'.join(expressions))
+
+    def has_prefix(self, value):
+        """ Returns True if value starts with a literal prefix of at least one pattern with wildcards.
+        """
+        node = self.trie
+
+        if None in node:
+            return True
+
+        for char in value:
+            node = node.get(char)
+            if node is None:
+                return False
+            if None in node:
+                return True
+
+        return False
+
+    def match(self, value):
+        if value in self.literals:
+            return True
+
+        if self.regex is not None and self.has_prefix(value):
+            return self.regex.match(value) is not None
+
+        return False
+
+# ################################################################################################################################
+
 class Matcher:
-    def __init__(self):
+    def __init__(self, cache_size=default.cache_size):
         self.config = None
         self.items = {True:[], False:[]}
+        self.groups = {}
         self.order1 = None
         self.order2 = None
-        self.is_allowed_cache = {}
+        self.is_allowed_cache = LRUCache(cache_size)
         self.special_case = None
 
     def read_config(self, config):
+
+        # Configuration may be read more than once so we always start afresh
         self.config = config
+        self.items = {True:[], False:[]}
+        self.special_case = None
+        self.clear_cache()
+
         order = config.get('order', FALSE_TRUE)
         self.order1, self.order2 = (True, False) if order == TRUE_FALSE else (False, True)
 
@@ -51,13 +145,20 @@ class Matcher:
         for key in self.items:
             self.items[key] = sorted(self.items[key], reverse=True)
 
+        # Compile each order's patterns upfront, once for all the values to be matched against them
+        self.groups = {key: PatternGroup(value) for key, value in self.items.items()}
+
         for empty, non_empty in ((True, False), (False, True)):
             if not self.items[empty] and '*' in self.items[non_empty]:
                 self.special_case = non_empty
                 break
 
+    def clear_cache(self):
+        """ Invalidates results of previous matches, e.g. because patterns have changed.
+        """
+        self.is_allowed_cache.clear()
+
     def is_allowed(self, value):
-        logger.debug('Cache:`%s`, value:`%s`', self.is_allowed_cache, value)
 
         if self.special_case is not None:
             return self.special_case
@@ -65,16 +166,16 @@ class Matcher:
         try:
             return self.is_allowed_cache[value]
         except KeyError:
-            _match = globre_match
-            is_allowed = None
 
-            for order in self.order1, self.order2:
-                for pattern in self.items[order]:
-                    if _match(pattern, value):
-                        is_allowed = order
-
-            # No match at all - we don't allow it in that case
-            is_allowed = is_allowed if (is_allowed is not None) else False
+            # The last order that matches decides, and if there is no match at all, we don't allow it
+            if self.groups[self.order2].match(value):
+                is_allowed = self.order2
+            elif self.groups[self.order1].match(value):
+                is_allowed = self.order1
+            else:
+                is_allowed = False
 
             self.is_allowed_cache[value] = is_allowed
             return is_allowed
+
+# ################################################################################################################################
@@ -799,13 +799,14 @@ class ODBManager(SessionWrapper):
 # ################################################################################################################################
 
     def get_basic_data_deployed_service_list(self):
-        """ Returns basic information about all the deployed services in ODB.
+        """ Returns basic information about all the deployed services in ODB. Only hashes of the source code
+        are returned, which is enough to find out whether a service changed and much less than the source itself.
         """
         with closing(self.session()) as session:
 
             query = select([
                 ServiceTable.c.name,
-                DeployedServiceTable.c.source,
+                DeployedServiceTable.c.source_hash,
             ]).where(and_(
                 DeployedServiceTable.c.service_id==ServiceTable.c.id,
                 DeployedServiceTable.c.server_id==self.server_id
@@ -846,6 +847,17 @@ class ODBManager(SessionWrapper):
             where(DeployedService.service_id.in_(service_id_list))
         )
 
+# ################################################################################################################################
+
+    def drop_deployed_services_by_id(self, session, server_id, service_id_list):
+        """ Removes deployed services from a single server by their service IDs.
+        """
+        session.execute(
+            DeployedServiceDelete().\
+            where(DeployedService.server_id==server_id).\
+            where(DeployedService.service_id.in_(service_id_list))
+        )
+
 # ################################################################################################################################
 
     def drop_deployed_services(self, server_id):
@@ -20,7 +20,7 @@ from sqlalchemy.sql.expression import case
 
 # Zato
 from zato.common.api import CACHE, DEFAULT_HTTP_PING_METHOD, DEFAULT_HTTP_POOL_SIZE, GENERIC, HTTP_SOAP_SERIALIZATION_TYPE, \
-     PARAMS_PRIORITY, PUBSUB, URL_PARAMS_PRIORITY
+     PARAMS_PRIORITY, PUBSUB, SEARCH, URL_PARAMS_PRIORITY
 from zato.common.json_internal import loads
 from zato.common.odb.model import AWSS3, APIKeySecurity, AWSSecurity, Cache, CacheBuiltin, CacheMemcached, CassandraConn, \
      CassandraQuery, ChannelAMQP, ChannelWebSocket, ChannelWMQ, ChannelZMQ, Cluster, ConnDefAMQP, ConnDefWMQ, \
@@ -51,6 +51,10 @@ _not_given = object()
 _no_page_limit = 2 ** 24 # ~16.7 million results, tops
 _gen_attr = GENERIC.ATTR_NAME
 
+_total_exact = SEARCH.ZATO.TOTAL.EXACT
+_total_approx = SEARCH.ZATO.TOTAL.APPROX
+_total_none = SEARCH.ZATO.TOTAL.NONE
+
 # ################################################################################################################################
 
 def count(session, q):
@@ -59,6 +63,54 @@ def count(session, q):
 
 # ################################################################################################################################
 
+def approx_count(session, q):
+    """ Returns the number of rows that the query planner expects the query to return. This is available in PostgreSQL only
+    and, in other databases, an exact count is returned instead.
+    """
+    if session.bind.dialect.name != 'postgresql':
+        return count(session, q)
+
+    _q = q.statement.order_by(None)
+    compiled = _q.compile(dialect=session.bind.dialect)
+
+    plan = session.connection().execute('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+    plan = plan if isinstance(plan, list) else loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+# ################################################################################################################################
+
+def get_keyset_column(q):
+    """ Returns the column that keyset pagination of a given query is based on, i.e. its ID.
+    """
+    for item in q.column_descriptions:
+        if item['name'] == 'id':
+            return item['expr']
+
+    # The query may be one returning whole objects rather than individual columns
+    for item in q.column_descriptions:
+        if column := getattr(item['entity'], 'id', None):
+            return column
+
+    raise ValueError('Query has no `id` column to paginate by -> {}'.format(q))
+
+# ################################################################################################################################
+
+def keyset_page(q, cursor, page_size, is_desc=False):
+    """ Returns a query for a page of results following the cursor, i.e. the last ID returned previously.
+    One more row than page_size is returned to let the caller know whether there is a next page.
+    """
+    column = get_keyset_column(q)
+
+    if cursor is not None and cursor != '':
+        cursor = int(cursor)
+        q = q.filter(column < cursor if is_desc else column > cursor)
+
+    q = q.order_by(None).order_by(column.desc() if is_desc else column)
+    return q.limit(page_size + 1)
+
+# ################################################################################################################################
+
 class _QueryConfig:
 
     @staticmethod
@@ -108,17 +160,29 @@ class _SearchWrapper:
                 q = q.filter(combine_criteria_using(*filters))
 
         # Total number of results
-        total_q = q.statement.with_only_columns([func.count()]).order_by(None)
-        self.total = q.session.execute(total_q).scalar()
+        total_mode = config.get('total_mode') or _total_exact
+        if total_mode == _total_approx:
+            self.total = approx_count(q.session, q)
+        elif total_mode == _total_none:
+            self.total = None
+        else:
+            self.total = count(q.session, q)
 
         # Pagination
         page_size = config.get('page_size', default_page_size)
         cur_page = config.get('cur_page', 0)
 
-        slice_from = cur_page * page_size
-        slice_to = slice_from + page_size
+        # In the keyset mode, we do not use OFFSET, which needs to read all the preceding rows each time,
+        # and instead we go from the last ID that the caller has already seen, using the column's index.
+        if config.get('is_keyset'):
+            self.q = keyset_page(q, config.get('cursor'), page_size, config.get('cursor_desc'))
+            self.is_keyset = True
+        else:
+            slice_from = cur_page * page_size
+            slice_to = slice_from + page_size
 
-        self.q = q.slice(slice_from, slice_to)
+            self.q = q.slice(slice_from, slice_to)
+            self.is_keyset = False
 
 # ################################################################################################################################
 
@@ -142,6 +206,9 @@ def query_wrapper(func):
         tool = _SearchWrapper(result, **kwargs)
         result = _SearchResults(tool.q, tool.q.all(), tool.q.statement.columns, tool.total)
 
+        if tool.is_keyset:
+            result.set_keyset_data(get_keyset_column(tool.q).key, kwargs.get('page_size', _no_page_limit))
+
         if needs_columns:
             return result, result.columns
 
@@ -11,7 +11,7 @@ import operator
 from logging import getLogger
 
 # SQLAlchemy
-from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy import and_, delete, exists, func, or_, select, text
 
 # Zato
 from zato.common.odb.model import PubSubEndpoint, PubSubEndpointEnqueuedMessage, PubSubMessage, PubSubSubscription, PubSubTopic
@@ -23,7 +23,9 @@ if 0:
     from datetime import datetime
     from sqlalchemy.orm.query import Query
     from sqlalchemy.orm.session import Session as SASession
-    from zato.common.typing_ import any_, anylist, strlist
+    from sqlalchemy import Table
+    from sqlalchemy.sql.elements import ClauseElement
+    from zato.common.typing_ import any_, anylist, intnone, strlist
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -235,3 +237,146 @@ def delete_topic_messages(session:'SASession', msg_id_list:'strlist') -> 'None':
 
 # ################################################################################################################################
 # ################################################################################################################################
+
+#
+# The functions below are used by the set-based cleanup strategy. Rather than reading messages in to delete them
+# by their IDs, they let the database find and delete them in batches bounded by ranges of primary keys.
+#
+
+def get_topic_messages_already_expired_condition(topic_id:'int', max_time_float:'float') -> 'ClauseElement':
+    return and_(
+        MsgTable.c.topic_id == topic_id,
+        MsgTable.c.expiration_time < max_time_float,
+    )
+
+# ################################################################################################################################
+
+def get_topic_messages_with_max_retention_reached_condition(topic_id:'int', max_time_float:'float') -> 'ClauseElement':
+    return and_(
+        MsgTable.c.topic_id == topic_id,
+        MsgTable.c.pub_time < max_time_float,
+    )
+
+# ################################################################################################################################
+
+def get_topic_messages_without_subscribers_condition(topic_id:'int', max_time_float:'float') -> 'ClauseElement':
+    return and_(
+        MsgTable.c.topic_id == topic_id,
+        MsgTable.c.pub_time < max_time_float,
+        ~exists().where(QueueTable.c.pub_msg_id == MsgTable.c.pub_msg_id),
+    )
+
+# ################################################################################################################################
+
+def get_queue_messages_condition(sub_key:'str', max_time_float:'float') -> 'ClauseElement':
+    return and_(
+        QueueTable.c.sub_key == sub_key,
+        QueueTable.c.creation_time < max_time_float,
+    )
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_min_id(session:'SASession', table:'Table', condition:'ClauseElement') -> 'intnone':
+    """ Returns the lowest primary key of all the rows matching the condition.
+    """
+    query = select([func.min(table.c.id)]).where(condition)
+    return session.execute(query).scalar()
+
+# ################################################################################################################################
+
+def get_id_range_end(session:'SASession', table:'Table', condition:'ClauseElement', min_id:'int', batch_size:'int') -> 'intnone':
+    """ Returns the primary key that a batch of up to batch_size rows matching the condition, starting at min_id, ends at,
+    exclusive, or None if there are no more than batch_size such rows left.
+    """
+    query = select([table.c.id]).\
+        where(and_(
+            table.c.id >= min_id,
+            condition,
+        )).\
+        order_by(table.c.id).\
+        offset(batch_size).\
+        limit(1)
+
+    return session.execute(query).scalar()
+
+# ################################################################################################################################
+
+def delete_by_id_range(
+    session:'SASession',
+    table:'Table',
+    condition:'ClauseElement',
+    min_id:'int',
+    max_id:'intnone',
+    ) -> 'int':
+    """ Deletes all the rows matching the condition whose primary keys are greater than or equal to min_id
+    and, unless it is None, lower than max_id. Returns the number of rows deleted.
+    """
+    id_condition = table.c.id >= min_id
+
+    if max_id is not None:
+        id_condition = and_(id_condition, table.c.id < max_id)
+
+    result = session.execute(
+        delete(table).\
+        where(and_(
+            id_condition,
+            condition,
+        ))
+    )
+
+    return result.rowcount
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_message_partitions(session:'SASession') -> 'strlist':
+    """ Returns names of all the partitions of the topic message table, assuming that it is a partitioned table.
+    Only PostgreSQL is supported - under other databases, the result is always an empty list.
+    """
+    if session.bind.dialect.name != 'postgresql':
+        return []
+
+    query = text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE parent.relname = :table_name
+        ORDER BY child.relname
+    """)
+
+    result = session.execute(query, {'table_name': MsgTable.name}).fetchall()
+    return [elem[0] for elem in result]
+
+# ################################################################################################################################
+
+def is_message_partition_expired(session:'SASession', partition_name:'str', max_time_float:'float') -> 'bool':
+    """ Returns True if all the messages in a partition have already expired.
+    """
+    quoted_partition_name = session.bind.dialect.identifier_preparer.quote(partition_name)
+
+    query = text("""
+        SELECT 1 FROM {} WHERE expiration_time IS NULL OR expiration_time >= :max_time LIMIT 1
+    """.format(quoted_partition_name))
+
+    return session.execute(query, {'max_time': max_time_float}).first() is None
+
+# ################################################################################################################################
+
+def drop_message_partition(session:'SASession', partition_name:'str') -> 'int':
+    """ Deletes all the queue messages pointing to messages from a partition and drops the partition.
+    Returns the number of queue messages deleted.
+    """
+    quoted_partition_name = session.bind.dialect.identifier_preparer.quote(partition_name)
+
+    result = session.execute(text("""
+        DELETE FROM {queue_table} WHERE pub_msg_id IN (SELECT pub_msg_id FROM {partition})
+    """.format(queue_table=QueueTable.name, partition=quoted_partition_name)))
+
+    session.execute(text('DROP TABLE {}'.format(quoted_partition_name)))
+
+    return result.rowcount
+
+# ################################################################################################################################
+# ################################################################################################################################
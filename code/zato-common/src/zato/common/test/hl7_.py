@@ -12,3 +12,13 @@ EVN||200605290901||||200605290900
 PID|||56782445^^^UAReg^PI||KLEINSAMPLE^BARRY^Q^JR||19620910|M||2028-9^^HL70005^RA99113^^XYZ|260 GOODWIN CREST DRIVE^^BIRMINGHAM^AL^35209^^M~NICKELL'S PICKLES^10000 W 100TH AVE^BIRMINGHAM^AL^35200^^O|||||||0105I30001^^^99DEF^AN
 PV1||I|W^389^1^UABH^^^^3||||12345^MORGAN^REX^J^^^MD^0010^UAMC^L||67890^GRAINGER^LUCY^X^^^MD^0010^UAMC^L|MED|||||A0||13579^POTTER^SHERMAN^T^^^MD^0010^UAMC^L|||||||||||||||||||||||||||200605290900
 """.strip().replace('\n', '\r') # noqa: E501, W605
+
+test_data_oru_r01 = """
+MSH|^~\\&|LabSys|XYZLab|EHR|XYZHospC|20060529090131-0500||ORU^R01^ORU_R01|LAB0529001|P|2.5
+PID|||56782445^^^UAReg^PI||KLEINSAMPLE^BARRY^Q^JR||19620910|M
+OBR|1|845439^GHH OE|1045813^GHH LAB|15545^GLUCOSE|||200605290800
+OBX|1|NM|15074-8^GLUCOSE^LN||182|mg/dl|70-105|H|||F
+OBX|2|NM|2951-2^SODIUM^LN||139|mmol/l|136-145|N|||F
+OBX|3|NM|2823-3^POTASSIUM^LN||4.2|mmol/l|3.5-5.1|N|||F
+OBX|4|ED|PDF^Report^L||^application^pdf^Base64^JVBERi0xLjQKJcfsj6IKNSAwIG9iago8PC9MZW5ndGggNiAwIFI+PgpzdHJlYW0K||||||F
+""".strip().replace('\n', '\r') # noqa: E501, W605
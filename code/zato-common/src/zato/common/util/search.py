@@ -16,7 +16,8 @@ if 0:
 # ################################################################################################################################
 # ################################################################################################################################
 
-_search_attrs = 'num_pages', 'cur_page', 'prev_page', 'next_page', 'has_prev_page', 'has_next_page', 'page_size', 'total'
+_search_attrs = 'num_pages', 'cur_page', 'prev_page', 'next_page', 'has_prev_page', 'has_next_page', 'page_size', 'total', \
+    'next_cursor'
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -35,6 +36,8 @@ class SearchResults:
         self.has_prev_page = False
         self.has_next_page = False
         self.page_size = None # type: int
+        self.next_cursor = None
+        self.is_keyset = False
 
 # ################################################################################################################################
 
@@ -48,11 +51,34 @@ class SearchResults:
         from zato.common.util.api import make_repr
         return make_repr(self)
 
+# ################################################################################################################################
+
+    def set_keyset_data(self, column_name, page_size):
+        # type: (str, int) -> None
+        """ Sets pagination information for results of a query that was given a cursor rather than a page number.
+        Such a query returns one more row than there is on a page if there is a next page.
+        """
+        self.is_keyset = True
+        self.page_size = page_size
+        self.has_next_page = len(self.result) > page_size
+        self.result = self.result[:page_size]
+
+        if self.has_next_page:
+            self.next_cursor = getattr(self.result[-1], column_name)
+
 # ################################################################################################################################
 
     def set_data(self, cur_page, page_size):
 
-        num_pages, rest = divmod(self.total, page_size)
+        # Page numbers have no meaning with cursors and all the data has been already set
+        if self.is_keyset:
+            return
+
+        # We may not have been asked to count the results
+        if self.total is None:
+            num_pages, rest = 0, 0
+        else:
+            num_pages, rest = divmod(self.total, page_size)
 
         # Apparently there are some results in rest that did not fit a full page
         if rest:
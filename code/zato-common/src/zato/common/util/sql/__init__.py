@@ -46,6 +46,8 @@ has_debug = logger_zato.isEnabledFor(DEBUG) or logger_pubsub.isEnabledFor(DEBUG)
 _default_page_size = SEARCH.ZATO.DEFAULTS.PAGE_SIZE
 _max_page_size = _default_page_size * 5
 
+_total_exact = SEARCH.ZATO.TOTAL.EXACT
+
 # All exceptions that can be raised when deadlocks occur
 _DeadlockException = (SAInternalError, SAOperationalError)
 
@@ -53,7 +55,7 @@ _DeadlockException = (SAInternalError, SAOperationalError)
 # but the underlying PyMySQL library returns only a string rather than an integer code.
 _deadlock_code = 'Deadlock found when trying to get lock'
 
-_zato_opaque_skip_attrs = {'needs_details', 'paginate', 'cur_page', 'query'}
+_zato_opaque_skip_attrs = {'needs_details', 'paginate', 'cur_page', 'query', 'cursor', 'use_cursor', 'cursor_desc', 'total_mode'}
 
 # ################################################################################################################################
 
@@ -82,8 +84,17 @@ def search(search_func, config, filter_by, session=None, cluster_id=None, *args,
         'where': kwargs.get('where'),
         'filter_op': kwargs.get('filter_op'),
         'data_filter': kwargs.get('data_filter'),
+        'total_mode': config.get('total_mode') or _total_exact,
     }
 
+    # Callers that already have a cursor or that ask for one will get a page following the cursor
+    # rather than a page with a given number.
+    cursor = config.get('cursor')
+    if cursor or config.get('use_cursor'):
+        kwargs['is_keyset'] = True
+        kwargs['cursor'] = cursor or None
+        kwargs['cursor_desc'] = config.get('cursor_desc', False)
+
     query = config.get('query')
     if query:
         query = query.strip().split()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from threading import get_ident
+from time import sleep as time_sleep
+from unittest import TestCase
+
+# gevent
+import gevent
+
+# Zato
+from zato.common.crypto import hash_
+from zato.common.crypto.hash_ import HashPool, HashPoolBusy
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Scheme:
+    def __init__(self, rounds:'int') -> 'None':
+        self.rounds = rounds
+
+    def needs_update(self, hashed:'str') -> 'bool':
+        return not hashed.startswith('{}$'.format(self.rounds))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _CryptoManager:
+    """ Stands in for CryptoManager - each hash takes some time to compute, as it would with a real one.
+    """
+    def __init__(self, delay:'float'=0.05) -> 'None':
+        self.delay = delay
+        self.thread_ids = set()
+        self.hash_scheme = {'zato.default': _Scheme(1000)}
+
+    def hash_secret(self, data:'any_', name:'str') -> 'str':
+        self.thread_ids.add(get_ident())
+        time_sleep(self.delay)
+        return '{}${}'.format(self.hash_scheme[name].rounds, data)
+
+    def verify_hash(self, given:'any_', expected:'any_', name:'str') -> 'bool':
+        return self.hash_secret(given, name) == expected
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class HashPoolTestCase(TestCase):
+
+    def test_hashing_does_not_block_greenlets(self) -> 'None':
+
+        crypto_manager = _CryptoManager()
+        pool = HashPool(crypto_manager, pool_size=2)
+
+        ticks = []
+
+        def _ticker() -> 'None':
+            for _ in range(5):
+                ticks.append(1)
+                gevent.sleep(0.01)
+
+        ticker = gevent.spawn(_ticker)
+        result = pool.hash_secret('secret')
+        ticker.join()
+
+        self.assertEqual(result, '1000$secret')
+        self.assertTrue(pool.verify_hash('secret', result))
+
+        # Other greenlets ran while the hash was being computed in another thread
+        self.assertGreater(len(ticks), 1)
+        self.assertNotIn(get_ident(), crypto_manager.thread_ids)
+
+        pool.close()
+
+# ################################################################################################################################
+
+    def test_limit_per_key(self) -> 'None':
+
+        pool = HashPool(_CryptoManager(), pool_size=4, max_per_key=2)
+
+        greenlets = [gevent.spawn(pool.verify_hash, 'secret', '1000$secret', limit_keys=['user.1']) for _ in range(3)]
+        gevent.joinall(greenlets)
+
+        results = [greenlet.value for greenlet in greenlets]
+        errors = [greenlet.exception for greenlet in greenlets if greenlet.exception]
+
+        # Only two requests for the same user could be in progress at the same time ..
+        self.assertEqual(results.count(True), 2)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], HashPoolBusy)
+
+        # .. and when they are completed, new ones are accepted again.
+        self.assertDictEqual(pool.in_progress, {})
+        self.assertTrue(pool.verify_hash('secret', '1000$secret', limit_keys=['user.1']))
+
+        pool.close()
+
+# ################################################################################################################################
+
+    def test_queue_is_bounded(self) -> 'None':
+
+        pool = HashPool(_CryptoManager(0.2), pool_size=1, max_queue_size=1, queue_timeout=0.01)
+
+        greenlets = [gevent.spawn(pool.hash_secret, 'secret') for _ in range(3)]
+        gevent.joinall(greenlets)
+
+        errors = [greenlet.exception for greenlet in greenlets if greenlet.exception]
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], HashPoolBusy)
+
+        pool.close()
+
+# ################################################################################################################################
+
+    def test_needs_rehash(self) -> 'None':
+
+        crypto_manager = _CryptoManager(0)
+        pool = HashPool(crypto_manager)
+
+        hashed = pool.hash_secret('secret')
+        self.assertFalse(pool.needs_rehash(hashed))
+
+        # The cost was changed in configuration
+        crypto_manager.hash_scheme['zato.default'] = _Scheme(2000)
+        self.assertTrue(pool.needs_rehash(hashed))
+
+        pool.close()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+    def test_threadpool_per_process(self) -> 'None':
+
+        # No threads are created until the pool is used ..
+        pool = HashPool(_CryptoManager(0))
+        self.assertIsNone(pool._threadpool)
+
+        _ = pool.hash_secret('secret')
+        threadpool = pool._threadpool
+        self.assertIsNotNone(threadpool)
+
+        # .. they are reused in the same process ..
+        _ = pool.hash_secret('secret')
+        self.assertIs(pool._threadpool, threadpool)
+
+        # .. but a forked one creates its own.
+        pid = os.getpid() + 1
+        original_getpid = hash_.os.getpid
+        hash_.os.getpid = lambda: pid
+
+        try:
+            _ = pool.hash_secret('secret')
+            self.assertIsNot(pool._threadpool, threadpool)
+            self.assertEqual(pool._threadpool_pid, pid)
+        finally:
+            hash_.os.getpid = original_getpid
+
+        threadpool.kill()
+        pool.close()
+
+# ################################################################################################################################
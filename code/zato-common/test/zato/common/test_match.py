@@ -10,14 +10,18 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from copy import deepcopy
+from random import Random
 from unittest import TestCase
 
 # Bunch
 from bunch import Bunch
 
+# globre
+from globre import match as globre_match
+
 # Zato
 from zato.common.api import FALSE_TRUE, TRUE_FALSE
-from zato.common.match import Matcher
+from zato.common.match import LRUCache, Matcher
 
 default_config = Bunch({
     'order': FALSE_TRUE,
@@ -287,6 +291,9 @@ class MatcherTestCase(TestCase):
                 self.getitem_used += 1
                 return self.impl[key]
 
+            def clear(self):
+                self.impl.clear()
+
         m = Matcher()
         m.is_allowed_cache = FakeCache()
         m.read_config(default_config)
@@ -327,4 +334,79 @@ class MatcherTestCase(TestCase):
         m.is_allowed('aaa.zxc')
         self.assertEqual(m.is_allowed_cache, {})
 
+# ################################################################################################################################
+
+    def test_is_allowed_cache_is_bounded(self):
+
+        m = Matcher(cache_size=2)
+        m.read_config(default_config)
+
+        m.is_allowed('aaa.zxc')
+        m.is_allowed('bbb.zxc')
+
+        # Reading a key marks it as the most recently used one ..
+        m.is_allowed('aaa.zxc')
+
+        # .. so it is the other one that is evicted when a new key is added.
+        m.is_allowed('qwe.444.aaa')
+        self.assertIsInstance(m.is_allowed_cache, LRUCache)
+        self.assertListEqual(list(m.is_allowed_cache), ['aaa.zxc', 'qwe.444.aaa'])
+
+# ################################################################################################################################
+
+    def test_read_config_invalidates(self):
+
+        m = Matcher()
+        m.read_config(default_config)
+        self.assertIs(m.is_allowed('aaa.zxc'), True)
+
+        # New configuration replaces the previous one completely, including any results already cached
+        config = Bunch({'order':FALSE_TRUE, 'abc.*':True, '*.zxc':False})
+        m.read_config(config)
+
+        self.assertDictEqual(m.is_allowed_cache, {})
+        self.assertListEqual(m.items[True], ['abc.*'])
+        self.assertListEqual(m.items[False], ['*.zxc'])
+        self.assertIs(m.is_allowed('aaa.zxc'), False)
+
+# ################################################################################################################################
+
+    def test_is_allowed_same_as_globre(self):
+
+        chars = 'ab.*?/'
+
+        # A fixed seed means that each run checks the same patterns and values
+        random = Random(9001)
+
+        def get_pattern():
+            return ''.join(random.choice(chars) for _ in range(random.randint(1, 6)))
+
+        def get_value():
+            return ''.join(random.choice('ab./') for _ in range(random.randint(0, 6)))
+
+        for _ in range(200):
+
+            config = Bunch({'order': random.choice((FALSE_TRUE, TRUE_FALSE))})
+            for _ in range(random.randint(1, 8)):
+                config[get_pattern()] = random.choice((True, False))
+
+            m = Matcher()
+            m.read_config(config)
+
+            if m.special_case is not None:
+                continue
+
+            for _ in range(20):
+                value = get_value()
+
+                # This is how each value was matched before patterns were compiled
+                expected = None
+                for order in m.order1, m.order2:
+                    for pattern in m.items[order]:
+                        if globre_match(pattern, value):
+                            expected = order
+                expected = expected if (expected is not None) else False
+
+                self.assertIs(m.is_allowed(value), expected, (config, value))
+
 # ################################################################################################################################
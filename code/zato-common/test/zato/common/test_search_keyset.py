@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from unittest import main, TestCase
+
+# SQLAlchemy
+from sqlalchemy import Column, create_engine, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common.api import SEARCH
+from zato.common.odb.query import query_wrapper
+from zato.common.util.sql import search
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+Base = declarative_base()
+
+class Item(Base):
+    __tablename__ = 'test_item'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(200), nullable=False)
+    cluster_id = Column(Integer, nullable=False)
+
+# ################################################################################################################################
+
+def _item_list(session:'any_', cluster_id:'int') -> 'any_':
+    return session.query(Item.id, Item.name).\
+        filter(Item.cluster_id==cluster_id).\
+        order_by(Item.name)
+
+@query_wrapper
+def item_list(session:'any_', cluster_id:'int', needs_columns:'bool'=False) -> 'any_':
+    return _item_list(session, cluster_id)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class KeysetSearchTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+
+        self.session = sessionmaker(bind=engine)()
+
+        # Names are in the reverse order of IDs, and the second cluster's items should never be returned
+        for idx in range(1, 12):
+            self.session.add(Item(id=idx, name='item.{:02}'.format(20 - idx), cluster_id=1))
+            self.session.add(Item(id=idx + 100, name='item.{:02}'.format(idx), cluster_id=2))
+
+        self.session.commit()
+
+    def tearDown(self) -> 'None':
+        self.session.close()
+
+# ################################################################################################################################
+
+    def _search(self, **config:'any_') -> 'any_':
+        config.setdefault('page_size', 5)
+        return search(item_list, config, [Item.name], self.session, 1, False)
+
+# ################################################################################################################################
+
+    def _get_ids(self, result:'anylist') -> 'anylist':
+        return [item.id for item in result]
+
+# ################################################################################################################################
+
+    def test_pages(self) -> 'None':
+
+        result = self._search(use_cursor=True)
+
+        # The first page starts from the lowest ID ..
+        self.assertListEqual(self._get_ids(result), [1, 2, 3, 4, 5])
+        self.assertTrue(result.has_next_page)
+        self.assertEqual(result.next_cursor, 5)
+        self.assertEqual(result.total, 11)
+
+        # .. the next one continues from where the previous one finished ..
+        result = self._search(cursor=result.next_cursor)
+        self.assertListEqual(self._get_ids(result), [6, 7, 8, 9, 10])
+
+        # .. and the last one lets the caller know that there are no more results.
+        result = self._search(cursor=result.next_cursor)
+        self.assertListEqual(self._get_ids(result), [11])
+        self.assertFalse(result.has_next_page)
+        self.assertIsNone(result.next_cursor)
+
+        # All the pagination information is available to the caller
+        search_meta = result.to_dict()
+        self.assertEqual(search_meta['page_size'], 5)
+        self.assertIsNone(search_meta['next_cursor'])
+
+# ################################################################################################################################
+
+    def test_pages_desc(self) -> 'None':
+
+        result = self._search(use_cursor=True, cursor_desc=True)
+        self.assertListEqual(self._get_ids(result), [11, 10, 9, 8, 7])
+
+        result = self._search(cursor=result.next_cursor, cursor_desc=True)
+        self.assertListEqual(self._get_ids(result), [6, 5, 4, 3, 2])
+
+# ################################################################################################################################
+
+    def test_query_and_total_mode(self) -> 'None':
+
+        result = self._search(use_cursor=True, query='item.1', total_mode=SEARCH.ZATO.TOTAL.NONE)
+
+        # Search criteria are still applied and the results are not counted if not required
+        self.assertListEqual(self._get_ids(result), [1, 2, 3, 4, 5])
+        self.assertIsNone(result.total)
+
+        # Outside PostgreSQL, approximate counts are exact ones
+        result = self._search(use_cursor=True, total_mode=SEARCH.ZATO.TOTAL.APPROX)
+        self.assertEqual(result.total, 11)
+
+# ################################################################################################################################
+
+    def test_page_numbers(self) -> 'None':
+
+        # Without a cursor, pages are still available by their numbers, sorted the way the query sorts them
+        result = self._search(cur_page=2)
+        self.assertListEqual(self._get_ids(result), [6, 5, 4, 3, 2])
+        self.assertEqual(result.num_pages, 3)
+        self.assertIsNone(result.next_cursor)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -13,7 +13,7 @@ from zato.common.api import HL7
 # ################################################################################################################################
 
 impl_class_all     = {HL7.Const.ImplClass.hl7apy, HL7.Const.ImplClass.zato}
-impl_class_current = {HL7.Const.ImplClass.hl7apy}
+impl_class_current = {HL7.Const.ImplClass.hl7apy, HL7.Const.ImplClass.zato}
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import re
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from hl7apy.core import Message
+    from zato.common.typing_ import any_, strlist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# Segments are separated by CR but we accept LF and CRLF too
+_segment_re = re.compile(r'[^\r\n]+')
+
+# E.g. PID-3, PID-3.1, PID-3.1.2, PID-3[2].1, OBX[2]-5
+_path_re = re.compile(r'^([A-Z][A-Z0-9]{2})(?:\[(\d+)\])?-(\d+)(?:\[(\d+)\])?(?:\.(\d+))?(?:\.(\d+))?$')
+
+_msh = 'MSH'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LazySegment:
+    """ A single segment of a message whose fields are split only when the first one is read
+    and whose values are decoded only when they are accessed.
+    """
+    __slots__ = 'message', 'id', 'start', 'end', '_fields'
+
+    def __init__(self, message:'LazyMessage', id:'str', start:'int', end:'int') -> 'None':
+        self.message = message
+        self.id = id
+        self.start = start
+        self.end = end
+        self._fields = None # type: strlist | None
+
+# ################################################################################################################################
+
+    def __repr__(self) -> 'str':
+        return '<{} at {} id:{} ({}:{})>'.format(self.__class__.__name__, hex(id(self)), self.id, self.start, self.end)
+
+# ################################################################################################################################
+
+    @property
+    def raw(self) -> 'str':
+        return self.message.data[self.start:self.end]
+
+# ################################################################################################################################
+
+    def _get_fields(self) -> 'strlist':
+        if self._fields is None:
+            self._fields = self.raw.split(self.message.field_sep)
+        return self._fields
+
+# ################################################################################################################################
+
+    def get_raw(self, field:'int') -> 'str':
+        """ Returns a field as it was received, without decoding any escape sequences.
+        """
+        fields = self._get_fields()
+
+        # In MSH, the field separator itself is MSH-1, which means that all the other fields are shifted by one.
+        if self.id == _msh:
+            if field == 1:
+                return self.message.field_sep
+            idx = field - 1
+        else:
+            idx = field
+
+        return fields[idx] if 0 < idx < len(fields) else ''
+
+# ################################################################################################################################
+
+    def get(
+        self,
+        field,             # type: int
+        component=None,    # type: int | None
+        subcomponent=None, # type: int | None
+        repetition=None    # type: int | None
+    ) -> 'str':
+        """ Returns a decoded value of a field, its component or subcomponent. All indexes are 1-based,
+        as in HL7 itself. If repetition is not given, the whole field is returned if no component is requested,
+        otherwise, the component is looked up in the first repetition.
+        """
+        message = self.message
+        value = self.get_raw(field)
+
+        # MSH-1 and MSH-2 describe the separators themselves so they are never decoded
+        if self.id == _msh and field < 3:
+            return value
+
+        if repetition is not None or component is not None:
+            repetitions = value.split(message.repetition_sep)
+            idx = (repetition or 1) - 1
+            value = repetitions[idx] if idx < len(repetitions) else ''
+
+        if component is not None:
+            components = value.split(message.component_sep)
+            idx = component - 1
+            value = components[idx] if idx < len(components) else ''
+
+            if subcomponent is not None:
+                subcomponents = value.split(message.subcomponent_sep)
+                idx = subcomponent - 1
+                value = subcomponents[idx] if idx < len(subcomponents) else ''
+
+        return message.decode(value)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LazyMessage:
+    """ An HL7 v2 message that is tokenized into an index of segments on first access, instead of being fully parsed
+    upfront. Individual values are read through paths such as MSH-9.1 or PID-3 and a full hl7apy message
+    is built only if it is explicitly requested, or if an attribute that only hl7apy provides is accessed.
+    """
+    __slots__ = 'data', 'should_validate', 'field_sep', 'component_sep', 'repetition_sep', 'escape_char', \
+        'subcomponent_sep', '_escape_map', '_segments', '_segments_by_id', '_hl7apy_message'
+
+    def __init__(self, data:'str', should_validate:'bool'=True) -> 'None':
+
+        # This is the only check that we run upfront, everything else is deferred until values are actually accessed
+        if not data.startswith(_msh) or len(data) < 8:
+            raise ValueError('Data does not begin with an MSH segment `{!r}`'.format(data[:8]))
+
+        self.data = data
+        self.should_validate = should_validate
+
+        # Separators are always found at the same positions in MSH
+        self.field_sep = data[3]
+        self.component_sep = data[4]
+        self.repetition_sep = data[5]
+        self.escape_char = data[6]
+        self.subcomponent_sep = data[7]
+
+        self._escape_map = {
+            'F': self.field_sep,
+            'S': self.component_sep,
+            'R': self.repetition_sep,
+            'E': self.escape_char,
+            'T': self.subcomponent_sep,
+        }
+
+        self._segments = None       # type: list[LazySegment] | None
+        self._segments_by_id = None # type: dict | None
+        self._hl7apy_message = None # type: Message | None
+
+# ################################################################################################################################
+
+    def __repr__(self) -> 'str':
+        return '<{} at {} type:{}>'.format(self.__class__.__name__, hex(id(self)), self.get('MSH-9'))
+
+# ################################################################################################################################
+
+    def __str__(self) -> 'str':
+        return self.data
+
+# ################################################################################################################################
+
+    def __getitem__(self, path:'str') -> 'str':
+        return self.get(path)
+
+# ################################################################################################################################
+
+    def __getattr__(self, name:'str') -> 'any_':
+
+        # We are here only if an attribute was not found through regular means, in which case it may be an hl7apy one,
+        # e.g. .MSH or .PID, so we need to parse the message fully. Note that private names are never delegated.
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        return getattr(self.to_hl7apy(), name)
+
+# ################################################################################################################################
+
+    def _build_index(self) -> 'None':
+        """ Tokenizes the message into segment offsets without splitting any of the segments.
+        """
+        data = self.data
+        segments = []
+        segments_by_id = {}
+
+        for match in _segment_re.finditer(data):
+            start, end = match.span()
+            segment = LazySegment(self, data[start:start+3], start, end)
+            segments.append(segment)
+            segments_by_id.setdefault(segment.id, []).append(segment)
+
+        self._segments = segments
+        self._segments_by_id = segments_by_id
+
+# ################################################################################################################################
+
+    @property
+    def segment_ids(self) -> 'strlist':
+        """ Returns IDs of all the segments, in the order they appear in the message.
+        """
+        if self._segments is None:
+            self._build_index()
+        return [elem.id for elem in self._segments] # type: ignore
+
+# ################################################################################################################################
+
+    def segments(self, id:'str') -> 'list[LazySegment]':
+        """ Returns all the segments of a given ID.
+        """
+        if self._segments_by_id is None:
+            self._build_index()
+        return self._segments_by_id.get(id) or [] # type: ignore
+
+# ################################################################################################################################
+
+    def segment(self, id:'str', idx:'int'=1) -> 'LazySegment | None':
+        """ Returns a segment of a given ID, by its 1-based index among all the segments of that ID.
+        """
+        segments = self.segments(id)
+        return segments[idx-1] if 0 < idx <= len(segments) else None
+
+# ################################################################################################################################
+
+    def decode(self, value:'str') -> 'str':
+        """ Replaces HL7 escape sequences with the characters they stand for.
+        """
+        escape_char = self.escape_char
+
+        # Most values have no escape sequences so we can return them as they are
+        if escape_char not in value:
+            return value
+
+        out = []
+        parts = value.split(escape_char)
+
+        # Each escape sequence turns into an element with an odd index after splitting
+        for idx, part in enumerate(parts):
+            if idx % 2:
+                out.append(self._escape_map.get(part, escape_char + part + escape_char))
+            else:
+                out.append(part)
+
+        return ''.join(out)
+
+# ################################################################################################################################
+
+    def get(self, path:'str', default:'str'='') -> 'str':
+        """ Returns a decoded value pointed to by path, e.g. MSH-9, MSH-9.1, PID-3[2].1 or OBX[3]-5.
+        """
+        match = _path_re.match(path)
+        if not match:
+            raise ValueError('Invalid HL7 path `{}`'.format(path))
+
+        segment_id, segment_idx, field, repetition, component, subcomponent = match.groups()
+
+        segment = self.segment(segment_id, int(segment_idx) if segment_idx else 1)
+        if not segment:
+            return default
+
+        return segment.get(
+            int(field),
+            int(component) if component else None,
+            int(subcomponent) if subcomponent else None,
+            int(repetition) if repetition else None,
+        ) or default
+
+# ################################################################################################################################
+
+    @property
+    def message_type(self) -> 'str':
+        return self.get('MSH-9.1')
+
+    @property
+    def trigger_event(self) -> 'str':
+        return self.get('MSH-9.2')
+
+    @property
+    def control_id(self) -> 'str':
+        return self.get('MSH-10')
+
+    @property
+    def version_id(self) -> 'str':
+        return self.get('MSH-12')
+
+# ################################################################################################################################
+
+    def to_hl7apy(self) -> 'Message':
+        """ Parses the message fully using hl7apy. The result is cached so this happens at most once.
+        """
+        if self._hl7apy_message is None:
+
+            # hl7apy
+            from hl7apy.parser import parse_message
+
+            self._hl7apy_message = parse_message(self.data, force_validation=self.should_validate)
+
+        return self._hl7apy_message
+
+# ################################################################################################################################
+
+    def to_er7(self) -> 'str':
+        """ Returns the message serialized to ER7, which is what we were given on input.
+        """
+        return self.data
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def parse_lazy(data:'str', force_validation:'bool'=True) -> 'LazyMessage':
+    """ Returns a message that will be tokenized on first access, without running any hl7apy parsing yet.
+    The signature is the same as that of hl7apy's parse_message.
+    """
+    return LazyMessage(data, force_validation)
+
+# ################################################################################################################################
+# ################################################################################################################################
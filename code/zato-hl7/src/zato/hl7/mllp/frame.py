@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import byteslist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class MLLPFrameError(Exception):
+    """ Raised when data received from a remote end cannot be a valid MLLP frame.
+    """
+    def __init__(self, reason:'str') -> 'None':
+        super().__init__(reason)
+        self.reason = reason
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FrameDecoder:
+    """ An incremental decoder of MLLP frames. Each call to .feed appends new bytes to an internal buffer
+    and returns a list of all the messages that have been completed by these bytes, which means that a single
+    read from a socket may result in zero, one or more messages. Only the newly received bytes are scanned
+    for the end sequence - the part of the buffer that was already scanned is never looked at again.
+    """
+    __slots__ = 'start_seq', 'start_seq_len', 'end_seq', 'end_seq_len', 'max_msg_size', 'buffer', 'scan_from', \
+        'has_header'
+
+    def __init__(
+        self,
+        start_seq,   # type: bytes
+        end_seq,     # type: bytes
+        max_msg_size # type: int
+    ) -> 'None':
+
+        self.start_seq = start_seq
+        self.start_seq_len = len(start_seq)
+
+        self.end_seq = end_seq
+        self.end_seq_len = len(end_seq)
+
+        self.max_msg_size = max_msg_size
+
+        # Bytes of the current message, and possibly more messages following it, that are not processed yet
+        self.buffer = bytearray()
+
+        # Position in the buffer from which we will look up the end sequence next time
+        self.scan_from = 0
+
+        # Whether the current message's header was already received and confirmed to be valid
+        self.has_header = False
+
+# ################################################################################################################################
+
+    @property
+    def pending_size(self) -> 'int':
+        """ Returns the number of bytes received that are not part of any complete message yet.
+        """
+        return len(self.buffer)
+
+# ################################################################################################################################
+
+    def reset(self) -> 'None':
+        """ Drops any data accumulated so far.
+        """
+        self.buffer.clear()
+        self.scan_from = 0
+        self.has_header = False
+
+# ################################################################################################################################
+
+    def _check_header(self) -> 'bool':
+        """ Returns True if the buffer begins with a full header, False if more bytes are needed to confirm it,
+        or raises an exception if the bytes received so far cannot be the beginning of a header.
+        """
+        buffer = self.buffer
+        buffer_len = len(buffer)
+
+        # We do not have all the bytes of the header yet but what we have must be its prefix ..
+        if buffer_len < self.start_seq_len:
+            if buffer != self.start_seq[:buffer_len]:
+                raise MLLPFrameError('header mismatch `{!r}` != `{!r}`'.format(bytes(buffer), self.start_seq))
+            return False
+
+        # .. otherwise, we have enough bytes and the whole header needs to match.
+        if not buffer.startswith(self.start_seq):
+            header = bytes(buffer[:self.start_seq_len])
+            raise MLLPFrameError('header mismatch `{!r}` != `{!r}`'.format(header, self.start_seq))
+
+        # If we are here, it means that the header was correct ..
+        self.has_header = True
+
+        # .. and we can start to look for the trailer right after it.
+        self.scan_from = self.start_seq_len
+
+        return True
+
+# ################################################################################################################################
+
+    def feed(self, data:'bytes | bytearray | memoryview') -> 'byteslist':
+        """ Appends input data to the buffer and returns a list of messages, without their headers and trailers,
+        that are now complete.
+        """
+        out = [] # type: byteslist
+
+        # Local aliases
+        buffer = self.buffer
+        start_seq_len = self.start_seq_len
+        end_seq_len = self.end_seq_len
+        max_msg_size = self.max_msg_size
+
+        buffer += data
+
+        while buffer:
+
+            # Each message needs to begin with a header ..
+            if not self.has_header:
+                if not self._check_header():
+                    break
+
+            # .. look up the trailer in the bytes that have not been scanned yet ..
+            end_idx = buffer.find(self.end_seq, self.scan_from)
+
+            # .. no trailer yet ..
+            if end_idx == -1:
+
+                msg_size = len(buffer) - start_seq_len
+
+                # .. which is fine unless the message has already grown too large ..
+                if msg_size > max_msg_size:
+                    raise MLLPFrameError('message exceeds max. size allowed `{}` > `{}`'.format(msg_size, max_msg_size))
+
+                # .. the next scan will begin with bytes that may turn out to be the beginning of a trailer
+                # split across two reads from the socket.
+                self.scan_from = max(start_seq_len, len(buffer) - end_seq_len + 1)
+                break
+
+            # .. if we are here, it means that we have a complete message ..
+            msg_size = end_idx - start_seq_len
+
+            if msg_size > max_msg_size:
+                raise MLLPFrameError('message exceeds max. size allowed `{}` > `{}`'.format(msg_size, max_msg_size))
+
+            # .. copy its business data out of the buffer, without any intermediate copies ..
+            with memoryview(buffer) as view:
+                out.append(view[start_seq_len:end_idx].tobytes())
+
+            # .. and discard the whole frame. Deleting from the front of a bytearray is amortised O(1)
+            # so this does not move the remaining bytes around.
+            del buffer[:end_idx + end_seq_len]
+
+            # .. whatever remains in the buffer, if anything, is the beginning of the next message.
+            self.has_header = False
+            self.scan_from = 0
+
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -9,7 +9,7 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 # stdlib
 from logging import DEBUG, getLevelName, getLogger
 from socket import timeout as SocketTimeoutException
-from time import sleep
+from time import monotonic, sleep
 from traceback import format_exc
 
 # hl7apy
@@ -21,6 +21,7 @@ from zato.common.audit_log import DataReceived, DataSent
 from zato.common.typing_ import cast_
 from zato.common.util.api import new_cid
 from zato.common.util.tcp import get_fqdn_by_ip, ZatoStreamServer
+from zato.hl7.mllp.frame import FrameDecoder, MLLPFrameError
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -30,7 +31,7 @@ if 0:
     from socket import socket as Socket
     from bunch import Bunch
     from zato.common.audit_log import AuditLog
-    from zato.common.typing_ import any_, anydict, anylist, anytuple, boolnone, byteslist, bytesnone, callable_, type_
+    from zato.common.typing_ import any_, anydict, anytuple, bytesnone, callable_, type_
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -58,9 +59,6 @@ def new_msg_id(
 
 class HandleCompleteMessageArgs:
 
-    _buffer:           'anylist'
-    _buffer_join_func: 'callable_'
-
     conn_ctx:    'ConnCtx'
     request_ctx: 'RequestCtx'
 
@@ -89,6 +87,9 @@ class ConnCtx:
     stats_per_msg_type: 'anydict'
     total_message_packets_received: 'int'
     total_messages_received: 'int'
+    total_bytes_received: 'int'
+    total_bytes_sent: 'int'
+    conn_start_time: 'float'
 
     def __init__(
         self,
@@ -113,6 +114,13 @@ class ConnCtx:
         # Total full messages received, no matter their type
         self.total_messages_received = 0
 
+        # Total bytes received and sent, including MLLP headers and trailers
+        self.total_bytes_received = 0
+        self.total_bytes_sent = 0
+
+        # When the connection was established, used to compute throughput
+        self.conn_start_time = monotonic()
+
         self.peer_fqdn = get_fqdn_by_ip(self.peer_ip, 'peer', server_type)
         self.local_ip, self.local_port, self.local_fqdn = self._get_local_conn_info('local')
 
@@ -124,6 +132,24 @@ class ConnCtx:
             self.local_ip, self.local_port, self.local_fqdn, self.conn_name,
         )
 
+# ################################################################################################################################
+
+    def get_throughput(self) -> 'anydict':
+        """ Returns counters describing how much data has been exchanged through this connection so far.
+        """
+        # Avoid dividing by zero if we are called immediately after the connection was established
+        elapsed = max(monotonic() - self.conn_start_time, 0.001)
+
+        return {
+            'elapsed': elapsed,
+            'total_bytes_received': self.total_bytes_received,
+            'total_bytes_sent': self.total_bytes_sent,
+            'total_messages_received': self.total_messages_received,
+            'total_message_packets_received': self.total_message_packets_received,
+            'bytes_received_per_second': self.total_bytes_received / elapsed,
+            'messages_received_per_second': self.total_messages_received / elapsed,
+        }
+
 # ################################################################################################################################
 
     def _get_local_conn_info(self, default_local_fqdn:'str') -> 'anytuple':
@@ -164,8 +190,6 @@ class RequestCtx:
         self.msg_id = _new_msg_id()
         self.msg_size = 0
         self.data = b''
-        self.meta['has_start_seq'] = False
-        self.meta['has_end_seq'] = False
 
 # ################################################################################################################################
 
@@ -206,12 +230,11 @@ class HL7MLLPServer:
     audit_log: 'AuditLog'
     should_log_messages: 'bool'
 
-    start_seq: 'str'
-    start_seq_len: 'int'
-    start_seq_len_eq_one: 'bool'
+    should_parse_on_input: 'bool'
+    should_validate: 'bool'
 
-    end_seq: 'str'
-    end_seq_len: 'int'
+    start_seq: 'bytes'
+    end_seq: 'bytes'
 
     is_audit_log_sent_active: 'bool'
     is_audit_log_received_active: 'bool'
@@ -242,14 +265,15 @@ class HL7MLLPServer:
         self.name = config.name
         self.service_name = config.service_name
         self.should_log_messages = config.should_log_messages
-        self.read_buffer_size = int(cast_('str', config.read_buffer_size))
 
-        self.start_seq     = cast_('str', config.start_seq)
-        self.start_seq_len = len(self.start_seq)
-        self.start_seq_len_eq_one = self.start_seq_len == 1
+        # Messages are fully parsed before they are handed to services unless the channel is configured otherwise
+        self.should_parse_on_input = config.get('should_parse_on_input', True)
+        self.should_validate = config.get('should_validate', True)
+
+        self.read_buffer_size = int(cast_('str', config.read_buffer_size))
 
-        self.end_seq     = cast_('str', config.end_seq)
-        self.end_seq_len = len(self.end_seq)
+        self.start_seq = cast_('bytes', config.start_seq)
+        self.end_seq   = cast_('bytes', config.end_seq)
 
         self.is_audit_log_sent_active = config.get('is_audit_log_sent_active') or False
         self.is_audit_log_received_active = config.get('is_audit_log_received_active') or False
@@ -318,16 +342,10 @@ class HL7MLLPServer:
 
         self._logger_info('Waiting for HL7 MLLP data from %s', conn_ctx.get_conn_pretty_info())
 
-        # Current message whose contents we are accumulating
-        _buffer = []
-
         # Details of the current message
         request_ctx = RequestCtx()
         request_ctx.conn_id = conn_ctx.conn_id
 
-        # To indicate if message header is already checked or not
-        _needs_header_check = True
-
         # To make fewer namespace lookups
         _max_msg_size = int(cast_('str', self.config.max_msg_size))
         _recv_timeout = self.config.recv_timeout # type: float
@@ -335,187 +353,78 @@ class HL7MLLPServer:
         # We do not want for this to be too small
         _read_buffer_size = max(self.read_buffer_size, self.min_read_buffer_size)
 
+        # Each recv call writes into the same pre-allocated buffer ..
+        _read_buffer = bytearray(_read_buffer_size)
+        _read_view = memoryview(_read_buffer)
+
+        # .. from which complete messages are extracted incrementally.
+        _decoder = FrameDecoder(self.start_seq, self.end_seq, _max_msg_size)
+        _decoder_feed = _decoder.feed
+
         _has_debug_log = self._has_debug_log
         _log_debug = self._logger_debug
 
         _run_callback = self._run_callback
-        _check_header = self._check_header
         _close_connection = self._close_connection
+        _handle_complete_message = self._handle_complete_message
         _request_ctx_reset = request_ctx.reset
-        _buffer_append = _buffer.append
-        _buffer_len    = _buffer.__len__
-        _buffer_join_func = b''.join
 
-        _socket_recv = conn_ctx.socket.recv
+        _socket_recv_into = conn_ctx.socket.recv_into
         _socket_send = conn_ctx.socket.send
         _socket_settimeout = conn_ctx.socket.settimeout
 
         _handle_complete_message_args = HandleCompleteMessageArgs()
-        _handle_complete_message_args._buffer = _buffer
-        _handle_complete_message_args._buffer_join_func = _buffer_join_func
         _handle_complete_message_args.conn_ctx = conn_ctx
         _handle_complete_message_args.request_ctx = request_ctx
         _handle_complete_message_args._socket_send = _socket_send
         _handle_complete_message_args._run_callback = _run_callback
         _handle_complete_message_args._request_ctx_reset = _request_ctx_reset
 
+        # Receive data from the other end
+        _socket_settimeout(_recv_timeout)
+
         # Run the main loop
         while self.keep_running:
 
             try:
-                # In each iteration, assume that no data was received
-                data = None
-
-                # Check whether reading the data would not exceed our message size limit
-                new_size = request_ctx.msg_size + _read_buffer_size
-                if new_size > _max_msg_size:
-                    reason = 'message would exceed max. size allowed `{}` > `{}`'.format(new_size, _max_msg_size)
-                    _close_connection(conn_ctx, reason)
-                    return
-
-                # Receive data from the other end
-                _socket_settimeout(_recv_timeout)
 
                 # Try to receive some data from the socket ..
                 try:
 
                     # .. read data in ..
-                    data = _socket_recv(_read_buffer_size)
-
-                    # .. update counters ..
-                    conn_ctx.total_message_packets_received += 1
-
-                    if _has_debug_log:
-                        _log_debug('HL7 MLLP data received by `%s` (%d) -> `%s`', conn_ctx.conn_id, len(data), data)
+                    data_len = _socket_recv_into(_read_buffer)
 
                 # .. catch timeouts here but no other exception type ..
                 except SocketTimeoutException:
                     # That is fine, we simply did not get any data in this iteration
-                    pass
-
-                # .. no timeout = we may have received some data from the socket ..
-                else:
-
-                    # .. something was received so we can append it to our buffer ..
-                    if data:
-
-                        # If we are here, it means that the recv call succeeded so we can increase the message size
-                        # by how many bytes were actually read from the socket.
-                        request_ctx.msg_size += len(data)
-
-                        # At this point we either do not have all the bytes required to check the header
-                        # or the header is already checked, so we can just append data to our current buffer ..
-                        _buffer_append(data)
-
-                        # The first byte may be a header and we need to check whether we require it or not at this stage of parsing.
-                        # This method will close the connection if anything to do with header parsing is invalid.
-                        if _needs_header_check:
-
-                            # If we have a single-byte header, we can check it immediately. This is because
-                            # we received some data, which means one byte at the very least, so we can go ahead
-                            # with checking the header ..
-                            if self.start_seq_len_eq_one:
-                                if not _check_header(conn_ctx, request_ctx, data):
-                                    return
-                                else:
-                                    _needs_header_check = False
-
-                            # .. but if we have a multi-byte header, we need to ensure we have already
-                            # read as many bytes as there are in the expected header. We do it by iterating
-                            # over the buffer of bytes received so far and concatenating them until we have
-                            # at least as many bytes as there are in the header to check.
-                            else:
-                                to_check_buffer = [] # type: byteslist
-                                to_check_len = 0
-
-                                # Go through each, potentially multi-byte, element in the buffer so far ..
-                                for elem in _buffer:
-                                    elem = cast_('bytes', elem)
-
-                                    # .. break if we have already all the bytes that we need ..
-                                    if to_check_len >= self.start_seq_len:
-                                        break
-
-                                    # .. otherwise, append bytes from the current element
-                                    # and increase the bytes read so far counter.
-                                    else:
-                                        to_check_buffer.append(elem)
-                                        to_check_len += len(elem)
-
-                                # We still need to check if we have the full header worth of bytes already ..
-                                if to_check_len >= self.start_seq_len:
-
-                                    # .. and if we do, we can look up the header now.
-                                    to_check = b''.join(to_check_buffer)
-
-                                    if not _check_header(conn_ctx, request_ctx, to_check):
-                                        return
-                                    else:
-                                        _needs_header_check = False
-
-                                else:
-                                    # .. otherwise, if we do not have enough bytes,
-                                    # we do nothing and this block is added to make it explicit that it is the case.
-                                    pass
-
-                        # .. the line that have just received may have been part of a trailer
-                        # or the trailer itself so we need to check it ..
-
-                        # .. but we need to take into account the fact that the trailer has been split into two or more
-                        # segments. For instance, the previous segment of bytes returned by _socket_recv
-                        # ended with the first byte of end_seq and now we have received the second byte.
-                        # E.g. our _read_buffer_size is 2048 and if the overall message happens to be 2049 bytes
-                        # then the first byte of end_seq will be in the buffer already and the data currently
-                        # received contains the second byte. Note that if someone uses end_seq longer than two bytes
-                        # this will still work because our _read_buffer_size is always at least 2048 bytes
-                        # so end_seq may be split across two segments at most (unless someone uses a multi-kilobyte end_seq,
-                        # which is not something to be expected).
-
-                        # First, try to check if data currently received ends in end_seq ..
-                        if self._points_to_full_message(data):
-
-                            # .. even if it does, make sure we have a header already and reject the message otherwise ..
-                            if _needs_header_check:
-                                reason = 'end bytes `{}` received without a preceeding header `{}` (#1)'.format(
-                                    self.end_seq, self.start_seq)
-                                self._close_connection(conn_ctx, reason)
-                                return
-
-                            # .. it is a match so it means that data was the last part of a message that we can already process ..
-                            self._handle_complete_message(_handle_complete_message_args)
-
-                        # .. otherwise, try to check if in combination with the previous segment,
-                        # the data received now points to a full message. However, for this to work
-                        # we require that there be at least one previous segment - otherwise we are the first one
-                        # and if we were the ending one we would have been caught in the if above ..
-                        else:
-
-                            if _buffer_len() > 1:
-
-                                # Index -1 is our own segment (data) previously appended,
-                                # which is why we use -2 to get the segment preceeding it.
-                                last_data = _buffer[-2] # type: bytes
-                                concatenated = last_data + data
-
-                                # .. now that we have it concatenated, check if that indicates that a full message
-                                # is already received.
-                                if self._points_to_full_message(concatenated):
-
-                                    # Again, even if it does but have not received the header yet,
-                                    # we need to reject the whole message.
-                                    if _needs_header_check:
-                                        reason = 'end bytes `{}` received without a preceeding header `{}` (#2)'.format(
-                                            self.end_seq, self.start_seq)
-                                        self._close_connection(conn_ctx, reason)
-                                        return
-
-                                    self._handle_complete_message(_handle_complete_message_args)
-
-                    # No data received = remote end is no longer connected.
-                    else:
-                        reason = 'remote end disconnected; `{}`'.format(data)
-                        _close_connection(conn_ctx, reason)
-                        return
+                    continue
+
+                # .. no data received = remote end is no longer connected ..
+                if not data_len:
+                    _close_connection(conn_ctx, 'remote end disconnected')
+                    return
+
+                # .. update counters ..
+                conn_ctx.total_message_packets_received += 1
+                conn_ctx.total_bytes_received += data_len
+
+                data = _read_view[:data_len]
+
+                if _has_debug_log:
+                    _log_debug('HL7 MLLP data received by `%s` (%d) -> `%s`', conn_ctx.conn_id, data_len, data.tobytes())
+
+                # .. extract all the messages that this chunk of data completes, if any. Note that only the newly
+                # received bytes are scanned and that the decoder will raise an exception if the header is invalid
+                # or if the message would exceed the max. size allowed ..
+                try:
+                    messages = _decoder_feed(data)
+                except MLLPFrameError as e:
+                    _close_connection(conn_ctx, e.reason)
+                    return
+
+                # .. and process each of them in the order they were received.
+                for msg in messages:
+                    _handle_complete_message(_handle_complete_message_args, msg)
 
             # This covers the whole body of the 'while' block,
             # catching everything that was raised in a given loop's iteration.
@@ -530,27 +439,11 @@ class HL7MLLPServer:
 
 # ################################################################################################################################
 
-    def _points_to_full_message(self, data:'bytes') -> 'bool':
-        """ Returns True if input bytes indicate that we have a full message from the socket.
-        """
-        # Get as many bytes from data as we expected for our end_seq to be the length of ..
-        data_last_bytes = data[-self.end_seq_len:]
-
-        # .. return True if the last bytes point to our having a complete message to process.
-        return data_last_bytes == self.end_seq
-
-# ################################################################################################################################
-
-    def _handle_complete_message(self, args:'HandleCompleteMessageArgs') -> 'None':
-
-        # Produce the message to invoke the callback with ..
-        _buffer_data = args._buffer_join_func(args._buffer)
+    def _handle_complete_message(self, args:'HandleCompleteMessageArgs', data:'bytes') -> 'None':
 
-        # .. remove the header and trailer ..
-        _buffer_data = _buffer_data[self.start_seq_len:-self.end_seq_len]
-
-        # .. asign the actual business data to message ..
-        args.request_ctx.data = _buffer_data
+        # Asign the actual business data to message, already without the header and trailer ..
+        args.request_ctx.data = data
+        args.request_ctx.msg_size = len(data)
 
         # .. update our runtime metadata first (data received) ..
         if self.is_audit_log_received_active:
@@ -569,6 +462,7 @@ class HL7MLLPServer:
 
         # .. write the response back ..
         args._socket_send(response)
+        args.conn_ctx.total_bytes_sent += len(response)
 
         # .. update our runtime metadata first (data sent) ..
         if self.is_audit_log_sent_active:
@@ -636,8 +530,8 @@ class HL7MLLPServer:
                     'data_encoding': 'utf8',
                     'hl7_version': _hl7_v2,
                     'json_path': None,
-                    'should_parse_on_input': True,
-                    'should_validate': True,
+                    'should_parse_on_input': self.should_parse_on_input,
+                    'should_validate': self.should_validate,
                     'hl7_mllp_conn_ctx': conn_ctx,
                     }
                 }
@@ -665,50 +559,6 @@ class HL7MLLPServer:
         self._logger_info('Closing connection; %s; %s', reason, conn_ctx.get_conn_pretty_info())
         conn_ctx.socket.close()
 
-# ################################################################################################################################
-
-    def _check_meta(
-        self,
-        conn_ctx,       # type: ConnCtx
-        request_ctx,    # type: RequestCtx
-        data,           # type: bytes
-        bytes_to_check, # type: bytes
-        meta_attr,      # type: str
-        has_meta_attr,  # type: str
-        meta_seq        # type: str
-    ) -> 'boolnone':
-
-        # If we already have the meta element then we do not expect another one
-        # while we are still processing the same message and if one is found, we close the connection.
-        if request_ctx.meta[has_meta_attr]:
-            if bytes_to_check == meta_seq:
-                reason = 'unexpected {} found `{!r}` == `{!r}` in data `{!r}`'.format(meta_attr, bytes_to_check, meta_seq, data)
-                self._close_connection(conn_ctx, reason)
-                return
-
-        # If we do not have the element, it must be a new message that we are receiving.
-        # In such a case, we expect for it to begin with a header. Otherwise, we reject the entire connection.
-        else:
-            if bytes_to_check != meta_seq:
-                reason = '{} mismatch `{!r}` != `{!r}` in data `{!r}`'.format(meta_attr, bytes_to_check, meta_seq, data)
-                self._close_connection(conn_ctx, reason)
-                return
-
-        # If we are here, it means that the meta attribute is correct
-        request_ctx.meta[has_meta_attr] = True
-        return True
-
-# ################################################################################################################################
-
-    def _check_header(self, conn_ctx:'ConnCtx', request_ctx:'RequestCtx', data:'bytes') -> 'boolnone':
-
-        bytes_to_check = data[:self.start_seq_len]
-        meta_attr = 'header'
-        has_meta_attr  = 'has_start_seq'
-        meta_seq = self.start_seq
-
-        return self._check_meta(conn_ctx, request_ctx, data, bytes_to_check, meta_attr, has_meta_attr, meta_seq)
-
 # ################################################################################################################################
 # ################################################################################################################################
 
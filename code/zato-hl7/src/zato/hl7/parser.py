@@ -16,6 +16,7 @@ from hl7apy.parser import parse_message as hl7apy_parse_message
 # Zato
 from zato.common.api import HL7
 from zato.common.hl7 import HL7Exception
+from zato.hl7.lazy import parse_lazy
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -23,6 +24,7 @@ from zato.common.hl7 import HL7Exception
 if 0:
     from hl7apy.core import Message
     from zato.common.typing_ import any_, boolnone
+    from zato.hl7.lazy import LazyMessage
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -36,24 +38,30 @@ logger_hl7 = getLogger('zato_hl7')
 # Maps HL7 versions and implementation classes to parse functions.
 _parse_func_map = {
     HL7.Const.Version.v2.id: {
-        HL7.Const.ImplClass.hl7apy: hl7apy_parse_message
+        HL7.Const.ImplClass.hl7apy: hl7apy_parse_message,
+        HL7.Const.ImplClass.zato: parse_lazy,
     }
 }
 
-_impl_class = HL7.Const.ImplClass.hl7apy
+# Messages are fully parsed by hl7apy if a channel wants it on input ..
+_impl_class_parse_on_input = HL7.Const.ImplClass.hl7apy
+
+# .. otherwise, they are only tokenized when accessed and hl7apy is used on demand.
+_impl_class_lazy = HL7.Const.ImplClass.zato
 
 # ################################################################################################################################
 # ################################################################################################################################
 
 def get_payload_from_request(
-    data,           # type: str
-    data_encoding,  # type: str
-    hl7_version,    # type: str
-    _ignored_json_path,             # type: boolnone
-    _ignored_should_parse_on_input, # type: boolnone
-    should_validate                 # type: bool
-) -> 'Message':
-    """ Parses a channel message into an HL7 one.
+    data,                  # type: str
+    data_encoding,         # type: str
+    hl7_version,           # type: str
+    _ignored_json_path,    # type: boolnone
+    should_parse_on_input, # type: boolnone
+    should_validate        # type: bool
+) -> 'Message | LazyMessage':
+    """ Parses a channel message into an HL7 one. If the channel does not need for the message to be parsed on input,
+    the result is a LazyMessage, which gives access to individual fields without parsing the whole message.
     """
     try:
 
@@ -61,8 +69,11 @@ def get_payload_from_request(
         if isinstance(data, bytes):
             data = data.decode(data_encoding)
 
+        # .. find out how the message should be parsed ..
+        impl_class = _impl_class_lazy if should_parse_on_input is False else _impl_class_parse_on_input
+
         # .. now, parse and return the result.
-        return parse(data, _impl_class, hl7_version, should_validate)
+        return parse(data, impl_class, hl7_version, should_validate)
 
     except Exception as e:
         msg = 'Caught an HL7 exception while handling data:`%s` (%s); e:`%s`'
@@ -76,8 +87,9 @@ def parse(
     impl_class,      # type: any_
     hl7_version,     # type: str
     should_validate  # type: bool
-) -> 'Message':
+) -> 'Message | LazyMessage':
     """ Parses input data in the specified HL7 version using implementation pointed to be impl_class.
+    Use HL7.Const.ImplClass.zato to receive a LazyMessage instead of a fully parsed hl7apy one.
     """
     impl_dict = _parse_func_map[hl7_version] # type: dict
     parse_func = impl_dict[impl_class]
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from logging import basicConfig, getLogger, INFO
+from time import monotonic
+from unittest import TestCase
+
+# Zato
+from zato.common.api import HL7
+from zato.common.test.hl7_ import test_data, test_data_oru_r01
+from zato.hl7.lazy import LazyMessage, parse_lazy
+from zato.hl7.parser import get_payload_from_request, parse
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import callable_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+basicConfig(level=INFO, format='%(asctime)s - %(message)s')
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LazyMessageTestCase(TestCase):
+
+    def test_msh(self) -> 'None':
+
+        msg = parse_lazy(test_data)
+
+        self.assertEqual(msg.get('MSH-1'), '|')
+        self.assertEqual(msg.get('MSH-2'), '^~\\&')
+        self.assertEqual(msg.get('MSH-9'), 'ADT^A01^ADT_A01')
+        self.assertEqual(msg.message_type, 'ADT')
+        self.assertEqual(msg.trigger_event, 'A01')
+        self.assertEqual(msg.control_id, '01052901')
+        self.assertEqual(msg.version_id, '2.5')
+
+# ################################################################################################################################
+
+    def test_pid(self) -> 'None':
+
+        msg = parse_lazy(test_data)
+
+        self.assertEqual(msg['PID-3'], '56782445^^^UAReg^PI')
+        self.assertEqual(msg['PID-3.1'], '56782445')
+        self.assertEqual(msg['PID-3.5'], 'PI')
+        self.assertEqual(msg['PID-5.2'], 'BARRY')
+
+        # Repetitions
+        self.assertEqual(msg['PID-11.3'], 'BIRMINGHAM')
+        self.assertEqual(msg['PID-11[2].1'], "NICKELL'S PICKLES")
+        self.assertEqual(msg['PID-11[3].1'], '')
+
+# ################################################################################################################################
+
+    def test_multiple_segments(self) -> 'None':
+
+        msg = parse_lazy(test_data_oru_r01)
+
+        self.assertListEqual(msg.segment_ids, ['MSH', 'PID', 'OBR', 'OBX', 'OBX', 'OBX', 'OBX'])
+        self.assertEqual(len(msg.segments('OBX')), 4)
+
+        self.assertEqual(msg['OBX-3.2'], 'GLUCOSE')
+        self.assertEqual(msg['OBX[2]-3.2'], 'SODIUM')
+        self.assertEqual(msg['OBX[3]-5'], '4.2')
+        self.assertEqual(msg['OBX[4]-5.3'], 'pdf')
+        self.assertEqual(msg['OBX[5]-5'], '')
+
+# ################################################################################################################################
+
+    def test_missing_values(self) -> 'None':
+
+        msg = parse_lazy(test_data)
+
+        self.assertEqual(msg.get('ZZZ-1'), '')
+        self.assertEqual(msg.get('ZZZ-1', 'default'), 'default')
+        self.assertEqual(msg.get('PID-999'), '')
+        self.assertEqual(msg.get('PID-3.99'), '')
+        self.assertIsNone(msg.segment('PID', 2))
+
+# ################################################################################################################################
+
+    def test_escape_sequences(self) -> 'None':
+
+        msg = parse_lazy('MSH|^~\\&|App\rNTE|1||a\\F\\b\\S\\c\\T\\d\\R\\e\\E\\f\\X0D\\')
+        self.assertEqual(msg['NTE-3'], 'a|b^c&d~e\\f\\X0D\\')
+
+# ################################################################################################################################
+
+    def test_segment_separators(self) -> 'None':
+
+        msg = parse_lazy(test_data.replace('\r', '\r\n'))
+
+        self.assertListEqual(msg.segment_ids, ['MSH', 'EVN', 'PID', 'PV1'])
+        self.assertEqual(msg['PV1-3.4'], 'UABH')
+
+# ################################################################################################################################
+
+    def test_index_is_lazy(self) -> 'None':
+
+        msg = parse_lazy(test_data)
+
+        # Nothing is tokenized until a value is requested ..
+        self.assertIsNone(msg._segments)
+
+        # .. and only the segment accessed has its fields split.
+        _ = msg['PID-3']
+
+        self.assertIsNotNone(msg.segment('PID')._fields) # type: ignore
+        self.assertIsNone(msg.segment('PV1')._fields)    # type: ignore
+
+# ################################################################################################################################
+
+    def test_invalid_input(self) -> 'None':
+
+        with self.assertRaises(ValueError):
+            _ = parse_lazy('PID|||123')
+
+        with self.assertRaises(ValueError):
+            _ = parse_lazy(test_data).get('PID.3')
+
+# ################################################################################################################################
+
+    def test_to_er7(self) -> 'None':
+        msg = parse_lazy(test_data)
+        self.assertEqual(msg.to_er7(), test_data)
+
+# ################################################################################################################################
+
+    def test_hl7apy_on_demand(self) -> 'None':
+
+        msg = parse_lazy(test_data)
+
+        # Attributes that only hl7apy provides are delegated to a fully parsed message
+        self.assertEqual(msg.PID.patient_address.city.value, 'BIRMINGHAM')
+        self.assertIs(msg.to_hl7apy(), msg.to_hl7apy())
+
+# ################################################################################################################################
+
+    def test_parse_impl_class(self) -> 'None':
+
+        result = parse(test_data, HL7.Const.ImplClass.zato, HL7.Const.Version.v2.id, True)
+        self.assertIsInstance(result, LazyMessage)
+
+# ################################################################################################################################
+
+    def test_get_payload_from_request(self) -> 'None':
+
+        version = HL7.Const.Version.v2.id
+
+        # Messages are parsed lazily only if a channel does not want them to be parsed on input
+        lazy = get_payload_from_request(test_data, 'utf8', version, None, False, True)
+        full = get_payload_from_request(test_data, 'utf8', version, None, True, True)
+
+        self.assertIsInstance(lazy, LazyMessage)
+        self.assertNotIsInstance(full, LazyMessage)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LazyMessageBenchmarkTestCase(TestCase):
+
+    def _run_benchmark(self, func:'callable_', data:'str', iters:'int') -> 'float':
+
+        start = monotonic()
+
+        for _ in range(iters):
+            func(data)
+
+        return monotonic() - start
+
+# ################################################################################################################################
+
+    def test_benchmark(self) -> 'None':
+
+        if not os.environ.get('Zato_Test_HL7_Lazy_Benchmark'):
+            return
+
+        # hl7apy
+        from hl7apy.parser import parse_message
+
+        iters = 2000
+
+        def _lazy(data:'str') -> 'None':
+            msg = parse_lazy(data)
+            _ = msg['MSH-9']
+            _ = msg['PID-3']
+
+        def _hl7apy(data:'str') -> 'None':
+            msg = parse_message(data, force_validation=True)
+            _ = msg.MSH.msh_9.value
+            _ = msg.PID.pid_3.value
+
+        for name, data in (('ADT^A01', test_data), ('ORU^R01', test_data_oru_r01)):
+            lazy = self._run_benchmark(_lazy, data, iters)
+            full = self._run_benchmark(_hl7apy, data, iters)
+            logger.info('%s; lazy msg/s:%.1f; hl7apy msg/s:%.1f; speedup:%.1fx',
+                name, iters / lazy, iters / full, full / lazy)
+
+# ################################################################################################################################
+# ################################################################################################################################
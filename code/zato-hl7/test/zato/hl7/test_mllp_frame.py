@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+import socket
+from logging import basicConfig, getLogger, INFO
+from threading import Thread
+from time import monotonic
+from unittest import TestCase
+
+# Zato
+from zato.hl7.mllp.frame import FrameDecoder, MLLPFrameError
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+basicConfig(level=INFO, format='%(asctime)s - %(message)s')
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Default:
+    start_seq = b'\x0b'
+    end_seq = b'\x1c\x0d'
+    max_msg_size = 1_000_000
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def new_decoder(start_seq:'bytes'=_Default.start_seq, max_msg_size:'int'=_Default.max_msg_size) -> 'FrameDecoder':
+    return FrameDecoder(start_seq, _Default.end_seq, max_msg_size)
+
+# ################################################################################################################################
+
+def wrap(data:'bytes', start_seq:'bytes'=_Default.start_seq) -> 'bytes':
+    return start_seq + data + _Default.end_seq
+
+# ################################################################################################################################
+
+def get_synthetic_message(size:'int') -> 'bytes':
+    """ Returns an ORU-like message with an OBX segment carrying a large, base64-like, embedded document.
+    """
+    header = b'MSH|^~\\&|Lab|Hospital|EHR|Hospital|20240101120000||ORU^R01|123|P|2.5\rPID|||12345\r'
+    body = b'OBX|1|ED|PDF^Report||^application^pdf^Base64^'
+    filler = b'QUJDREVGR0hJSktMTU5PUFFSU1RVVldYWVo' * (size // 35 + 1)
+
+    return header + body + filler[:size] + b'\r'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FrameDecoderTestCase(TestCase):
+
+    def test_single_message_single_read(self) -> 'None':
+
+        decoder = new_decoder()
+        result = decoder.feed(wrap(b'abc'))
+
+        self.assertListEqual(result, [b'abc'])
+        self.assertEqual(decoder.pending_size, 0)
+
+# ################################################################################################################################
+
+    def test_single_message_byte_by_byte(self) -> 'None':
+
+        decoder = new_decoder()
+        data = wrap(b'MSH|abc\rPID|123')
+
+        out = [] # type: list[bytes]
+
+        for idx in range(len(data)):
+            out.extend(decoder.feed(data[idx:idx+1]))
+
+        self.assertListEqual(out, [b'MSH|abc\rPID|123'])
+        self.assertEqual(decoder.pending_size, 0)
+
+# ################################################################################################################################
+
+    def test_end_seq_split_across_reads(self) -> 'None':
+
+        decoder = new_decoder()
+        data = wrap(b'abc')
+
+        # The first read ends with the first byte of the trailer ..
+        self.assertListEqual(decoder.feed(data[:-1]), [])
+
+        # .. and the second one completes it.
+        self.assertListEqual(decoder.feed(data[-1:]), [b'abc'])
+
+# ################################################################################################################################
+
+    def test_multiple_messages_single_read(self) -> 'None':
+
+        decoder = new_decoder()
+        data = wrap(b'abc') + wrap(b'def') + wrap(b'ghi')[:3]
+
+        self.assertListEqual(decoder.feed(data), [b'abc', b'def'])
+        self.assertListEqual(decoder.feed(wrap(b'ghi')[3:]), [b'ghi'])
+
+# ################################################################################################################################
+
+    def test_memoryview_input(self) -> 'None':
+
+        decoder = new_decoder()
+        buffer = bytearray(wrap(b'abc') + b'\x00\x00')
+
+        with memoryview(buffer) as view:
+            result = decoder.feed(view[:-2])
+
+        self.assertListEqual(result, [b'abc'])
+
+# ################################################################################################################################
+
+    def test_multi_byte_header(self) -> 'None':
+
+        start_seq = b'\x0b\x0b'
+        decoder = new_decoder(start_seq)
+        data = wrap(b'abc', start_seq)
+
+        self.assertListEqual(decoder.feed(data[:1]), [])
+        self.assertListEqual(decoder.feed(data[1:]), [b'abc'])
+
+# ################################################################################################################################
+
+    def test_header_mismatch(self) -> 'None':
+
+        decoder = new_decoder()
+
+        with self.assertRaises(MLLPFrameError) as ctx:
+            _ = decoder.feed(b'abc' + _Default.end_seq)
+
+        self.assertIn('header mismatch', ctx.exception.reason)
+
+# ################################################################################################################################
+
+    def test_header_mismatch_after_message(self) -> 'None':
+
+        decoder = new_decoder()
+
+        with self.assertRaises(MLLPFrameError):
+            _ = decoder.feed(wrap(b'abc') + b'def')
+
+# ################################################################################################################################
+
+    def test_max_msg_size_without_trailer(self) -> 'None':
+
+        decoder = new_decoder(max_msg_size=10)
+
+        self.assertListEqual(decoder.feed(_Default.start_seq + b'x' * 10), [])
+
+        with self.assertRaises(MLLPFrameError) as ctx:
+            _ = decoder.feed(b'x')
+
+        self.assertIn('exceeds max. size', ctx.exception.reason)
+
+# ################################################################################################################################
+
+    def test_max_msg_size_with_trailer(self) -> 'None':
+
+        decoder = new_decoder(max_msg_size=10)
+
+        self.assertListEqual(decoder.feed(wrap(b'x' * 10)), [b'x' * 10])
+
+        with self.assertRaises(MLLPFrameError):
+            _ = decoder.feed(wrap(b'x' * 11))
+
+# ################################################################################################################################
+
+    def test_reset(self) -> 'None':
+
+        decoder = new_decoder()
+
+        _ = decoder.feed(_Default.start_seq + b'abc')
+        decoder.reset()
+
+        self.assertEqual(decoder.pending_size, 0)
+        self.assertListEqual(decoder.feed(wrap(b'def')), [b'def'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FrameDecoderBenchmarkTestCase(TestCase):
+    """ Sends large synthetic messages over loopback and reports how quickly they are decoded.
+    """
+    def _run_benchmark(self, msg_size:'int', msg_count:'int', read_buffer_size:'int') -> 'any_':
+
+        msg = get_synthetic_message(msg_size)
+        data = wrap(msg)
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+
+        def _send() -> 'None':
+            with socket.create_connection(listener.getsockname()) as client:
+                for _ in range(msg_count):
+                    client.sendall(data)
+
+        sender = Thread(target=_send)
+        sender.start()
+
+        conn, _ = listener.accept()
+        decoder = new_decoder(max_msg_size=msg_size * 2)
+        read_buffer = bytearray(read_buffer_size)
+        read_view = memoryview(read_buffer)
+
+        received = 0
+        start = monotonic()
+
+        with conn:
+            while received < msg_count:
+                data_len = conn.recv_into(read_buffer)
+                if not data_len:
+                    break
+                for item in decoder.feed(read_view[:data_len]):
+                    self.assertEqual(len(item), len(msg))
+                    received += 1
+
+        elapsed = monotonic() - start
+
+        sender.join()
+        listener.close()
+
+        self.assertEqual(received, msg_count)
+
+        return elapsed
+
+# ################################################################################################################################
+
+    def test_benchmark(self) -> 'None':
+
+        if not os.environ.get('Zato_Test_HL7_MLLP_Benchmark'):
+            return
+
+        read_buffer_size = 2048
+
+        for msg_size, msg_count in ((10_000, 2000), (1_000_000, 100), (20_000_000, 5)):
+            elapsed = self._run_benchmark(msg_size, msg_count, read_buffer_size)
+            total_mb = msg_size * msg_count / 1_000_000
+            logger.info('HL7 MLLP; msg_size:%s; msg_count:%s; elapsed:%.3fs; msg/s:%.1f; MB/s:%.1f',
+                msg_size, msg_count, elapsed, msg_count / elapsed, total_mb / elapsed)
+
+# ################################################################################################################################
+# ################################################################################################################################
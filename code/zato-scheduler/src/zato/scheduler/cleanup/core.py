@@ -24,15 +24,19 @@ from logging import captureWarnings, getLogger
 
 # gevent
 from gevent import sleep
+from gevent.pool import Pool
 
 # Zato
 from zato.broker.client import BrokerClient
 from zato.common.api import PUBSUB
 from zato.common.broker_message import SCHEDULER
 from zato.common.marshal_.api import Model
-from zato.common.odb.query.cleanup import delete_queue_messages, delete_topic_messages, \
-    get_topic_messages_already_expired, get_topic_messages_with_max_retention_reached, \
-    get_topic_messages_without_subscribers, get_subscriptions
+from zato.common.odb.query.cleanup import delete_by_id_range, delete_queue_messages, delete_topic_messages, \
+    drop_message_partition, get_id_range_end, get_message_partitions, get_min_id, get_queue_messages_condition, \
+    get_topic_messages_already_expired, get_topic_messages_already_expired_condition, \
+    get_topic_messages_with_max_retention_reached, get_topic_messages_with_max_retention_reached_condition, \
+    get_topic_messages_without_subscribers, get_topic_messages_without_subscribers_condition, get_subscriptions, \
+    is_message_partition_expired, MsgTable, QueueTable
 from zato.common.odb.query.pubsub.delivery import get_sql_msg_ids_by_sub_key
 from zato.common.odb.query.pubsub.topic import get_topics_basic_data
 from zato.common.typing_ import cast_, list_
@@ -45,7 +49,9 @@ from zato.scheduler.util import set_up_zato_client
 
 if 0:
     from logging import Logger
+    from sqlalchemy import Table
     from sqlalchemy.orm.session import Session as SASession
+    from sqlalchemy.sql.elements import ClauseElement
     from zato.common.typing_ import any_, anylist, callable_, dictlist, dtnone, floatnone, stranydict, strlist, \
         strlistdict
     from zato.scheduler.server import Config
@@ -100,6 +106,21 @@ class CleanupConfig:
     # How long to sleep after deleting messages from a single group (no matter if queue, topic or subscriber)
     DeleteSleepTime = 0.02 # In seconds
 
+    # How many topics to clean up concurrently under the id-range strategy
+    Concurrency = 4
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class CleanupStrategy:
+
+    # Messages are read in and deleted by their IDs, one group, topic and subscription at a time
+    MsgList = 'msg-list'
+
+    # Messages are never read in - the database deletes them in batches bounded by ranges of their primary keys
+    # and topics are cleaned up concurrently.
+    IDRange = 'id-range'
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -144,6 +165,12 @@ class CleanupCtx:
     clean_up_topics_with_max_retention_reached: 'bool'
     clean_up_queues_with_expired_messages: 'bool'
 
+    strategy: 'str'
+    drop_partitions: 'bool'
+
+    # Partitions of the topic message table dropped because all of their messages expired
+    found_partitions_dropped: 'strlist'
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -165,9 +192,17 @@ class CleanupManager:
     broker_client: 'BrokerClient'
     parts_enabled: 'CleanupPartsEnabled'
 
-    def __init__(self, repo_location:'str', parts_enabled:'CleanupPartsEnabled') -> 'None':
+    def __init__(
+        self,
+        repo_location:'str',
+        parts_enabled:'CleanupPartsEnabled',
+        strategy:'str'=CleanupStrategy.MsgList,
+        drop_partitions:'bool'=False,
+    ) -> 'None':
         self.repo_location = repo_location
         self.parts_enabled = parts_enabled
+        self.strategy = strategy
+        self.drop_partitions = drop_partitions
 
 # ################################################################################################################################
 
@@ -231,6 +266,63 @@ class CleanupManager:
 
         return out
 
+# ################################################################################################################################
+
+    def _delete_by_id_range(self, task_id:'str', label:'str', ctx_id:'str', table:'Table', condition:'ClauseElement') -> 'int':
+        """ Deletes all the rows matching the condition, in batches of up to CleanupConfig.MsgDeleteBatchSize rows each,
+        and returns the number of rows deleted.
+        """
+        # Local aliases
+        batch_size = CleanupConfig.MsgDeleteBatchSize
+        batch_no = 0
+        total_deleted = 0
+
+        # Always create a new session so as not to block the database
+        with closing(self.config.odb.session()) as session: # type: ignore
+
+            # Find where the first batch starts ..
+            min_id = get_min_id(session, table, condition)
+
+            # .. and keep deleting batches until there are no more rows to delete.
+            while min_id is not None:
+
+                batch_no += 1
+
+                # Find where the current batch ends, which is where the next one starts ..
+                max_id = get_id_range_end(session, table, condition, min_id, batch_size)
+
+                # .. delete the batch ..
+                deleted = delete_by_id_range(session, table, condition, min_id, max_id)
+                total_deleted += deleted
+
+                # .. make sure to commit the progress of the transaction ..
+                session.commit()
+
+                self.logger.info('%s: Deleted %s %s in batch %s, ids:[%s, %s) (%s)',
+                    task_id, deleted, label, batch_no, min_id, max_id or '-', ctx_id)
+
+                # .. let other topics be cleaned up too ..
+                sleep(0)
+
+                # .. and move on to the next batch.
+                min_id = max_id
+
+        return total_deleted
+
+# ################################################################################################################################
+
+    def _run_per_topic(self, func:'callable_', topics:'topic_ctx_list', *args:'any_') -> 'None':
+        """ Invokes a function for each of the topics, either one by one or concurrently, depending on the strategy.
+        """
+        if self.strategy == CleanupStrategy.IDRange:
+            pool = Pool(CleanupConfig.Concurrency)
+            for topic_ctx in topics:
+                _ = pool.spawn(func, *args, topic_ctx)
+            _ = pool.join(raise_error=True)
+        else:
+            for topic_ctx in topics:
+                func(*args, topic_ctx)
+
 # ################################################################################################################################
 
     def _get_subscriptions(self, task_id:'str', topic_ctx:'TopicCtx', cleanup_ctx:'CleanupCtx') -> 'anylist':
@@ -341,17 +433,13 @@ class CleanupManager:
 
 # ################################################################################################################################
 
-    def _cleanup_sub(self, task_id:'str', cleanup_ctx:'CleanupCtx', sub:'stranydict') -> 'strlist':
-        """ Cleans up an individual subscription. First it deletes old queue messages, then it notifies servers
-        that a subscription object should be deleted as well.
+    def _get_sub_queue_msg_list(self, task_id:'str', cleanup_ctx:'CleanupCtx', sub:'stranydict') -> 'dictlist':
+        """ Looks up all the queue messages of a subscription and deletes them by their IDs.
         """
 
         # Local aliases
         sub_key = sub['sub_key']
 
-        self.logger.info('%s: ---------------', task_id)
-        self.logger.info('%s: Looking up queue messages for %s', task_id, sub_key)
-
         # We look up all the messages in the database which is why the last_sql_run
         # needs to be set to a value that will be always matched
         # and the start of UNIX time, as expressed as a float, will always do.
@@ -380,6 +468,35 @@ class CleanupManager:
             self.logger.debug('%s: ** Messages to clean up for sub_key `%s` **\n%s', task_id, sub_key, table)
             self._cleanup_queue_msg_list(task_id, cleanup_ctx, 'sub-cleanup', sub_key, sk_queue_msg_list)
 
+        return sk_queue_msg_list
+
+# ################################################################################################################################
+
+    def _cleanup_sub(self, task_id:'str', cleanup_ctx:'CleanupCtx', sub:'stranydict') -> 'strlist':
+        """ Cleans up an individual subscription. First it deletes old queue messages, then it notifies servers
+        that a subscription object should be deleted as well.
+        """
+
+        # Local aliases
+        sub_key = sub['sub_key']
+
+        self.logger.info('%s: ---------------', task_id)
+        self.logger.info('%s: Looking up queue messages for %s', task_id, sub_key)
+
+        # Under this strategy, we do not need to look up the messages at all ..
+        if self.strategy == CleanupStrategy.IDRange:
+            condition = get_queue_messages_condition(sub_key, cleanup_ctx.now)
+            deleted = self._delete_by_id_range(task_id, 'queue message(s)', sub_key, QueueTable, condition)
+            cleanup_ctx.found_total_queue_messages += deleted
+            sk_queue_msg_list = []
+
+            self.logger.info('%s: Deleted %s message(s) for sub_key `%s` (ext: %s)',
+                task_id, deleted, sub_key, sub['ext_client_id'])
+
+        # .. whereas under the default one, we read them in first.
+        else:
+            sk_queue_msg_list = self._get_sub_queue_msg_list(task_id, cleanup_ctx, sub)
+
         # At this point, we have already deleted all the enqueued messages for all the subscribers
         # that we have not seen in DeltaNotInteracted hours. It means that we can proceed now
         # to delete each subscriber too because we know that it will not cascade to any of its
@@ -408,44 +525,50 @@ class CleanupManager:
 
 # ################################################################################################################################
 
-    def _cleanup_subscriptions(
-        self,
-        task_id:'str',
-        cleanup_ctx:'CleanupCtx'
-        ) -> 'CleanupCtx':
-        """ Cleans up all subscriptions - all the old queue messages as well as their subscribers.
+    def _cleanup_topic_subscriptions(self, task_id:'str', cleanup_ctx:'CleanupCtx', topic_ctx:'TopicCtx') -> 'None':
+        """ Cleans up all subscriptions to a single topic.
         """
 
-        # For each topic we already know it exists ..
-        for topic_ctx in cleanup_ctx.all_topics:
+        # This is a list of all the pub_msg_id objects that we are going to remove from subsciption queues.
+        # It does not contain messages residing in topics that do not have any subscribers.
+        # Currently, we populate this list but we do not use it for anything.
+        queue_msg_list = []
 
-            # This is a list of all the pub_msg_id objects that we are going to remove from subsciption queues.
-            # It does not contain messages residing in topics that do not have any subscribers.
-            # Currently, we populate this list but we do not use it for anything.
-            queue_msg_list = []
+        # Find all subscribers in the database ..
+        subs = self._get_subscriptions(task_id, topic_ctx, cleanup_ctx)
+        len_subs = len(subs)
 
-            # Find all subscribers in the database ..
-            subs = self._get_subscriptions(task_id, topic_ctx, cleanup_ctx)
-            len_subs = len(subs)
+        # .. and clean up their queues, if any were found ..
+        for sub in subs:
+            sub_key = sub['sub_key']
+            endpoint_name = sub['endpoint_name']
+            self.logger.info('%s: Cleaning up subscription %s/%s; %s -> %s (%s)',
+                task_id, sub['idx'], len_subs, sub_key, endpoint_name, topic_ctx.name)
 
-            # .. and clean up their queues, if any were found ..
-            for sub in subs:
-                sub_key = sub['sub_key']
-                endpoint_name = sub['endpoint_name']
-                self.logger.info('%s: Cleaning up subscription %s/%s; %s -> %s (%s)',
-                    task_id, sub['idx'], len_subs, sub_key, endpoint_name, topic_ctx.name)
+            # Clean up this sub_key and get the list of message IDs found for it ..
+            sk_queue_msg_list = self._cleanup_sub(task_id, cleanup_ctx, sub)
 
-                # Clean up this sub_key and get the list of message IDs found for it ..
-                sk_queue_msg_list = self._cleanup_sub(task_id, cleanup_ctx, sub)
+            # .. append the per-sub_key message to the overall list of messages found for subscribers.
+            queue_msg_list.extend(sk_queue_msg_list)
 
-                # .. append the per-sub_key message to the overall list of messages found for subscribers.
-                queue_msg_list.extend(sk_queue_msg_list)
+        self.logger.info(f'{task_id}: Cleaned up %d pub/sub queue message(s) from sk_list: %s (%s)',
+            cleanup_ctx.found_total_queue_messages, cleanup_ctx.found_sk_list, topic_ctx.name)
 
-            self.logger.info(f'{task_id}: Cleaned up %d pub/sub queue message(s) from sk_list: %s (%s)',
-                cleanup_ctx.found_total_queue_messages, cleanup_ctx.found_sk_list, topic_ctx.name)
+        # .. and sleep for a moment so as not to overwhelm the database.
+        sleep(CleanupConfig.DeleteSleepTime)
 
-            # .. and sleep for a moment so as not to overwhelm the database.
-            sleep(CleanupConfig.DeleteSleepTime)
+# ################################################################################################################################
+
+    def _cleanup_subscriptions(
+        self,
+        task_id:'str',
+        cleanup_ctx:'CleanupCtx'
+        ) -> 'CleanupCtx':
+        """ Cleans up all subscriptions - all the old queue messages as well as their subscribers.
+        """
+
+        # Clean up subscriptions to each topic we already know exists
+        self._run_per_topic(self._cleanup_topic_subscriptions, cleanup_ctx.all_topics, task_id, cleanup_ctx)
 
         return cleanup_ctx
 
@@ -578,8 +701,14 @@ class CleanupManager:
         use_topic_retention_time:'bool',
         max_time_dt: 'dtnone' = None,
         max_time_float: 'floatnone' = None,
+        condition_func: 'callable_',
         ) -> 'topic_ctx_list':
 
+        # Under this strategy, messages are not looked up before they are deleted
+        if self.strategy == CleanupStrategy.IDRange:
+            return self._cleanup_topic_messages_by_id_range(
+                task_id, cleanup_ctx, message_type_label, condition_func, use_topic_retention_time, max_time_float)
+
         # A dictionary mapping all the topics that have any messages to be deleted
         topics_to_clean_up = [] # type: topic_ctx_list
 
@@ -647,6 +776,73 @@ class CleanupManager:
         # .. and return all the processed topics to our caller.
         return topics_to_clean_up
 
+# ################################################################################################################################
+
+    def _cleanup_topic_messages_by_id_range(
+        self,
+        task_id:'str',
+        cleanup_ctx:'CleanupCtx',
+        message_type_label:'str',
+        condition_func:'callable_',
+        use_topic_retention_time:'bool',
+        max_time_float:'floatnone',
+        ) -> 'topic_ctx_list':
+        """ Deletes messages matching a condition from all the topics, with topics cleaned up concurrently.
+        """
+
+        def _cleanup_topic(topic_ctx:'TopicCtx') -> 'None':
+
+            # Each topic may have its own max. retention time ..
+            if use_topic_retention_time:
+                per_topic_max_time_float = topic_ctx.limit_retention_float
+
+            # .. or the same time applies to all the topics.
+            else:
+                per_topic_max_time_float = max_time_float
+
+            condition = condition_func(topic_ctx.id, per_topic_max_time_float)
+            topic_ctx.len_messages = self._delete_by_id_range(
+                task_id, 'message(s) ' + message_type_label, topic_ctx.name, MsgTable, condition)
+
+            self.logger.info('%s: Deleted %d message(s) %s from topic %s',
+                task_id, topic_ctx.len_messages, message_type_label, topic_ctx.name)
+
+        self._run_per_topic(_cleanup_topic, cleanup_ctx.all_topics)
+
+        # Return all the topics that had any messages deleted
+        return [topic_ctx for topic_ctx in cleanup_ctx.all_topics if topic_ctx.len_messages]
+
+# ################################################################################################################################
+
+    def _drop_expired_partitions(self, task_id:'str', cleanup_ctx:'CleanupCtx') -> 'None':
+        """ Drops all the partitions of the topic message table whose messages have all expired already.
+        This is much faster than deleting such messages one by one and it applies only to time-partitioned tables.
+        """
+
+        # Always create a new session so as not to block the database
+        with closing(self.config.odb.session()) as session: # type: ignore
+
+            partitions = get_message_partitions(session)
+            self.logger.info('%s: Message table partitions found -> %s', task_id, partitions)
+
+            for partition_name in partitions:
+
+                # Partitions with messages that have not expired yet cannot be dropped ..
+                if not is_message_partition_expired(session, partition_name, cleanup_ctx.now):
+                    continue
+
+                # .. but this one can be.
+                self.logger.info('%s: Dropping message table partition `%s`', task_id, partition_name)
+
+                deleted = drop_message_partition(session, partition_name)
+                session.commit()
+
+                cleanup_ctx.found_total_queue_messages += deleted
+                cleanup_ctx.found_partitions_dropped.append(partition_name)
+
+                self.logger.info('%s: Dropped message table partition `%s`, deleted %d queue message(s)',
+                    task_id, partition_name, deleted)
+
 # ################################################################################################################################
 
     def _cleanup_topic_messages_without_subscribers(
@@ -677,7 +873,8 @@ class CleanupManager:
 
         return self._cleanup_topic_messages(task_id, cleanup_ctx, query, message_type_label,
             use_as_dict=True,
-            use_topic_retention_time=False, max_time_dt=max_time_dt, max_time_float=max_time_float)
+            use_topic_retention_time=False, max_time_dt=max_time_dt, max_time_float=max_time_float,
+            condition_func=get_topic_messages_without_subscribers_condition)
 
 # ################################################################################################################################
 
@@ -702,7 +899,8 @@ class CleanupManager:
 
         return self._cleanup_topic_messages(task_id, cleanup_ctx, query, message_type_label,
             use_as_dict=True,
-            use_topic_retention_time=True, max_time_dt=max_time_dt, max_time_float=max_time_float)
+            use_topic_retention_time=True, max_time_dt=max_time_dt, max_time_float=max_time_float,
+            condition_func=get_topic_messages_with_max_retention_reached_condition)
 
 # ################################################################################################################################
 
@@ -733,7 +931,8 @@ class CleanupManager:
 
         return self._cleanup_topic_messages(task_id, cleanup_ctx, query, message_type_label,
             use_as_dict=False,
-            use_topic_retention_time=False, max_time_dt=max_time_dt, max_time_float=max_time_float)
+            use_topic_retention_time=False, max_time_dt=max_time_dt, max_time_float=max_time_float,
+            condition_func=get_topic_messages_already_expired_condition)
 
 # ################################################################################################################################
 
@@ -765,13 +964,24 @@ class CleanupManager:
 
         # Clean up queues that contain messages which were already expired
         if cleanup_ctx.clean_up_queues_with_expired_messages:
+
+            # If the message table is partitioned by time, whole partitions with expired messages can be dropped first
+            if cleanup_ctx.drop_partitions:
+                self.logger.info('Entering _drop_expired_partitions')
+                self._drop_expired_partitions(task_id, cleanup_ctx)
+
             self.logger.info('Entering _clean_up_queues_with_expired_messages')
             topics_cleaned_up = self._clean_up_queues_with_expired_messages(task_id, cleanup_ctx)
             cleanup_ctx.topics_cleaned_up.extend(topics_cleaned_up)
             cleanup_ctx.topics_with_expired_messages.extend(topics_cleaned_up)
             for topic_ctx in topics_cleaned_up:
-                cleanup_ctx.expired_messages.extend(topic_ctx.messages)
-                cleanup_ctx.found_total_expired_messages += len(topic_ctx.messages)
+
+                # Under this strategy, we know only how many messages were deleted, not what their IDs were
+                if cleanup_ctx.strategy == CleanupStrategy.IDRange:
+                    cleanup_ctx.found_total_expired_messages += topic_ctx.len_messages
+                else:
+                    cleanup_ctx.expired_messages.extend(topic_ctx.messages)
+                    cleanup_ctx.found_total_expired_messages += len(topic_ctx.messages)
 
         return cleanup_ctx
 
@@ -791,6 +1001,7 @@ class CleanupManager:
         # Log what parts of the cleanup procedure are enabled
         parts_enabled_log_msg = tabulate_dictlist([self.parts_enabled.to_dict()])
         self.logger.info('%s: Parts enabled: \n%s', task_id, parts_enabled_log_msg)
+        self.logger.info('%s: Strategy: %s; drop partitions: %s', task_id, self.strategy, self.drop_partitions)
 
         # Overall context of the procedure, including a response to produce
         cleanup_ctx = CleanupCtx()
@@ -804,6 +1015,11 @@ class CleanupManager:
         cleanup_ctx.topics_with_max_retention_reached = []
         cleanup_ctx.topics_with_expired_messages = []
         cleanup_ctx.expired_messages = []
+        cleanup_ctx.found_partitions_dropped = []
+
+        # How to clean up
+        cleanup_ctx.strategy = self.strategy
+        cleanup_ctx.drop_partitions = self.drop_partitions
 
         # What cleanup parts to run
         cleanup_ctx.clean_up_subscriptions = self.parts_enabled.subscriptions
@@ -853,8 +1069,14 @@ def run_cleanup(
     clean_up_topics_with_max_retention_reached: 'bool',
     clean_up_queues_with_expired_messages: 'bool',
     scheduler_path:'str',
+    strategy:'str'=CleanupStrategy.MsgList,
+    drop_partitions:'bool'=False,
 ) -> 'CleanupCtx':
 
+    # Reject unknown strategies
+    if strategy not in (CleanupStrategy.MsgList, CleanupStrategy.IDRange):
+        raise ValueError(f'Unknown cleanup strategy: `{strategy}`')
+
     # Always work with absolute paths
     scheduler_path = os.path.abspath(scheduler_path)
 
@@ -873,7 +1095,7 @@ def run_cleanup(
     parts_enabled.queues_with_expired_messages = clean_up_queues_with_expired_messages
 
     # Build and initialize object responsible for cleanup tasks ..
-    cleanup_manager = CleanupManager(repo_location, parts_enabled)
+    cleanup_manager = CleanupManager(repo_location, parts_enabled, strategy, drop_partitions)
     cleanup_manager.init()
 
     # .. if we are here, it means that we can start our work ..
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from datetime import datetime
+from logging import getLogger
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# SQLAlchemy
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Zato
+from zato.common.odb.query.cleanup import get_queue_messages_condition, MsgTable, QueueTable
+from zato.scheduler.cleanup.core import CleanupConfig, CleanupCtx, CleanupManager, CleanupPartsEnabled, CleanupStrategy, \
+    TopicCtx
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class CleanupIDRangeTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        # Each connection to an in-memory database would see its own, empty, database
+        # so all the greenlets that the cleanup spawns need to share a single one.
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        MsgTable.create(self.engine)
+        QueueTable.create(self.engine)
+
+        self.manager = CleanupManager('', CleanupPartsEnabled(), CleanupStrategy.IDRange)
+        self.manager.logger = logger
+        self.manager.config = Bunch(odb=Bunch(session=sessionmaker(bind=self.engine))) # type: ignore
+
+        # Use small batches so that each test needs more than one of them
+        self.batch_size = CleanupConfig.MsgDeleteBatchSize
+        CleanupConfig.MsgDeleteBatchSize = 3
+
+    def tearDown(self) -> 'None':
+        CleanupConfig.MsgDeleteBatchSize = self.batch_size
+
+# ################################################################################################################################
+
+    def _get_cleanup_ctx(self, now:'float', topic_id_list:'anylist') -> 'CleanupCtx':
+
+        cleanup_ctx = CleanupCtx()
+        cleanup_ctx.now = now
+        cleanup_ctx.now_dt = datetime.utcfromtimestamp(now)
+        cleanup_ctx.all_topics = []
+
+        for topic_id in topic_id_list:
+            topic_ctx = TopicCtx()
+            topic_ctx.id = topic_id
+            topic_ctx.name = 'topic.{}'.format(topic_id)
+            topic_ctx.messages = []
+            topic_ctx.len_messages = 0
+            topic_ctx.limit_retention_float = now
+            cleanup_ctx.all_topics.append(topic_ctx)
+
+        return cleanup_ctx
+
+# ################################################################################################################################
+
+    def _add_message(self, topic_id:'int', pub_time:'float', expiration_time:'float', msg_idx:'int'=0) -> 'str':
+
+        # Message IDs need to be unique even if all the other attributes of two messages are the same
+        pub_msg_id = 'msg.{}.{}.{}.{}'.format(topic_id, pub_time, expiration_time, msg_idx)
+
+        with self.engine.begin() as conn:
+            _ = conn.execute(MsgTable.insert().values(
+                pub_msg_id=pub_msg_id,
+                topic_id=topic_id,
+                pub_time=pub_time,
+                expiration_time=expiration_time,
+                pub_pattern_matched='',
+                data='',
+                data_prefix='',
+                data_prefix_short='',
+                size=0,
+                published_by_id=1,
+                cluster_id=1,
+            ))
+
+        return pub_msg_id
+
+# ################################################################################################################################
+
+    def _add_queue_message(self, pub_msg_id:'str', sub_key:'str', creation_time:'float') -> 'None':
+        with self.engine.begin() as conn:
+            _ = conn.execute(QueueTable.insert().values(
+                pub_msg_id=pub_msg_id,
+                sub_key=sub_key,
+                creation_time=creation_time,
+                sub_pattern_matched='',
+                endpoint_id=1,
+                topic_id=1,
+                cluster_id=1,
+            ))
+
+# ################################################################################################################################
+
+    def _get_rows(self, column:'any_') -> 'anylist':
+        with self.engine.connect() as conn:
+            return sorted(elem[0] for elem in conn.execute(select([column])))
+
+# ################################################################################################################################
+
+    def test_expired_messages(self) -> 'None':
+
+        # Messages from the first topic expire at times 0-9 and the ones from the second topic do not expire in time
+        for idx in range(10):
+            _ = self._add_message(1, 1.0, float(idx))
+            _ = self._add_message(2, 1.0, 100.0, idx)
+
+        cleanup_ctx = self._get_cleanup_ctx(5.0, [1, 2])
+        topics_cleaned_up = self.manager._clean_up_queues_with_expired_messages('task.1', cleanup_ctx)
+
+        # Only the messages that expired before the current time are deleted, in several batches, from the first topic only
+        self.assertListEqual([topic_ctx.id for topic_ctx in topics_cleaned_up], [1])
+        self.assertEqual(topics_cleaned_up[0].len_messages, 5)
+
+        expiration_times = self._get_rows(MsgTable.c.expiration_time)
+        self.assertListEqual(expiration_times, [5.0, 6.0, 7.0, 8.0, 9.0] + [100.0] * 10)
+
+# ################################################################################################################################
+
+    def test_messages_without_subscribers(self) -> 'None':
+
+        for idx in range(8):
+            pub_msg_id = self._add_message(1, float(idx), 100.0)
+
+            # Every other message has a subscriber
+            if idx % 2:
+                self._add_queue_message(pub_msg_id, 'sk.1', float(idx))
+
+        cleanup_ctx = self._get_cleanup_ctx(6.0, [1])
+        _ = self.manager._cleanup_topic_messages_without_subscribers('task.1', cleanup_ctx)
+
+        # Messages without subscribers are deleted unless they were published after the cleanup started
+        self.assertListEqual(self._get_rows(MsgTable.c.pub_time), [1.0, 3.0, 5.0, 6.0, 7.0])
+
+# ################################################################################################################################
+
+    def test_queue_messages(self) -> 'None':
+
+        pub_msg_id = self._add_message(1, 1.0, 100.0)
+
+        for idx in range(10):
+            self._add_queue_message(pub_msg_id, 'sk.1', float(idx))
+            self._add_queue_message(pub_msg_id, 'sk.2', float(idx))
+
+        condition = get_queue_messages_condition('sk.1', 100.0)
+        deleted = self.manager._delete_by_id_range('task.1', 'queue message(s)', 'sk.1', QueueTable, condition)
+
+        # All the messages of the first subscription are deleted and none of the other one's are
+        self.assertEqual(deleted, 10)
+        self.assertListEqual(self._get_rows(QueueTable.c.sub_key), ['sk.2'] * 10)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
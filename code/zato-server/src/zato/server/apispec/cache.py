@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from hashlib import sha1
+from json import dumps
+from logging import getLogger
+
+# gevent
+from gevent.lock import RLock
+
+# PyYAML
+from yaml import dump as yaml_dump, Dumper as YAMLDumper
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict, callable_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class RenderedSpec:
+    """ A complete API specification, serialised upfront, along with an ETag computed out of it.
+    """
+    __slots__ = 'data', 'yaml', '_json', 'etag'
+
+    def __init__(self, data:'anydict') -> 'None':
+        self.data = data
+        self.yaml = yaml_dump(data, Dumper=YAMLDumper, default_flow_style=False)
+        self.etag = '"{}"'.format(sha1(self.yaml.encode('utf8')).hexdigest())
+        self._json = None # type: str | None
+
+    @property
+    def json(self) -> 'str':
+
+        # Not everyone needs JSON so it is serialised only if someone asks for it
+        if self._json is None:
+            self._json = dumps(self.data)
+
+        return self._json
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class APISpecCache:
+    """ Keeps API specifications of individual services and models, as well as complete specifications built out of them,
+    so that they do not have to be generated each time they are requested. Everything that a service or model
+    contributes to is invalidated when it is deployed again.
+    """
+    def __init__(self) -> 'None':
+
+        # (service name, tags, needs_sio_desc) -> (service class, output of ServiceInfo.to_dict)
+        self.service_info = {} # type: anydict
+
+        # (service name, is_request) -> (OpenAPI schema of the service's request or response, names of models it refers to)
+        self.message_schemas = {} # type: anydict
+
+        # Model name -> (OpenAPI schema of the model, names of models it refers to)
+        self.model_schemas = {} # type: anydict
+
+        # Keys built by each generator out of its input -> RenderedSpec
+        self.rendered = {} # type: anydict
+
+        # How many times any part of the cache was invalidated
+        self.version = 0
+
+        self.lock = RLock()
+
+# ################################################################################################################################
+
+    def get_service_info(
+        self,
+        service_name,   # type: str
+        service_class,  # type: any_
+        tags,           # type: list[str]
+        needs_sio_desc, # type: bool
+        get_info_func   # type: callable_
+    ) -> 'anydict':
+
+        key = (service_name, tuple(tags), needs_sio_desc)
+        entry = self.service_info.get(key)
+
+        # A hot-deployed service will have a new class even if we were not told about it
+        if entry and entry[0] is service_class:
+            return entry[1]
+
+        info = get_info_func()
+        self.service_info[key] = (service_class, info)
+
+        return info
+
+# ################################################################################################################################
+
+    def get_schema(self, container:'anydict', key:'any_', get_schema_func:'callable_') -> 'any_':
+        """ Returns a schema from one of the containers, creating it first if it does not exist yet.
+        """
+        entry = container.get(key)
+
+        if entry is None:
+            entry = container[key] = get_schema_func()
+
+        return entry
+
+# ################################################################################################################################
+
+    def get_rendered(self, key:'any_', get_data_func:'callable_') -> 'RenderedSpec':
+
+        rendered = self.rendered.get(key)
+
+        if not rendered:
+            with self.lock:
+                rendered = self.rendered.get(key)
+                if not rendered:
+                    rendered = self.rendered[key] = RenderedSpec(get_data_func())
+
+        return rendered
+
+# ################################################################################################################################
+
+    def _invalidate(self) -> 'None':
+        self.rendered.clear()
+        self.version += 1
+
+# ################################################################################################################################
+
+    def on_service_deployed(self, service_name:'str', mod_name:'str'='') -> 'None':
+        """ Invalidates everything that a service contributes to, including any models from the same module
+        because they were just imported again along with the service.
+        """
+        with self.lock:
+
+            for key in [key for key in self.service_info if key[0] == service_name]:
+                del self.service_info[key]
+
+            for is_request in (True, False):
+                _ = self.message_schemas.pop((service_name, is_request), None)
+
+            if mod_name:
+                prefix = mod_name + '.'
+                for model_name in [name for name in self.model_schemas if name.startswith(prefix)]:
+                    del self.model_schemas[model_name]
+
+            self._invalidate()
+
+    on_service_deleted = on_service_deployed
+
+# ################################################################################################################################
+
+    def on_model_deployed(self, model_name:'str') -> 'None':
+        with self.lock:
+            _ = self.model_schemas.pop(model_name, None)
+            self._invalidate()
+
+    on_model_deleted = on_model_deployed
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -18,8 +18,10 @@ from zato.server.apispec.parser.service import ServiceInfo
 if 0:
     from dataclasses import Field
     from zato.common.typing_ import anydict, anylist, anylistnone, dict_, dictlist
+    from zato.server.apispec.cache import APISpecCache
     from zato.server.service import Service
 
+    APISpecCache = APISpecCache
     Field   = Field
     Service = Service
 
@@ -35,7 +37,8 @@ class Generator:
         exclude,                # type: anylist
         query='',               # type: str
         tags=None,              # type: anylistnone
-        needs_sio_desc=True     # type: bool
+        needs_sio_desc=True,    # type: bool
+        cache=None,             # type: APISpecCache | None
         ) -> 'None':
 
         self.service_store_services = service_store_services
@@ -45,7 +48,8 @@ class Generator:
         self.query = query
         self.tags = tags or []
         self.needs_sio_desc = needs_sio_desc
-        self.services = {} # type: dict_[str, ServiceInfo]
+        self.cache = cache
+        self.services = {} # type: dict_[str, anydict]
 
 # ################################################################################################################################
 
@@ -76,8 +80,7 @@ class Generator:
             if not proceed:
                 continue
 
-            info = self.services[name] # type: ServiceInfo
-            out.append(info.to_dict())
+            out.append(self.services[name])
 
         return out
 
@@ -102,8 +105,19 @@ class Generator:
             if (not _should_include) or _should_exclude:
                 continue
 
-            info = ServiceInfo(details['name'], details['service_class'], self.simple_io_config, self.tags, self.needs_sio_desc)
-            self.services[info.name] = info
+            if self.cache:
+                info = self.cache.get_service_info(details['name'], details['service_class'], self.tags, self.needs_sio_desc,
+                    lambda: self._get_service_info(details))
+            else:
+                info = self._get_service_info(details)
+
+            self.services[details['name']] = info
+
+# ################################################################################################################################
+
+    def _get_service_info(self, details:'anydict') -> 'anydict':
+        info = ServiceInfo(details['name'], details['service_class'], self.simple_io_config, self.tags, self.needs_sio_desc)
+        return info.to_dict()
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -20,7 +20,6 @@ from yaml import dump as yaml_dump, Dumper as YAMLDumper
 
 # Zato
 from zato.common.api import URL_TYPE
-from zato.common.marshal_.api import Model
 from zato.common.typing_ import cast_
 from zato.common.util.file_system import fs_safe_name
 from zato.common.util.import_ import import_string
@@ -33,9 +32,12 @@ from zato.simpleio import SIO_TYPE_MAP
 # ################################################################################################################################
 
 if 0:
-    from zato.common.typing_ import anydict, anydictnone, anylist, dictlist, stranydict, strorlist
+    from zato.common.typing_ import anydict, anydictnone, anylist, anytuple, dictlist, stranydict, strlist, strorlist
+    from zato.server.apispec.cache import APISpecCache, RenderedSpec
     from zato.server.apispec.model import FieldInfo
+    APISpecCache = APISpecCache
     FieldInfo = FieldInfo
+    RenderedSpec = RenderedSpec
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -59,13 +61,23 @@ class OpenAPIGenerator:
         channel_data,        # type: dictlist
         needs_api_invoke,    # type: bool
         needs_rest_channels, # type: bool
-        api_invoke_path      # type: strorlist
+        api_invoke_path,     # type: strorlist
+        cache=None,          # type: APISpecCache | None
         ) -> 'None':
 
         self.data = data
         self.channel_data = channel_data
         self.needs_api_invoke = needs_api_invoke
         self.needs_rest_channels = needs_rest_channels
+        self.cache = cache
+
+        # Maps service names to the first plain HTTP channel each of them is mounted on
+        self.rest_channels = {} # type: stranydict
+
+        for channel_item in channel_data:
+            if channel_item['transport'] == URL_TYPE.PLAIN_HTTP:
+                if channel_item['service_name'] not in self.rest_channels:
+                    self.rest_channels[channel_item['service_name']] = channel_item
 
         if api_invoke_path:
             api_invoke_path = api_invoke_path if isinstance(api_invoke_path, list) else [api_invoke_path]
@@ -86,26 +98,62 @@ class OpenAPIGenerator:
 
 # ################################################################################################################################
 
-    def _add_model_schema(self, model_name:'str', model:'Model', out:'anydict') -> 'None':
+    def _get_model_schema(self, model_name:'str') -> 'anytuple':
+
+        # First, a model (class) ..
+        model = import_string(model_name)
+
+        # .. now, we can extract elements from the model object ..
+        sio_elems = build_field_list(model, _SIO_TYPE_MAP.OPEN_API_V3)
+
+        # .. and turn them into a schema.
+        return self._get_schema(sio_elems)
+
+# ################################################################################################################################
+
+    def _add_model_schema(self, model_name:'str', out:'anydict') -> 'None':
 
         # Do not visit the model if we have already seen it
         if model_name in out:
             return
+
+        if self.cache:
+            schema, ref_names = self.cache.get_schema(
+                self.cache.model_schemas, model_name, lambda: self._get_model_schema(model_name))
         else:
-            out[model_name] = {}
+            schema, ref_names = self._get_model_schema(model_name)
 
-        # Extract elements from the model object ..
-        sio_elems = build_field_list(model, _SIO_TYPE_MAP.OPEN_API_V3)
+        out[model_name] = schema
 
-        # .. and visit each of them, potentially recursing back into our function.
-        self._visit_sio_elems(model_name, sio_elems, out)
+        # Visit each of the models this one refers to, potentially recursing back into our function.
+        self._add_ref_schemas(ref_names, out)
+
+# ################################################################################################################################
+
+    def _add_ref_schemas(self, ref_names:'strlist', out:'anydict') -> 'None':
+        for model_name in ref_names:
+            self._add_model_schema(model_name, out)
 
 # ################################################################################################################################
 
     def _visit_sio_elems(self, schema_name:'str', sio_elems:'anylist', out:'anydict') -> 'None':
 
+        schema, ref_names = self._get_schema(sio_elems)
+        out[schema_name].update(schema)
+
+        self._add_ref_schemas(ref_names, out)
+
+# ################################################################################################################################
+
+    def _get_schema(self, sio_elems:'anylist') -> 'anytuple':
+        """ Returns a schema built out of SIO elements, along with names of all the models that the schema refers to.
+        The models are not visited here, which lets the schema be cached without them.
+        """
+        schema = {} # type: stranydict
+        ref_names = [] # type: strlist
+
         properties = {} # type: stranydict
-        out[schema_name]['properties'] = properties
+        schema['properties'] = properties
 
         # All the elements of this model that are required
         elems_required_names = [elem.name for elem in sio_elems if elem.is_required]
@@ -137,11 +185,9 @@ class OpenAPIGenerator:
                 else:
                     property_map['$ref'] = info.ref
 
-                # .. now, a model (class) ..
-                model = import_string(model_name)
-
-                # .. next, we can append this class's definitions to our dictionary of schemas ..
-                self._add_model_schema(model_name, model, out)
+                # .. next, we will need to append this class's definitions to our dictionary of schemas ..
+                if model_name not in ref_names:
+                    ref_names.append(model_name)
 
             # .. while for simple types, these two will exist ..
             else:
@@ -157,7 +203,9 @@ class OpenAPIGenerator:
             properties[info.name] = property_map
 
         if elems_required_names:
-            out[schema_name]['required'] = elems_required_names
+            schema['required'] = elems_required_names
+
+        return schema, ref_names
 
 # ################################################################################################################################
 
@@ -185,28 +233,43 @@ class OpenAPIGenerator:
             # .. turn its class name into a schema name ..
             message_name = name_func(item['name'])
 
-            # .. prepare it upfront here ..
-            out[message_name] = {
-                'title': '{} object for {}'.format(msg_name, item['name']),
-                'type': 'object',
-            }
+            # .. get its schema, possibly from the cache ..
+            if self.cache:
+                schema, ref_names = self.cache.get_schema(self.cache.message_schemas, (item['name'], is_request),
+                    lambda: self._get_message_schema(item, msg_name, sio_elem_attr))
+            else:
+                schema, ref_names = self._get_message_schema(item, msg_name, sio_elem_attr)
 
-            # .. get all the elements of the model class ..
-            sio_elems = getattr(item['simple_io']['openapi_v3'], sio_elem_attr)
+            out[message_name] = schema
 
-            # .. turn them into an OpenAPI schema ..
-            self._visit_sio_elems(message_name, sio_elems, out)
+            # .. add all the models it refers to ..
+            self._add_ref_schemas(ref_names, out)
 
         # .. and return our result to the caller.
         return out
 
+# ################################################################################################################################
+
+    def _get_message_schema(self, item:'anydict', msg_name:'str', sio_elem_attr:'str') -> 'anytuple':
+
+        # Get all the elements of the model class ..
+        sio_elems = getattr(item['simple_io']['openapi_v3'], sio_elem_attr)
+
+        # .. turn them into an OpenAPI schema ..
+        schema, ref_names = self._get_schema(sio_elems)
+
+        # .. and add the details that each message has.
+        schema['title'] = '{} object for {}'.format(msg_name, item['name'])
+        schema['type'] = 'object'
+
+        return schema, ref_names
+
 # ################################################################################################################################
 
     def get_rest_channel(self, service_name:'str') -> 'anydictnone':
-        for channel_item in self.channel_data:
-            if channel_item['service_name'] == service_name:
-                if channel_item['transport'] == URL_TYPE.PLAIN_HTTP:
-                    return bunchify(channel_item)
+        channel_item = self.rest_channels.get(service_name)
+        if channel_item:
+            return bunchify(channel_item)
 
 # ################################################################################################################################
 
@@ -230,6 +293,46 @@ class OpenAPIGenerator:
 # ################################################################################################################################
 
     def generate(self) -> 'str':
+        """ Returns the specification in YAML.
+        """
+        if self.cache:
+            return self.generate_rendered().yaml
+        else:
+            return yaml_dump(self.generate_dict(), Dumper=YAMLDumper, default_flow_style=False)
+
+# ################################################################################################################################
+
+    def get_cache_key(self) -> 'anytuple':
+        """ Returns a key that identifies a complete specification - services it describes and the channels they are mounted on.
+        Anything else that the specification is built of is cached per service or model and invalidated when they change.
+        """
+        services = []
+
+        for item in self.data:
+
+            channel_item = self.rest_channels.get(item['name']) if self.needs_rest_channels else None
+
+            if channel_item:
+                group_names = channel_item['match_target_compiled'].group_names
+                channel_key = (channel_item['url_path'], tuple(sorted(group_names or ())))
+            else:
+                channel_key = None
+
+            services.append((item['name'], channel_key))
+
+        return (tuple(services), bool(self.needs_api_invoke), bool(self.needs_rest_channels), tuple(self.api_invoke_path))
+
+# ################################################################################################################################
+
+    def generate_rendered(self) -> 'RenderedSpec':
+        """ Returns the specification rendered upfront, along with its ETag, reusing a cached one if the input is the same.
+        """
+        cache = cast_('APISpecCache', self.cache)
+        return cache.get_rendered(self.get_cache_key(), self.generate_dict)
+
+# ################################################################################################################################
+
+    def generate_dict(self) -> 'anydict':
 
         # Local aliases
         sec_name = 'BasicAuth'
@@ -374,7 +477,7 @@ class OpenAPIGenerator:
                     if should_attach:
                         post['parameters'] = channel_params
 
-        return yaml_dump(out.toDict(), Dumper=YAMLDumper, default_flow_style=False)
+        return out.toDict()
 
 # ################################################################################################################################
 # ################################################################################################################################
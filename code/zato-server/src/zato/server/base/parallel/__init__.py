@@ -34,8 +34,8 @@ from paste.util.converters import asbool
 from zato.broker import BrokerMessageReceiver
 from zato.broker.client import BrokerClient
 from zato.bunch import Bunch
-from zato.common.api import API_Key, DATA_FORMAT, default_internal_modules, EnvFile, EnvVariable,  GENERIC,  HotDeploy, IPC, \
-    KVDB as CommonKVDB, RATE_LIMIT, SERVER_STARTUP, SEC_DEF_TYPE, SERVER_UP_STATUS, ZatoKVDB as CommonZatoKVDB, \
+from zato.common.api import API_Key, CACHE, DATA_FORMAT, default_internal_modules, EnvFile, EnvVariable,  GENERIC,  HotDeploy, \
+    IPC, KVDB as CommonKVDB, RATE_LIMIT, SERVER_STARTUP, SEC_DEF_TYPE, SERVER_UP_STATUS, ZatoKVDB as CommonZatoKVDB, \
         ZATO_ODB_POOL_NAME
 from zato.common.audit import audit_pii
 from zato.common.audit_log import AuditLog
@@ -68,6 +68,7 @@ from zato.common.util.time_ import TimeUtil
 from zato.common.util.tcp import wait_until_port_taken
 from zato.distlock import LockManager
 from zato.server.base.parallel.config import ConfigLoader
+from zato.server.base.parallel.config_snapshot import ConfigSnapshot, ModuleCtx as ConfigSnapshotCtx
 from zato.server.base.parallel.http import HTTPHandler
 from zato.server.base.parallel.subprocess_.api import CurrentState as SubprocessCurrentState, \
      StartConfig as SubprocessStartConfig
@@ -208,6 +209,7 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
         self.deployment_lock_expires = -1
         self.deployment_lock_timeout = -1
         self.deployment_key = ''
+        self.config_odb = None # type: ConfigSnapshot | None
         self.has_gevent = True
         self.request_dispatcher_dispatch = cast_('callable_', None)
         self.delivery_store = None
@@ -238,6 +240,7 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
         self._hash_secret_method = ''
         self._hash_secret_rounds = -1
         self._hash_secret_salt_size = -1
+        self.hash_pool = cast_('any_', None)
         self.sso_tool = SSOTool(self)
         self.platform_system = platform_system().lower()
         self.has_posix_ipc = is_posix
@@ -476,12 +479,21 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
                 self.is_starting_first = True
                 logger.debug('Got lock_name:`%s`, ttl:`%s`', lock_name, self.deployment_lock_expires)
 
-                # .. Remove all the deployed services from the DB ..
-                self.odb.drop_deployed_services(server.id)
+                # .. if we have a manifest from the previous deployment, services that did not change
+                # can be kept in the DB as they are, otherwise, we need to start from scratch ..
+                manifest = self.service_store.set_up_manifest(self.base_dir)
 
-                # .. deploy them back including any missing ones found on other servers.
+                # .. remove all the deployed services from the DB unless we can reuse them ..
+                if not manifest.is_warm:
+                    self.odb.drop_deployed_services(server.id)
+
+                # .. deploy them back including any missing ones found on other servers ..
                 locally_deployed = import_initial_services_jobs()
 
+                # .. and if we did not drop them above, remove the ones that no longer exist.
+                if manifest.is_warm:
+                    self.service_store.drop_stale_deployed_services(list(locally_deployed))
+
                 # Add the flag to Redis indicating that this server has already
                 # deployed its services. Note that by default the expiration
                 # time is more than a century in the future. It will be cleared out
@@ -880,6 +892,43 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
         user_conf_location:'str' = self.pickup_config.get('user_conf', {}).get('pickup_from', '')
         return path_string_list_to_list(self.base_dir, user_conf_location)
 
+# ################################################################################################################################
+
+    def set_up_config_from_snapshot(self, server:'any_') -> 'None':
+        """ Reads in all configuration from ODB. The first worker to get here runs all the queries and saves their results
+        in a snapshot that the other workers started along with it will read instead of running the same queries again.
+        """
+        misc = self.fs_server_config.misc
+
+        # Snapshots may be disabled, in which case each worker reads its configuration from ODB directly
+        if not asbool(misc.get('use_config_snapshot', True)):
+            self.set_up_config(server) # type: ignore
+            return
+
+        max_age = int(misc.get('config_snapshot_max_age') or ConfigSnapshotCtx.Default_Max_Age)
+        snapshot = ConfigSnapshot.from_work_dir(self.odb, self.work_dir, self.deployment_key, max_age)
+
+        self.config_odb = snapshot
+
+        try:
+            # Only one worker at a time may check if there is a snapshot and the first one will create it ..
+            with self.zato_lock_manager(snapshot.lock_name, ttl=self.deployment_lock_expires,
+                block=self.deployment_lock_timeout):
+
+                if not snapshot.load():
+                    self.set_up_config(server) # type: ignore
+                    snapshot.save()
+
+            # .. whereas if there is a snapshot already, we no longer need to hold the lock to read it.
+            if snapshot.is_loaded:
+                self.set_up_config(server) # type: ignore
+
+        finally:
+            self.config_odb = None
+
+        logger.info('Config read; queries run:%s; from snapshot:%s; (pid:%s)',
+            snapshot.total_queried, snapshot.total_from_snapshot, self.pid)
+
 # ################################################################################################################################
 
     def set_up_odb(self) -> 'None':
@@ -1078,7 +1127,7 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
         self.worker_store = WorkerStore(self.config, self)
         self.worker_store.invoke_matcher.read_config(self.fs_server_config.invoke_patterns_allowed)
         self.worker_store.target_matcher.read_config(self.fs_server_config.invoke_target_patterns_allowed)
-        self.set_up_config(server) # type: ignore
+        self.set_up_config_from_snapshot(server)
 
         # Normalize hot-deploy configuration
         self.hot_deploy_config = Bunch()
@@ -1503,7 +1552,16 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
 
     def configure_sso(self) -> 'None':
         if self.is_sso_enabled:
-            self.sso_api.post_configure(self._get_sso_session, self.odb.is_sqlite)
+
+            # Sessions are cached unless explicitly disabled. Their expiry is not extended on .get
+            # because each session has its own expiration time, which only renewals can change.
+            if asbool(self.sso_config.session.get('use_cache', True)):
+                session_cache = self.worker_store.get_internal_builtin_cache(
+                    CACHE.Default_Name.SSO_Session, extend_expiry_on_get=False)
+            else:
+                session_cache = None
+
+            self.sso_api.post_configure(self._get_sso_session, self.odb.is_sqlite, session_cache)
 
 # ################################################################################################################################
 
@@ -1756,12 +1814,18 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
 # ################################################################################################################################
 
     def hash_secret(self, data:'str', name:'str'='zato.default') -> 'str':
-        return self.crypto_manager.hash_secret(data, name)
+        if self.hash_pool:
+            return self.hash_pool.hash_secret(data, name)
+        else:
+            return self.crypto_manager.hash_secret(data, name)
 
 # ################################################################################################################################
 
     def verify_hash(self, given:'str', expected:'str', name:'str'='zato.default') -> 'bool':
-        return self.crypto_manager.verify_hash(given, expected, name)
+        if self.hash_pool:
+            return self.hash_pool.verify_hash(given, expected, name)
+        else:
+            return self.crypto_manager.verify_hash(given, expected, name)
 
 # ################################################################################################################################
 
@@ -59,60 +59,63 @@ class ConfigLoader:
 
     def set_up_security(self:'ParallelServer', cluster_id:'int') -> 'None':
 
+        # Queries are run through a snapshot of the configuration, if there is one
+        odb = self.config_odb or self.odb
+
         # API keys
-        query = self.odb.get_apikey_security_list(cluster_id, True)
+        query = odb.get_apikey_security_list(cluster_id, True)
         self.config.apikey = ConfigDict.from_query('apikey', query, decrypt_func=self.decrypt)
 
         # AWS
-        query = self.odb.get_aws_security_list(cluster_id, True)
+        query = odb.get_aws_security_list(cluster_id, True)
         self.config.aws = ConfigDict.from_query('aws', query, decrypt_func=self.decrypt)
 
         # HTTP Basic Auth
-        query = self.odb.get_basic_auth_list(cluster_id, None, True)
+        query = odb.get_basic_auth_list(cluster_id, None, True)
         self.config.basic_auth = ConfigDict.from_query('basic_auth', query, decrypt_func=self.decrypt)
 
         # JWT
-        query = self.odb.get_jwt_list(cluster_id, None, True)
+        query = odb.get_jwt_list(cluster_id, None, True)
         self.config.jwt = ConfigDict.from_query('jwt', query, decrypt_func=self.decrypt)
 
         # NTLM
-        query = self.odb.get_ntlm_list(cluster_id, True)
+        query = odb.get_ntlm_list(cluster_id, True)
         self.config.ntlm = ConfigDict.from_query('ntlm', query, decrypt_func=self.decrypt)
 
         # OAuth
-        query = self.odb.get_oauth_list(cluster_id, True)
+        query = odb.get_oauth_list(cluster_id, True)
         self.config.oauth = ConfigDict.from_query('oauth', query, decrypt_func=self.decrypt)
 
         # RBAC - permissions
-        query = self.odb.get_rbac_permission_list(cluster_id, True)
+        query = odb.get_rbac_permission_list(cluster_id, True)
         self.config.rbac_permission = ConfigDict.from_query('rbac_permission', query, decrypt_func=self.decrypt)
 
         # RBAC - roles
-        query = self.odb.get_rbac_role_list(cluster_id, True)
+        query = odb.get_rbac_role_list(cluster_id, True)
         self.config.rbac_role = ConfigDict.from_query('rbac_role', query, decrypt_func=self.decrypt)
 
         # RBAC - client roles
-        query = self.odb.get_rbac_client_role_list(cluster_id, True)
+        query = odb.get_rbac_client_role_list(cluster_id, True)
         self.config.rbac_client_role = ConfigDict.from_query('rbac_client_role', query, decrypt_func=self.decrypt)
 
         # RBAC - role permission
-        query = self.odb.get_rbac_role_permission_list(cluster_id, True)
+        query = odb.get_rbac_role_permission_list(cluster_id, True)
         self.config.rbac_role_permission = ConfigDict.from_query('rbac_role_permission', query, decrypt_func=self.decrypt)
 
         # TLS CA certs
-        query = self.odb.get_tls_ca_cert_list(cluster_id, True)
+        query = odb.get_tls_ca_cert_list(cluster_id, True)
         self.config.tls_ca_cert = ConfigDict.from_query('tls_ca_cert', query, decrypt_func=self.decrypt)
 
         # TLS channel security
-        query = self.odb.get_tls_channel_sec_list(cluster_id, True)
+        query = odb.get_tls_channel_sec_list(cluster_id, True)
         self.config.tls_channel_sec = ConfigDict.from_query('tls_channel_sec', query, decrypt_func=self.decrypt)
 
         # TLS key/cert pairs
-        query = self.odb.get_tls_key_cert_list(cluster_id, True)
+        query = odb.get_tls_key_cert_list(cluster_id, True)
         self.config.tls_key_cert = ConfigDict.from_query('tls_key_cert', query, decrypt_func=self.decrypt)
 
         # Vault connections
-        query = self.odb.get_vault_connection_list(cluster_id, True)
+        query = odb.get_vault_connection_list(cluster_id, True)
         self.config.vault_conn_sec = ConfigDict.from_query('vault_conn_sec', query, decrypt_func=self.decrypt)
 
         # Encrypt all secrets
@@ -122,19 +125,22 @@ class ConfigLoader:
 
     def set_up_pubsub(self:'ParallelServer', cluster_id:'int') -> 'None':
 
+        # Queries are run through a snapshot of the configuration, if there is one
+        odb = self.config_odb or self.odb
+
         # Pub/sub
         self.config.pubsub = Bunch()
 
         # Pub/sub - endpoints
-        query = self.odb.get_pubsub_endpoint_list(cluster_id, True)
+        query = odb.get_pubsub_endpoint_list(cluster_id, True)
         self.config.pubsub_endpoint = ConfigDict.from_query('pubsub_endpoint', query, decrypt_func=self.decrypt)
 
         # Pub/sub - topics
-        query = self.odb.get_pubsub_topic_list(cluster_id, True)
+        query = odb.get_pubsub_topic_list(cluster_id, True)
         self.config.pubsub_topic = ConfigDict.from_query('pubsub_topic', query, decrypt_func=self.decrypt)
 
         # Pub/sub - subscriptions
-        query = self.odb.get_pubsub_subscription_list(cluster_id, True)
+        query = odb.get_pubsub_subscription_list(cluster_id, True)
         self.config.pubsub_subscription = ConfigDict.from_query('pubsub_subscription', query, decrypt_func=self.decrypt)
 
 # ################################################################################################################################
@@ -144,6 +150,9 @@ class ConfigLoader:
         server:'ServerModel'
     ) -> 'None':
 
+        # Queries are run through a snapshot of the configuration, if there is one
+        odb = self.config_odb or self.odb
+
         # Which components are enabled
         self.component_enabled.stats = asbool(self.fs_server_config.component_enabled.stats)
         self.component_enabled.slow_response = asbool(self.fs_server_config.component_enabled.slow_response)
@@ -152,10 +161,10 @@ class ConfigLoader:
         # Cassandra - start
         #
 
-        query = self.odb.get_cassandra_conn_list(server.cluster.id, True)
+        query = odb.get_cassandra_conn_list(server.cluster.id, True)
         self.config.cassandra_conn = ConfigDict.from_query('cassandra_conn', query, decrypt_func=self.decrypt)
 
-        query = self.odb.get_cassandra_query_list(server.cluster.id, True)
+        query = odb.get_cassandra_query_list(server.cluster.id, True)
         self.config.cassandra_query = ConfigDict.from_query('cassandra_query', query, decrypt_func=self.decrypt)
 
         #
@@ -166,10 +175,10 @@ class ConfigLoader:
         # Search - start
         #
 
-        query = self.odb.get_search_es_list(server.cluster.id, True)
+        query = odb.get_search_es_list(server.cluster.id, True)
         self.config.search_es = ConfigDict.from_query('search_es', query, decrypt_func=self.decrypt)
 
-        query = self.odb.get_search_solr_list(server.cluster.id, True)
+        query = odb.get_search_solr_list(server.cluster.id, True)
         self.config.search_solr = ConfigDict.from_query('search_solr', query, decrypt_func=self.decrypt)
 
         #
@@ -180,7 +189,7 @@ class ConfigLoader:
         # SMS - start
         #
 
-        query = self.odb.get_sms_twilio_list(server.cluster.id, True)
+        query = odb.get_sms_twilio_list(server.cluster.id, True)
         self.config.sms_twilio = ConfigDict.from_query('sms_twilio', query, decrypt_func=self.decrypt)
 
         #
@@ -193,7 +202,7 @@ class ConfigLoader:
 
         # AWS S3
 
-        query = self.odb.get_cloud_aws_s3_list(server.cluster.id, True)
+        query = odb.get_cloud_aws_s3_list(server.cluster.id, True)
         self.config.cloud_aws_s3 = ConfigDict.from_query('cloud_aws_s3', query, decrypt_func=self.decrypt)
 
         #
@@ -203,7 +212,7 @@ class ConfigLoader:
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
         # Services
-        query = self.odb.get_service_list(server.cluster.id, True)
+        query = odb.get_service_list(server.cluster.id, True)
         self.config.service = ConfigDict.from_query('service_list', query, decrypt_func=self.decrypt)
 
         #
@@ -211,11 +220,11 @@ class ConfigLoader:
         #
 
         # AMQP
-        query = self.odb.get_definition_amqp_list(server.cluster.id, True)
+        query = odb.get_definition_amqp_list(server.cluster.id, True)
         self.config.definition_amqp = ConfigDict.from_query('definition_amqp', query, decrypt_func=self.decrypt)
 
         # IBM MQ
-        query = self.odb.get_definition_wmq_list(server.cluster.id, True)
+        query = odb.get_definition_wmq_list(server.cluster.id, True)
         self.config.definition_wmq = ConfigDict.from_query('definition_wmq', query, decrypt_func=self.decrypt)
 
         #
@@ -227,11 +236,11 @@ class ConfigLoader:
         #
 
         # AMQP
-        query = self.odb.get_channel_amqp_list(server.cluster.id, True)
+        query = odb.get_channel_amqp_list(server.cluster.id, True)
         self.config.channel_amqp = ConfigDict.from_query('channel_amqp', query, decrypt_func=self.decrypt)
 
         # IBM MQ
-        query = self.odb.get_channel_wmq_list(server.cluster.id, True)
+        query = odb.get_channel_wmq_list(server.cluster.id, True)
         self.config.channel_wmq = ConfigDict.from_query('channel_wmq', query, decrypt_func=self.decrypt)
 
         #
@@ -243,58 +252,58 @@ class ConfigLoader:
         #
 
         # AMQP
-        query = self.odb.get_out_amqp_list(server.cluster.id, True)
+        query = odb.get_out_amqp_list(server.cluster.id, True)
         self.config.out_amqp = ConfigDict.from_query('out_amqp', query, decrypt_func=self.decrypt)
 
         # Caches
-        query = self.odb.get_cache_builtin_list(server.cluster.id, True)
+        query = odb.get_cache_builtin_list(server.cluster.id, True)
         self.config.cache_builtin = ConfigDict.from_query('cache_builtin', query, decrypt_func=self.decrypt)
 
-        query = self.odb.get_cache_memcached_list(server.cluster.id, True)
+        query = odb.get_cache_memcached_list(server.cluster.id, True)
         self.config.cache_memcached = ConfigDict.from_query('cache_memcached', query, decrypt_func=self.decrypt)
 
         # FTP
-        query = self.odb.get_out_ftp_list(server.cluster.id, True)
+        query = odb.get_out_ftp_list(server.cluster.id, True)
         self.config.out_ftp = ConfigDict.from_query('out_ftp', query, decrypt_func=self.decrypt)
 
         # IBM MQ
-        query = self.odb.get_out_wmq_list(server.cluster.id, True)
+        query = odb.get_out_wmq_list(server.cluster.id, True)
         self.config.out_wmq = ConfigDict.from_query('out_wmq', query, decrypt_func=self.decrypt)
 
         # Odoo
-        query = self.odb.get_out_odoo_list(server.cluster.id, True)
+        query = odb.get_out_odoo_list(server.cluster.id, True)
         self.config.out_odoo = ConfigDict.from_query('out_odoo', query, decrypt_func=self.decrypt)
 
         # SAP RFC
-        query = self.odb.get_out_sap_list(server.cluster.id, True)
+        query = odb.get_out_sap_list(server.cluster.id, True)
         self.config.out_sap = ConfigDict.from_query('out_sap', query, decrypt_func=self.decrypt)
 
         # REST
-        query = self.odb.get_http_soap_list(server.cluster.id, 'outgoing', 'plain_http', True)
+        query = odb.get_http_soap_list(server.cluster.id, 'outgoing', 'plain_http', True)
         self.config.out_plain_http = ConfigDict.from_query('out_plain_http', query, decrypt_func=self.decrypt)
 
         # SFTP
-        query = self.odb.get_out_sftp_list(server.cluster.id, True)
+        query = odb.get_out_sftp_list(server.cluster.id, True)
         self.config.out_sftp = ConfigDict.from_query('out_sftp', query, decrypt_func=self.decrypt, drop_opaque=True)
 
         # SOAP
-        query = self.odb.get_http_soap_list(server.cluster.id, 'outgoing', 'soap', True)
+        query = odb.get_http_soap_list(server.cluster.id, 'outgoing', 'soap', True)
         self.config.out_soap = ConfigDict.from_query('out_soap', query, decrypt_func=self.decrypt)
 
         # SQL
-        query = self.odb.get_out_sql_list(server.cluster.id, True)
+        query = odb.get_out_sql_list(server.cluster.id, True)
         self.config.out_sql = ConfigDict.from_query('out_sql', query, decrypt_func=self.decrypt)
 
         # ZMQ channels
-        query = self.odb.get_channel_zmq_list(server.cluster.id, True)
+        query = odb.get_channel_zmq_list(server.cluster.id, True)
         self.config.channel_zmq = ConfigDict.from_query('channel_zmq', query, decrypt_func=self.decrypt)
 
         # ZMQ outgoing
-        query = self.odb.get_out_zmq_list(server.cluster.id, True)
+        query = odb.get_out_zmq_list(server.cluster.id, True)
         self.config.out_zmq = ConfigDict.from_query('out_zmq', query, decrypt_func=self.decrypt)
 
         # WebSocket channels
-        query = self.odb.get_channel_web_socket_list(server.cluster.id, True)
+        query = odb.get_channel_web_socket_list(server.cluster.id, True)
         self.config.channel_web_socket = ConfigDict.from_query('channel_web_socket', query, decrypt_func=self.decrypt)
 
         #
@@ -310,7 +319,7 @@ class ConfigLoader:
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
         # Connections
-        query = self.odb.get_generic_connection_list(server.cluster.id, True)
+        query = odb.get_generic_connection_list(server.cluster.id, True)
         self.config.generic_connection = ConfigDict.from_query('generic_connection', query, decrypt_func=self.decrypt)
 
         #
@@ -324,7 +333,7 @@ class ConfigLoader:
         #
 
         # SQL
-        query = self.odb.get_notif_sql_list(server.cluster.id, True)
+        query = odb.get_notif_sql_list(server.cluster.id, True)
         self.config.notif_sql = ConfigDict.from_query('notif_sql', query, decrypt_func=self.decrypt)
 
         #
@@ -348,7 +357,7 @@ class ConfigLoader:
         # All the HTTP/SOAP channels.
         http_soap = []
 
-        for item in elems_with_opaque(self.odb.get_http_soap_list(server.cluster.id, 'channel')):
+        for item in elems_with_opaque(odb.get_http_soap_list(server.cluster.id, 'channel')):
 
             hs_item = {}
             for key in item.keys():
@@ -362,7 +371,7 @@ class ConfigLoader:
         self.config.http_soap = http_soap
 
         # JSON Pointer
-        query = self.odb.get_json_pointer_list(server.cluster.id, True)
+        query = odb.get_json_pointer_list(server.cluster.id, True)
         self.config.json_pointer = ConfigDict.from_query('json_pointer', query, decrypt_func=self.decrypt)
 
         # SimpleIO
@@ -396,11 +405,11 @@ class ConfigLoader:
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
         # E-mail - SMTP
-        query = self.odb.get_email_smtp_list(server.cluster.id, True)
+        query = odb.get_email_smtp_list(server.cluster.id, True)
         self.config.email_smtp = ConfigDict.from_query('email_smtp', query, decrypt_func=self.decrypt)
 
         # E-mail - IMAP
-        query = self.odb.get_email_imap_list(server.cluster.id, True)
+        query = odb.get_email_imap_list(server.cluster.id, True)
         self.config.email_imap = ConfigDict.from_query('email_imap', query, decrypt_func=self.decrypt)
 
         # .. reusable ..
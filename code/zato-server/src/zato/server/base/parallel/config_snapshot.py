@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from logging import getLogger
+from pickle import dumps as pickle_dumps, HIGHEST_PROTOCOL as highest_pickle_protocol, loads as pickle_loads
+from tempfile import NamedTemporaryFile
+from time import time
+from traceback import format_exc
+
+# Zato
+from zato.bunch import Bunch
+from zato.common.util.search import SearchResults
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.odb.api import ODBManager
+    from zato.common.typing_ import any_, anydict, callable_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ModuleCtx:
+
+    # Bump it up each time the structure of the snapshot changes
+    Version = 1
+
+    File_Name = 'config-snapshot.pickle'
+
+    # For how many seconds a snapshot can be used by workers started after it was taken
+    Default_Max_Age = 120
+
+    Lock_Prefix = 'zato.server.config-snapshot.'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SnapshotRow(Bunch):
+    """ A row read from a snapshot. It can be accessed like a row returned by SQLAlchemy, e.g. by elems_with_opaque.
+    """
+    def _asdict(self) -> 'anydict':
+        return dict(self)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ConfigSnapshot:
+    """ Stands in for ODBManager when a server reads its configuration. Each get_*_list query is run only if its result
+    is not in the snapshot already. A snapshot is taken by the first worker of a server and saved to a local file,
+    from which all the other workers load it instead of running the same queries again. A snapshot is valid for a single
+    deployment key only, i.e. for workers started together, and only for a limited time, so that workers that are
+    restarted later on read their configuration from the ODB, as they would do without a snapshot.
+    """
+    def __init__(self, odb:'ODBManager', path:'str', key:'str', max_age:'int'=ModuleCtx.Default_Max_Age) -> 'None':
+        self.odb = odb
+        self.path = path
+        self.key = key
+        self.max_age = max_age
+
+        # Query key -> its result, as it is kept in the snapshot
+        self.queries = {} # type: dict[str, anydict]
+
+        # Whether the snapshot was loaded from a file
+        self.is_loaded = False
+
+        # How many queries were actually run and how many were served from the snapshot
+        self.total_queried = 0
+        self.total_from_snapshot = 0
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_work_dir(odb:'ODBManager', work_dir:'str', key:'str', max_age:'int'=ModuleCtx.Default_Max_Age) -> 'ConfigSnapshot':
+        path = os.path.join(work_dir, ModuleCtx.File_Name)
+        return ConfigSnapshot(odb, path, key, max_age)
+
+# ################################################################################################################################
+
+    @property
+    def lock_name(self) -> 'str':
+        return ModuleCtx.Lock_Prefix + self.key
+
+# ################################################################################################################################
+
+    def __getattr__(self, name:'str') -> 'any_':
+
+        # We are here only for attributes that we do not have, i.e. ODBManager ones. Only queries returning lists
+        # of configuration objects are snapshotted, anything else goes directly to the ODB.
+        if name.startswith('get_') and name.endswith('_list'):
+            return self._get_query_func(name)
+        else:
+            return getattr(self.odb, name)
+
+# ################################################################################################################################
+
+    def _get_query_func(self, name:'str') -> 'callable_':
+        def _query(*args:'any_', **kwargs:'any_') -> 'any_':
+            return self._invoke(name, args, kwargs)
+        return _query
+
+# ################################################################################################################################
+
+    def _invoke(self, name:'str', args:'any_', kwargs:'anydict') -> 'any_':
+
+        query_key = '{}:{!r}:{!r}'.format(name, args, sorted(kwargs.items()))
+
+        # We already have this query's result ..
+        if entry := self.queries.get(query_key):
+            self.total_from_snapshot += 1
+            return self._from_entry(entry)
+
+        # .. otherwise, we need to run the query ..
+        result = getattr(self.odb, name)(*args, **kwargs)
+        self.total_queried += 1
+
+        # .. if its result cannot be snapshotted, it is returned as it is ..
+        entry = self._to_entry(result)
+        if not entry:
+            return result
+
+        # .. otherwise, we store it and return it in the same form that other workers will see it.
+        self.queries[query_key] = entry
+        return self._from_entry(entry)
+
+# ################################################################################################################################
+
+    def _to_entry(self, result:'any_') -> 'anydict | None':
+        """ Turns the result of a query into a form that can be kept in a snapshot or returns None if that is not possible.
+        """
+        # Queries are called with or without needs_columns ..
+        if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], SearchResults):
+            search_result, columns = result
+            has_columns = True
+
+        elif isinstance(result, SearchResults):
+            search_result = result
+            columns = result.columns
+            has_columns = False
+
+        # .. and this is not a result that we recognise.
+        else:
+            return None
+
+        rows = []
+
+        for row in search_result.result:
+            if hasattr(row, '_asdict'):
+                rows.append(row._asdict())
+            elif isinstance(row, dict):
+                rows.append(dict(row))
+
+            # E.g. an SQLAlchemy model instance
+            else:
+                return None
+
+        column_names = list(columns.keys()) if hasattr(columns, 'keys') else [elem.name for elem in columns] # type: list[str]
+
+        return {
+            'rows': rows,
+            'columns': column_names,
+            'total': search_result.total,
+            'has_columns': has_columns,
+        }
+
+# ################################################################################################################################
+
+    def _from_entry(self, entry:'anydict') -> 'any_':
+        """ Returns a query's result out of what is kept in a snapshot.
+        """
+        rows = [SnapshotRow(row) for row in entry['rows']]
+
+        # Our callers expect for columns to have .keys()
+        columns = dict.fromkeys(entry['columns'])
+
+        result = SearchResults(None, rows, columns, entry['total'])
+
+        if entry['has_columns']:
+            return result, columns
+        else:
+            return result
+
+# ################################################################################################################################
+
+    def load(self) -> 'bool':
+        """ Loads a snapshot from its file and returns True if it can be used, False otherwise.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle_loads(f.read())
+        except Exception:
+            logger.info('Ignoring invalid config snapshot `%s`; e:`%s`', self.path, format_exc())
+            return False
+
+        if data.get('version') != ModuleCtx.Version or data.get('key') != self.key:
+            return False
+
+        if time() - data['created'] > self.max_age:
+            logger.info('Ignoring config snapshot older than %ss `%s`', self.max_age, self.path)
+            return False
+
+        self.queries = data['queries']
+        self.is_loaded = True
+
+        return True
+
+# ################################################################################################################################
+
+    def save(self) -> 'None':
+        """ Saves a snapshot to its file, atomically replacing the previous one, if any.
+        The file is readable only by the user that the server runs as.
+        """
+        data = {
+            'version': ModuleCtx.Version,
+            'key': self.key,
+            'created': time(),
+            'queries': self.queries,
+        }
+
+        try:
+            with NamedTemporaryFile('wb', dir=os.path.dirname(self.path), delete=False) as f:
+                _ = f.write(pickle_dumps(data, highest_pickle_protocol))
+            os.replace(f.name, self.path)
+        except Exception:
+            logger.warning('Could not save config snapshot `%s`; e:`%s`', self.path, format_exc())
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -36,7 +36,7 @@ from orjson import dumps
 # Zato
 from zato.bunch import Bunch
 from zato.common import broker_message
-from zato.common.api import API_Key, CHANNEL, CONNECTION, DATA_FORMAT, FILE_TRANSFER, GENERIC as COMMON_GENERIC, \
+from zato.common.api import API_Key, CACHE, CHANNEL, CONNECTION, DATA_FORMAT, FILE_TRANSFER, GENERIC as COMMON_GENERIC, \
      HotDeploy, HTTP_SOAP_SERIALIZATION_TYPE, IPC, NOTIF, PUBSUB, RATE_LIMIT, SEC_DEF_TYPE, simple_types, \
      URL_TYPE, WEB_SOCKET, Wrapper_Name_Prefix_List, ZATO_DEFAULT, ZATO_NONE, ZATO_ODB_POOL_NAME, ZMQ
 from zato.common.broker_message import code_to_name, GENERIC as BROKER_MSG_GENERIC, SERVICE
@@ -48,7 +48,7 @@ from zato.common.model.amqp_ import AMQPConnectorConfig
 from zato.common.model.wsx import WSXConnectorConfig
 from zato.common.odb.api import PoolStore, SessionWrapper
 from zato.common.typing_ import cast_
-from zato.common.util.api import get_tls_ca_cert_full_path, get_tls_key_cert_full_path, get_tls_from_payload, \
+from zato.common.util.api import asbool, get_tls_ca_cert_full_path, get_tls_key_cert_full_path, get_tls_from_payload, \
      fs_safe_name, import_module_from_path, new_cid, parse_extra_into_dict, parse_tls_channel_security_definition, \
      start_connectors, store_tls, update_apikey_username_to_channel, update_bind_port, visit_py_source, wait_for_dict_key, \
      wait_for_dict_key_by_get_func
@@ -112,9 +112,11 @@ if 0:
     from zato.server.base.parallel import ParallelServer
     from zato.server.config import ConfigDict
     from zato.server.config import ConfigStore
+    from zato.server.connection.cache import Cache
     from zato.server.connection.http_soap.outgoing import BaseHTTPSOAPWrapper
     from zato.server.service import Service
     from zato.server.store import BaseAPI
+    Cache          = Cache
     ConfigStore    = ConfigStore
     ParallelServer = ParallelServer
     Service        = Service
@@ -280,6 +282,10 @@ class WorkerStore(_WorkerStoreBase):
         # Caches
         self.cache_api = CacheAPI(self.server)
 
+        # JWT tokens that have been already verified, set in self.init_caches
+        self.jwt_verified_cache = None # type: Cache | None
+        self.jwt_needs_odb = True
+
         # File transfer
         self.file_transfer_api = FileTransferAPI(self.server, self)
 
@@ -968,21 +974,24 @@ class WorkerStore(_WorkerStoreBase):
 
     def init_rbac(self) -> 'None':
 
-        for value in self.worker_config.service.values():
-            self.rbac.create_resource(value.config.id)
+        # Permissions of all the clients are resolved only once everything is already in place
+        with self.rbac.bulk_update():
+
+            for value in self.worker_config.service.values():
+                self.rbac.create_resource(value.config.id)
 
-        for value in self.worker_config.rbac_permission.values():
-            self.rbac.create_permission(value.config.id, value.config.name)
+            for value in self.worker_config.rbac_permission.values():
+                self.rbac.create_permission(value.config.id, value.config.name)
 
-        for value in self.worker_config.rbac_role.values():
-            self.rbac.create_role(value.config.id, value.config.name, value.config.parent_id)
+            for value in self.worker_config.rbac_role.values():
+                self.rbac.create_role(value.config.id, value.config.name, value.config.parent_id)
 
-        for value in self.worker_config.rbac_client_role.values():
-            self.rbac.create_client_role(value.config.client_def, value.config.role_id)
+            for value in self.worker_config.rbac_client_role.values():
+                self.rbac.create_client_role(value.config.client_def, value.config.role_id)
 
-        # TODO - handle 'deny' as well
-        for value in self.worker_config.rbac_role_permission.values():
-            self.rbac.create_role_permission_allow(value.config.role_id, value.config.perm_id, value.config.service_id)
+            # TODO - handle 'deny' as well
+            for value in self.worker_config.rbac_role_permission.values():
+                self.rbac.create_role_permission_allow(value.config.role_id, value.config.perm_id, value.config.service_id)
 
         self.rbac.set_http_permissions()
 
@@ -1001,6 +1010,44 @@ class WorkerStore(_WorkerStoreBase):
             for value in cache.values():
                 self.cache_api.create(bunchify(value['config']))
 
+        self.init_jwt_verified_cache()
+
+# ################################################################################################################################
+
+    def init_jwt_verified_cache(self) -> 'None':
+
+        misc = self.server.fs_server_config.misc
+
+        # Whether JWT tokens are to be kept in ODB in addition to the verified cache.
+        # Without ODB, tokens are valid only in the server that issued them.
+        self.jwt_needs_odb = asbool(misc.get('jwt_needs_odb', True))
+
+        if not asbool(misc.get('jwt_use_verified_cache', True)):
+            return
+
+        self.jwt_verified_cache = self.get_internal_builtin_cache(CACHE.Default_Name.JWT, extend_expiry_on_get=True)
+
+# ################################################################################################################################
+
+    def get_internal_builtin_cache(self, name:'str', extend_expiry_on_get:'bool') -> 'Cache':
+        """ Returns a built-in cache used internally by the server, creating it first if it does not exist yet.
+        """
+        # Unless it was configured in ODB, each worker creates the cache by itself, using the same name,
+        # which is how all of them are synchronized.
+        if name not in self.cache_api.builtin:
+            config = Bunch()
+            config.name = name
+            config.cache_type = CACHE.TYPE.BUILTIN
+            config.is_default = False
+            config.max_size = CACHE.DEFAULT.MAX_SIZE
+            config.max_item_size = CACHE.DEFAULT.MAX_ITEM_SIZE
+            config.extend_expiry_on_get = extend_expiry_on_get
+            config.extend_expiry_on_set = True
+            config.sync_method = CACHE.SYNC_METHOD.IN_BACKGROUND.id
+            self.cache_api.create(config)
+
+        return self.cache_api.get_builtin_cache(name)
+
 # ################################################################################################################################
 
     def sync_security(self):
@@ -1200,6 +1247,8 @@ class WorkerStore(_WorkerStoreBase):
           'should_delete_after_pickup': config.get('delete_after_pickup', True),
           'is_case_sensitive': config.get('is_case_sensitive', True),
           'is_line_by_line': config.get('is_line_by_line', False),
+          'stream_batch_size': config.get('stream_batch_size'),
+          'stream_chunk_size': config.get('stream_chunk_size'),
           'is_recursive': config.get('is_recursive', False),
           'binary_file_patterns': config.get('binary_file_patterns') or [],
           'outconn_rest_list': [],
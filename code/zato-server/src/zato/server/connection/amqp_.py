@@ -9,9 +9,11 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 # pylint: disable=attribute-defined-outside-init
 
 # stdlib
+from collections import deque
 from datetime import datetime, timedelta
 from logging import getLogger
 from socket import error as socket_error
+from time import monotonic
 from traceback import format_exc
 
 # amqp
@@ -19,9 +21,10 @@ from amqp.exceptions import ConnectionError as AMQPConnectionError
 
 # gevent
 from gevent import sleep, spawn
+from gevent.pool import Pool
 
 # Kombu
-from kombu import Connection, Consumer as _Consumer, pools, Queue
+from kombu import Connection, Consumer as _Consumer, pools, Producer, Queue
 from kombu.transport.pyamqp import Connection as PyAMQPConnection, SSLTransport, Transport
 
 # Python 2/3 compatibility
@@ -77,6 +80,122 @@ class _AMQPMessage:
 
 # ################################################################################################################################
 
+class _AckBatcher:
+    """ Settles messages that a consumer received. Messages processed successfully are acknowledged in batches,
+    with a single multiple=True acknowledgement covering all the messages up to the last one in a batch,
+    whereas messages that could not be processed are published to the channel's dead-letter exchange, if there is one,
+    or requeued so that the broker delivers them again otherwise. Messages may be processed in any order
+    but they are always settled in the order they were received in, and always in the consumer's own greenlet,
+    because AMQP channels cannot be used by more than one greenlet at a time.
+    """
+    def __init__(self, name, is_ack_mode, batch_size, interval, dead_letter=None):
+        # type: (str, bool, int, float, Callable) -> None
+        self.name = name
+        self.is_ack_mode = is_ack_mode
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dead_letter = dead_letter
+
+        # Messages not settled yet, in the order they were received in, each with its processing result, if any
+        self.pending = deque()
+
+        # id(message) -> its entry in self.pending
+        self.pending_by_id = {}
+
+        # The last message that can be acknowledged along with all the ones before it
+        self.to_ack = None
+        self.to_ack_count = 0
+        self.to_ack_since = 0.0
+
+# ################################################################################################################################
+
+    def add(self, msg):
+        entry = [msg, None]
+        self.pending.append(entry)
+        self.pending_by_id[id(msg)] = entry
+
+# ################################################################################################################################
+
+    def on_processed(self, msg, is_ok):
+        # type: (object, bool) -> None
+
+        # There will be no entry if the consumer reconnected in the meantime, in which case the broker
+        # will deliver the message again anyway.
+        entry = self.pending_by_id.get(id(msg))
+        if entry:
+            entry[1] = is_ok
+
+# ################################################################################################################################
+
+    def clear(self):
+        """ Forgets all the messages, e.g. because the channel they were received through is closed.
+        """
+        self.pending.clear()
+        self.pending_by_id.clear()
+        self.to_ack = None
+        self.to_ack_count = 0
+
+# ################################################################################################################################
+
+    def flush(self, force=False, _received='RECEIVED'):
+        """ Settles all the messages that can be settled. Acknowledgements are sent if a batch is full,
+        if the oldest message in it has been waiting long enough or if force is True.
+        """
+        while self.pending and self.pending[0][1] is not None:
+
+            msg, is_ok = self.pending.popleft()
+            del self.pending_by_id[id(msg)]
+
+            # The service may have already settled the message on its own
+            if msg._state != _received:
+                continue
+
+            if is_ok:
+                if self.is_ack_mode:
+                    if not self.to_ack:
+                        self.to_ack_since = monotonic()
+                    self.to_ack = msg
+                    self.to_ack_count += 1
+                else:
+                    msg.reject()
+            else:
+                # Messages received before this one are acknowledged first so as to keep the order
+                self._ack()
+                self._on_failed(msg)
+
+        if self.to_ack:
+            if force or self.to_ack_count >= self.batch_size or monotonic() - self.to_ack_since >= self.interval:
+                self._ack()
+
+# ################################################################################################################################
+
+    def _ack(self):
+        if self.to_ack:
+            self.to_ack.ack(multiple=True)
+            self.to_ack = None
+            self.to_ack_count = 0
+
+# ################################################################################################################################
+
+    def _on_failed(self, msg):
+
+        if self.dead_letter:
+            try:
+                self.dead_letter(msg)
+            except Exception:
+                logger.warning('Could not dead-letter message `%s` from channel `%s`, e:`%s`',
+                    msg.delivery_tag, self.name, format_exc())
+            else:
+                msg.ack()
+                return
+
+        # Without a dead-letter exchange, or if the message could not be published to it, the message is requeued
+        # rather than dropped. It cannot be simply left unacknowledged because the next multiple=True acknowledgement
+        # would cover it too.
+        msg.reject(requeue=True)
+
+# ################################################################################################################################
+
 class _AMQPProducers:
     """ Encapsulates information about producers used by outgoing AMQP connection to send messages to a broker.
     Each outgoing connection has one _AMQPProducers object assigned.
@@ -125,11 +244,50 @@ class Consumer:
         self.is_connected = False # Instance-level flag indicating whether we have an active connection now.
         self.timeout = 0.35
 
+        # In the ordered mode, messages are processed one by one, in the order they were received in,
+        # otherwise, up to max_in_flight of them are processed concurrently.
+        if self.config.get('processing_mode') == AMQP.PROCESSING_MODE.UNORDERED.id:
+            max_in_flight = int(self.config.get('max_in_flight') or AMQP.DEFAULT.MAX_IN_FLIGHT)
+        else:
+            max_in_flight = 1
+
+        self.pool = Pool(max_in_flight)
+
+        self.ack_batcher = _AckBatcher(
+            self.name,
+            self.config.ack_mode == AMQP.ACK_MODE.ACK.id,
+            int(self.config.get('ack_batch_size') or AMQP.DEFAULT.ACK_BATCH_SIZE),
+            float(self.config.get('ack_interval') or AMQP.DEFAULT.ACK_INTERVAL),
+            self._dead_letter if self.config.get('dead_letter_exchange') else None,
+        )
+
     def _on_amqp_message(self, body, msg):
+
+        # This will block if there are already as many messages being processed as we allow for
+        self.ack_batcher.add(msg)
+        self.pool.spawn(self._process_message, body, msg)
+
+    def _process_message(self, body, msg):
         try:
-            return self.on_amqp_message(body, msg, self.name, self.config)
+            self.on_amqp_message(body, msg, self.name, self.config)
         except Exception:
             logger.warning(format_exc())
+            is_ok = False
+        else:
+            is_ok = True
+
+        self.ack_batcher.on_processed(msg, is_ok)
+
+    def _dead_letter(self, msg):
+        """ Publishes a message that could not be processed to the channel's dead-letter exchange.
+        """
+        producer = Producer(msg.channel)
+        producer.publish(msg.body,
+            exchange=self.config.dead_letter_exchange,
+            routing_key=self.config.get('dead_letter_routing_key') or msg.delivery_info.get('routing_key'),
+            headers=msg.headers,
+            content_type=msg.content_type,
+            content_encoding=msg.content_encoding)
 
 # ################################################################################################################################
 
@@ -148,6 +306,9 @@ class Consumer:
                 break
 
             try:
+                # Messages received through a previous connection, if any, will be delivered again by the broker
+                self.ack_batcher.clear()
+
                 conn = self.config.conn_class(self.config.conn_url)
                 consumer = _Consumer(conn, queues=self.queue, callbacks=[self._on_amqp_message],
                     no_ack=_no_ack[self.config.ack_mode], tag_prefix='{}/{}'.format(
@@ -195,6 +356,9 @@ class Consumer:
 
                     connection = consumer.connection
 
+                    # Settle messages processed since the previous iteration
+                    self.ack_batcher.flush()
+
                     # Do not assume the consumer still has the connection, it may have been already closed, we don't know.
                     # Unfortunately, the only way to check it is to invoke the method and catch AttributeError
                     # if connection is already None.
@@ -240,6 +404,14 @@ class Consumer:
                                 self.is_connected = True
 
             if connection:
+
+                # Wait for the messages that are still being processed and settle them before the connection is closed
+                self.pool.join(timeout=self.timeout)
+                try:
+                    self.ack_batcher.flush(force=True)
+                except Exception:
+                    logger.info('Could not settle messages for `%s`, e:`%s`', consumer, format_exc())
+
                 logger.info('Closing connection for `%s`', consumer)
                 connection.close()
             self.is_stopped = True # Set to True if we break out of the main loop.
@@ -340,9 +512,9 @@ class ConnectorAMQP(Connector):
 
 # ################################################################################################################################
 
-    def on_amqp_message(self, body, msg, channel_name, channel_config, _AMQPMessage=_AMQPMessage, _CHANNEL_AMQP=CHANNEL.AMQP,
-        _RECEIVED='RECEIVED', _ZATO_ACK_MODE_ACK=AMQP.ACK_MODE.ACK.id):
-        """ Invoked each time a message is taken off an AMQP queue.
+    def on_amqp_message(self, body, msg, channel_name, channel_config, _AMQPMessage=_AMQPMessage, _CHANNEL_AMQP=CHANNEL.AMQP):
+        """ Invoked each time a message is taken off an AMQP queue. The message is acknowledged or rejected
+        by the channel's consumer afterwards, unless the service already did it on its own.
         """
         self.on_message_callback(
             channel_config['service_name'], body, channel=_CHANNEL_AMQP,
@@ -354,12 +526,6 @@ class ConnectorAMQP(Connector):
                 'amqp_msg': msg,
             }}) # noqa: JS101
 
-        if msg._state == _RECEIVED:
-            if channel_config['ack_mode'] == _ZATO_ACK_MODE_ACK:
-                msg.ack()
-            else:
-                msg.reject()
-
 # ################################################################################################################################
 
     def _get_conn_string(self, needs_password=True, _amqp_prefix=('amqp://', 'amqps://')):
@@ -24,7 +24,7 @@ from wsgiref.simple_server import make_server as wsgiref_make_server
 from bunch import bunchify
 
 # Requests
-from requests import post as requests_post
+from requests import post as requests_post, Session as RequestsSession
 
 # YAML
 import yaml
@@ -189,6 +189,10 @@ class BaseConnectionContainer:
         self.logger = None # type: Logger
         self.parent_pid = getppid()
 
+        # A keep-alive HTTP session through which batches of messages are sent to our server
+        self.server_session = RequestsSession()
+        self.server_timeout = 60
+
         self.config_ipc = ConnectorConfigIPC()
 
         if self.options['zato_subprocess_mode']:
@@ -324,6 +328,31 @@ class BaseConnectionContainer:
         except Exception as e:
             self.logger.warning('Exception in BaseConnectionContainer._post: `%s`', e.args[0])
 
+# ################################################################################################################################
+
+    def _post_batch(self, msg_list):
+        """ Sends a list of messages to our server in one request, over a connection that is kept open between requests.
+        Returns True if the server confirmed that it received all of them.
+        """
+        self.logger.info('POST to `%s` (%s), len:`%s`', self.server_address, self.username, len(msg_list))
+
+        for msg in msg_list:
+            for k, v in msg.items():
+                if isinstance(v, bytes):
+                    msg[k] = v.decode('utf8')
+
+        try:
+            response = self.server_session.post(self.server_address, data=dumps({'msg_list': msg_list}),
+                auth=self.server_auth, timeout=self.server_timeout)
+        except Exception as e:
+            self.logger.warning('Exception in BaseConnectionContainer._post_batch: `%s`', e.args[0])
+            return False
+        else:
+            if not response.ok:
+                self.logger.warning('Batch not accepted by `%s`: `%s` `%s`', self.server_address, response.status_code,
+                    response.text)
+            return response.ok
+
 # ################################################################################################################################
 
     def on_mq_message_received(self, msg_ctx):
@@ -335,6 +364,17 @@ class BaseConnectionContainer:
             'data_format': msg_ctx.data_format,
         })
 
+# ################################################################################################################################
+
+    def on_mq_messages_received(self, msg_ctx_list):
+        return self._post_batch([{
+            'msg': msg_ctx.mq_msg.to_dict(),
+            'channel_id': msg_ctx.channel_id,
+            'queue_name': msg_ctx.queue_name,
+            'service_name': msg_ctx.service_name,
+            'data_format': msg_ctx.data_format,
+        } for msg_ctx in msg_ctx_list])
+
 # ################################################################################################################################
 
     def _create_definition(self, msg, needs_connect=True):
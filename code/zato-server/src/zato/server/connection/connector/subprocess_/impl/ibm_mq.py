@@ -28,7 +28,7 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 import logging
 from logging import DEBUG
 from http.client import BAD_REQUEST, FORBIDDEN, INTERNAL_SERVER_ERROR, NOT_ACCEPTABLE, OK, responses, SERVICE_UNAVAILABLE
-from time import sleep
+from time import monotonic, sleep
 from traceback import format_exc
 
 # Python 2/3 compatibility
@@ -43,6 +43,11 @@ from zato.server.connection.connector.subprocess_.base import BaseConnectionCont
 
 # ################################################################################################################################
 
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+
 logger_zato = logging.getLogger('zato')
 
 # ################################################################################################################################
@@ -69,6 +74,25 @@ _rc_reconnect_list = [_rc_conn_broken, _rc_q_mgr_quiescing, _rc_host_not_availab
 
 # ################################################################################################################################
 
+class ModuleCtx:
+
+    # How many messages at most are forwarded to the server in one batch
+    Default_Max_Batch_Size = 100
+
+    # How long, in seconds, to wait for more messages after the first one in a batch was received
+    Default_Max_Batch_Wait = 0.05
+
+    # How long, in milliseconds, to wait for the first message in a batch
+    Receive_Wait = 100
+
+    # Returned by connections that are being closed
+    Connection_Closing = 'zato.connection.closing'
+
+    # By default, messages are delivered again after each backout, without a limit
+    Default_Backout_Threshold = 0
+
+# ################################################################################################################################
+
 class _MessageCtx:
     __slots__ = ('mq_msg', 'channel_id', 'queue_name', 'service_name', 'data_format')
 
@@ -81,10 +105,134 @@ class _MessageCtx:
 
 # ################################################################################################################################
 
+class BatchForwarder:
+    """ Receives messages from a queue and forwards them in batches of up to max_batch_size messages, each batch
+    waiting for new messages no longer than max_batch_wait seconds after its first one was received. Messages are received
+    under syncpoint and they are committed only if the forward callback confirms that they were delivered,
+    otherwise they are backed out so that the queue manager delivers them again.
+
+    If backout_threshold and backout_queue_name are both given, messages that were already backed out
+    at least backout_threshold times are moved to the backout queue instead of being forwarded again.
+    """
+    def __init__(
+        self,
+        conn,           # type: WebSphereMQConnection
+        queue_name,     # type: bytes
+        forward,        # type: any_
+        max_batch_size, # type: int
+        max_batch_wait, # type: float
+        logger,         # type: logging.Logger
+        backout_threshold=ModuleCtx.Default_Backout_Threshold, # type: int
+        backout_queue_name=None, # type: bytes | None
+    ) -> 'None':
+        self.conn = conn
+        self.queue_name = queue_name
+        self.forward = forward
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.logger = logger
+        self.backout_threshold = backout_threshold if backout_queue_name else 0
+        self.backout_queue_name = backout_queue_name
+
+# ################################################################################################################################
+
+    def _receive(self, wait_interval:'int') -> 'any_':
+        return self.conn.receive(self.queue_name, wait_interval, ModuleCtx.Connection_Closing, syncpoint=True)
+
+# ################################################################################################################################
+
+    def receive_batch(self) -> 'anylist':
+        """ Returns the next batch of messages. Raises NoMessageAvailableException if there were none at all.
+        The last element of a batch may be ModuleCtx.Connection_Closing if the connection is being closed.
+        """
+        # Wait for the first message as long as it takes ..
+        msg = self._receive(ModuleCtx.Receive_Wait)
+        out = [msg]
+
+        if msg == ModuleCtx.Connection_Closing:
+            return out
+
+        # .. and for the rest of the batch, only as long as the batch can wait for.
+        deadline = monotonic() + self.max_batch_wait
+
+        while len(out) < self.max_batch_size:
+
+            wait_interval = int((deadline - monotonic()) * 1000)
+            if wait_interval <= 0:
+                break
+
+            try:
+                msg = self._receive(wait_interval)
+            except NoMessageAvailableException:
+                break
+            else:
+                out.append(msg)
+                if msg == ModuleCtx.Connection_Closing:
+                    break
+
+        return out
+
+# ################################################################################################################################
+
+    def _is_over_backout_threshold(self, msg:'any_') -> 'bool':
+        return self.backout_threshold > 0 and int(getattr(msg, 'JMSXDeliveryCount', 0) or 0) >= self.backout_threshold
+
+# ################################################################################################################################
+
+    def forward_batch(self, msg_list:'anylist') -> 'bool':
+        """ Forwards messages and commits or backs them out, depending on whether they were delivered.
+        Messages over the backout threshold are moved to the backout queue in the same unit of work.
+        """
+        to_forward = []
+
+        try:
+            for msg in msg_list:
+                if self._is_over_backout_threshold(msg):
+                    self.logger.warning('Moving message from queue `%s` to backout queue `%s` after %s backout(s)',
+                        self.queue_name, self.backout_queue_name, msg.JMSXDeliveryCount)
+                    self.conn.send(msg, self.backout_queue_name, syncpoint=True)
+                else:
+                    to_forward.append(msg)
+
+            is_ok = self.forward(to_forward) if to_forward else True
+
+        except Exception:
+            self.logger.warning('Could not forward messages %s', format_exc())
+            is_ok = False
+
+        if is_ok:
+            self.conn.commit()
+        else:
+            self.logger.warning('Backing out %s message(s) from queue `%s`', len(msg_list), self.queue_name)
+            self.conn.backout()
+
+        return is_ok
+
+# ################################################################################################################################
+
+    def run_once(self) -> 'any_':
+        """ Receives and forwards a single batch. Returns True or False, depending on whether the batch was delivered,
+        or ModuleCtx.Connection_Closing if the connection is being closed.
+        """
+        msg_list = self.receive_batch()
+        is_closing = msg_list[-1] == ModuleCtx.Connection_Closing
+
+        if is_closing:
+            msg_list.pop()
+
+        is_ok = self.forward_batch(msg_list) if msg_list else True
+
+        return ModuleCtx.Connection_Closing if is_closing else is_ok
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 class IBMMQChannel:
     """ A process to listen for messages from IBM MQ queue managers.
     """
-    def __init__(self, conn, is_active, channel_id, queue_name, service_name, data_format, on_message_callback, logger):
+    def __init__(self, conn, is_active, channel_id, queue_name, service_name, data_format, on_message_callback, logger,
+        max_batch_size=ModuleCtx.Default_Max_Batch_Size, max_batch_wait=ModuleCtx.Default_Max_Batch_Wait,
+        backout_threshold=ModuleCtx.Default_Backout_Threshold, backout_queue_name=None):
         self.conn = conn
         self.is_active = is_active
         self.id = channel_id
@@ -95,6 +243,10 @@ class IBMMQChannel:
         self.keep_running = True if is_active else False
         self.logger = logger
         self.has_debug = self.logger.isEnabledFor(DEBUG)
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.backout_threshold = backout_threshold
+        self.backout_queue_name = backout_queue_name
 
         # PyMQI is an optional dependency so let's import it here rather than on module level
         import pymqi
@@ -107,40 +259,64 @@ class IBMMQChannel:
 
 # ################################################################################################################################
 
-    def start(self, sleep_on_error=3, _connection_closing='zato.connection.closing'):
+    def _forward(self, msg_list):
+        """ Forwards received messages to the server, returning True if it confirmed their delivery.
+        """
+        if self.has_debug:
+            self.logger.debug('Messages received `%s`', len(msg_list))
+
+        return self.on_message_callback([
+            _MessageCtx(msg, self.id, self.queue_name, self.service_name, self.data_format) for msg in msg_list])
+
+# ################################################################################################################################
+
+    def start(self, sleep_on_error=3):
         """ Runs a background queue listener in its own  thread.
         """
-        def _invoke_callback(msg_ctx):
+        def _impl():
+
+            # Messages are committed only after the server confirms their delivery, which is why each channel needs
+            # a connection of its own - otherwise, it would commit or back out messages of other channels too.
+            receive_conn = self.conn.copy()
+            forwarder = BatchForwarder(receive_conn, self.queue_name, self._forward, self.max_batch_size, self.max_batch_wait,
+                self.logger, self.backout_threshold, self.backout_queue_name)
+
             try:
-                self.on_message_callback(msg_ctx)
-            except Exception:
-                self.logger.warning('Could not invoke message callback %s', format_exc())
+                _receive_loop(self.conn, receive_conn, forwarder)
+            finally:
+                receive_conn.close()
 
-        def _impl():
+        def _receive_loop(parent_conn, conn, forwarder):
             while self.keep_running:
+
+                # The connection that ours was copied from may have been closed, e.g. because its definition was deleted
+                if parent_conn._disconnecting:
+                    self.logger.info('Parent connection closed, closing channel for queue `%s` (%s)',
+                        self.queue_name, conn.get_connection_info())
+                    self.keep_running = False
+                    return
+
                 try:
-                    msg = self.conn.receive(self.queue_name, 100)
-                    if self.has_debug:
-                        self.logger.debug('Message received `%s`' % str(msg).decode('utf-8'))
+                    result = forwarder.run_once()
 
-                    if msg == _connection_closing:
+                    if result == ModuleCtx.Connection_Closing:
                         self.logger.info('Received request to quit, closing channel for queue `%s` (%s)',
-                            self.queue_name, self.conn.get_connection_info())
+                            self.queue_name, conn.get_connection_info())
                         self.keep_running = False
                         return
 
-                    if msg:
-                        start_new_thread(_invoke_callback, (
-                            _MessageCtx(msg, self.id, self.queue_name, self.service_name, self.data_format),))
+                    # The server did not confirm the delivery so we give it some time before the messages are received again
+                    if not result:
+                        sleep(sleep_on_error)
 
                 except NoMessageAvailableException:
                     if self.has_debug:
                         self.logger.debug('Consumer for queue `%s` did not receive a message. `%s`' % (
-                            self.queue_name, self._get_destination_info(self.queue_name)))
+                            self.queue_name, self._get_destination_info()))
 
                 except self.pymqi.MQMIError as e:
                     if e.reason == self.pymqi.CMQC.MQRC_UNKNOWN_OBJECT_NAME:
-                        self.logger.warning('No such queue `%s` found for %s', self.queue_name, self.conn.get_connection_info())
+                        self.logger.warning('No such queue `%s` found for %s', self.queue_name, conn.get_connection_info())
                     else:
                         self.logger.warning('%s in run, reason_code:`%s`, comp_code:`%s`' % (
                             e.__class__.__name__, e.reason, e.comp))
@@ -153,15 +329,15 @@ class IBMMQChannel:
                 except WebSphereMQException as e:
 
                     sleep(sleep_on_error)
-                    conn_info = self.conn.get_connection_info()
+                    conn_info = conn.get_connection_info()
 
                     # Try to reconnect if the reason code points to one that is of a transient nature
                     while self.keep_running and e.completion_code == _cc_failed and e.reason_code in _rc_reconnect_list:
                         try:
                             self.logger.warning('Reconnecting channel `%s` due to MQRC `%s` and MQCC `%s`',
                                 conn_info, e.reason_code, e.completion_code)
-                            self.conn.reconnect()
-                            self.conn.ping()
+                            conn.reconnect()
+                            conn.ping()
                             break
                         except WebSphereMQException as exc:
                             e = exc
@@ -221,17 +397,6 @@ class IBMMQConnectionContainer(BaseConnectionContainer):
     def get_prereqs_not_ready_message(self):
         return 'PyMQI library could not be imported. Is PyMQI installed? Is ibm_mq set to True in server.conf?'
 
-# ################################################################################################################################
-
-    def on_mq_message_received(self, msg_ctx):
-        return self._post({
-            'msg': msg_ctx.mq_msg.to_dict(),
-            'channel_id': msg_ctx.channel_id,
-            'queue_name': msg_ctx.queue_name,
-            'service_name': msg_ctx.service_name,
-            'data_format': msg_ctx.data_format,
-        })
-
 # ################################################################################################################################
 
     def _on_DEFINITION_WMQ_CREATE(self, msg):
@@ -295,6 +460,8 @@ class IBMMQConnectionContainer(BaseConnectionContainer):
             channel.queue_name = msg.queue.encode('utf8')
             channel.service_name = msg.service_name
             channel.data_format = msg.data_format
+            channel.backout_threshold = int(msg.get('backout_threshold') or ModuleCtx.Default_Backout_Threshold)
+            channel.backout_queue_name = self._get_backout_queue_name(msg)
             channel.keep_running = True if msg.is_active else False
             channel.start()
 
@@ -386,11 +553,21 @@ class IBMMQConnectionContainer(BaseConnectionContainer):
             except Exception:
                 return self._on_send_exception()
 
+# ################################################################################################################################
+
+    def _get_backout_queue_name(self, msg):
+        backout_queue = msg.get('backout_queue')
+        return backout_queue.encode('utf8') if backout_queue else None
+
 # ################################################################################################################################
 
     def _create_channel_impl(self, conn, msg):
         return IBMMQChannel(conn, msg.is_active, msg.id, msg.queue.encode('utf8'), msg.service_name, msg.data_format,
-            self.on_mq_message_received, self.logger)
+            self.on_mq_messages_received, self.logger,
+            int(msg.get('max_batch_size') or ModuleCtx.Default_Max_Batch_Size),
+            float(msg.get('max_batch_wait') or ModuleCtx.Default_Max_Batch_Wait),
+            int(msg.get('backout_threshold') or ModuleCtx.Default_Backout_Threshold),
+            self._get_backout_queue_name(msg))
 
 # ################################################################################################################################
 
@@ -9,8 +9,10 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
+import os
 from datetime import datetime
-from tempfile import NamedTemporaryFile
+from shutil import rmtree
+from tempfile import mkdtemp
 from traceback import format_exc
 
 # Bunch
@@ -53,7 +55,9 @@ log_level_map = {
 # ################################################################################################################################
 
 class SFTPConnection:
-    """ Wraps access to SFTP commands via command line.
+    """ Wraps access to SFTP commands via command line. Unless should_reuse_session is False, all the sftp processes
+    started by a connection are multiplexed over a single, long-running SSH session established by the first of them,
+    which means that only that one goes through a full SSH handshake and authentication.
     """
     command_no = 0
 
@@ -98,6 +102,19 @@ class SFTPConnection:
         # SFTP expects kilobits instead of megabytes
         self.bandwidth_limit = int(float(self.config.bandwidth_limit) * mb_to_kbit) # type: int
 
+        # Whether to keep a long-running SSH session that all the commands will be executed through
+        should_reuse_session = self.config.get('should_reuse_session')
+        self.should_reuse_session = True if should_reuse_session is None else should_reuse_session # type: bool
+
+        # For how long an idle session is kept open
+        self.control_persist = self.config.get('control_persist') or SFTP.DEFAULT.CONTROL_PERSIST # type: int
+
+        # Used to close the session
+        self.ssh_command = self.config.get('ssh_command') or SFTP.DEFAULT.COMMAND_SSH # type: str
+
+        # A directory with the socket that the session can be accessed through
+        self.control_dir = self.get_control_dir() # type: str
+
         # Added for API completeness
         self.is_connected = True
         self.password = 'dummy-password'
@@ -105,6 +122,36 @@ class SFTPConnection:
         # Create the reusable command object
         self.command = self.get_command()
 
+# ################################################################################################################################
+
+    def get_control_dir(self):
+        """ Returns a new directory for the socket of the connection's SSH session or an empty string
+        if the session should not be reused.
+        """
+        if self.should_reuse_session and self.host:
+            return mkdtemp(prefix='zato-sftp-')
+        else:
+            return ''
+
+# ################################################################################################################################
+
+    def get_control_path(self):
+        """ Returns a path to the socket of the connection's SSH session. OpenSSH will expand %C to a hash of the local host name,
+        remote host, port and user name so the path will stay short enough for a Unix socket.
+        """
+        return os.path.join(self.control_dir, '%C')
+
+# ################################################################################################################################
+
+    def get_destination(self):
+        """ Returns the remote end to connect to. Both username and host are optional.
+        """
+        if self.host:
+            if self.username:
+                return '{}@{}'.format(self.username, self.host)
+            else:
+                return self.host
+
 # ################################################################################################################################
 
     def get_command(self):
@@ -156,6 +203,17 @@ class SFTPConnection:
             args.append('-F')
             args.append(self.ssh_config_file)
 
+        # Reusing a session is optional
+        if self.control_dir:
+            args.append('-o')
+            args.append('ControlMaster=auto')
+
+            args.append('-o')
+            args.append('ControlPath={}'.format(self.get_control_path()))
+
+            args.append('-o')
+            args.append('ControlPersist={}'.format(self.control_persist))
+
         # Base command to build additional arguments into
         command = Command(self.sftp_command)
         command = command.bake(*args)
@@ -172,53 +230,41 @@ class SFTPConnection:
 
         self.logger.info('Executing cid:`%s` (%s; %s; %s), data:`%s`', cid, self.id, self.name, self.command_no, data)
 
-        # Additional command arguments
-        args = []
+        # Additional command arguments, starting with the batch of commands that SFTP will read from its stdin
+        args = ['-b', '-']
 
-        with NamedTemporaryFile(mode='w+', suffix='-zato-sftp.txt') as f:
-
-            # Write command to the temporary file
-            f.write(data)
-            f.flush()
-
-            # Append the file names to the list of arguments SFTP receives
-            args.append('-b')
-            args.append(f.name)
-
-            # Logging is always available but may map to an empty string
-            log_level_mapped = log_level_map[log_level]
-            if log_level_mapped:
-                args.append(log_level_mapped)
-
-            # Both username and host are optional but if they are provided, they must be the last arguments in the command
-            if self.host:
-                if self.username:
-                    args.append('{}@{}'.format(self.username, self.host))
-                else:
-                    args.append(self.host)
-
-            out = SFTPOutput(cid, self.command_no)
-            result = None
-
-            try:
-                # Finally, execute all the commands
-                result = self.command(*args)
-
-            except Exception:
-                out.is_ok = False
-                out.details = format_exc()
-                if result:
-                    out.command = result.cmd
-                    out.stdout = result.stdout
-                    out.stderr = result.stderr
-            else:
-                out.is_ok = True
+        # Logging is always available but may map to an empty string
+        log_level_mapped = log_level_map[log_level]
+        if log_level_mapped:
+            args.append(log_level_mapped)
+
+        # Both username and host are optional but if they are provided, they must be the last arguments in the command
+        destination = self.get_destination()
+        if destination:
+            args.append(destination)
+
+        out = SFTPOutput(cid, self.command_no)
+        result = None
+
+        try:
+            # Finally, execute all the commands
+            result = self.command(*args, _in=data)
+
+        except Exception:
+            out.is_ok = False
+            out.details = format_exc()
+            if result:
                 out.command = result.cmd
                 out.stdout = result.stdout
                 out.stderr = result.stderr
-            finally:
-                self.encode_out(out)
-                return out
+        else:
+            out.is_ok = True
+            out.command = result.cmd
+            out.stdout = result.stdout
+            out.stderr = result.stderr
+        finally:
+            self.encode_out(out)
+            return out
 
 # ################################################################################################################################
 
@@ -240,8 +286,14 @@ class SFTPConnection:
 # ################################################################################################################################
 
     def connect(self):
-        # We do not maintain long-running connections but we may still want to ping the remote end
-        # to make sure we are actually able to connect to it.
+
+        # We may have been closed previously, in which case we need a new session
+        if not self.control_dir:
+            self.control_dir = self.get_control_dir()
+            self.command = self.get_command()
+
+        # Pinging the remote end confirms that we are actually able to connect to it
+        # and, if sessions are reused, it establishes the session that further commands will use.
         out = self.ping()
         self.logger.info('SFTP ping; name:`%s`, command:`%s`, stdout:`%s`, stderr:`%s`',
             self.name, out.command, out.stdout, out.stderr)
@@ -249,8 +301,36 @@ class SFTPConnection:
 # ################################################################################################################################
 
     def close(self):
-        # Added for API completeness
-        pass
+
+        # There is nothing to close if sessions are not reused
+        if not self.control_dir:
+            return
+
+        # sh
+        from sh import Command
+
+        args = ['-o', 'ControlPath={}'.format(self.get_control_path()), '-O', 'exit']
+
+        # The same port and configuration that the session was established with are needed to find its socket
+        if self.port:
+            args.append('-p')
+            args.append(self.port)
+
+        if self.ssh_config_file:
+            args.append('-F')
+            args.append(self.ssh_config_file)
+
+        args.append(self.get_destination())
+
+        try:
+            # This will fail if the session was never established or if it already timed out, which is fine
+            _ = Command(self.ssh_command)(*args, _ok_code=[0, 255])
+        except Exception:
+            self.logger.info('Could not close SFTP session `%s`, e:`%s`', self.name, format_exc())
+        finally:
+            rmtree(self.control_dir, ignore_errors=True)
+            self.control_dir = ''
+            self.command = self.get_command()
 
 # ################################################################################################################################
 
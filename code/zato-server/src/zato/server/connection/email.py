@@ -7,13 +7,22 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
+import re
 from base64 import b64decode
 from contextlib import contextmanager
 from io import BytesIO
 from logging import getLogger, INFO
 from mimetypes import guess_type as guess_mime_type
+from select import select
+from smtplib import SMTPDataError, SMTPRecipientsRefused, SMTPSenderRefused, SMTPServerDisconnected
+from time import monotonic
 from traceback import format_exc
 
+# gevent
+from gevent import sleep
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Pool
+
 # imbox
 from zato.common.ext.imbox import Imbox as _Imbox
 from zato.common.ext.imbox.imap import ImapTransport as _ImapTransport
@@ -54,16 +63,77 @@ _modes = {
     EMAIL.SMTP.MODE.STARTTLS: 'TLS'
 }
 
+# A server may reject an individual message without closing the session
+_SMTPMessageRejected = (SMTPDataError, SMTPRecipientsRefused, SMTPSenderRefused)
+
+_fetch_query = '(UID RFC822.SIZE BODY.PEEK[])'
+_fetch_headers_query = '(UID RFC822.SIZE BODY.PEEK[HEADER])'
+
+_uid_regex = re.compile(br'UID (\d+)')
+_size_regex = re.compile(br'RFC822.SIZE (\d+)')
+_idle_change_regex = re.compile(br' (EXISTS|EXPUNGE|FETCH)')
+
+# ################################################################################################################################
+
+def _no_pending():
+    return 0
+
+def _idle_readline(sock, until=None):
+    """ Reads a line during IDLE, or returns None if there is none until a given time. The socket is read directly
+    rather than through imaplib's buffered file so that waiting for it to be readable is reliable and so that
+    the session can be used as usual afterwards.
+    """
+    line = b''
+
+    while not line.endswith(b'\n'):
+
+        # Data that was already decrypted by an SSL socket does not make it readable again
+        if not getattr(sock, 'pending', _no_pending)():
+            remaining = None if until is None else max(until - monotonic(), 0)
+            readable, _, _ = select([sock], [], [], remaining)
+            if not readable:
+                return None
+
+        data = sock.recv(1)
+        if not data:
+            raise Exception('IMAP connection closed during IDLE')
+
+        line += data
+
+    return line
+
+# ################################################################################################################################
+
+def _uid_str(uid):
+    return uid.decode('utf8') if isinstance(uid, bytes) else str(uid)
+
+def _uid_set(uids):
+    return ','.join(_uid_str(uid) for uid in uids)
+
 # ################################################################################################################################
 # ################################################################################################################################
 
 class GenericIMAPMessage(IMAPMessage):
+    conn: 'GenericIMAPConnection'
+
+    def __init__(self, uid, conn, data, folder='INBOX', is_body_loaded=True):
+        super().__init__(uid, conn, data)
+        self.folder = folder
+        self.is_body_loaded = is_body_loaded
 
     def delete(self):
-        self.conn.delete(self.uid)
+        self.conn.delete(self.uid, folder=self.folder)
 
     def mark_seen(self):
-        self.conn.mark_seen(self.uid)
+        self.conn.mark_seen(self.uid, folder=self.folder)
+
+    def load_body(self):
+        """ Downloads the whole of a message that was fetched with its headers only.
+        """
+        if not self.is_body_loaded:
+            self.data = self.conn.fetch_body(self.uid, self.folder)
+            self.is_body_loaded = True
+        return self.data
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -88,6 +158,10 @@ class Imbox(_Imbox):
         self.server = ImapTransport(self.config.host, self.config.port, self.config.mode==EMAIL.IMAP.MODE.SSL)
         self.connection = self.server.connect(self.config.username, self.config.password or '', self.config.debug_level)
 
+        # Connecting selects INBOX
+        self.selected_folder = 'INBOX'
+        self.last_used = monotonic()
+
     def __repr__(self):
         return '<{} at {}, config:`{}`>'.format(self.__class__.__name__, hex(id(self)), self.config_no_sensitive)
 
@@ -112,9 +186,215 @@ class Imbox(_Imbox):
         for uid in uid_list:
             yield (uid, self.fetch_by_uid(uid))
 
+    def select_folder(self, folder):
+        """ Selects a folder and returns its UIDVALIDITY. If it is different than previously,
+        UIDs that were returned from the folder before cannot be used anymore.
+        """
+        status, data = self.connection.select(folder)
+        if status != 'OK':
+            raise Exception('Could not select folder `{}` -> `{}`'.format(folder, data))
+
+        self.selected_folder = folder
+
+        _, data = self.connection.response('UIDVALIDITY')
+        return int(data[-1]) if data and data[-1] else None
+
+    def ensure_folder(self, folder):
+        """ Selects a folder unless it is already selected.
+        """
+        if self.selected_folder != folder:
+            _ = self.select_folder(folder)
+
+    def search_after(self, last_uid, criteria):
+        """ Returns UIDs of messages matching the criteria that were added to the selected folder after the last UID seen.
+        """
+        _, data = self.connection.uid('search', None, 'UID {}:*'.format(last_uid + 1), criteria)
+
+        # A range of n:* always includes the folder's latest message, even if its UID is lower than n
+        uid_list = (int(elem) for elem in data[0].split())
+        return sorted(uid for uid in uid_list if uid > last_uid)
+
+    def fetch_batch(self, uid_list, headers_only=False):
+        """ Fetches all the messages from the list with a single command, optionally without their bodies.
+        Returns a list of UIDs and parsed messages, each of them having its size on the server, in bytes, too.
+        """
+        query = _fetch_headers_query if headers_only else _fetch_query
+        _, data = self.connection.uid('fetch', ','.join(_uid_str(uid) for uid in uid_list), query)
+
+        out = []
+
+        for item in data:
+
+            # Each message is a tuple of its metadata and contents, with closing parentheses returned between them
+            if not isinstance(item, tuple):
+                continue
+
+            meta, raw_email = item
+            uid = _uid_regex.search(meta).group(1).decode('utf8')
+            size = _size_regex.search(meta)
+
+            if not isinstance(raw_email, unicode):
+                raw_email = raw_email.decode('utf8')
+
+            email_object = parse_email(raw_email)
+            email_object.size = int(size.group(1)) if size else None
+
+            out.append((uid, email_object))
+
+        return out
+
+    def has_idle(self):
+        return 'IDLE' in self.connection.capabilities
+
+    def idle(self, timeout):
+        """ Waits until the server reports changes to the selected folder or until the timeout is reached.
+        Returns True if there were any changes.
+        """
+        conn = self.connection
+        sock = conn.sock
+
+        tag = conn._new_tag()
+        conn.send(tag + b' IDLE\r\n')
+
+        response = _idle_readline(sock)
+        if not response.startswith(b'+'):
+            raise Exception('Could not start IDLE -> `{!r}`'.format(response))
+
+        has_changes = False
+        until = monotonic() + timeout
+
+        try:
+            while True:
+
+                # Nothing was received within the timeout ..
+                response = _idle_readline(sock, until)
+                if response is None:
+                    break
+
+                # .. any of these responses means that the folder changed.
+                if response.startswith(b'*') and _idle_change_regex.search(response):
+                    has_changes = True
+                    break
+
+        finally:
+
+            # IDLE ends with a tagged response, possibly preceded by untagged ones that we can ignore
+            conn.send(b'DONE\r\n')
+            while not _idle_readline(sock).startswith(tag + b' '):
+                pass
+
+        self.last_used = monotonic()
+        return has_changes
+
     def close(self):
         self.connection.close()
 
+    def logout(self):
+        self.connection.logout()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _SessionPool:
+    """ Keeps sessions logged in between calls, creating them as they are needed, up to pool_size at a time.
+    """
+    protocol = '<default>'
+
+    def __init__(self, name, new_session, pool_size, keepalive):
+        self.name = name
+        self.new_session = new_session
+        self.keepalive = keepalive
+        self.idle = []
+        self.semaphore = BoundedSemaphore(pool_size)
+        self.is_closed = False
+
+        # Counters
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+
+    def ping(self, conn):
+        raise NotImplementedError('Must be implemented by subclasses')
+
+    def logout(self, conn):
+        raise NotImplementedError('Must be implemented by subclasses')
+
+    def _get(self):
+
+        while self.idle:
+            conn = self.idle.pop()
+
+            # Sessions not used for a while may have been logged out by the server
+            if monotonic() - conn.last_used > self.keepalive:
+                try:
+                    self.ping(conn)
+                except Exception:
+                    logger.info('%s session to `%s` not available, e:`%s`', self.protocol, self.name, format_exc())
+                    self._close(conn)
+                    continue
+
+            self.reused += 1
+            return conn
+
+        conn = self.new_session()
+        self.created += 1
+
+        return conn
+
+    def _close(self, conn):
+        self.closed += 1
+        try:
+            self.logout(conn)
+        except Exception:
+            logger.info('Exception while closing %s session to `%s`, e:`%s`', self.protocol, self.name, format_exc())
+
+    @contextmanager
+    def session(self):
+        with self.semaphore:
+            conn = self._get()
+            is_ok = False
+
+            try:
+                yield conn
+                is_ok = True
+            finally:
+
+                # A session that was in use when an exception was raised may be in an unknown state so it is not reused
+                if is_ok and not self.is_closed:
+                    conn.last_used = monotonic()
+                    self.idle.append(conn)
+                else:
+                    self._close(conn)
+
+    def close(self):
+        self.is_closed = True
+        while self.idle:
+            self._close(self.idle.pop())
+
+# ################################################################################################################################
+
+class _IMAPSessionPool(_SessionPool):
+    protocol = 'IMAP'
+
+    def ping(self, conn):
+        _ = conn.connection.noop()
+
+    def logout(self, conn):
+        conn.logout()
+
+# ################################################################################################################################
+
+class _SMTPSessionPool(_SessionPool):
+    protocol = 'SMTP'
+
+    def ping(self, conn):
+        code, response = conn._conn.noop()
+        if code != 250:
+            raise Exception('Unexpected NOOP response `{}` `{!r}`'.format(code, response))
+
+    def logout(self, conn):
+        conn.disconnect()
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -171,9 +451,24 @@ class SMTPConnection(_Connection):
         else:
             self.conn_class = AnonymousOutbox
 
+        self.pool_size = int(config.get('pool_size') or EMAIL.DEFAULT.SMTP_POOL_SIZE)
+        keepalive = int(config.get('keepalive') or EMAIL.DEFAULT.SMTP_KEEPALIVE)
+        self.pool = _SMTPSessionPool(config.name, self.new_session, self.pool_size, keepalive)
+
+        # Counters
+        self.sent = 0
+        self.failed = 0
+
 # ################################################################################################################################
 
-    def send(self, msg, from_=None) -> 'bool':
+    def new_session(self):
+        conn = self.conn_class(*self.conn_args)
+        conn.connect()
+        return conn
+
+# ################################################################################################################################
+
+    def _get_email(self, msg):
 
         headers = msg.headers or {}
         atts = []
@@ -196,11 +491,47 @@ class SMTPConnection(_Connection):
         body, html_body = (None, msg.body) if msg.is_html else (msg.body, None)
         email = Email(msg.to, msg.subject, body, html_body, msg.charset, headers, msg.is_rfc2231)
 
+        return email, atts
+
+# ################################################################################################################################
+
+    def _send(self, msg, from_):
+        """ Sends a message through one of the pooled sessions, returning the names of its attachments.
+        """
+        # A session from the pool may have been closed by the server in the meantime,
+        # in which case we try again once, this time with a new session.
+        for attempt in range(2):
+
+            email, atts = self._get_email(msg)
+            error = None
+
+            try:
+                with self.pool.session() as conn:
+
+                    # The server rejected this message but the session can still be used for other ones
+                    try:
+                        conn.send(email, atts, from_ or msg.from_)
+                    except _SMTPMessageRejected as e:
+                        error = e
+
+            except SMTPServerDisconnected:
+                if attempt:
+                    raise
+            else:
+                if error:
+                    raise error
+                return atts
+
+# ################################################################################################################################
+
+    def send(self, msg, from_=None) -> 'bool':
+
         try:
-            with self.conn_class(*self.conn_args) as conn:
-                conn.send(email, atts, from_ or msg.from_)
+            atts = self._send(msg, from_)
         except Exception:
 
+            self.failed += 1
+
             # Log what happened ..
             logger.warning('Could not send an SMTP message to `%s`, e:`%s`', self.config_no_sensitive, format_exc())
 
@@ -208,6 +539,8 @@ class SMTPConnection(_Connection):
             return False
         else:
 
+            self.sent += 1
+
             # Optionally, log what happened ..
             if logger.isEnabledFor(INFO):
                 atts_info = ', '.join(att.name for att in atts) if atts else None
@@ -217,6 +550,31 @@ class SMTPConnection(_Connection):
             # .. and tell the caller that the message was sent successfully.
             return True
 
+# ################################################################################################################################
+
+    def send_many(self, msg_list, from_=None) -> 'list[bool]':
+        """ Sends all the messages from the list, each through one of the pooled sessions, with all of the sessions
+        used at the same time. Returns a list of booleans, each saying whether a corresponding message was sent.
+        """
+        pool = Pool(self.pool_size)
+        return pool.map(lambda msg: self.send(msg, from_), msg_list)
+
+# ################################################################################################################################
+
+    def get_counters(self) -> 'dict[str, int]':
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'sessions_created': self.pool.created,
+            'sessions_reused': self.pool.reused,
+            'sessions_closed': self.pool.closed,
+        }
+
+# ################################################################################################################################
+
+    def close(self):
+        self.pool.close()
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -227,7 +585,24 @@ class SMTPAPI(BaseAPI):
 # ################################################################################################################################
 # ################################################################################################################################
 
-class SMTPConnStore(BaseStore):
+class _EMailConnStore(BaseStore):
+
+    def _delete(self, name):
+
+        # Log out of any sessions that the connection keeps open
+        item = self.items.get(name)
+        if item and item.impl:
+            try:
+                item.impl.close()
+            except Exception:
+                logger.warning('Could not close e-mail connection `%s`, e:`%s`', name, format_exc())
+
+        super()._delete(name)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SMTPConnStore(_EMailConnStore):
     """ Stores connections to SMTP.
     """
     def create_impl(self, config, config_no_sensitive):
@@ -255,39 +630,137 @@ class _IMAPConnection(_Connection):
     def mark_seen(self, *args, **kwargs):
         raise NotImplementedError('Must be implemented by subclasses')
 
+    def close(self):
+        pass # Not all connections keep anything open
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _FolderState:
+    """ What was already returned from a folder by GenericIMAPConnection.get_new.
+    """
+    __slots__ = 'uid_validity', 'last_uid'
+
+    def __init__(self, uid_validity, last_uid):
+        self.uid_validity = uid_validity
+        self.last_uid = last_uid
+
 # ################################################################################################################################
 # ################################################################################################################################
 
 class GenericIMAPConnection(_IMAPConnection):
 
+    def __init__(self, config, config_no_sensitive):
+        super().__init__(config, config_no_sensitive)
+
+        self.batch_size = int(config.get('fetch_batch_size') or EMAIL.DEFAULT.IMAP_FETCH_BATCH_SIZE)
+        self.idle_timeout = int(config.get('idle_timeout') or EMAIL.DEFAULT.IMAP_IDLE_TIMEOUT)
+
+        pool_size = int(config.get('pool_size') or EMAIL.DEFAULT.IMAP_POOL_SIZE)
+        keepalive = int(config.get('keepalive') or EMAIL.DEFAULT.IMAP_KEEPALIVE)
+        self.pool = _IMAPSessionPool(config.name, self.new_session, pool_size, keepalive)
+
+        # Folder name -> _FolderState
+        self.folder_state = {} # type: dict[str, _FolderState]
+
+    def new_session(self):
+        return Imbox(self.config, self.config_no_sensitive)
+
     @contextmanager
     def get_connection(self):
-        conn = Imbox(self.config, self.config_no_sensitive)
-        yield conn
-        conn.close()
-        conn.server.server.sock.close()
+        with self.pool.session() as conn:
+            yield conn
+
+    def _get_criteria(self):
+        return ' '.join(self.config.get_criteria.splitlines())
+
+    def _get_messages(self, folder, uid_list, headers_only=False):
+        """ Yields messages from the folder in batches, each fetched with a single command. The session is not kept
+        while the caller processes the messages so that it can be used by others in the meantime.
+        """
+        for idx in range(0, len(uid_list), self.batch_size):
+
+            with self.get_connection() as conn: # type: Imbox
+                conn.ensure_folder(folder)
+                batch = conn.fetch_batch(uid_list[idx:idx+self.batch_size], headers_only)
+
+            for uid, msg in batch:
+                yield (uid, GenericIMAPMessage(uid, self, msg, folder, not headers_only))
+
+    def get(self, folder='INBOX', headers_only=False):
+        """ Yields all the messages matching the connection's criteria.
+        """
+        with self.get_connection() as conn: # type: Imbox
+            conn.ensure_folder(folder)
+            uid_list = conn.search(self._get_criteria())
+
+        return self._get_messages(folder, uid_list, headers_only)
+
+    def get_new(self, folder='INBOX', headers_only=False):
+        """ Yields messages matching the connection's criteria that were added to the folder since the previous call,
+        based on their UIDs. A message counts as returned once the caller asks for the next one.
+        """
+        with self.get_connection() as conn: # type: Imbox
+
+            # Always select the folder to learn about new messages and about UIDVALIDITY ..
+            uid_validity = conn.select_folder(folder)
+
+            # .. if it is not what it was previously, UIDs were reassigned and we need to start over.
+            state = self.folder_state.get(folder)
+            if state and state.uid_validity == uid_validity:
+                last_uid = state.last_uid
+            else:
+                last_uid = 0
+
+            uid_list = conn.search_after(last_uid, self._get_criteria())
+
+        for uid, msg in self._get_messages(folder, uid_list, headers_only):
+            yield (uid, msg)
+            self.folder_state[folder] = _FolderState(uid_validity, int(uid))
+
+    def fetch_body(self, uid, folder='INBOX'):
+        with self.get_connection() as conn: # type: Imbox
+            conn.ensure_folder(folder)
+            _, msg = conn.fetch_batch([uid])[0]
+            return msg
+
+    def wait_for_changes(self, folder='INBOX', timeout=None):
+        """ Blocks until the server reports that messages in a folder changed, which returns True, or until timeout
+        seconds elapse, which returns False. Servers without IDLE are not asked - we sleep for the timeout and return True.
+        """
+        timeout = timeout or self.idle_timeout
 
-    def get(self, folder='INBOX'):
         with self.get_connection() as conn: # type: Imbox
-            conn.connection.select(folder)
+            if conn.has_idle():
+                conn.ensure_folder(folder)
+                return conn.idle(timeout)
 
-            for uid, msg in conn.fetch_list(' '.join(self.config.get_criteria.splitlines())):
-                yield (uid, GenericIMAPMessage(uid, conn, msg))
+        sleep(timeout)
+        return True
 
     def ping(self):
         with self.get_connection() as conn: # type: Imbox
             conn.connection.noop()
 
-    def delete(self, *uids):
+    def delete(self, *uids, folder='INBOX'):
+        if not uids:
+            return
+
         with self.get_connection() as conn: # type: Imbox
-            for uid in uids:
-                mov, data = self.connection.uid('STORE', uid, '+FLAGS', '(\\Deleted)')
+            conn.ensure_folder(folder)
+            conn.connection.uid('STORE', _uid_set(uids), '+FLAGS', '(\\Deleted)')
             conn.connection.expunge()
 
-    def mark_seen(self, *uids):
+    def mark_seen(self, *uids, folder='INBOX'):
+        if not uids:
+            return
+
         with self.get_connection() as conn: # type: Imbox
-            for uid in uids:
-                conn.connection.uid('STORE', uid, '+FLAGS', '\\Seen')
+            conn.ensure_folder(folder)
+            conn.connection.uid('STORE', _uid_set(uids), '+FLAGS', '(\\Seen)')
+
+    def close(self):
+        self.pool.close()
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -437,7 +910,7 @@ class Microsoft365IMAPConnection(_IMAPConnection):
 # ################################################################################################################################
 # ################################################################################################################################
 
-class IMAPConnStore(BaseStore):
+class IMAPConnStore(_EMailConnStore):
     """ Stores connections to IMAP.
     """
 
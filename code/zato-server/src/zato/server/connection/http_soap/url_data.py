@@ -15,7 +15,7 @@ from traceback import format_exc
 from uuid import uuid4
 
 # Python 2/3 compatibility
-from zato.common.ext.future.utils import iteritems, iterkeys
+from zato.common.ext.future.utils import iteritems
 from zato.common.py23_.past.builtins import unicode
 from six import PY2
 
@@ -292,7 +292,7 @@ class URLData(CyURLData, OAuthDataStore):
                 return False
 
         token = authorization.split('Bearer ', 1)[1]
-        result = JWT(self.odb, self.worker.server.decrypt, self.jwt_secret).validate(
+        result = JWT.from_server(self.worker.server).validate(
             sec_def.username, token.encode('utf8'))
 
         if not result.valid:
@@ -377,7 +377,7 @@ class URLData(CyURLData, OAuthDataStore):
 # ################################################################################################################################
 
     def check_rbac_delegated_security(self, sec, cid, channel_item, path_info, payload, wsgi_environ, post_data, worker_store,
-            sep=MISC.SEPARATOR, plain_http=URL_TYPE.PLAIN_HTTP, _empty_client_def=tuple()): # noqa: C408
+            sep=MISC.SEPARATOR, plain_http=URL_TYPE.PLAIN_HTTP):
 
         auth_result = False
 
@@ -388,37 +388,34 @@ class URLData(CyURLData, OAuthDataStore):
             logger.error('Invalid HTTP method `%s`, cid:`%s`', http_method, cid)
             raise Forbidden(cid, 'You are not allowed to access this URL\n')
 
-        for role_id, perm_id, resource_id in iterkeys(worker_store.rbac.registry._allowed):
+        # All the clients allowed to access this resource, with role hierarchies already resolved
+        client_defs = worker_store.rbac.get_allowed_clients(http_method_permission_id, channel_item['service_id'])
 
-            if auth_result:
-                return auth_result
-
-            if perm_id == http_method_permission_id and resource_id == channel_item['service_id']:
-                for client_def in worker_store.rbac.role_id_to_client_def.get(role_id, _empty_client_def):
+        for client_def in client_defs:
 
-                    _, sec_type, sec_name = client_def.split(sep)
+            _, sec_type, sec_name = client_def.split(sep)
 
-                    _sec = Bunch()
-                    _sec.is_active = True
-                    _sec.transport = plain_http
-                    _sec.sec_use_rbac = False
-                    _sec.sec_def = self.sec_config_getter[sec_type](sec_name)['config']
+            _sec = Bunch()
+            _sec.is_active = True
+            _sec.transport = plain_http
+            _sec.sec_use_rbac = False
+            _sec.sec_def = self.sec_config_getter[sec_type](sec_name)['config']
 
-                    auth_result = self.check_security(
-                        _sec, cid, channel_item, path_info, payload, wsgi_environ, post_data, worker_store,
-                        enforce_auth=False)
+            auth_result = self.check_security(
+                _sec, cid, channel_item, path_info, payload, wsgi_environ, post_data, worker_store,
+                enforce_auth=False)
 
-                    if auth_result:
+            if auth_result:
 
-                        # If input sec object is a dict/Bunch-like one, it means that we have just confirmed
-                        # credentials of the underlying security definition behind an RBAC one,
-                        # in which case we need to overwrite the sec object's sec_def attribute and make it
-                        # point to the one that we have just found. Otherwise, it would still point to ZATO_NONE.
-                        if hasattr(sec, 'keys'):
-                            sec.sec_def = _sec['sec_def']
+                # If input sec object is a dict/Bunch-like one, it means that we have just confirmed
+                # credentials of the underlying security definition behind an RBAC one,
+                # in which case we need to overwrite the sec object's sec_def attribute and make it
+                # point to the one that we have just found. Otherwise, it would still point to ZATO_NONE.
+                if hasattr(sec, 'keys'):
+                    sec.sec_def = _sec['sec_def']
 
-                        enrich_with_sec_data(wsgi_environ, _sec.sec_def, sec_type)
-                        break
+                enrich_with_sec_data(wsgi_environ, _sec.sec_def, sec_type)
+                break
 
         if auth_result:
             return auth_result
@@ -202,6 +202,31 @@ class WebSphereMQConnection:
             else:
                 logger.debug('Not connected, skipping cleaning up the resources')
 
+# ################################################################################################################################
+
+    def copy(self):
+        """ Returns a new connection with the same configuration as this one, e.g. to have a unit of work of its own.
+        """
+        config = self.get_config()
+        config['queue_manager'] = self.queue_manager.decode('utf8') if self.queue_manager else ''
+        config['channel'] = self.channel.decode('utf8')
+
+        return self.__class__(None, **config)
+
+# ################################################################################################################################
+
+    def commit(self):
+        """ Commits all the messages received with syncpoint since the previous commit or backout.
+        """
+        self.mgr.commit()
+
+# ################################################################################################################################
+
+    def backout(self):
+        """ Makes all the messages received with syncpoint since the previous commit or backout available again.
+        """
+        self.mgr.backout()
+
 # ################################################################################################################################
 
     def get_connection_info(self):
@@ -327,7 +352,10 @@ class WebSphereMQConnection:
 
 # ################################################################################################################################
 
-    def send(self, message, destination):
+    def send(self, message, destination, syncpoint=False):
+        """ Sends a message to a queue. With syncpoint set to True, the message is only made available
+        when .commit is called and it is discarded if .backout is called.
+        """
         if self._disconnecting:
             logger.info('Connection factory disconnecting, aborting receive')
             return
@@ -372,7 +400,12 @@ class WebSphereMQConnection:
         queue = self.get_queue_for_sending(destination)
 
         try:
-            queue.put(body, md)
+            if syncpoint:
+                pmo = self.mq.pmo()
+                pmo.Options = self.CMQC.MQPMO_SYNCPOINT | self.CMQC.MQPMO_FAIL_IF_QUIESCING
+                queue.put(body, md, pmo)
+            else:
+                queue.put(body, md)
         except self.mq.MQMIError as e:
             logger.error('MQMIError in queue.put, comp:`%s`, reason:`%s`' % (e.comp, e.reason))
             exc = WebSphereMQException(e, e.comp, e.reason)
@@ -405,7 +438,10 @@ class WebSphereMQConnection:
 
 # ################################################################################################################################
 
-    def receive(self, destination, wait_interval, _connection_closing='zato.connection.closing'):
+    def receive(self, destination, wait_interval, _connection_closing='zato.connection.closing', syncpoint=False):
+        """ Receives a message from a queue. With syncpoint set to True, the message is only removed from the queue
+        when .commit is called and it is made available again if .backout is called or if the connection is broken.
+        """
         if self._disconnecting:
             logger.info('Connection factory disconnecting, aborting receive')
             return _connection_closing
@@ -433,6 +469,9 @@ class WebSphereMQConnection:
             gmo.Options = self.CMQC.MQGMO_WAIT | self.CMQC.MQGMO_FAIL_IF_QUIESCING
             gmo.WaitInterval = wait_interval
 
+            if syncpoint:
+                gmo.Options |= self.CMQC.MQGMO_SYNCPOINT
+
             message = queue.get(None, md, gmo)
 
             return self._build_text_message(md, message)
@@ -19,7 +19,7 @@ from sys import maxsize
 from traceback import format_exc
 
 # gevent
-from gevent import sleep
+from gevent import joinall, sleep
 from gevent.lock import RLock
 
 # globre
@@ -108,6 +108,10 @@ class FileTransferAPI:
         # Caches parser objects by their name
         self._parser_cache = {}
 
+        # A mapping of channel_id to a snapshot maker of a remote observer. Such snapshot makers are kept here
+        # between the scheduler's runs so that they do not need to connect and read their snapshots each time.
+        self.snapshot_maker_dict = {} # type: dict[int, BaseRemoteSnapshotMaker]
+
         # Information about what local paths should be ignored, i.e. we should not send events about them.
         self._local_ignored = set()
 
@@ -119,7 +123,13 @@ class FileTransferAPI:
             self.inotify_lock = RLock()
 
             self.inotify = INotify()
-            self.inotify_flags = inotify_flags.CLOSE_WRITE
+
+            # Files are reported when they are written to and closed in a directory that we observe
+            # or when they are moved to it from elsewhere, e.g. after a temporary file was renamed.
+            self.inotify_flags = inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+
+            # Directories moved to the ones that we observe are not reported
+            self.inotify_flag_is_dir = inotify_flags.ISDIR
 
             self.inotify_wd_to_path = {}
             self.inotify_path_to_observer_list = {}
@@ -236,6 +246,11 @@ class FileTransferAPI:
             if not observer_to_delete.is_local:
                 self.observer_dict.pop(observer_to_delete.channel_id)
 
+                # .. close the connections of its snapshot maker, if there is one ..
+                snapshot_maker = self.snapshot_maker_dict.pop(observer_to_delete.channel_id, None)
+                if snapshot_maker:
+                    snapshot_maker.close()
+
             # .. for local transfer under Linux, delete it from any references among paths being observed via inotify.
             if prefer_inotify and config.source_type == source_type_local:
                 for path in observer_path_list:
@@ -340,7 +355,8 @@ class FileTransferAPI:
         event,        # type: FileTransferEvent
         service_list, # type: anylist
         topic_list,   # type: anylist
-        outconn_rest_list # type: anylist
+        outconn_rest_list, # type: anylist
+        needs_wait=False   # type: bool
     ) -> 'None':
 
         # Do not invoke callbacks if the path is to be ignored
@@ -361,39 +377,56 @@ class FileTransferAPI:
             'has_raw_data': event.has_raw_data,
             'has_data': event.has_data,
             'parse_error': event.parse_error,
+            'is_stream': event.is_stream,
+            'batch_no': event.batch_no,
+            'is_last_batch': event.is_last_batch,
+            'line_no_list': event.line_no_list,
+            'parse_error_list': event.parse_error_list,
             'config': config,
         }
 
         # Services
-        self.invoke_service_callbacks(service_list, request)
+        greenlets = self.invoke_service_callbacks(service_list, request)
 
         # Topics
-        self.invoke_topic_callbacks(topic_list, request)
+        greenlets.extend(self.invoke_topic_callbacks(topic_list, request))
 
         # REST outgoing connections
-        self.invoke_rest_outconn_callbacks(outconn_rest_list, request)
+        greenlets.extend(self.invoke_rest_outconn_callbacks(outconn_rest_list, request))
+
+        # Wait for all the callbacks to complete if we are told to
+        if needs_wait:
+            _ = joinall([elem for elem in greenlets if elem])
 
 # ################################################################################################################################
 
-    def invoke_service_callbacks(self, service_list:'anylist', request:'anydict') -> 'None':
+    def invoke_service_callbacks(self, service_list:'anylist', request:'anydict') -> 'anylist':
+
+        out = []
 
         for item in service_list: # type: str
             try:
-                _ = spawn_greenlet(self.server.invoke, item, request)
+                out.append(spawn_greenlet(self.server.invoke, item, request))
             except Exception:
                 logger.warning(format_exc())
 
+        return out
+
 # ################################################################################################################################
 
-    def invoke_topic_callbacks(self, topic_list:'anylist', request:'anydict') -> 'None':
+    def invoke_topic_callbacks(self, topic_list:'anylist', request:'anydict') -> 'anylist':
+
+        out = []
 
         for item in topic_list:
             item = cast_('str', item)
             try:
-                _ = spawn_greenlet(self.server.invoke, item, request)
+                out.append(spawn_greenlet(self.server.invoke, item, request))
             except Exception:
                 logger.warning(format_exc())
 
+        return out
+
 # ################################################################################################################################
 
     def _invoke_rest_outconn_callback(self, item_id:'str', request:'anydict') -> 'None':
@@ -432,10 +465,14 @@ class FileTransferAPI:
 
 # ################################################################################################################################
 
-    def invoke_rest_outconn_callbacks(self, outconn_rest_list:'anylist', request:'anydict') -> 'None':
+    def invoke_rest_outconn_callbacks(self, outconn_rest_list:'anylist', request:'anydict') -> 'anylist':
+
+        out = []
 
         for item_id in outconn_rest_list: # type: int
-            _ = spawn_greenlet(self._invoke_rest_outconn_callback, item_id, request)
+            out.append(spawn_greenlet(self._invoke_rest_outconn_callback, item_id, request))
+
+        return out
 
 # ################################################################################################################################
 
@@ -463,6 +500,10 @@ class FileTransferAPI:
                 for event in self.inotify.read(0):
                     try:
 
+                        # We are interested in files only
+                        if event.mask & self.inotify_flag_is_dir:
+                            continue
+
                         # Build a full path to the file we are processing
                         dir_name = self.inotify_wd_to_path[event.wd]
                         src_path = os.path.normpath(os.path.join(dir_name, event.name))
@@ -599,13 +640,27 @@ class FileTransferAPI:
         if not observer.is_active:
             return
 
-        source_type = observer.channel_config.source_type   # type: str
-        snapshot_maker_class = source_type_to_snapshot_maker_class[source_type]
+        # Remote observers may already have a snapshot maker from a previous run ..
+        snapshot_maker = self.snapshot_maker_dict.get(observer.channel_id)
+
+        # .. if they do not, we need to create one ..
+        if not snapshot_maker:
+
+            source_type = observer.channel_config.source_type   # type: str
+            snapshot_maker_class = source_type_to_snapshot_maker_class[source_type]
+
+            snapshot_maker = snapshot_maker_class(self, observer.channel_config) # type: any_
+            snapshot_maker = cast_('BaseRemoteSnapshotMaker', snapshot_maker)
+
+            if not observer.is_local:
+                self.snapshot_maker_dict[observer.channel_id] = snapshot_maker
 
-        snapshot_maker = snapshot_maker_class(self, observer.channel_config) # type: any_
-        snapshot_maker = cast_('BaseRemoteSnapshotMaker', snapshot_maker)
-        snapshot_maker.connect()
+        # .. local snapshot makers do not need to connect anywhere and remote ones
+        # need to do it each time their connections may have been broken.
+        if observer.is_local or snapshot_maker.needs_connect:
+            snapshot_maker.connect()
 
+        # Each path is checked in its own greenlet and remote ones use a pool of connections to do it in parallel.
         for item in observer.path_list: # type: (str)
             _ = spawn_greenlet(observer.observe_with_snapshots, snapshot_maker, item, max_iters, False)
 
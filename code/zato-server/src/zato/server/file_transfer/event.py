@@ -18,6 +18,7 @@ from watchdog.events import DirCreatedEvent
 
 # Zato
 from zato.common.util.api import hot_deploy, spawn_greenlet
+from zato.server.file_transfer.stream import iter_batches, iter_records, ModuleCtx as StreamCtx
 
 if 0:
     from bunch import Bunch
@@ -75,6 +76,13 @@ class FileTransferEvent:
     has_data = 'not-set'      # type: bool
     parse_error = 'not-set'   # type: str
 
+    # These are used if a file is read in batches rather than as a whole
+    is_stream = False         # type: bool
+    batch_no = 1              # type: int
+    is_last_batch = True      # type: bool
+    line_no_list = None       # type: list | None
+    parse_error_list = None   # type: list | None
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -161,6 +169,18 @@ class FileTransferEventHandler:
                         self.config.should_delete_after_pickup, should_deploy_in_place=self.config.should_deploy_in_place)
                 return
 
+            # Large files can be read in batches, each of which is delivered to callbacks separately ..
+            if self.config.should_read_on_pickup and self.config.get('is_line_by_line'):
+
+                # .. the callbacks have completed by now, so we can clean up, but only if the whole file could be read,
+                # .. otherwise, we leave it as it is, without deleting or moving it, so that it is not lost.
+                if self._invoke_callbacks_with_stream(event, snapshot_maker):
+                    self.manager.post_handle(event, self.config, observer, snapshot_maker)
+                else:
+                    logger.warning('File transfer skipping post-handle actions for `%s` (%s) because it could not be read',
+                        event.full_path, self.config.name)
+                return
+
             if self.config.should_read_on_pickup:
 
                 if snapshot_maker:
@@ -196,6 +216,65 @@ class FileTransferEventHandler:
             logger.warning('Exception in pickup event handler `%s` (%s) `%s`',
                 self.config.name, transfer_event.src_path, format_exc())
 
+# ################################################################################################################################
+
+    def _invoke_callbacks_with_stream(
+        self,
+        event,         # type: FileTransferEvent
+        snapshot_maker # type: BaseRemoteSnapshotMaker | None
+    ) -> 'bool':
+        """ Reads a file in batches of records, or chunks of raw data if it is not to be parsed, and invokes callbacks
+        for each batch. Callbacks for the next batch are not invoked until the ones for the previous batch complete
+        so there are never more than two batches of a file in memory. Returns True if the whole file was read.
+        """
+        if self.config.should_parse_on_pickup:
+            parser = self.manager.get_parser(self.config.parse_with)
+            batch_size = int(self.config.get('stream_batch_size') or StreamCtx.Default_Batch_Size)
+        else:
+            parser = None
+            batch_size = 1
+
+        if snapshot_maker:
+            f = snapshot_maker.open_file(event.full_path)
+        else:
+            f = open(event.full_path, 'rb')
+
+        event.is_stream = True
+
+        try:
+            with f:
+                for batch in iter_batches(iter_records(self.config, f, parser), batch_size):
+
+                    event.batch_no = batch.batch_no
+                    event.is_last_batch = batch.is_last
+                    event.line_no_list = batch.line_no_list
+                    event.parse_error_list = batch.parse_error_list
+                    event.parse_error = ''
+
+                    if parser:
+                        event.raw_data = ''
+                        event.has_raw_data = False
+                        event.data = batch.data
+                        event.has_data = True
+                    else:
+                        event.raw_data = ''.join(batch.data)
+                        event.has_raw_data = True
+
+                    if batch.parse_error_list:
+                        logger.warning('File transfer parsing errors (%s) in batch %s of `%s` -> %s',
+                            self.config.name, batch.batch_no, event.full_path, batch.parse_error_list)
+
+                    self.manager.invoke_callbacks(event, self.config.service_list, self.config.topic_list,
+                        self.config.outconn_rest_list, needs_wait=True)
+
+        except Exception:
+            logger.warning('File transfer stream error (%s) in batch %s of `%s` e:`%s`',
+                self.config.name, event.batch_no, event.full_path, format_exc())
+            return False
+
+        else:
+            return True
+
 # ################################################################################################################################
 
     def on_created(
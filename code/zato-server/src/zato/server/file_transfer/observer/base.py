@@ -254,10 +254,18 @@ class BaseObserver:
     ) -> 'None':
         """ An observer's main loop that uses snapshots.
         """
-        try:
+        # How many times to run the loop - either given on input or, essentially, infinitely.
+        current_iter = 0
+
+        # Snapshot makers may tell us to skip this path, e.g. if it is being checked already or if it did not change
+        # in a while and it is not its turn yet.
+        if not snapshot_maker.start_path_check(path):
+            return
 
-            # How many times to run the loop - either given on input or, essentially, infinitely.
-            current_iter = 0
+        # Whether anything changed in the path while we were checking it
+        has_changes = False
+
+        try:
 
             # Local aliases to avoid namespace lookups in self
             timeout = self.sleep_time
@@ -280,6 +288,16 @@ class BaseObserver:
                     # .. difference between the old and new will return, in particular, new or modified files ..
                     diff = DirSnapshotDiff(snapshot, new_snapshot) # type: ignore
 
+                    # .. if there were no such files, the new snapshot will be treated as the old one in the next iteration
+                    # and there is no need to make another one ..
+                    if not (diff.files_created or diff.files_modified):
+                        if new_snapshot:
+                            snapshot_maker.store_snapshot(new_snapshot)
+                            snapshot = new_snapshot
+                        continue
+
+                    has_changes = True
+
                     for path_created in diff.files_created:
 
                         # .. ignore Python's own directorries ..
@@ -342,6 +360,9 @@ class BaseObserver:
             logger.warning('Exception in %s file observer `%s` e:`%s (%s t:%s)',
                 self.observer_type_name, path, format_exc(), self.name, self.observer_type_impl)
 
+        finally:
+            snapshot_maker.end_path_check(path, has_changes)
+
         if log_stop_event:
             logger.warning('Stopped %s file transfer observer `%s` for `%s` (snapshot:%s/%s)',
                 self.observer_type_name, self.name, path, current_iter, max_iters) # type: ignore
@@ -39,7 +39,8 @@ class FTPObserver(BaseObserver):
 # ################################################################################################################################
 
     def path_exists(self, path:'str', snapshot_maker:'BaseRemoteSnapshotMaker') -> 'bool':
-        return snapshot_maker.file_client.path_exists(path)
+        with snapshot_maker.get_file_client() as file_client:
+            return file_client.path_exists(path)
 
 # ################################################################################################################################
 
@@ -74,21 +75,24 @@ class FTPObserver(BaseObserver):
         #
         #
 
-        # Case 1)
-        if event.has_raw_data:
-            snapshot_maker.file_client.store(path_to, event.raw_data)
-            snapshot_maker.file_client.delete_file(path_from)
+        with snapshot_maker.get_file_client() as file_client:
 
-        # Case 2)
-        else:
-            snapshot_maker.file_client.move_file(path_from, path_to)
+            # Case 1)
+            if event.has_raw_data:
+                file_client.store(path_to, event.raw_data)
+                file_client.delete_file(path_from)
+
+            # Case 2)
+            else:
+                file_client.move_file(path_from, path_to)
 
 # ################################################################################################################################
 
     def delete_file(self, path:'str', snapshot_maker:'BaseRemoteSnapshotMaker') -> 'None':
         """ Deletes a file pointed to by path.
         """
-        snapshot_maker.file_client.delete_file(path)
+        with snapshot_maker.get_file_client() as file_client:
+            file_client.delete_file(path)
 
 # ################################################################################################################################
 # ################################################################################################################################
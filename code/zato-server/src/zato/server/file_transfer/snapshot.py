@@ -8,11 +8,18 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 
 # stdlib
 import os
+from contextlib import contextmanager
 from datetime import datetime
+from hashlib import sha256
+from io import BytesIO
 from logging import getLogger
-from pathlib import Path
+from tempfile import NamedTemporaryFile
+from time import monotonic
 from traceback import format_exc
 
+# gevent
+from gevent.queue import Queue
+
 # ciso8601
 try:
     from zato.common.util.api import parse_datetime
@@ -20,7 +27,7 @@ except ImportError:
     from dateutil.parser import parse as parse_datetime
 
 # Zato
-from zato.common.json_ import dumps
+from zato.common.json_ import dumps, loads
 from zato.common.odb.query.generic import FTPFileTransferWrapper, SFTPFileTransferWrapper
 from zato.common.typing_ import cast_
 from zato.server.connection.file_client.base import PathAccessException
@@ -32,7 +39,7 @@ from zato.server.connection.file_client.sftp import SFTPFileClient
 
 if 0:
     from bunch import Bunch
-    from zato.common.typing_ import any_, anydict, anylist
+    from zato.common.typing_ import any_, anydict, anylist, binaryio_, iterator_
     from zato.server.connection.file_client.base import BaseFileClient
     from zato.server.connection.ftp import FTPStore
     from zato.server.file_transfer.api import FileTransferAPI
@@ -58,6 +65,27 @@ default_interval = 1.1
 # ################################################################################################################################
 # ################################################################################################################################
 
+class ModuleCtx:
+
+    # Where, under the server's work directory, the state of local snapshots is kept
+    State_Dir_Name = 'file-transfer'
+
+    # Bumped each time the format of the state files changes
+    State_Version = 1
+
+    # The state of a local path is saved to disk no more often than once in that many seconds
+    Default_State_Store_Interval = 10
+
+    # How many connections to a remote server a single channel may use to list its paths in parallel
+    Default_Listing_Pool_Size = 4
+
+    # A remote path that has not changed for a while is checked less frequently,
+    # up to this many seconds between two checks, but as soon as it changes, it is checked in each run again.
+    Default_Max_Poll_Interval = 60
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 class ItemInfo:
     """ Information about a single file as found by a snapshot maker.
     """
@@ -68,6 +96,9 @@ class ItemInfo:
     is_dir: 'bool'
     is_file: 'bool'
 
+    # This is set only by local snapshot makers
+    mtime_ns: 'int' = -1
+
 # ################################################################################################################################
 
     def to_dict(self):
@@ -76,6 +107,8 @@ class ItemInfo:
             'name': self.name,
             'size': self.size,
             'last_modified': self.last_modified.isoformat(),
+            'is_dir': self.is_dir,
+            'is_file': self.is_file,
         }
 
 # ################################################################################################################################
@@ -99,8 +132,10 @@ class DirSnapshot:
             item_info.full_path = self.get_full_path(item)
             item_info.name = item['name']
             item_info.size = item['size']
-            item_info.is_dir = item['is_dir']
-            item_info.is_file = item['is_file']
+
+            # Snapshots stored in the ODB by previous versions do not have these keys and they contained only files
+            item_info.is_dir = item.get('is_dir', False)
+            item_info.is_file = item.get('is_file', True)
 
             # This may be either string or a datetime object
             last_modified = item['last_modified']
@@ -168,6 +203,10 @@ class DirSnapshotDiff:
         if not (previous_snapshot and current_snapshot):
             return
 
+        # Snapshot makers return the previous snapshot as is if nothing changed since it was taken.
+        if previous_snapshot is current_snapshot:
+            return
+
         # New files ..
         self.files_created = set(current_snapshot.file_data) - set(previous_snapshot.file_data)
 
@@ -217,44 +256,253 @@ class AbstractSnapshotMaker:
     def get_file_data(self, *args:'any_', **kwargs:'any_') -> 'None':
         raise NotImplementedError('Must be implemented in subclasses')
 
+# ################################################################################################################################
+
+    def open_file(self, path:'str') -> 'binaryio_':
+        """ Returns a binary file object to read a file from. Subclasses that can read files
+        without downloading them in full first should override it.
+        """
+        return BytesIO(self.get_file_data(path)) # type: ignore
+
 # ################################################################################################################################
 
     def store_snapshot(self, snapshot:'DirSnapshot') -> 'None':
         pass
 
+# ################################################################################################################################
+
+    def start_path_check(self, path:'str') -> 'bool':
+        return True
+
+# ################################################################################################################################
+
+    def end_path_check(self, path:'str', has_changes:'bool') -> 'None':
+        pass
+
 # ################################################################################################################################
 # ################################################################################################################################
 
 class LocalSnapshotMaker(AbstractSnapshotMaker):
+    """ Makes snapshots of local directories. Each pass reuses the entries of the previous snapshot for files
+    whose size and modification time did not change, and if nothing changed at all, the previous snapshot itself
+    is returned, so only the entries that did change need to be compared and reported. The most recent snapshot
+    of each path is also kept in the server's work directory, indexed by modification time and size,
+    which means that files that already existed before a restart are not reported again.
+
+    Snapshots are used only with paths that inotify cannot be used with, i.e. recursive ones, paths on systems
+    other than Linux and, through ZATO_HOT_DEPLOY_PREFER_SNAPSHOTS, network mounts. Such paths are not observed
+    incrementally - each pass still lists and stats every file under them and only the comparison is cheaper.
+
+    The state of a path is saved no more often than once in state_store_interval seconds, which means that
+    if a server stops abruptly, the files that it reported within that time may be reported again after it starts.
+    """
+    def __init__(self, file_transfer_api:'FileTransferAPI', channel_config:'any_') -> 'None':
+        super().__init__(file_transfer_api, channel_config)
+
+        self.state_store_interval = float(channel_config.get('state_store_interval') or ModuleCtx.Default_State_Store_Interval)
+
+        # Path -> the most recent snapshot of that path
+        self.last_snapshot = {} # type: dict[str, DirSnapshot]
+
+        # Path -> the most recent snapshot of that path that was saved to the work directory
+        self.stored_snapshot = {} # type: dict[str, DirSnapshot]
+
+        # Path -> when its snapshot may be saved to the work directory again
+        self.next_store_time = {} # type: dict[str, float]
+
+# ################################################################################################################################
+
     def connect(self):
         # Not used with local snapshots
         pass
 
-    def get_snapshot(self, path:'str', *args:'any_', **kwargs:'any_') -> 'DirSnapshot':
+# ################################################################################################################################
+
+    def get_state_path(self, path:'str') -> 'str':
+
+        # A combination of our channel's name and directory we are checking is unique. We do not use the ID
+        # because channels from pickup.conf do not have their own IDs.
+        name = '{}; {}'.format(self.channel_config.name, path)
+        name = sha256(name.encode('utf8')).hexdigest()
+
+        work_dir = self.file_transfer_api.server.work_dir
+        return os.path.join(work_dir, ModuleCtx.State_Dir_Name, 'local-{}.json'.format(name))
+
+# ################################################################################################################################
+
+    def load_snapshot(self, path:'str') -> 'DirSnapshot | None':
+        """ Returns a snapshot of a path that was saved previously or None if there is no such snapshot.
+        """
+        state_path = self.get_state_path(path)
+
+        if not os.path.exists(state_path):
+            return
+
+        try:
+            with open(state_path, 'rb') as f:
+                data = loads(f.read())
+        except Exception:
+            logger.info('Ignoring invalid file transfer state `%s`; e:`%s`', state_path, format_exc())
+            return
+
+        if data.get('version') != ModuleCtx.State_Version or data.get('path') != path:
+            return
+
+        snapshot = DirSnapshot(path)
+
+        for full_path, (size, mtime_ns, is_dir) in data['items'].items():
+            snapshot.file_data[full_path] = self._get_item_info(full_path, size, mtime_ns, is_dir)
+
+        return snapshot
+
+# ################################################################################################################################
+
+    def store_snapshot(self, snapshot:'DirSnapshot') -> 'None':
+
+        # We do not need to store anything if nothing changed since the last time ..
+        if self.stored_snapshot.get(snapshot.path) is snapshot:
+            return
+
+        # .. and if something did, we do not store it more often than configured to. We are called in each pass,
+        # so the most recent snapshot will be stored in one of the next ones.
+        now = monotonic()
+
+        if now < self.next_store_time.get(snapshot.path, 0):
+            return
+
+        work_dir = self.file_transfer_api.server.work_dir
+
+        # We may be running in an environment that does not have a work directory, e.g. in tests
+        if not os.path.isdir(work_dir):
+            return
+
+        state_path = self.get_state_path(snapshot.path)
+        state_dir = os.path.dirname(state_path)
+
+        items = {}
+        for full_path, item in snapshot.file_data.items(): # type: (str, ItemInfo)
+            items[full_path] = [item.size, item.mtime_ns, item.is_dir]
+
+        data = {
+            'version': ModuleCtx.State_Version,
+            'path': snapshot.path,
+            'items': items,
+        }
+
+        try:
+            os.makedirs(state_dir, exist_ok=True)
+            with NamedTemporaryFile('wb', dir=state_dir, delete=False) as f:
+                _ = f.write(dumps(data).encode('utf8'))
+            os.replace(f.name, state_path)
+        except Exception:
+            logger.warning('Could not save file transfer state `%s`; e:`%s`', state_path, format_exc())
+        else:
+            self.stored_snapshot[snapshot.path] = snapshot
+            self.next_store_time[snapshot.path] = now + self.state_store_interval
+
+# ################################################################################################################################
+
+    def _get_item_info(self, full_path:'str', size:'int', mtime_ns:'int', is_dir:'bool') -> 'ItemInfo':
+
+        item_info = ItemInfo()
+        item_info.full_path = full_path
+        item_info.name = os.path.basename(full_path)
+        item_info.size = size
+        item_info.mtime_ns = mtime_ns
+        item_info.last_modified = datetime.fromtimestamp(mtime_ns / 1_000_000_000)
+        item_info.is_dir = is_dir
+        item_info.is_file = not is_dir
+
+        return item_info
+
+# ################################################################################################################################
+
+    def _get_current_snapshot(self, path:'str', previous:'DirSnapshot | None') -> 'DirSnapshot':
 
         # Output to return
         snapshot = DirSnapshot(path)
+        file_data = snapshot.file_data
+
+        # Entries from the previous pass that we can reuse
+        previous_data = previous.file_data if previous else {}
+
+        # Set to True if any entry was added or modified
+        has_changes = False
+
+        # Directories still to be scanned
+        dir_list = [path]
+
+        while dir_list:
+
+            dir_path = dir_list.pop()
+
+            try:
+                listing = os.scandir(dir_path)
+            except FileNotFoundError:
+                # Directories may be deleted while we are scanning them and a missing one has no files
+                continue
+
+            with listing:
+                for entry in listing:
+
+                    try:
+                        stat = entry.stat()
+                        is_dir = entry.is_dir()
+                    except FileNotFoundError:
+                        # The entry was deleted after it was listed
+                        continue
+
+                    full_path = entry.path
+
+                    if is_dir:
+                        dir_list.append(full_path)
 
-        # All files found in path
-        file_list = [] # type: anylist
+                    # Reuse what we already know about this entry if it did not change ..
+                    item_info = previous_data.get(full_path)
 
-        # Recursively, get all files
-        listing = Path(path).rglob('*')
+                    if item_info and item_info.mtime_ns == stat.st_mtime_ns and item_info.size == stat.st_size:
+                        file_data[full_path] = item_info
 
-        for item in listing:
-            full_path = str(item)
-            stat = item.stat()
-            file_list.append({
-                'full_path': full_path,
-                'name': item.name,
-                'is_dir': item.is_dir(),
-                'is_file': item.is_file(),
-                'size': stat.st_size,
-                'last_modified': datetime.fromtimestamp(stat.st_mtime)
-            })
+                    # .. otherwise, it is new or modified.
+                    else:
+                        file_data[full_path] = self._get_item_info(full_path, stat.st_size, stat.st_mtime_ns, is_dir)
+                        has_changes = True
 
-        snapshot.add_item(file_list)
+        # If nothing was added, modified or deleted, the previous snapshot is still the current one.
+        if previous and (not has_changes) and len(file_data) == len(previous_data):
+            return previous
+        else:
+            return snapshot
+
+# ################################################################################################################################
 
+    def get_snapshot(
+        self,
+        path, # type: str
+        ignored_is_recursive=True, # type: bool
+        is_initial=False,          # type: bool
+        needs_store=False          # type: bool
+    ) -> 'DirSnapshot':
+
+        # If this is the observer's initial snapshot, we may have it already from before a restart ..
+        if is_initial:
+            snapshot = self.load_snapshot(path)
+
+            # .. if we do, we can return it ..
+            if snapshot:
+                self.last_snapshot[path] = snapshot
+                self.stored_snapshot[path] = snapshot
+                return snapshot
+
+        # .. otherwise, we build a snapshot based on the previous one, if any ..
+        snapshot = self._get_current_snapshot(path, self.last_snapshot.get(path))
+        self.last_snapshot[path] = snapshot
+
+        # .. store it if we are told to ..
+        if needs_store:
+            self.store_snapshot(snapshot)
+
+        # .. and return the result to our caller.
         return snapshot
 
 # ################################################################################################################################
@@ -263,11 +511,19 @@ class LocalSnapshotMaker(AbstractSnapshotMaker):
         with open(path, 'rb') as f:
             return f.read()
 
+# ################################################################################################################################
+
+    def open_file(self, path:'str') -> 'binaryio_':
+        return open(path, 'rb')
+
 # ################################################################################################################################
 # ################################################################################################################################
 
 class BaseRemoteSnapshotMaker(AbstractSnapshotMaker):
-    """ Functionality shared by FTP and SFTP.
+    """ Functionality shared by FTP and SFTP. Snapshot makers of remote directories are kept by FileTransferAPI
+    between the scheduler's runs. Each has a pool of file clients so that all of a channel's paths can be listed
+    in parallel, the last snapshot of each path is kept in memory and it is stored in the ODB only if it changed.
+    Paths that do not change are checked less and less frequently.
     """
     transfer_wrapper_class:'any_' = None
     worker_config_out_name = '<invalid-worker_config_out_name>'
@@ -275,40 +531,155 @@ class BaseRemoteSnapshotMaker(AbstractSnapshotMaker):
     file_client_class:'any_' = None
     has_get_by_id = False
 
+    def __init__(self, file_transfer_api:'FileTransferAPI', channel_config:'any_') -> 'None':
+        super().__init__(file_transfer_api, channel_config)
+
+        self.pool_size = int(channel_config.get('listing_pool_size') or ModuleCtx.Default_Listing_Pool_Size)
+        self.max_poll_interval = float(channel_config.get('max_poll_interval') or ModuleCtx.Default_Max_Poll_Interval)
+
+        # File clients that paths are listed with, each stored along with the generation of the pool it belongs to
+        self.file_client_pool = Queue()
+
+        # Incremented each time the pool is closed so that clients checked out of a previous pool
+        # can be closed when they are returned instead of being put back.
+        self.pool_generation = 0
+
+        # Set to True if a connection may be broken and the pool needs to be created anew
+        self.needs_connect = True
+
+        # Path -> the most recent snapshot of that path
+        self.last_snapshot = {} # type: dict[str, DirSnapshot]
+
+        # Path -> files and their modification times and sizes, as last stored in the ODB
+        self.stored_file_data = {} # type: dict[str, dict]
+
+        # Path -> how many seconds to wait between checks of that path and when to check it next
+        self.poll_interval = {} # type: dict[str, float]
+        self.next_check_time = {} # type: dict[str, float]
+
+        # Paths that are being checked right now
+        self.paths_in_progress = set() # type: set[str]
+
 # ################################################################################################################################
 
-    def connect(self) -> 'None':
+    def _get_outconn(self) -> 'any_':
 
         # Extract all the configuration ..
         store = getattr(self.file_transfer_api.server.worker_store.worker_config, self.worker_config_out_name)
         source_id = int(self.channel_config[self.source_id_attr_name])
 
-        # Some connection types will directly expose this method ..
+        # Some connection types will directly expose this method, returning a new connection each time ..
         if self.has_get_by_id:
-            outconn = store.get_by_id(source_id)
+            return store.get_by_id(source_id)
 
-        # .. while some will not.
+        # .. while some will not and their connections can be shared.
         else:
             for value in store.values():
                 config = value['config']
                 if config['id'] == source_id:
-                    outconn = value.conn
-                    break
+                    return value.conn
             else:
                 raise ValueError('ID not found in `{}`'.format(store.values()))
 
+# ################################################################################################################################
+
+    def connect(self) -> 'None':
+
+        # Close any connections that we may already have ..
+        self.close()
+
         # .. connect to the remote server ..
-        self.file_client = self.file_client_class(outconn, self.channel_config)
+        self.file_client = self.file_client_class(self._get_outconn(), self.channel_config)
 
         # .. and confirm that the connection works.
         self.file_client.ping()
 
+        # The main client is also the first one in the pool ..
+        self.file_client_pool.put((self.pool_generation, self.file_client))
+
+        # .. and the other ones are created here.
+        for _ in range(self.pool_size - 1):
+            file_client = self.file_client_class(self._get_outconn(), self.channel_config)
+            self.file_client_pool.put((self.pool_generation, file_client))
+
+        self.needs_connect = False
+
+# ################################################################################################################################
+
+    def _close_file_client(self, file_client:'BaseFileClient') -> 'None':
+        try:
+            file_client.close()
+        except Exception:
+            logger.info('Could not close file client (%s), e:`%s`', self.channel_config.name, format_exc())
+
+# ################################################################################################################################
+
+    def close(self) -> 'None':
+
+        # Clients that are checked out right now belong to the current generation
+        # and they will be closed when they are returned ..
+        self.pool_generation += 1
+
+        # .. while the idle ones can be closed immediately.
+        while not self.file_client_pool.empty():
+            _, file_client = self.file_client_pool.get_nowait()
+            self._close_file_client(file_client)
+
+# ################################################################################################################################
+
+    @contextmanager
+    def get_file_client(self) -> 'iterator_[BaseFileClient]':
+        generation, file_client = self.file_client_pool.get()
+        try:
+            yield file_client
+        finally:
+            # The pool may have been closed in the meantime, in which case this client is not needed anymore
+            if generation == self.pool_generation:
+                self.file_client_pool.put((generation, file_client))
+            else:
+                self._close_file_client(file_client)
+
+# ################################################################################################################################
+
+    def start_path_check(self, path:'str') -> 'bool':
+        """ Returns True if a path should be checked now, i.e. if it is not being checked already
+        and if enough time passed since it was last checked.
+        """
+        if path in self.paths_in_progress:
+            return False
+
+        if monotonic() < self.next_check_time.get(path, 0):
+            return False
+
+        self.paths_in_progress.add(path)
+        return True
+
+# ################################################################################################################################
+
+    def end_path_check(self, path:'str', has_changes:'bool') -> 'None':
+        """ Decides when a path should be checked next based on whether it changed.
+        """
+        self.paths_in_progress.discard(path)
+
+        # Changes often come in groups so we are going to check this path in each run ..
+        if has_changes:
+            interval = 0.0
+
+        # .. but if there were none, we can wait longer and longer until the next check.
+        else:
+            interval = self.poll_interval.get(path, 0.0)
+            interval = min(max(interval * 2, default_interval), self.max_poll_interval)
+
+        self.poll_interval[path] = interval
+        self.next_check_time[path] = monotonic() + interval
+
 # ################################################################################################################################
 
     def _get_current_snapshot(self, path:'str') -> 'DirSnapshot':
 
         # First, get a list of files under path ..
-        result = self.file_client.list(path) # type: anydict
+        with self.get_file_client() as file_client:
+            result = file_client.list(path) # type: anydict
 
         # .. create a new container for the snapshot ..
         snapshot = DirSnapshot(path)
@@ -320,6 +691,54 @@ class BaseRemoteSnapshotMaker(AbstractSnapshotMaker):
         # .. and return the result.
         return snapshot
 
+# ################################################################################################################################
+
+    def _get_name(self, path:'str') -> 'str':
+        # A combination of our channel's ID and directory we are checking is unique
+        return '{}; {}'.format(self.channel_config.id, path)
+
+# ################################################################################################################################
+
+    def _get_stored_file_data(self, snapshot:'DirSnapshot') -> 'anydict':
+        out = {}
+        for full_path, item in snapshot.file_data.items(): # type: (str, ItemInfo)
+            out[full_path] = (item.size, item.last_modified)
+        return out
+
+# ################################################################################################################################
+
+    def store_snapshot(self, snapshot:'DirSnapshot') -> 'None':
+
+        # We do not need to store anything if nothing changed since the last time.
+        file_data = self._get_stored_file_data(snapshot)
+        if self.stored_file_data.get(snapshot.path) == file_data:
+            return
+
+        session = self.odb.session()
+        try:
+            wrapper = self.transfer_wrapper_class(session, self.file_transfer_api.server.cluster_id)
+            wrapper.store(self._get_name(snapshot.path), snapshot.to_json())
+        finally:
+            session.close()
+
+        self.stored_file_data[snapshot.path] = file_data
+
+# ################################################################################################################################
+
+    def _load_snapshot(self, path:'str') -> 'DirSnapshot | None':
+
+        session = self.odb.session()
+        try:
+            wrapper = self.transfer_wrapper_class(session, self.file_transfer_api.server.cluster_id)
+            already_existing = wrapper.get(self._get_name(path))
+        finally:
+            session.close()
+
+        if already_existing:
+            snapshot = DirSnapshot.from_sql_dict(path, already_existing)
+            self.stored_file_data[path] = self._get_stored_file_data(snapshot)
+            return snapshot
+
 # ################################################################################################################################
 
     def get_snapshot(
@@ -330,39 +749,32 @@ class BaseRemoteSnapshotMaker(AbstractSnapshotMaker):
         needs_store           # type: bool
     ) -> 'DirSnapshot | None':
 
-        # We are not sure yet if we are to need it.
-        session = None
-
-        # A combination of our channel's ID and directory we are checking is unique
-        name = '{}; {}'.format(self.channel_config.id, path)
-
         try:
-            # If we otherwise know that we will access the database,
-            # we can create a new SQL session here.
-            if needs_store:
-                session = self.odb.session()
-                wrapper = self.transfer_wrapper_class(session, self.file_transfer_api.server.cluster_id)
 
             # If this is the observer's initial snapshot ..
             if is_initial:
 
-                # .. we need to check if we may perhaps have it in the ODB ..
-                already_existing = wrapper.get(name)
+                # .. we may have it from the scheduler's previous run ..
+                snapshot = self.last_snapshot.get(path)
+
+                # .. or we may have it in the ODB, e.g. from before a restart ..
+                if not snapshot:
+                    snapshot = self._load_snapshot(path)
 
-                # .. if we do, we can return it ..
-                if already_existing:
-                    return DirSnapshot.from_sql_dict(path, already_existing)
+                # .. if there is none, we return the current state of the remote resource.
+                if not snapshot:
+                    snapshot = self._get_current_snapshot(path)
 
-                # .. otherwise, we return the current state of the remote resource.
-                else:
-                    return self._get_current_snapshot(path)
+                self.last_snapshot[path] = snapshot
+                return snapshot
 
             # .. this is not the initial snapshot so we need to make one ..
             snapshot = self._get_current_snapshot(path)
+            self.last_snapshot[path] = snapshot
 
             # .. store it if we are told to ..
             if needs_store:
-                wrapper.store(name, snapshot.to_json())
+                self.store_snapshot(snapshot)
 
             # .. and return the result to our caller.
             return snapshot
@@ -373,16 +785,16 @@ class BaseRemoteSnapshotMaker(AbstractSnapshotMaker):
 
         except Exception:
             logger.warning('Exception caught in get_snapshot (%s), e:`%s`', self.channel_config.source_type, format_exc())
-            raise
 
-        finally:
-            if session:
-                session.close()
+            # The connection may be broken so we will create new ones the next time
+            self.needs_connect = True
+            raise
 
 # ################################################################################################################################
 
     def get_file_data(self, path:'str') -> 'bytes':
-        return self.file_client.get(path)
+        with self.get_file_client() as file_client:
+            return file_client.get(path)
 
 # ################################################################################################################################
 # ################################################################################################################################
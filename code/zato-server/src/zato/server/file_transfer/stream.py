@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import csv
+from io import TextIOWrapper
+from logging import getLogger
+from traceback import format_exc
+
+# lxml
+from lxml import etree
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, binaryio_, callable_, iterator_, textio_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ModuleCtx:
+
+    # How many records, or chunks of raw data, there can be in a single batch
+    Default_Batch_Size = 1000
+
+    # How many characters of raw data there can be in a single chunk
+    Default_Chunk_Size = 1_000_000
+
+    # Parsers that need a stream of characters rather than individual lines
+    CSV_Parser = 'py:csv.reader'
+
+    # Parsers with any of these in their names will be given one XML element at a time
+    XML_Parser_Markers = ('xml', 'objectify', 'etree')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class StreamRecord:
+    """ A single record read from a file, or a chunk of its data if it is not parsed.
+    """
+    __slots__ = 'line_no', 'data', 'error'
+
+    def __init__(self, line_no:'int', data:'any_'=None, error:'str'='') -> 'None':
+        self.line_no = line_no
+        self.data = data
+        self.error = error
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class StreamBatch:
+    """ A batch of records that a file is split into. Each batch is delivered to callbacks separately.
+    """
+    def __init__(self, batch_no:'int') -> 'None':
+        self.batch_no = batch_no
+        self.is_last = False
+        self.data = [] # type: list
+        self.line_no_list = [] # type: list[int]
+        self.parse_error_list = [] # type: list[dict]
+
+    def add(self, record:'StreamRecord') -> 'None':
+        if record.error:
+            self.parse_error_list.append({'line_no': record.line_no, 'error': record.error})
+        else:
+            self.data.append(record.data)
+            self.line_no_list.append(record.line_no)
+
+    def __len__(self) -> 'int':
+        return len(self.data) + len(self.parse_error_list)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def iter_csv_records(f:'textio_') -> 'iterator_[StreamRecord]':
+    """ Returns rows of a CSV file. A row that cannot be parsed is reported and the rest of the file is still read.
+    """
+    reader = csv.reader(f)
+
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield StreamRecord(reader.line_num, error='CSV error: {}'.format(e))
+        else:
+            yield StreamRecord(reader.line_num, row)
+
+# ################################################################################################################################
+
+def iter_xml_records(f:'binaryio_', parser:'callable_') -> 'iterator_[StreamRecord]':
+    """ Returns each child of an XML document's root element, parsed with the channel's parser. Elements already returned
+    are removed from the tree, so the whole document is never in memory at once. An XML document that is not
+    well-formed cannot be read any further, so the first error found in it is the last record returned.
+    """
+    depth = 0
+
+    try:
+        for event, elem in etree.iterparse(f, events=('start', 'end')):
+
+            if event == 'start':
+                depth += 1
+                continue
+
+            depth -= 1
+
+            # We are interested only in the children of the root element
+            if depth != 1:
+                continue
+
+            line_no = elem.sourceline or 0
+
+            try:
+                data = parser(etree.tostring(elem))
+            except Exception:
+                yield StreamRecord(line_no, error=format_exc())
+            else:
+                yield StreamRecord(line_no, data)
+
+            # Free the memory taken by this element and all the ones before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    except etree.XMLSyntaxError as e:
+        yield StreamRecord(e.lineno or 0, error='XML error: {}'.format(e))
+
+# ################################################################################################################################
+
+def iter_line_records(f:'textio_', parser:'callable_') -> 'iterator_[StreamRecord]':
+    """ Parses each non-empty line of a file on its own, e.g. JSON Lines with py:json.loads.
+    """
+    for line_no, line in enumerate(f, 1):
+
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            data = parser(line)
+        except Exception:
+            yield StreamRecord(line_no, error=format_exc())
+        else:
+            yield StreamRecord(line_no, data)
+
+# ################################################################################################################################
+
+def iter_raw_records(f:'textio_', chunk_size:'int') -> 'iterator_[StreamRecord]':
+    """ Returns raw data of a file in chunks. Line numbers are the ones that each chunk starts with.
+    """
+    line_no = 1
+
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            return
+
+        yield StreamRecord(line_no, data)
+        line_no += data.count('\n')
+
+# ################################################################################################################################
+
+def iter_records(
+    config,      # type: any_
+    f,           # type: binaryio_
+    parser=None, # type: callable_ | None
+) -> 'iterator_[StreamRecord]':
+    """ Returns records from a binary file object, one by one, as configured for a file transfer channel.
+    """
+    parser_name = config.parse_with if config.should_parse_on_pickup else ''
+
+    # XML parsers read bytes on their own ..
+    if parser_name and any(elem in parser_name for elem in ModuleCtx.XML_Parser_Markers):
+        return iter_xml_records(f, parser) # type: ignore
+
+    # .. whereas everything else is decoded first.
+    text = TextIOWrapper(f, encoding=config.data_encoding, newline='' if parser_name == ModuleCtx.CSV_Parser else None)
+
+    if not parser_name:
+        chunk_size = int(config.get('stream_chunk_size') or ModuleCtx.Default_Chunk_Size)
+        return iter_raw_records(text, chunk_size)
+
+    elif parser_name == ModuleCtx.CSV_Parser:
+        return iter_csv_records(text)
+
+    else:
+        return iter_line_records(text, parser) # type: ignore
+
+# ################################################################################################################################
+
+def iter_batches(records:'iterator_[StreamRecord]', batch_size:'int') -> 'iterator_[StreamBatch]':
+    """ Groups records into batches of up to batch_size elements each. The last batch is marked as such,
+    which is why each batch is returned only after the first record of the next one has been read.
+    """
+    batch_no = 1
+    batch = StreamBatch(batch_no)
+
+    for record in records:
+
+        if len(batch) == batch_size:
+            yield batch
+            batch_no += 1
+            batch = StreamBatch(batch_no)
+
+        batch.add(record)
+
+    batch.is_last = True
+    yield batch
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -70,6 +70,10 @@ class ChannelHL7MLLPWrapper(Wrapper):
                 'logging_level': self.config.logging_level,
                 'should_log_messages': self.config.should_log_messages,
 
+                # Services that only need a few fields will receive messages indexed lazily instead of fully parsed ones
+                'should_parse_on_input': self.config.get('should_parse_on_input', True),
+                'should_validate': self.config.get('should_validate', True),
+
                 'start_seq': hex_sequence_to_bytes(self.config.start_seq),
                 'end_seq': hex_sequence_to_bytes(self.config.end_seq),
 
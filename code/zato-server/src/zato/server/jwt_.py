@@ -12,7 +12,9 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import uuid
 from contextlib import closing
 from datetime import datetime
+from hashlib import sha256
 from logging import getLogger
+from time import time
 
 # Bunch
 from bunch import bunchify, Bunch
@@ -29,10 +31,25 @@ from zato.server.jwt_cache import JWTCache
 
 # ################################################################################################################################
 
+if 0:
+    from zato.server.base.parallel import ParallelServer
+    from zato.server.connection.cache import Cache
+    Cache = Cache
+    ParallelServer = ParallelServer
+
+# ################################################################################################################################
+
 logger = getLogger(__name__)
 
 # ################################################################################################################################
 
+class ModuleCtx:
+
+    # How often, as a fraction of a token's TTL, its expiration time is renewed in ODB if it is found in the verified cache
+    ODB_Renew_Ratio = 0.5
+
+# ################################################################################################################################
+
 class AuthInfo:
     __slots__ = 'sec_def_id', 'sec_def_username', 'token'
 
@@ -51,7 +68,8 @@ class JWT:
 
 # ################################################################################################################################
 
-    def __init__(self, odb, decrypt_func, secret):
+    def __init__(self, odb, decrypt_func, secret, verified_cache=None, needs_odb=True):
+        # type: (object, object, bytes, Cache, bool) -> None
         self.odb = odb
         self.cache = JWTCache(odb)
         self.decrypt_func = decrypt_func
@@ -59,6 +77,34 @@ class JWT:
         self.secret = secret
         self.fernet = Fernet(self.secret)
 
+        # Tokens that have been already verified, keyed by their digests, with their decoded claims as values.
+        # This is a built-in cache which means that it is synchronized with other workers.
+        self.verified_cache = verified_cache
+
+        # Whether tokens are kept in ODB too. This matters only if there is a verified cache,
+        # because without it, ODB is the only place where the tokens can be kept. Note that the verified cache
+        # is synchronized among workers of a single server only, which means that if this is False,
+        # tokens are valid only in the server that issued them and they are lost when it restarts.
+        self.needs_odb = needs_odb if verified_cache is not None else True
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_server(server):
+        # type: (ParallelServer) -> JWT
+        """ Returns a new backend object using the configuration and verified cache of a given server.
+        """
+        worker_store = server.worker_store
+        return JWT(server.odb, server.decrypt, server.jwt_secret, worker_store.jwt_verified_cache, worker_store.jwt_needs_odb)
+
+# ################################################################################################################################
+
+    def _get_token_digest(self, token):
+        # type: (object) -> str
+        if not isinstance(token, bytes):
+            token = token.encode('utf8')
+        return sha256(token).hexdigest()
+
 # ################################################################################################################################
 
     def _lookup_jwt(self, username, password):
@@ -97,43 +143,108 @@ class JWT:
         2.a: If not valid, return nothing
         2.b: If valid:
             3. Create a new token
-            4. Cache the new token synchronously (we wait for it to be truly stored).
-            5. Return the token
+            4. Cache the new token synchronously (we wait for it to be truly stored), unless it is not to be kept in ODB.
+            5. Store the token in the verified cache, if there is one.
+            6. Return the token
         """
         item = self._lookup_jwt(username, password)
         if item:
             token = self._create_token(username=username, ttl=item.ttl)
-            self.cache.put(token, token, item.ttl, is_async=False)
+
+            # The verified cache is synchronized with other workers in background, which is why ODB is written to first
+            # and we wait for it - until the verified cache is in sync, other workers will find the token in ODB.
+            if self.needs_odb:
+                self.cache.put(token, token, item.ttl, is_async=False)
+
+            if self.verified_cache is not None:
+                self._set_verified(token, {'username': username, 'ttl': item.ttl})
+
             suffix = 's' if item.ttl > 1 else ''
             logger.info('New token generated for user `%s` with a TTL of `%i` second{}'.format(suffix), username, item.ttl)
 
             return AuthInfo(item.id, item.username, token)
 
+# ################################################################################################################################
+
+    def _set_verified(self, token, token_data):
+        # type: (object, dict) -> None
+        """ Stores decoded claims of a verified token in the verified cache, from which other workers will receive it too.
+        """
+        entry = {
+            'token_data': dict(token_data),
+            'odb_renewed_at': time(),
+        }
+        self.verified_cache.set(self._get_token_digest(token), entry, token_data['ttl']) # type: ignore
+
+# ################################################################################################################################
+
+    def _validate_token_data(self, expected_username, token, token_data):
+        # type: (str, object, Bunch) -> Bunch
+        if token_data.username == expected_username:
+            return Bunch(valid=True, token=token_data, raw_token=token)
+        else:
+            return Bunch(valid=False, message='Unexpected user for token found')
+
+# ################################################################################################################################
+
+    def _validate_verified(self, expected_username, token):
+        # type: (str, object) -> Bunch | None
+        """ Returns the result of a validation if a token is in the verified cache or None if it is not there.
+        """
+        entry = self.verified_cache.get(self._get_token_digest(token), None) # type: ignore
+        if not entry:
+            return None
+
+        token_data = bunchify(entry['token_data'])
+
+        # The verified cache extends expiration times on .get by itself but ODB needs to be told explicitly
+        # so we do it in background, though not more frequently than needed.
+        if self.needs_odb:
+            now = time()
+            if now - entry['odb_renewed_at'] > token_data.ttl * ModuleCtx.ODB_Renew_Ratio:
+                entry['odb_renewed_at'] = now
+                self.cache.put(token, token, token_data.ttl, is_async=True)
+
+        return self._validate_token_data(expected_username, token, token_data)
+
 # ################################################################################################################################
 
     def validate(self, expected_username, token):
         """ Check if the given token is (still) valid.
 
-        1. Look for the token in Cache without decrypting/decoding it.
-        2.a If not found, return "Invalid"
-        2.b If found:
-            3. decrypt
-            4. decode
-            5. renew the cache expiration asynchronously (do not wait for the update confirmation).
-            5. return "valid" + the token contents
+        1. If there is a verified cache and the token is in it, return its claims, without decrypting, decoding or using ODB.
+        2. Otherwise, look for the token in ODB without decrypting/decoding it.
+        3.a If not found, return "Invalid"
+        3.b If found:
+            4. decrypt
+            5. decode
+            6. store the claims in the verified cache, if there is one
+            7. renew the cache expiration asynchronously (do not wait for the update confirmation).
+            8. return "valid" + the token contents
         """
+        if self.verified_cache is not None:
+            result = self._validate_verified(expected_username, token)
+            if result:
+                return result
+
+            # If tokens are not kept in ODB, the verified cache is the only place that they can be in
+            if not self.needs_odb:
+                return Bunch(valid=False, message='Invalid token')
+
         if self.cache.get(token):
             decrypted = self.fernet.decrypt(token)
-            token_data = bunchify(jwt.decode(decrypted, self.secret))
+            token_data = bunchify(jwt.decode(decrypted, self.secret, algorithms=[self.ALGORITHM]))
 
             if token_data.username == expected_username:
 
+                # Other workers will not need to decrypt and decode it again
+                if self.verified_cache is not None:
+                    self._set_verified(token, token_data)
+
                 # Renew the token expiration
                 self.cache.put(token, token, token_data.ttl, is_async=True)
-                return Bunch(valid=True, token=token_data, raw_token=token)
 
-            else:
-                return Bunch(valid=False, message='Unexpected user for token found')
+            return self._validate_token_data(expected_username, token, token_data)
 
         else:
             return Bunch(valid=False, message='Invalid token')
@@ -141,8 +252,11 @@ class JWT:
 # ################################################################################################################################
 
     def delete(self, token):
-        """ Deletes a token in ODB.
+        """ Deletes a token in ODB and revokes it in all the workers, if there is a verified cache.
         """
+        if self.verified_cache is not None:
+            _ = self.verified_cache.delete(self._get_token_digest(token), raise_key_error=False)
+
         self.cache.delete(token)
 
 # ################################################################################################################################
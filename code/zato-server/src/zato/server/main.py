@@ -53,6 +53,7 @@ import yaml
 # Zato
 from zato.common.api import IPC, OS_Env, SERVER_STARTUP, TRACE1, ZATO_CRYPTO_WELL_KNOWN_DATA
 from zato.common.crypto.api import ServerCryptoManager
+from zato.common.crypto.hash_ import HashPool, ModuleCtx as HashPoolCtx
 from zato.common.ext.configobj_ import ConfigObj
 from zato.common.ipaddress_ import get_preferred_ip
 from zato.common.kvdb.api import KVDB
@@ -475,8 +476,19 @@ def run(base_dir:'str', start_gunicorn_app:'bool'=True, options:'dictnone'=None)
     server.stop_after = stop_after # type: ignore
     server.is_sso_enabled = server.fs_server_config.component_enabled.sso
     if server.is_sso_enabled:
+
+        # Passwords are hashed in a pool of threads so as not to block other greenlets
+        hash_secret_config = sso_config.hash_secret
+        server.hash_pool = HashPool(
+            crypto_manager,
+            int(hash_secret_config.get('pool_size') or HashPoolCtx.Default_Pool_Size),
+            int(hash_secret_config.get('max_queue_size', HashPoolCtx.Default_Max_Queue_Size)),
+            float(hash_secret_config.get('queue_timeout', HashPoolCtx.Default_Queue_Timeout)),
+            int(hash_secret_config.get('max_per_key', HashPoolCtx.Default_Max_Per_Key)),
+        )
+
         server.sso_api = SSOAPI(server, sso_config, cast_('callable_', None), crypto_manager.encrypt, server.decrypt,
-            crypto_manager.hash_secret, crypto_manager.verify_hash, new_user_id)
+            server.hash_pool.hash_secret, server.hash_pool.verify_hash, new_user_id, server.hash_pool.needs_rehash)
 
     if scheduler_api_password := server.fs_server_config.scheduler.get('scheduler_api_password'):
         if is_encrypted(scheduler_api_password):
@@ -9,10 +9,11 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 # stdlib
+from contextlib import contextmanager
 from logging import getLogger
 
 # simple-rbac
-from rbac.acl import Registry as _Registry
+from rbac.acl import get_family, Registry as _Registry
 
 # gevent
 from gevent.lock import RLock
@@ -77,6 +78,22 @@ class Registry(_Registry):
 
 # ################################################################################################################################
 
+class DecisionTable:
+    """ RBAC decisions for all clients flattened upfront. Once created, a table is never modified - any change to RBAC
+    results in a new one that replaces the previous one in a single assignment, which is why it can be read without locks.
+    """
+    __slots__ = 'allowed', 'clients'
+
+    def __init__(self, allowed=None, clients=None):
+
+        # (client_def, perm_id, resource) -> True, for all the allowed combinations only
+        self.allowed = allowed or {}
+
+        # (perm_id, resource) -> a tuple of client_defs allowed to use that permission for that resource
+        self.clients = clients or {}
+
+# ################################################################################################################################
+
 class RBAC:
     def __init__(self):
         self.registry = Registry(self._delete_callback)
@@ -88,11 +105,144 @@ class RBAC:
         self.client_def_to_role_id = {}
         self.role_id_to_client_def = {}
 
+        # Consulted by all the run-time checks and replaced as a whole each time RBAC changes
+        self.decisions = DecisionTable()
+
+        # client_def -> a frozenset of (perm_id, resource) that the client is allowed, i.e. what each table was built from
+        self._client_perms = {}
+
+        # Set while many changes are being applied, e.g. on startup, in which case the table is built once, afterwards
+        self._in_bulk_update = False
+
 # ################################################################################################################################
 
     def __repr__(self):
         return make_repr(self)
 
+# ################################################################################################################################
+
+    @contextmanager
+    def bulk_update(self):
+        """ Applies all the changes made within the block and builds the decision table only once they are all in.
+        """
+        with self.update_lock:
+            self._in_bulk_update = True
+            try:
+                yield
+            finally:
+                self._in_bulk_update = False
+                self._rebuild_decisions()
+
+# ################################################################################################################################
+
+    def _get_role_clients(self, role_id):
+        """ Returns all the clients that have a given role, either directly or through any of the role's parents.
+        """
+        out = set()
+
+        for family_role_id in get_family(self.registry._children, role_id):
+            out.update(self.role_id_to_client_def.get(family_role_id, []))
+
+        return out
+
+# ################################################################################################################################
+
+    def _get_rules_by_role(self):
+        """ Returns (allowed, denied) dicts of role -> a list of (perm_id, resource) tuples found in the registry.
+        """
+        allowed = {}
+        denied = {}
+
+        for source, target in ((self.registry._allowed, allowed), (self.registry._denied, denied)):
+            for role_id, perm_id, resource in source:
+                target.setdefault(role_id, []).append((perm_id, resource))
+
+        return allowed, denied
+
+# ################################################################################################################################
+
+    def _get_client_perms(self, client_def, allowed, denied):
+        """ Resolves role hierarchies of a client and returns all the (perm_id, resource) combinations it is allowed,
+        using the same rules that the registry's is_any_allowed method does, i.e. a denial by any role wins.
+        """
+        client_allowed = set()
+        client_denied = set()
+
+        for role_id in self.client_def_to_role_id.get(client_def, []):
+
+            # A role may have been deleted along with its parent
+            if role_id not in self.registry._roles:
+                continue
+
+            for family_role_id in get_family(self.registry._roles, role_id):
+                client_allowed.update(allowed.get(family_role_id, []))
+                client_denied.update(denied.get(family_role_id, []))
+
+        return frozenset(client_allowed - client_denied)
+
+# ################################################################################################################################
+
+    def _update_decisions(self, client_defs):
+        """ Computes what each of the input clients is now allowed and applies the differences to a copy of the current table,
+        which then replaces it. Must be called with self.update_lock held.
+        """
+        if self._in_bulk_update:
+            return
+
+        allowed, denied = self._get_rules_by_role()
+
+        new_allowed = dict(self.decisions.allowed)
+        new_clients = dict(self.decisions.clients)
+
+        # (perm_id, resource) -> a set of client_defs, for each combination that any of the clients gained or lost
+        changed = {}
+
+        for client_def in client_defs:
+
+            old_perms = self._client_perms.get(client_def, frozenset())
+            new_perms = self._get_client_perms(client_def, allowed, denied)
+
+            if new_perms:
+                self._client_perms[client_def] = new_perms
+            else:
+                _ = self._client_perms.pop(client_def, None)
+
+            for key in old_perms - new_perms:
+                del new_allowed[(client_def,) + key]
+                if key not in changed:
+                    changed[key] = set(new_clients.get(key, ()))
+                changed[key].discard(client_def)
+
+            for key in new_perms - old_perms:
+                new_allowed[(client_def,) + key] = True
+                if key not in changed:
+                    changed[key] = set(new_clients.get(key, ()))
+                changed[key].add(client_def)
+
+        for key, clients in changed.items():
+            if clients:
+                new_clients[key] = tuple(sorted(clients))
+            else:
+                _ = new_clients.pop(key, None)
+
+        self.decisions = DecisionTable(new_allowed, new_clients)
+
+# ################################################################################################################################
+
+    def _rebuild_decisions(self):
+        """ Builds the decision table from scratch, for all the clients.
+        """
+        self.decisions = DecisionTable()
+        self._client_perms.clear()
+        self._update_decisions(list(self.client_def_to_role_id))
+
+# ################################################################################################################################
+
+    def _update_role_decisions(self, role_id, extra_client_defs=None):
+        client_defs = self._get_role_clients(role_id)
+        client_defs.update(extra_client_defs or [])
+        self._update_decisions(client_defs)
+
 # ################################################################################################################################
 
     def create_permission(self, id, name):
@@ -109,6 +259,7 @@ class RBAC:
         with self.update_lock:
             del self.permissions[id]
             self.registry.delete_from_permissions('operation', id)
+            self._rebuild_decisions()
 
     def set_http_permissions(self):
         """ Maps HTTP verbs to CRUD permissions.
@@ -144,16 +295,27 @@ class RBAC:
     def create_role(self, id, name, parent_id):
         with self.update_lock:
             self._rbac_create_role(id, name, parent_id)
+            self._update_role_decisions(id)
 
     def edit_role(self, id, old_name, name, parent_id):
         with self.update_lock:
+
+            # Clients of the role may lose permissions from its previous parent
+            client_defs = self._get_role_clients(id)
+
             self._rbac_delete_role(id, old_name)
             self.registry._roles[id].clear() # Roles can have one parent only
             self._rbac_create_role(id, name, parent_id)
+            self._update_role_decisions(id, client_defs)
 
     def delete_role(self, id, name):
         with self.update_lock:
+
+            # Children are deleted too so their clients need to be found before that happens
+            client_defs = self._get_role_clients(id)
+
             self.registry.delete_role(id)
+            self._update_decisions(client_defs)
 
 # ################################################################################################################################
 
@@ -165,11 +327,13 @@ class RBAC:
 
             self.client_def_to_role_id.setdefault(client_def, []).append(role_id)
             self.role_id_to_client_def.setdefault(role_id, []).append(client_def)
+            self._update_decisions([client_def])
 
     def delete_client_role(self, client_def, role_id):
         with self.update_lock:
             self.client_def_to_role_id[client_def].remove(role_id)
             self.role_id_to_client_def[role_id].remove(client_def)
+            self._update_decisions([client_def])
 
     def wait_for_client_role(self, role_id):
         wait_for_dict_key(self.role_id_to_name, role_id)
@@ -183,24 +347,29 @@ class RBAC:
     def delete_resource(self, resource):
         with self.update_lock:
             self.registry.delete_resource(resource)
+            self._rebuild_decisions()
 
 # ################################################################################################################################
 
     def create_role_permission_allow(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.allow(role_id, perm_id, resource)
+            self._update_role_decisions(role_id)
 
     def create_role_permission_deny(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.deny(role_id, perm_id, resource)
+            self._update_role_decisions(role_id)
 
     def delete_role_permission_allow(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.delete_allow((role_id, perm_id, resource))
+            self._update_role_decisions(role_id)
 
     def delete_role_permission_deny(self, role_id, perm_id, resource):
         with self.update_lock:
             self.registry.delete_deny((role_id, perm_id, resource))
+            self._update_role_decisions(role_id)
 
 # ################################################################################################################################
 
@@ -213,12 +382,16 @@ class RBAC:
         """ Returns True/False depending on whether a given client is allowed to obtain a selected permission for a resource.
         All of the client's roles are consulted and if any is allowed, True is returned. If none is, False is returned.
         """
-        roles = self.client_def_to_role_id.get(client_def, ZATO_NONE)
-        return self.registry.is_any_allowed(roles, perm_id, resource) if roles != ZATO_NONE else False
+        return self.decisions.allowed.get((client_def, perm_id, resource), False)
 
     def is_http_client_allowed(self, client_def, http_verb, resource):
         """ Same as is_client_allowed but accepts a HTTP verb rather than a permission ID.
         """
         return self.is_client_allowed(client_def, self.http_permissions[http_verb], resource)
 
+    def get_allowed_clients(self, perm_id, resource, _empty=()):
+        """ Returns all the clients that are allowed to obtain a selected permission for a resource.
+        """
+        return self.decisions.clients.get((perm_id, resource), _empty)
+
 # ################################################################################################################################
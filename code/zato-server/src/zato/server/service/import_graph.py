@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import ast
+import logging
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, callable_, strlist, strset
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_imported_names(mod_name:'str', source:'str') -> 'strset':
+    """ Returns names of all the modules that the source code of a module imports. In `from a.b import c`,
+    both a.b and a.b.c are returned because c may be a module on its own. Relative imports are resolved against mod_name.
+    """
+    out = set() # type: strset
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        logger.info('Could not parse module `%s` to find its imports', mod_name)
+        return out
+
+    package_parts = mod_name.split('.')[:-1]
+
+    for node in ast.walk(tree):
+
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                out.add(alias.name)
+
+        elif isinstance(node, ast.ImportFrom):
+
+            # .. e.g. from .utils import x ..
+            if node.level:
+                base_parts = package_parts[:len(package_parts) - node.level + 1]
+                if node.module:
+                    base_parts = base_parts + [node.module]
+                base = '.'.join(base_parts)
+
+            # .. e.g. from utils import x ..
+            else:
+                base = node.module or ''
+
+            if base:
+                out.add(base)
+
+            for alias in node.names:
+                if alias.name != '*':
+                    out.add('{}.{}'.format(base, alias.name) if base else alias.name)
+
+    return out
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ImportGraph:
+    """ A reverse-import graph of deployed modules, i.e. for each module name, the paths to modules that import it.
+    Modules are added as their services or models are deployed but their source code is parsed only when the graph
+    is queried for the first time afterwards, which means that a server starting up does not parse anything
+    until a module is hot-deployed.
+    """
+    def __init__(self) -> 'None':
+
+        # Path -> name of the module under that path
+        self.path_to_mod_name = {} # type: dict[str, str]
+
+        # Path -> names of the modules that a given module imports
+        self.imports = {} # type: dict[str, strset]
+
+        # Module name -> paths to modules that import it
+        self.importers = {} # type: dict[str, strset]
+
+        # Path -> (module name, source code or a function returning it) of modules that have not been parsed yet
+        self._pending = {} # type: dict[str, tuple[str, str | callable_]]
+
+        # Path -> hash of the source code that the current information about a module was built from
+        self._source_hashes = {} # type: dict[str, any_]
+
+# ################################################################################################################################
+
+    def update(self, path:'str', mod_name:'str', source:'str | callable_', source_hash:'any_'=None) -> 'None':
+        """ Schedules a module to be (re-)indexed, unless its source code is the same as the last time.
+        Modules with multiple services or models are given to us once per each but only the first call matters.
+        The source code may be a function returning it, in which case it is called only when the module is parsed,
+        and its hash should be given on input.
+        """
+        source_hash = source_hash if source_hash is not None else hash(source)
+
+        if self._source_hashes.get(path) == source_hash and self.path_to_mod_name.get(path) == mod_name:
+            return
+
+        self._source_hashes[path] = source_hash
+        self.path_to_mod_name[path] = mod_name
+        self._pending[path] = (mod_name, source)
+
+# ################################################################################################################################
+
+    def _unlink(self, path:'str') -> 'None':
+        for name in self.imports.pop(path, ()):
+            paths = self.importers.get(name)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self.importers[name]
+
+# ################################################################################################################################
+
+    def _index_pending(self) -> 'None':
+
+        while self._pending:
+            path, (mod_name, source) = self._pending.popitem()
+
+            if callable(source):
+                try:
+                    source = source()
+                except Exception as e:
+                    logger.info('Could not read source code of `%s` (%s); e:`%s`', path, mod_name, e)
+                    source = ''
+
+            # Forget what the module imported previously ..
+            self._unlink(path)
+
+            # .. and record what it imports now.
+            names = get_imported_names(mod_name, source)
+            self.imports[path] = names
+
+            for name in names:
+                self.importers.setdefault(name, set()).add(path)
+
+# ################################################################################################################################
+
+    def remove(self, path:'str') -> 'None':
+        """ Removes all the information about a module, e.g. because its file was deleted.
+        """
+        _ = self._pending.pop(path, None)
+        _ = self._source_hashes.pop(path, None)
+        _ = self.path_to_mod_name.pop(path, None)
+        self._unlink(path)
+
+# ################################################################################################################################
+
+    def _get_direct_importers(self, mod_name:'str') -> 'strset':
+        return self.importers.get(mod_name) or set()
+
+# ################################################################################################################################
+
+    def get_importers(self, mod_name:'str', transitive:'bool'=False) -> 'strlist':
+        """ Returns paths to modules that import the one given on input. If transitive is True, modules that import
+        the importers are returned too, in a topological order, i.e. each module is returned only after
+        all the modules it imports that are also being returned.
+        """
+        self._index_pending()
+
+        if not transitive:
+            return sorted(self._get_direct_importers(mod_name))
+
+        # Paths of all the modules that depend on the input one, directly or not, in a reverse topological order
+        out = [] # type: strlist
+        visited = set() # type: strset
+
+        # Pairs of (path, is_exit) - a module is added to out only when it is exited, i.e. after all of its dependents
+        stack = [(path, False) for path in sorted(self._get_direct_importers(mod_name), reverse=True)]
+
+        while stack:
+            path, is_exit = stack.pop()
+
+            # .. all the dependents of this module have been returned so we can return the module itself ..
+            if is_exit:
+                out.append(path)
+                continue
+
+            # .. each module is visited only once, which also means that import cycles are broken here ..
+            if path in visited:
+                continue
+
+            visited.add(path)
+            stack.append((path, True))
+
+            if importer_mod_name := self.path_to_mod_name.get(path):
+                for importer in sorted(self._get_direct_importers(importer_mod_name), reverse=True):
+                    if importer not in visited:
+                        stack.append((importer, False))
+
+        # Dependents were collected before the modules they depend on so we need to reverse them ..
+        out.reverse()
+
+        # .. and the input module itself may have been reached through an import cycle, which we ignore.
+        out = [path for path in out if self.path_to_mod_name.get(path) != mod_name]
+
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
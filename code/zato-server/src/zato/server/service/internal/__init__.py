@@ -44,7 +44,8 @@ class SearchTool:
     """ Optionally attached to each internal service returning a list of results responsible for extraction
     and serialization of search criteria.
     """
-    _search_attrs = 'num_pages', 'cur_page', 'prev_page', 'next_page', 'has_prev_page', 'has_next_page', 'page_size', 'total'
+    _search_attrs = 'num_pages', 'cur_page', 'prev_page', 'next_page', 'has_prev_page', 'has_next_page', 'page_size', 'total', \
+        'next_cursor'
 
     def __init__(self, *criteria):
         self.criteria = criteria
@@ -64,7 +65,8 @@ class AdminSIO:
 # ################################################################################################################################
 
 class GetListAdminSIO:
-    input_optional = (Int('cur_page'), Bool('paginate'), 'query')
+    input_optional = (Int('cur_page'), Bool('paginate'), 'query', 'cursor', Bool('use_cursor'), Bool('cursor_desc'),
+        'total_mode')
 
 # ################################################################################################################################
 
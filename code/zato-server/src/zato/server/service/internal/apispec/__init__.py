@@ -7,6 +7,7 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
+from http.client import NOT_MODIFIED
 from io import StringIO
 from itertools import chain
 from json import dumps
@@ -20,6 +21,7 @@ from zato.server.apispec.spec.openapi import OpenAPIGenerator
 from zato.server.service import List, Opaque, Service
 
 # Zato
+from zato.common.api import URL_TYPE
 from zato.common.ext.dataclasses import asdict
 from zato.common.util.eval_ import as_list
 from zato.common.util.file_system import fs_safe_name
@@ -83,7 +85,8 @@ class GetAPISpec(Service):
             needs_sphinx = True
 
         data = Generator(self.server.service_store.services, self.server.sio_config,
-            include, exclude, self.request.input.query, self.request.input.tags).get_info()
+            include, exclude, self.request.input.query, self.request.input.tags,
+            cache=self.server.service_store.apispec_cache).get_info()
 
         if needs_sphinx:
             out = self.invoke(GetSphinx.get_name(), {
@@ -134,7 +137,8 @@ class GetSphinx(Service):
 
         data = bunchify(data)
         channel_data = self.server.worker_store.request_dispatcher.url_data.channel_data
-        generator = OpenAPIGenerator(data, channel_data, needs_api_invoke, needs_rest_channels, api_invoke_path)
+        generator = OpenAPIGenerator(data, channel_data, needs_api_invoke, needs_rest_channels, api_invoke_path,
+            cache=self.server.service_store.apispec_cache)
         return generator.generate()
 
 # ################################################################################################################################
@@ -194,11 +198,14 @@ class GetSphinx(Service):
         # The table is within a 'table' block which is why it needs to be indented
         len_table_indent = 3
 
+        # Elements may be cached between invocations so they cannot be modified, hence names are kept here
+        name_sphinx = {}
+
         # Find the longest elements for each column
         for elem in chain(input, output):
-            elem.name_sphinx = elem.name.replace('_', '\_') # Sphinx treats _ as hyperlinks # noqa: W605
+            name_sphinx[elem.name] = elem.name.replace('_', '\_') # Sphinx treats _ as hyperlinks # noqa: W605
 
-            len_elem_name_sphinx = len(elem.name_sphinx)
+            len_elem_name_sphinx = len(name_sphinx[elem.name])
             len_elem_subtype     = len(elem.subtype)
             len_elem_description = len(elem.description)
 
@@ -223,14 +230,12 @@ class GetSphinx(Service):
 
         for elem in chain(input, output):
 
-            elem.description = elem.description.replace('\n', new_line_with_indent)
-
             sio_lines.append(bunchify({
-                'name': elem.name_sphinx,
+                'name': name_sphinx[elem.name],
                 'datatype': elem.subtype + (list_suffix if elem.is_list else ''),
                 'is_required': elem.is_required,
                 'is_required_str': 'Yes' if elem.is_required else no_value,
-                'description': elem.description,
+                'description': elem.description.replace('\n', new_line_with_indent),
             }))
 
         longest_name += len_col_sep
@@ -439,3 +444,82 @@ class GetSphinx(Service):
         self.response.payload.data = files
 
 # ################################################################################################################################
+
+class GetOpenAPI(Service):
+    """ Returns an OpenAPI specification in YAML or JSON, either for all services or only for the ones mounted
+    on a given channel. Specifications are cached until any of the services or models they describe is deployed again,
+    and if the caller already has the current one, as indicated by an ETag, nothing is returned.
+    """
+    class SimpleIO:
+        input_optional = ('query', Bool('return_internal'), 'include', 'exclude', 'needs_api_invoke', 'needs_rest_channels',
+            'api_invoke_path', AsIs('tags'), 'channel_name', 'data_format', 'if_none_match')
+
+    def _get_channel_data(self, channel_name):
+        """ Returns all the plain HTTP channels or, if a name is given, the only one of that name.
+        """
+        channel_data = self.server.worker_store.request_dispatcher.url_data.channel_data
+        out = []
+
+        for item in channel_data:
+            if item['transport'] == URL_TYPE.PLAIN_HTTP:
+                if (not channel_name) or item['name'] == channel_name:
+                    out.append(item)
+
+        if channel_name and not out:
+            raise ValueError('No such channel `{}`'.format(channel_name))
+
+        return out
+
+    def handle(self):
+
+        input = self.request.input
+        cache = self.server.service_store.apispec_cache
+
+        channel_name = input.get('channel_name')
+        channel_data = self._get_channel_data(channel_name)
+
+        # Only the services that the channel is mounted on are described and only the services' schemas are visited,
+        # without going through any other services ..
+        if channel_name:
+            include = [item['service_name'] for item in channel_data]
+            exclude = []
+            needs_api_invoke = False
+            needs_rest_channels = True
+            api_invoke_path = []
+
+        # .. otherwise, the input decides what is described.
+        else:
+            include = [elem for elem in as_list(input.include, ',') if elem] or ['*']
+            exclude = [elem for elem in as_list(input.exclude, ',') if elem]
+
+            if not input.get('return_internal'):
+                if 'zato.*' not in exclude:
+                    exclude.append('zato.*')
+
+            needs_api_invoke = input.get('needs_api_invoke')
+            needs_rest_channels = input.get('needs_rest_channels')
+            api_invoke_path = [elem for elem in as_list(input.api_invoke_path, ',') if elem]
+
+        data = Generator(self.server.service_store.services, self.server.sio_config,
+            include, exclude, input.query, input.tags, needs_sio_desc=False, cache=cache).get_info()
+
+        generator = OpenAPIGenerator(data, channel_data, needs_api_invoke, needs_rest_channels, api_invoke_path, cache=cache)
+        rendered = generator.generate_rendered()
+
+        self.response.headers['ETag'] = rendered.etag
+
+        # The caller already has the current specification
+        if_none_match = input.get('if_none_match') or self.wsgi_environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match == rendered.etag:
+            self.response.status_code = NOT_MODIFIED
+            self.response.payload = ''
+            return
+
+        if input.get('data_format') == 'json':
+            self.response.content_type = 'application/json'
+            self.response.payload = rendered.json
+        else:
+            self.response.content_type = 'application/yaml'
+            self.response.payload = rendered.yaml
+
+# ################################################################################################################################
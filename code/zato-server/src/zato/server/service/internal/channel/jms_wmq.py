@@ -15,6 +15,9 @@ from traceback import format_exc
 # Arrow
 from arrow import get as arrow_get
 
+# gevent
+from gevent import spawn
+
 # Python 2/3 compatibility
 from zato.common.py23_ import pickle_loads
 
@@ -227,10 +230,30 @@ class Delete(AdminService):
 # ################################################################################################################################
 
 class OnMessageReceived(Service):
-    """ A callback service invoked by WebSphere connectors for each taken off a queue.
+    """ A callback service invoked by WebSphere connectors for each message, or a batch of messages, taken off a queue.
+    Connectors commit messages after this service returns, which is why a batch is confirmed as soon as it is received
+    and its messages are handled in background - otherwise, a batch whose handling took longer than the connector waits
+    for would be backed out, and delivered again, even though its messages have already been handled.
     """
-    def handle(self, _channel=CHANNEL.IBM_MQ, ts_format='YYYYMMDDHHmmssSS'):
+    def handle(self):
         request = loads(self.request.raw_request)
+
+        # A batch of messages is handled concurrently and in background, as separate requests would be ..
+        if 'msg_list' in request:
+            for elem in request['msg_list']:
+                _ = spawn(self._on_message_in_batch, elem)
+
+        # .. whereas a single message is handled directly.
+        else:
+            self._on_message(request)
+
+    def _on_message_in_batch(self, request):
+        try:
+            self._on_message(request)
+        except Exception:
+            self.logger.warning('Could not handle IBM MQ message from `%s` -> `%s`', request.get('queue_name'), format_exc())
+
+    def _on_message(self, request, _channel=CHANNEL.IBM_MQ, ts_format='YYYYMMDDHHmmssSS'):
         msg = request['msg']
         service_name = request['service_name']
 
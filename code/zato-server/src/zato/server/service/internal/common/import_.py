@@ -11,6 +11,7 @@ from contextlib import closing
 from copy import deepcopy
 from dataclasses import dataclass
 from json import dumps
+from traceback import format_exc
 
 # SQLAlchemy
 from sqlalchemy import insert
@@ -534,3 +535,38 @@ class ImportObjects(Service):
 
 # ################################################################################################################################
 # ################################################################################################################################
+
+class ImportObjectList(Service):
+    """ Invokes the same create or edit service for each object from a list so that clients, such as enmasse,
+    do not need to make a separate call for each object. Stops on the first object that could not be imported.
+    """
+    name = 'zato.common.import-object-list'
+
+    def handle(self):
+
+        request = self.request.raw_request
+
+        service_name = request['service_name']
+        object_list = request['object_list'] # type: dictlist
+
+        # Response for each object, in the same order as on input
+        out = []
+
+        for item in object_list:
+
+            try:
+                response = self.invoke(service_name, item, skip_response_elem=True)
+            except Exception:
+                details = format_exc()
+                self.logger.warning('Could not import `%s` with `%s` -> %s', item.get('name'), service_name, details)
+                out.append({'name': item.get('name'), 'ok': False, 'data': None, 'details': details})
+                break
+            else:
+                out.append({'name': item.get('name'), 'ok': True, 'data': response, 'details': ''})
+
+        self.logger.info('Imported %s/%s object(s) with `%s`', len(out), len(object_list), service_name)
+
+        self.response.payload = {'object_list': out}
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -14,7 +14,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from errno import ENOENT
 from json import loads
-from time import sleep
+from time import monotonic, sleep
 from traceback import format_exc
 
 # Zato
@@ -41,6 +41,10 @@ if 0:
 MAX_BACKUPS = 1000
 _first_prefix = '0' * (len(str(MAX_BACKUPS)) - 1) # So it runs from, e.g.,  000 to 999
 
+# For how many seconds a module scheduled for redeployment because of its dependencies is not expected
+# to schedule its own dependents, which have been already scheduled along with it.
+DEPENDENTS_SCHEDULED_TTL = 60
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -160,15 +164,32 @@ class Create(AdminService):
 
     def _redeploy_module_dependencies(self, file_name:'str') -> 'None':
 
+        # Local aliases
+        service_store = self.server.service_store
+
         # Reload the module so its newest contents is in sys path ..
         mod_info = import_module_by_path(file_name)
 
         # .. we enter here if the reload succeeded ..
         if mod_info:
 
-            # .. get all the files with that are making use of this module ..
-            # .. which may mean both files with services or models ..
-            file_name_list = self.server.service_store.get_module_importers(mod_info.name)
+            now = monotonic()
+
+            with service_store.update_lock:
+
+                # .. if this module is being redeployed only because something that it imports changed,
+                # .. all of its own dependents have been already scheduled for redeployment too ..
+                scheduled_at = service_store.dependents_scheduled.pop(file_name, None)
+                if scheduled_at is not None and now - scheduled_at < DEPENDENTS_SCHEDULED_TTL:
+                    return
+
+                # .. get all the files, with services or models, that are making use of this module,
+                # .. directly or not, in the order in which they should be redeployed ..
+                file_name_list = service_store.get_module_importers(mod_info.name, transitive=True)
+
+                # .. note that all of them are about to be redeployed ..
+                for item in file_name_list:
+                    service_store.dependents_scheduled[item] = now
 
             # .. and redeploy all such files.
             touch_multiple(file_name_list)
@@ -187,12 +208,6 @@ class Create(AdminService):
         # .. extract unique names only ..
         model_name_list = {item.name for item in model_info_list}
 
-        # .. if we have deployed any models ..
-        if model_name_list:
-
-            # .. redeploy all the modules that depend on the one we have just deployed ..
-            self._redeploy_module_dependencies(model_file_name)
-
         # .. and return to the caller the list of models deployed.
         return model_name_list
 
@@ -218,9 +233,6 @@ class Create(AdminService):
             # .. append it for later use ..
             service_id_list.append(service_id)
 
-            # .. redeploy all the modules that depend on the one we have just deployed ..
-            self._redeploy_module_dependencies(service.source_code_info.path)
-
         # .. and return to the caller the list of IDs of all the services deployed.
         return service_id_list
 
@@ -241,6 +253,11 @@ class Create(AdminService):
         model_name_list = self._deploy_models(current_work_dir, file_name)
         service_id_list = self._deploy_services(current_work_dir, file_name)
 
+        # Redeploy all the modules that depend on the one we have just deployed. This is done once per file,
+        # no matter how many models or services were in it.
+        if model_name_list or service_id_list:
+            self._redeploy_module_dependencies(file_name)
+
         ctx = DeploymentCtx()
         ctx.model_name_list = model_name_list # type: ignore
         ctx.service_id_list = service_id_list
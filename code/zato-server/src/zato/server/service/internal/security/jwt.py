@@ -246,7 +246,7 @@ class LogIn(Service):
     def handle(self, _sec_type=SEC_DEF_TYPE.JWT):
 
         try:
-            auth_info = JWTBackend(self.odb, self.server.decrypt, self.server.jwt_secret).authenticate(
+            auth_info = JWTBackend.from_server(self.server).authenticate(
                 self.request.input.username, self.server.decrypt(self.request.input.password))
 
             if auth_info:
@@ -290,7 +290,7 @@ class LogOut(Service):
             self.response.payload.result = 'No JWT found'
 
         try:
-            JWTBackend(self.odb, self.server.decrypt, self.server.jwt_secret).delete(token)
+            JWTBackend.from_server(self.server).delete(token)
         except Exception:
             self.logger.warning(format_exc())
             self.response.status_code = BAD_REQUEST
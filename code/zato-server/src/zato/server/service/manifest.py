@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import inspect
+import logging
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+from traceback import format_exc
+
+# Zato
+from zato.common.api import SourceCodeInfo
+from zato.common.json_internal import dumps, loads
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict, stranydict
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ModuleCtx:
+
+    # Bump it up each time the structure of the manifest changes, which will invalidate all the existing ones
+    Version = 1
+
+    File_Name = 'deployment-manifest.json'
+    Hash_Method = 'SHA-256'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ModuleEntry:
+    """ What we know about a single module with services, as of the last time it was deployed.
+    """
+    __slots__ = 'path', 'mtime_ns', 'size', 'hash', 'hash_method', 'source_path', 'line_numbers', 'services'
+
+    def __init__(self) -> 'None':
+        self.path = ''
+        self.mtime_ns = 0
+        self.size = 0
+        self.hash = ''
+        self.hash_method = ModuleCtx.Hash_Method
+        self.source_path = ''
+        self.line_numbers = {} # type: stranydict
+        self.services = []     # type: list[str]
+
+# ################################################################################################################################
+
+    def to_dict(self) -> 'stranydict':
+        return {
+            'mtime_ns': self.mtime_ns,
+            'size': self.size,
+            'hash': self.hash,
+            'hash_method': self.hash_method,
+            'source_path': self.source_path,
+            'line_numbers': self.line_numbers,
+            'services': self.services,
+        }
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_dict(path:'str', data:'anydict') -> 'ModuleEntry':
+        out = ModuleEntry()
+        out.path = path
+        out.mtime_ns = data['mtime_ns']
+        out.size = data['size']
+        out.hash = data['hash']
+        out.hash_method = data['hash_method']
+        out.source_path = data['source_path']
+        out.line_numbers = data['line_numbers']
+        out.services = data['services']
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LazySourceCodeInfo(SourceCodeInfo):
+    """ Describes a module that did not change since it was recorded in the manifest. Everything but its source code
+    is known upfront and the source code itself is read from disk only if anything asks for it.
+    """
+    __slots__ = '_source', '_file_name'
+
+    def __init__(self, file_name:'str') -> 'None':
+        super().__init__()
+        self._file_name = file_name
+        self._source = None # type: bytes | None
+
+    @property
+    def source(self) -> 'bytes':
+        if self._source is None:
+            with open(self._file_name, 'rb') as f:
+                self._source = f.read()
+        return self._source
+
+    @source.setter
+    def source(self, value:'bytes') -> 'None':
+        self._source = value
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DeploymentManifest:
+    """ A persistent record of modules with services, their modification times, sizes, hashes and the services they contain.
+    A module whose modification time and size did not change since it was recorded does not need to be analysed again,
+    i.e. its hash is not computed and the line numbers of its classes are not looked up.
+    """
+    def __init__(self, path:'str', server_id:'int'=0) -> 'None':
+
+        # Where the manifest is kept on disk
+        self.path = path
+
+        # The manifest is valid for one server only
+        self.server_id = server_id
+
+        # All the modules that we know about, keyed by their paths
+        self.modules = {} # type: dict[str, ModuleEntry]
+
+        # Whether the manifest was loaded from disk and matches our server
+        self.is_warm = False
+
+        # Sources of modules read during the current deployment, so that each module is read only once
+        # even if it contains multiple services. Modules that did not change are not read at all.
+        self._sources = {} # type: dict[str, bytes]
+
+        # Paths to all the modules visited during the current deployment, whether they changed or not
+        self._visited = set() # type: set[str]
+
+        # Counters of how many modules had to be analysed and how many were found unchanged
+        self.total_analysed = 0
+        self.total_unchanged = 0
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_base_dir(base_dir:'str', server_id:'int'=0) -> 'DeploymentManifest':
+        """ Returns a manifest kept in the same directory that the internal services cache is in.
+        """
+        path = os.path.join(base_dir, 'config', 'repo', ModuleCtx.File_Name)
+        manifest = DeploymentManifest(path, server_id)
+        manifest.load()
+        return manifest
+
+# ################################################################################################################################
+
+    def load(self) -> 'bool':
+        """ Loads the manifest from disk and returns True if it can be used, False otherwise.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = loads(f.read())
+        except Exception:
+            logger.info('Ignoring invalid deployment manifest `%s`; e:`%s`', self.path, format_exc())
+            return False
+
+        # Ignore manifests from other versions or other servers
+        if data.get('version') != ModuleCtx.Version or data.get('server_id') != self.server_id:
+            logger.info('Ignoring stale deployment manifest `%s`', self.path)
+            return False
+
+        for path, entry in data['modules'].items():
+            self.modules[path] = ModuleEntry.from_dict(path, entry)
+
+        self.is_warm = True
+        return True
+
+# ################################################################################################################################
+
+    def save(self) -> 'None':
+        """ Saves the manifest to disk, atomically replacing the previous one, if any.
+        """
+        dir_name = os.path.dirname(self.path)
+
+        # We may be running in an environment that does not have a repository directory, e.g. in tests
+        if not os.path.isdir(dir_name):
+            return
+
+        # There is no need to keep track of what has been already deleted
+        self.prune()
+
+        data = {
+            'version': ModuleCtx.Version,
+            'server_id': self.server_id,
+            'modules': {path: entry.to_dict() for path, entry in self.modules.items()},
+        }
+
+        try:
+            with NamedTemporaryFile('wb', dir=dir_name, delete=False) as f:
+                _ = f.write(dumps(data).encode('utf8'))
+            os.replace(f.name, self.path)
+        except Exception:
+            logger.warning('Could not save deployment manifest `%s`; e:`%s`', self.path, format_exc())
+
+# ################################################################################################################################
+
+    def is_unchanged(self, file_name:'str') -> 'bool':
+        """ Returns True if a module was not modified since the last time it was recorded in the manifest.
+        """
+        entry = self.modules.get(file_name)
+        if not entry:
+            return False
+
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return False
+
+        return entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size
+
+# ################################################################################################################################
+
+    def _get_source(self, file_name:'str') -> 'bytes':
+        source = self._sources.get(file_name)
+        if source is None:
+            with open(file_name, 'rb') as f:
+                source = f.read()
+            self._sources[file_name] = source
+        return source
+
+# ################################################################################################################################
+
+    def _get_entry(self, mod:'any_', file_name:'str') -> 'ModuleEntry':
+        """ Returns an entry for a module, analysing the module only if it changed since it was last recorded.
+        """
+        stat = os.stat(file_name)
+        entry = self.modules.get(file_name)
+
+        # We already have this module and it has not changed, in which case we do not even read it ..
+        if entry and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            if file_name not in self._visited:
+                self._visited.add(file_name)
+                self.total_unchanged += 1
+            return entry
+
+        # .. otherwise, it is either a new module or one that changed.
+        self._visited.add(file_name)
+        source = self._get_source(file_name)
+
+        entry = ModuleEntry()
+        entry.path = file_name
+        entry.mtime_ns = stat.st_mtime_ns
+        entry.size = stat.st_size
+        entry.hash = sha256(source).hexdigest()
+        entry.source_path = inspect.getsourcefile(mod) or 'no-source-file'
+
+        self.modules[file_name] = entry
+        self.total_analysed += 1
+
+        return entry
+
+# ################################################################################################################################
+
+    def get_source_code_info(self, mod:'any_', class_:'any_') -> 'SourceCodeInfo':
+        """ Returns the source code of and the FS path to the module that a given class is in.
+        """
+        file_name = mod.__file__ or ''
+        if file_name[-1] in('c', 'o'):
+            file_name = file_name[:-1]
+
+        entry = self._get_entry(mod, file_name)
+
+        # We would have used inspect.getsource(mod) had it not been apparently using
+        # cached copies of the source code. If the module has not changed, its source code
+        # has not been read and it will be read only if it is actually needed.
+        source = self._sources.get(file_name)
+
+        if source is None:
+            source_info = LazySourceCodeInfo(file_name)
+            source_info.len_source = entry.size
+        else:
+            source_info = SourceCodeInfo()
+            source_info.source = source
+            source_info.len_source = len(source)
+
+        source_info.path = entry.source_path
+        source_info.hash = entry.hash
+        source_info.hash_method = entry.hash_method
+
+        # The line number this class object is defined on - this is the most expensive part of the analysis
+        # which is why we look it up only once per class and module.
+        line_number = entry.line_numbers.get(class_.__name__)
+        if line_number is None:
+            line_number = inspect.findsource(class_)[1]
+            entry.line_numbers[class_.__name__] = line_number
+
+        source_info.line_number = line_number
+
+        return source_info
+
+# ################################################################################################################################
+
+    def set_services(self, services:'any_') -> 'None':
+        """ Records which services each module contains, based on a list of InRAMService objects.
+        """
+        by_path = {} # type: dict[str, list[str]]
+
+        for item in services:
+            by_path.setdefault(item.source_code_info.path, []).append(item.name)
+
+        for entry in self.modules.values():
+            if entry.source_path in by_path:
+                entry.services = sorted(by_path[entry.source_path])
+
+# ################################################################################################################################
+
+    def remove(self, file_name:'str') -> 'None':
+        _ = self.modules.pop(file_name, None)
+
+# ################################################################################################################################
+
+    def prune(self) -> 'None':
+        """ Removes modules that no longer exist on disk.
+        """
+        for file_name in list(self.modules):
+            if not os.path.exists(file_name):
+                self.remove(file_name)
+
+# ################################################################################################################################
+
+    def end_deployment(self) -> 'None':
+        """ Releases resources that were needed only while a deployment was in progress.
+        """
+        self._sources.clear()
+        self._visited.clear()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -49,6 +49,7 @@ if 0:
     from zato.common.kvdb.api import KVDB as KVDBAPI
     from zato.common.odb.api import PoolStore
     from zato.common.typing_ import any_, callable_, stranydict, strnone
+    from zato.hl7.lazy import LazyMessage as LazyHL7Message
     from zato.hl7.mllp.server import ConnCtx as HL7ConnCtx
     from zato.server.config import ConfigDict, ConfigStore
     from zato.server.connection.email import EMailAPI
@@ -74,6 +75,7 @@ if 0:
     HL7ConnCtx = HL7ConnCtx
     KombuAMQPMessage = KombuAMQPMessage
     KVDBAPI = KVDBAPI
+    LazyHL7Message = LazyHL7Message
     Logger = Logger
     PoolStore = PoolStore
     SearchAPI = SearchAPI
@@ -173,7 +175,7 @@ class HL7RequestData:
     __slots__ = 'connection', 'data',
 
     def __init__(self, connection, data):
-        # type: (HL7ConnCtx, hl7apy_Message) -> None
+        # type: (HL7ConnCtx, hl7apy_Message | LazyHL7Message) -> None
         self.connection = connection
         self.data = data
 
@@ -7,15 +7,14 @@ Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
-import importlib
 import inspect
 import logging
 import os
 import sys
+from contextlib import closing
 from dataclasses import dataclass
 from datetime import datetime
-from functools import total_ordering
-from hashlib import sha256
+from functools import partial, total_ordering
 from importlib import import_module
 from inspect import getargspec, getmodule, getmro, getsourcefile, isclass
 from pickle import HIGHEST_PROTOCOL as highest_pickle_protocol
@@ -56,10 +55,13 @@ from zato.common.typing_ import cast_, list_
 from zato.common.util.api import deployment_info, import_module_from_path, is_func_overridden, is_python_file, visit_py_source
 from zato.common.util.platform_ import is_non_windows
 from zato.common.util.python_ import get_module_name_by_path
+from zato.server.apispec.cache import APISpecCache
 from zato.server.config import ConfigDict
 from zato.server.service import after_handle_hooks, after_job_hooks, before_handle_hooks, before_job_hooks, \
     PubSubHook, SchedulerFacade, Service, WSXAdapter, WSXFacade
 from zato.server.service.internal import AdminService
+from zato.server.service.import_graph import ImportGraph
+from zato.server.service.manifest import DeploymentManifest
 
 # Zato - Cython
 from zato.simpleio import CySimpleIO
@@ -221,6 +223,11 @@ class DeploymentInfo:
 
 # ################################################################################################################################
 
+def _get_source_code(source_code_info:'SourceCodeInfo') -> 'str':
+    return source_code_info.source.decode('utf8')
+
+# ################################################################################################################################
+
 def get_service_name(class_obj:'type[Service]') -> 'str':
     """ Return the name of a service which will be either given us explicitly
     via the 'name' attribute or it will be a concatenation of the name of the
@@ -307,6 +314,18 @@ class ServiceStore:
         self.needs_post_deploy_attr = 'needs_post_deploy'
         self.has_internal_cache = is_non_windows
 
+        # Until we know our base directory, the manifest is kept in RAM only
+        self.manifest = DeploymentManifest('')
+
+        # Which deployed modules import which ones, to know what to redeploy when a module changes
+        self.import_graph = ImportGraph()
+
+        # API specifications of services and models, invalidated each time they are deployed
+        self.apispec_cache = APISpecCache()
+
+        # Paths of modules that are about to be redeployed because a module they import changed -> when it happened
+        self.dependents_scheduled = {} # type: dict[str, float]
+
         if self.has_internal_cache:
             self.action_internal_doing = 'Deploying and caching'
             self.action_internal_done  = 'Deployed and cached'
@@ -358,6 +377,7 @@ class ServiceStore:
             del self.impl_name_to_id[impl_name]
             del self.name_to_impl_name[name]
             del self.services[impl_name]
+            self.apispec_cache.on_service_deleted(name)
             if delete_from_odb:
                 self._delete_service_from_odb(service_id)
         except KeyError:
@@ -377,6 +397,7 @@ class ServiceStore:
     def _delete_model_data(self, name:'str') -> 'None':
         try:
             del self.models[name]
+            self.apispec_cache.on_model_deleted(name)
         except KeyError:
             # Same comment as in self._delete_service_data
             pass
@@ -434,6 +455,9 @@ class ServiceStore:
             for item in models_to_delete:
                 self._delete_model_data(item)
 
+            # Nothing can be redeployed from this file anymore
+            self.import_graph.remove(file_path)
+
 # ################################################################################################################################
 
     def post_deploy(self, class_:'type[Service]') -> 'None':
@@ -883,6 +907,51 @@ class ServiceStore:
         """
         return name in self.name_to_impl_name
 
+# ################################################################################################################################
+
+    def set_up_manifest(self, base_dir:'str') -> 'DeploymentManifest':
+        """ Loads the deployment manifest for our server, unless it has been loaded already.
+        """
+        if not self.manifest.path:
+
+            server_id = 0 if self.is_testing else self.server.id
+            self.manifest = DeploymentManifest.from_base_dir(base_dir, server_id)
+
+            if self.manifest.is_warm:
+                logger.info('Using deployment manifest with %d module(s) (%s)', len(self.manifest.modules), self.manifest.path)
+
+        return self.manifest
+
+# ################################################################################################################################
+
+    def save_manifest(self, deployed:'inramlist') -> 'None':
+        """ Records in the manifest what has been just deployed and saves it to disk.
+        """
+        self.manifest.set_services(deployed)
+        self.manifest.save()
+        self.manifest.end_deployment()
+
+# ################################################################################################################################
+
+    def drop_stale_deployed_services(self, deployed:'inramlist') -> 'None':
+        """ Removes from ODB services that our server had deployed previously but which it does not have anymore.
+        This is used when the server starts with a warm manifest, in which case deployed services are not removed
+        wholesale before they are deployed anew.
+        """
+        current = {item.name for item in deployed}
+        already_deployed = self.get_basic_data_deployed_services()
+
+        if not (stale := [name for name in already_deployed if name not in current]):
+            return
+
+        with closing(self.odb.session()) as session:
+            services = self.get_basic_data_services(session)
+            service_id_list = [services[name]['id'] for name in stale if name in services]
+            self.odb.drop_deployed_services_by_id(session, self.server.id, service_id_list)
+            session.commit()
+
+        logger.info('Removed %d stale deployed service(s) (%s)', len(stale), self.server.name)
+
 # ################################################################################################################################
 
     def import_internal_services(
@@ -1058,7 +1127,12 @@ class ServiceStore:
                 self.services[item.impl_name]['deployment_info'] = item_deployment_info
                 self.services[item.impl_name]['service_class'] = item_service_class
                 self.services[item.impl_name]['path'] = item.source_code_info.path
-                self.services[item.impl_name]['source_code'] = item.source_code_info.source.decode('utf8')
+
+                # Source code of modules that did not change since the last deployment is read only if the graph needs it
+                self.import_graph.update(item.source_code_info.path, item_service_class.__module__,
+                    partial(_get_source_code, item.source_code_info), item.source_code_info.hash)
+
+                self.apispec_cache.on_service_deployed(item_name, item_service_class.__module__)
 
                 item_is_active = item.is_active
                 item_slow_threshold = item.slow_threshold
@@ -1140,8 +1214,9 @@ class ServiceStore:
         # Already deployed ..
         if service.name in already_deployed:
 
-            # .. thus, return True if current source code is different to what we have already
-            if service.source_code_info.source != already_deployed[service.name]:
+            # .. thus, return True if current source code is different to what we have already,
+            # which we can find out by comparing the hashes of the source code.
+            if service.source_code_info.hash != already_deployed[service.name]:
                 return True
 
         # If we are here, it means that we should not delete this service
@@ -1290,6 +1365,9 @@ class ServiceStore:
         to_process = []
         should_skip = False
 
+        # Modules that did not change since they were last deployed will not be analysed again
+        _ = self.set_up_manifest(base_dir)
+
         for item in items:
 
             for ignored_name in internal_to_ignore:
@@ -1390,6 +1468,9 @@ class ServiceStore:
             if session:
                 session.commit() # type: ignore
 
+        # Make note of what we have deployed for the next time
+        self.save_manifest(info.to_process)
+
         # Done deploying, we can return
         return info
 
@@ -1491,6 +1572,8 @@ class ServiceStore:
         for item in model_info_list:
             item = cast_('ModelInfo', item)
             self.models[item.name] = item
+            self.import_graph.update(item.path, item.mod_name, item.source)
+            self.apispec_cache.on_model_deployed(item.name)
 
         # .. now, return the list to the caller.
         return model_info_list
@@ -1545,121 +1628,12 @@ class ServiceStore:
 
 # ################################################################################################################################
 
-    def _has_module_import(self, source_code:'str', mod_name:'str') -> 'bool':
-
-        # .. ignore modules that do not import what we had on input ..
-        for line in source_code.splitlines():
-
-            # .. these two will be True if we are importing this module ..
-            has_import   = 'import' in line
-            has_mod_name = mod_name in line
-
-            # .. in which case, there is no need to continue ..
-            if has_import and has_mod_name:
-                break
-
-        # .. otherwise, no, we are not importing this module ..
-        else:
-            has_import   = False
-            has_mod_name = False
-
-        return has_import and has_mod_name
-
-# ################################################################################################################################
-
-    def _get_service_module_imports(self, mod_name:'str') -> 'strlist':
-        """ Returns a list of paths pointing to modules with services that import the module given on input.
-        """
-        # Local aliases
-        out = []
-        modules_visited = set()
-
-        # Go through all the services that we are aware of ..
-        for service_data in self.services.values():
-
-            # .. this is the Python class representing a service ..
-            service_class = service_data['service_class']
-
-            # .. get the module of this class based on the module's name ..
-            mod = importlib.import_module(service_class.__module__)
-
-            # .. get the source of the module that this class is in, ..
-            # .. but not if we have already visited this module before ..
-            if mod in modules_visited:
-                continue
-            else:
-                # .. get the actual source code ..
-                source_code = service_data['source_code']
-
-                # .. this module can be ignored if it does not import the input one ..
-                if not self._has_module_import(source_code, mod_name):
-                    continue
-
-                # .. otherwise, extract the path of this module ..
-                path = service_data['path']
-
-                # .. store that module's path for later use ..
-                out.append(path)
-
-                # .. cache that item so that we do not have to visit it more than once ..
-                modules_visited.add(mod)
-
-        # .. now, we can return our result to the caller.
-        return out
-
-# ################################################################################################################################
-
-    def _get_model_module_imports(self, mod_name:'str') -> 'strlist':
-        """ Returns a list of paths pointing to modules with services that import the module given on input.
+    def get_module_importers(self, mod_name:'str', transitive:'bool'=False) -> 'strlist':
+        """ Returns a list of paths pointing to modules, with either services or models, that import the one given on input.
+        If transitive is True, modules importing the importers are returned too, in the order they should be redeployed in.
         """
-        # Local aliases
-        out = []
-        modules_visited = set()
-
-        # Go through all the models that we are aware of ..
-        for model in self.models.values():
-
-            # .. add type hints ..
-            model = cast_('ModelInfo', model)
-
-            # .. ignore this module if we have already visited this module before ..
-            if model.mod_name in modules_visited:
-                continue
-            else:
-                # .. this module can be ignored if it does not import the input one ..
-                if not self._has_module_import(model.source, mod_name):
-                    continue
-
-                # .. otherwise, store that module's path for later use ..
-                out.append(model.path)
-
-                # .. cache that item so that we do not have to visit it more than once ..
-                modules_visited.add(model.mod_name)
-
-        # .. now, we can return our result to the caller.
-        return out
-
-# ################################################################################################################################
-
-    def get_module_importers(self, mod_name:'str') -> 'strlist':
-        """ Returns a list of paths pointing to modules that import the one given on input.
-        """
-
-        # Local aliases
-        out = []
-
-        # .. get files with services that import this module ..
-        service_path_list = self._get_service_module_imports(mod_name)
-
-        # .. get files with models that import this module ..
-        model_path_list = self._get_model_module_imports(mod_name)
-
-        # .. add everything found to the result ..
-        out.extend(service_path_list)
-        out.extend(model_path_list)
-
-        # .. now, we can return our result to the caller.
-        return out
+        with self.update_lock:
+            return self.import_graph.get_importers(mod_name, transitive)
 
 # ################################################################################################################################
 
@@ -1721,29 +1695,12 @@ class ServiceStore:
     def _get_source_code_info(self, mod:'any_', class_:'any_') -> 'SourceCodeInfo':
         """ Returns the source code of and the FS path to the given module.
         """
-        source_info = SourceCodeInfo()
         try:
-            file_name = mod.__file__ or ''
-            if file_name[-1] in('c', 'o'):
-                file_name = file_name[:-1]
-
-            # We would have used inspect.getsource(mod) had it not been apparently using
-            # cached copies of the source code
-            source_info.source = open(file_name, 'rb').read()
-            source_info.len_source = len(source_info.source)
-
-            source_info.path = inspect.getsourcefile(mod) or 'no-source-file'
-            source_info.hash = sha256(source_info.source).hexdigest()
-            source_info.hash_method = 'SHA-256'
-
-            # The line number this class object is defined on
-            source_info.line_number = inspect.findsource(class_)[1]
-
+            return self.manifest.get_source_code_info(mod, class_)
         except IOError:
             if has_trace1:
                 logger.log(TRACE1, 'Ignoring IOError, mod:`%s`, e:`%s`', mod, format_exc())
-
-        return source_info
+            return SourceCodeInfo()
 
 # ################################################################################################################################
 
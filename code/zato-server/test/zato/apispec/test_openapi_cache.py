@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from copy import deepcopy
+from unittest import main
+from unittest.mock import patch
+
+# Zato
+from zato.common.test.apispec_ import run_common_apispec_assertions, service_name, sio_config
+from zato.common.api import APISPEC, URL_TYPE
+from zato.common.marshal_.simpleio import DataClassSimpleIO
+from zato.common.test import BaseSIOTestCase
+from zato.server.apispec.cache import APISpecCache
+from zato.server.apispec.spec import openapi
+from zato.server.apispec.spec.core import Generator
+from zato.server.apispec.spec.openapi import OpenAPIGenerator
+from zato.server.service.internal.helpers import MyDataclassService
+
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+
+class _MatchTestCompiled:
+    group_names = ['phone_number']
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class OpenAPICacheTestCase(BaseSIOTestCase):
+
+    def setUp(self) -> 'None':
+
+        MyClass = deepcopy(MyDataclassService)
+        DataClassSimpleIO.attach_sio(None, self.get_server_config(), MyClass)
+
+        self.service_store_services = {
+            'my.impl.name': {
+                'name': service_name,
+                'service_class': MyClass,
+            }
+        }
+
+        self.channel_data = [{
+            'service_name': service_name,
+            'transport':    URL_TYPE.PLAIN_HTTP,
+            'url_path':     '/test/{phone_number}',
+            'match_target_compiled': _MatchTestCompiled()
+        }]
+
+        self.cache = APISpecCache()
+
+# ################################################################################################################################
+
+    def _get_generator(self, cache:'any_'=None) -> 'OpenAPIGenerator':
+
+        info = Generator(self.service_store_services, sio_config, ['*'], [], '', ['public'],
+            needs_sio_desc=False, cache=cache).get_info()
+
+        return OpenAPIGenerator(info, self.channel_data, True, True, APISPEC.GENERIC_INVOKE_PATH, cache=cache)
+
+# ################################################################################################################################
+
+    def test_same_as_without_cache(self) -> 'None':
+
+        result = self._get_generator(self.cache).generate()
+        run_common_apispec_assertions(self, result)
+
+        self.assertEqual(result, self._get_generator().generate())
+
+# ################################################################################################################################
+
+    def test_rendered_reused(self) -> 'None':
+
+        rendered1 = self._get_generator(self.cache).generate_rendered()
+
+        # Nothing is generated again, including schemas of individual models ..
+        with patch.object(openapi, 'build_field_list') as build_field_list:
+            rendered2 = self._get_generator(self.cache).generate_rendered()
+            build_field_list.assert_not_called()
+
+        # .. and the very same specification is returned.
+        self.assertIs(rendered1, rendered2)
+        self.assertTrue(rendered1.etag.startswith('"'))
+        self.assertIn('"openapi": "3.0.3"', rendered1.json)
+
+# ################################################################################################################################
+
+    def test_channel_changed(self) -> 'None':
+
+        rendered1 = self._get_generator(self.cache).generate_rendered()
+        self.channel_data[0]['url_path'] = '/test2/{phone_number}'
+
+        # A different channel means a different specification, though models are still not visited again
+        with patch.object(openapi, 'build_field_list') as build_field_list:
+            rendered2 = self._get_generator(self.cache).generate_rendered()
+            build_field_list.assert_not_called()
+
+        self.assertNotEqual(rendered1.etag, rendered2.etag)
+        self.assertIn('/test2/{phone_number}', rendered2.yaml)
+
+# ################################################################################################################################
+
+    def test_service_deployed(self) -> 'None':
+
+        rendered1 = self._get_generator(self.cache).generate_rendered()
+
+        model_names = list(self.cache.model_schemas)
+        self.assertIn('zato.server.service.internal.helpers.MyAccount', model_names)
+
+        # Deploying the service again invalidates its schemas and models from its module ..
+        self.cache.on_service_deployed(service_name, 'zato.server.service.internal.helpers')
+
+        self.assertDictEqual(self.cache.rendered, {})
+        self.assertDictEqual(self.cache.message_schemas, {})
+        self.assertDictEqual(self.cache.model_schemas, {})
+
+        # .. which are generated again the next time they are needed.
+        rendered2 = self._get_generator(self.cache).generate_rendered()
+
+        self.assertIsNot(rendered1, rendered2)
+        self.assertEqual(rendered1.etag, rendered2.etag)
+        self.assertListEqual(sorted(self.cache.model_schemas), sorted(model_names))
+
+# ################################################################################################################################
+
+    def test_service_info_reused(self) -> 'None':
+
+        info1 = Generator(self.service_store_services, sio_config, ['*'], [], cache=self.cache).get_info()
+        info2 = Generator(self.service_store_services, sio_config, ['*'], [], cache=self.cache).get_info()
+        self.assertIs(info1[0], info2[0])
+
+        # A new class, e.g. after a hot-deployment, is parsed again even if the cache was not told about it
+        self.service_store_services['my.impl.name']['service_class'] = type('MyClass', (MyDataclassService,), {})
+        info3 = Generator(self.service_store_services, sio_config, ['*'], [], cache=self.cache).get_info()
+        self.assertIsNot(info1[0], info3[0])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
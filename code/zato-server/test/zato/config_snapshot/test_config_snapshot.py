@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from collections import namedtuple
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+# Zato
+from zato.common.util.search import SearchResults
+from zato.common.util.sql import elems_with_opaque
+from zato.server.base.parallel.config_snapshot import ConfigSnapshot
+from zato.server.config import ConfigDict
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+Row = namedtuple('Row', ['id', 'name', 'is_active', 'last_updated', 'opaque1']) # type: ignore
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Columns:
+    def keys(self) -> 'any_':
+        return Row._fields
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _FakeODB:
+    """ Returns query results in the same form that ODBManager does.
+    """
+    def __init__(self) -> 'None':
+        self.total_queries = 0
+        self.rows = [
+            Row(1, 'conn1', True, datetime(2024, 1, 1), None),
+            Row(2, 'conn2', False, datetime(2024, 1, 2), '{"timeout": 10}'),
+        ]
+
+    def _get_result(self) -> 'SearchResults':
+        self.total_queries += 1
+        return SearchResults(None, self.rows, _Columns(), len(self.rows))
+
+    def get_out_ftp_list(self, cluster_id:'int', needs_columns:'bool'=False) -> 'any_':
+        result = self._get_result()
+        return (result, result.columns) if needs_columns else result
+
+    def get_http_soap_list(self, cluster_id:'int', connection:'str', needs_columns:'bool'=False) -> 'any_':
+        return self.get_out_ftp_list(cluster_id, needs_columns)
+
+    def get_default_internal_pubsub_endpoint(self) -> 'str':
+        return 'default'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ConfigSnapshotTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.tmp_dir = TemporaryDirectory()
+        self.odb = _FakeODB()
+
+    def tearDown(self) -> 'None':
+        self.tmp_dir.cleanup()
+
+# ################################################################################################################################
+
+    def _get_snapshot(self, key:'str'='key1', max_age:'int'=120) -> 'ConfigSnapshot':
+        return ConfigSnapshot.from_work_dir(self.odb, self.tmp_dir.name, key, max_age) # type: ignore
+
+# ################################################################################################################################
+
+    def test_first_worker_queries_others_load(self) -> 'None':
+
+        # The first worker runs the query and saves its result ..
+        first = self._get_snapshot()
+        self.assertFalse(first.load())
+
+        config_first = ConfigDict.from_query('out_ftp', first.get_out_ftp_list(1, True))
+        first.save()
+
+        self.assertTrue(os.path.exists(first.path))
+        self.assertEqual(first.total_queried, 1)
+
+        # .. whereas the next one loads it from the snapshot.
+        second = self._get_snapshot()
+        self.assertTrue(second.load())
+
+        config_second = ConfigDict.from_query('out_ftp', second.get_out_ftp_list(1, True))
+
+        self.assertEqual(second.total_queried, 0)
+        self.assertEqual(second.total_from_snapshot, 1)
+        self.assertEqual(self.odb.total_queries, 1)
+
+        # Both workers end up with the same configuration
+        for name in 'conn1', 'conn2':
+            self.assertDictEqual(dict(config_first[name]['config']), dict(config_second[name]['config']))
+
+        self.assertEqual(config_second['conn2']['config']['timeout'], 10)
+        self.assertEqual(config_second['conn1']['config']['last_updated'], datetime(2024, 1, 1))
+
+# ################################################################################################################################
+
+    def test_query_arguments_are_part_of_key(self) -> 'None':
+
+        snapshot = self._get_snapshot()
+
+        _ = snapshot.get_out_ftp_list(1, True)
+        _ = snapshot.get_out_ftp_list(2, True)
+        _ = snapshot.get_out_ftp_list(1, True)
+
+        self.assertEqual(snapshot.total_queried, 2)
+        self.assertEqual(snapshot.total_from_snapshot, 1)
+
+# ################################################################################################################################
+
+    def test_result_without_columns(self) -> 'None':
+
+        first = self._get_snapshot()
+        _ = first.get_http_soap_list(1, 'channel')
+        first.save()
+
+        second = self._get_snapshot()
+        _ = second.load()
+
+        # This is how HTTP channels are read, i.e. without columns and through elems_with_opaque
+        result = elems_with_opaque(second.get_http_soap_list(1, 'channel'))
+
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[1].name, 'conn2')
+        self.assertEqual(result[1].timeout, 10)
+
+# ################################################################################################################################
+
+    def test_other_methods_are_not_snapshotted(self) -> 'None':
+        snapshot = self._get_snapshot()
+        self.assertEqual(snapshot.get_default_internal_pubsub_endpoint(), 'default')
+
+# ################################################################################################################################
+
+    def test_snapshot_of_another_deployment(self) -> 'None':
+
+        first = self._get_snapshot('key1')
+        _ = first.get_out_ftp_list(1, True)
+        first.save()
+
+        self.assertFalse(self._get_snapshot('key2').load())
+
+# ################################################################################################################################
+
+    def test_snapshot_too_old(self) -> 'None':
+
+        first = self._get_snapshot()
+        _ = first.get_out_ftp_list(1, True)
+        first.save()
+
+        self.assertFalse(self._get_snapshot(max_age=-1).load())
+
+# ################################################################################################################################
+# ################################################################################################################################
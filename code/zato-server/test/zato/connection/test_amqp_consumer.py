@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from socket import timeout as socket_timeout
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+import gevent
+
+# Kombu
+from kombu import Connection
+from kombu.transport.memory import Channel, Transport
+
+# Zato
+from zato.common.api import AMQP
+from zato.server.connection.amqp_ import Consumer
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Channel(Channel):
+    """ An in-memory channel that keeps track of how messages were settled.
+    """
+    settled = [] # type: anylist
+
+    def basic_ack(self, delivery_tag:'any_', multiple:'bool'=False) -> 'None':
+        self.settled.append(('ack', delivery_tag, multiple))
+        super().basic_ack(delivery_tag, multiple)
+
+    def basic_reject(self, delivery_tag:'any_', requeue:'bool'=False) -> 'None':
+        self.settled.append(('reject', delivery_tag, requeue))
+        super().basic_reject(delivery_tag, requeue)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Transport(Transport):
+    Channel = _Channel
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class AMQPConsumerTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        _Channel.settled[:] = []
+
+        # Delivery tag -> message body
+        self.delivered = {}
+
+        self.conn = Connection('memory://', transport=_Transport)
+
+        # Each test gets its own queue because the in-memory broker is shared by all of them
+        self.queue_name = 'queue.{}'.format(self.id())
+
+    def tearDown(self) -> 'None':
+        self.conn.release()
+
+# ################################################################################################################################
+
+    def _get_consumer(self, on_message:'any_', **config:'any_') -> 'Consumer':
+
+        def conn_class(conn_url:'str') -> 'Connection':
+            return self.conn.clone()
+
+        consumer_config = Bunch(
+            name='test.channel',
+            queue=self.queue_name,
+            conn_class=conn_class,
+            conn_url='memory://',
+            ack_mode=AMQP.ACK_MODE.ACK.id,
+            consumer_tag_prefix='test',
+            prefetch_count=0,
+        )
+        consumer_config.update(config)
+
+        def on_amqp_message(body:'int', msg:'any_', name:'str', config:'Bunch') -> 'None':
+            self.delivered[msg.delivery_tag] = body
+            on_message(body)
+
+        return Consumer(consumer_config, on_amqp_message)
+
+# ################################################################################################################################
+
+    def _publish(self, count:'int') -> 'None':
+        queue = self.conn.SimpleQueue(self.queue_name)
+        for idx in range(count):
+            queue.put(idx)
+        queue.close()
+
+# ################################################################################################################################
+
+    def _consume(self, consumer:'Consumer', expected:'int') -> 'None':
+        """ Runs the same steps that the consumer's mainloop does until the expected number of messages is processed.
+        """
+        kombu_consumer = consumer._get_consumer()
+        connection = kombu_consumer.connection
+
+        for _ in range(1000):
+
+            consumer.ack_batcher.flush()
+
+            try:
+                connection.drain_events(timeout=0.001)
+            except socket_timeout:
+                pass
+
+            gevent.sleep(0.001)
+
+            if len(self.delivered) == expected and not consumer.ack_batcher.pending:
+                break
+
+        consumer.pool.join()
+        consumer.ack_batcher.flush(force=True)
+
+# ################################################################################################################################
+
+    def _get_settled(self) -> 'anylist':
+        """ Returns how messages were settled, with each message identified by its body.
+        """
+        return [(action, self.delivered[delivery_tag], flag) for action, delivery_tag, flag in _Channel.settled]
+
+# ################################################################################################################################
+
+    def test_ordered(self) -> 'None':
+
+        received = []
+        in_flight = []
+
+        def on_message(body:'int') -> 'None':
+            in_flight.append(body)
+            self.assertEqual(len(in_flight), 1)
+            gevent.sleep(0.001)
+            received.append(body)
+            in_flight.remove(body)
+
+        consumer = self._get_consumer(on_message, ack_batch_size=5, ack_interval=60)
+
+        self._publish(10)
+        self._consume(consumer, 10)
+
+        # Messages are processed one by one, in the order they were published in ..
+        self.assertListEqual(received, list(range(10)))
+
+        # .. and acknowledged in batches.
+        self.assertListEqual(self._get_settled(), [('ack', 4, True), ('ack', 9, True)])
+
+# ################################################################################################################################
+
+    def test_unordered_max_in_flight(self) -> 'None':
+
+        received = []
+        in_flight = []
+        max_in_flight = []
+
+        def on_message(body:'int') -> 'None':
+            in_flight.append(body)
+            max_in_flight.append(len(in_flight))
+
+            # Messages with lower numbers take longer to process
+            gevent.sleep(0.005 * (10 - body))
+
+            received.append(body)
+            in_flight.remove(body)
+
+        consumer = self._get_consumer(on_message, processing_mode=AMQP.PROCESSING_MODE.UNORDERED.id, max_in_flight=3,
+            ack_batch_size=100, ack_interval=60)
+
+        self._publish(10)
+        self._consume(consumer, 10)
+
+        # There are never more messages processed at a time than configured for ..
+        self.assertEqual(max(max_in_flight), 3)
+        self.assertSetEqual(set(received), set(range(10)))
+        self.assertNotEqual(received, list(range(10)))
+
+        # .. and all of them are acknowledged at once.
+        self.assertListEqual(self._get_settled(), [('ack', 9, True)])
+
+# ################################################################################################################################
+
+    def test_dead_letter(self) -> 'None':
+
+        def on_message(body:'int') -> 'None':
+            if body == 2:
+                raise Exception('Message cannot be processed')
+
+        dead_letter_queue = self.conn.SimpleQueue(self.queue_name + '.dead')
+
+        consumer = self._get_consumer(on_message, ack_batch_size=100, ack_interval=60,
+            dead_letter_exchange=dead_letter_queue.queue.exchange.name, dead_letter_routing_key=dead_letter_queue.queue.name)
+
+        self._publish(5)
+        self._consume(consumer, 5)
+
+        # Messages before the failed one are acknowledged first, then the failed one is,
+        # once it has been published to the dead-letter exchange, and then the remaining ones.
+        self.assertListEqual(self._get_settled(), [('ack', 1, True), ('ack', 2, False), ('ack', 4, True)])
+
+        msg = dead_letter_queue.get(timeout=1)
+        self.assertEqual(msg.payload, 2)
+
+        dead_letter_queue.close()
+
+# ################################################################################################################################
+
+    def test_requeue_without_dead_letter_exchange(self) -> 'None':
+
+        failed = []
+
+        def on_message(body:'int') -> 'None':
+            if not failed:
+                failed.append(body)
+                raise Exception('Message cannot be processed')
+
+        consumer = self._get_consumer(on_message)
+
+        self._publish(1)
+        self._consume(consumer, 2)
+
+        # Without a dead-letter exchange, the message is requeued and acknowledged once it is processed when delivered again
+        self.assertListEqual(self._get_settled(), [('reject', 0, True), ('ack', 0, True)])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import re
+from socket import socketpair
+from threading import Thread
+from time import monotonic
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.server.connection.email import GenericIMAPConnection, Imbox
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+raw_email_template = """From: user1@example.com
+To: user2@example.com
+Subject: Message {uid}
+Message-ID: <{uid}@example.com>
+Content-Type: text/plain
+
+This is message {uid}.
+"""
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _IMAP4:
+    """ Stands in for imaplib.IMAP4, with each folder being a dict of UIDs to messages.
+    """
+    capabilities = ('IMAP4REV1', 'IDLE')
+
+    def __init__(self) -> 'None':
+        self.folders = {'INBOX': {}, 'Archive': {}}
+        self.uid_validity = {'INBOX': 1, 'Archive': 1}
+        self.selected = 'INBOX'
+        self.commands = [] # type: anylist
+        self.sock = None # type: any_
+
+    def add(self, folder:'str', uid:'int') -> 'None':
+        self.folders[folder][uid] = raw_email_template.format(uid=uid).encode('utf8')
+
+    def select(self, folder:'str') -> 'any_':
+        self.selected = folder
+        self.commands.append(('SELECT', folder))
+        return 'OK', [str(len(self.folders[folder])).encode('utf8')]
+
+    def response(self, name:'str') -> 'any_':
+        return name, [str(self.uid_validity[self.selected]).encode('utf8')]
+
+    def noop(self) -> 'any_':
+        self.commands.append(('NOOP',))
+        return 'OK', [b'']
+
+    def logout(self) -> 'None':
+        self.commands.append(('LOGOUT',))
+
+    def expunge(self) -> 'None':
+        self.commands.append(('EXPUNGE',))
+
+    def uid(self, command:'str', *args:'any_') -> 'any_':
+
+        self.commands.append((command.upper(),) + args)
+        messages = self.folders[self.selected]
+
+        if command == 'search':
+
+            uid_list = sorted(messages)
+
+            # UID n:* always includes the latest message
+            if match := re.match(r'UID (\d+):\*', args[1]):
+                start = int(match.group(1))
+                uid_list = [uid for uid in uid_list if uid >= start] or uid_list[-1:]
+
+            return 'OK', [' '.join(str(uid) for uid in uid_list).encode('utf8')]
+
+        elif command == 'fetch':
+            data = []
+            for uid in args[0].split(','):
+                raw_email = messages[int(uid)]
+                if 'HEADER' in args[1]:
+                    raw_email = raw_email.split(b'\n\n')[0] + b'\n\n'
+                meta = '{} (UID {} RFC822.SIZE {} BODY[] {{{}}}'.format(uid, uid, len(messages[int(uid)]), len(raw_email))
+                data.append((meta.encode('utf8'), raw_email))
+                data.append(b')')
+            return 'OK', data
+
+        return 'OK', [b'']
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class IMAPConnectionTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.imap = _IMAP4()
+        self.sessions_created = 0
+
+    def _get_connection(self, **config:'any_') -> 'GenericIMAPConnection':
+
+        conn_config = Bunch(name='test.imap', get_criteria='UNSEEN', fetch_batch_size=2)
+        conn_config.update(config)
+
+        new_session = self._new_session
+
+        class _Connection(GenericIMAPConnection):
+            def new_session(self) -> 'Imbox':
+                return new_session()
+
+        return _Connection(conn_config, conn_config)
+
+    def _new_session(self) -> 'Imbox':
+
+        self.sessions_created += 1
+
+        session = Imbox.__new__(Imbox)
+        session.config = session.config_no_sensitive = Bunch()
+        session.connection = self.imap
+        session.selected_folder = 'INBOX'
+        session.last_used = monotonic()
+
+        return session
+
+    def _get_fetched(self) -> 'anylist':
+        return [command[1] for command in self.imap.commands if command[0] == 'FETCH']
+
+# ################################################################################################################################
+
+    def test_get_new(self) -> 'None':
+
+        conn = self._get_connection()
+
+        for uid in range(1, 6):
+            self.imap.add('INBOX', uid)
+
+        # All the messages are returned the first time, fetched in batches ..
+        messages = list(conn.get_new())
+        self.assertListEqual([uid for uid, _ in messages], ['1', '2', '3', '4', '5'])
+        self.assertListEqual(self._get_fetched(), ['1,2', '3,4', '5'])
+        self.assertEqual(messages[0][1].data.subject, 'Message 1')
+
+        # .. only the new ones are returned next time ..
+        self.imap.add('INBOX', 6)
+        self.imap.add('INBOX', 7)
+        self.assertListEqual([uid for uid, _ in conn.get_new()], ['6', '7'])
+
+        # .. and nothing is if there are no new messages.
+        self.assertListEqual(list(conn.get_new()), [])
+
+        # Everything went through a single session
+        self.assertEqual(self.sessions_created, 1)
+
+# ################################################################################################################################
+
+    def test_get_new_uid_validity_changed(self) -> 'None':
+
+        conn = self._get_connection()
+
+        self.imap.add('INBOX', 1)
+        self.imap.add('INBOX', 2)
+        self.assertEqual(len(list(conn.get_new())), 2)
+
+        # UIDs are no longer valid so all the messages are returned again
+        self.imap.uid_validity['INBOX'] = 2
+        self.assertEqual(len(list(conn.get_new())), 2)
+
+# ################################################################################################################################
+
+    def test_get_new_not_processed(self) -> 'None':
+
+        conn = self._get_connection()
+
+        for uid in range(1, 4):
+            self.imap.add('INBOX', uid)
+
+        # The caller asks for the second message, which means that it processed the first one, and stops ..
+        messages = conn.get_new()
+        _ = next(messages)
+        _ = next(messages)
+        messages.close()
+
+        # .. so the second one is returned again.
+        self.assertListEqual([uid for uid, _ in conn.get_new()], ['2', '3'])
+
+# ################################################################################################################################
+
+    def test_headers_only(self) -> 'None':
+
+        conn = self._get_connection()
+        self.imap.add('Archive', 1)
+
+        (uid, msg), = list(conn.get_new('Archive', headers_only=True))
+
+        # Only headers are downloaded at first ..
+        self.assertFalse(msg.is_body_loaded)
+        self.assertEqual(msg.data.subject, 'Message 1')
+        self.assertListEqual(msg.data.body['plain'], [''])
+        self.assertEqual(msg.data.size, len(self.imap.folders['Archive'][1]))
+
+        # .. and the rest of the message when it is needed.
+        data = msg.load_body()
+        self.assertTrue(msg.is_body_loaded)
+        self.assertEqual(data.body['plain'], ['This is message 1.\n'])
+
+        # Messages know what folder they are in
+        msg.mark_seen()
+        self.assertEqual(self.imap.selected, 'Archive')
+        self.assertIn(('STORE', '1', '+FLAGS', '(\\Seen)'), self.imap.commands)
+
+# ################################################################################################################################
+
+    def test_delete(self) -> 'None':
+
+        conn = self._get_connection()
+        conn.delete(b'1', 2, '3')
+
+        # All the messages are deleted with one command
+        self.assertListEqual(self.imap.commands[-2:], [('STORE', '1,2,3', '+FLAGS', '(\\Deleted)'), ('EXPUNGE',)])
+
+# ################################################################################################################################
+
+    def test_session_not_reused_after_error(self) -> 'None':
+
+        conn = self._get_connection()
+        conn.ping()
+
+        def noop() -> 'None':
+            raise Exception('Connection closed')
+
+        self.imap.noop = noop
+
+        with self.assertRaises(Exception):
+            conn.ping()
+
+        # The session that failed was logged out of and a new one was created
+        del self.imap.noop
+        conn.ping()
+
+        self.assertIn(('LOGOUT',), self.imap.commands)
+        self.assertEqual(self.sessions_created, 2)
+
+# ################################################################################################################################
+
+    def test_close(self) -> 'None':
+
+        conn = self._get_connection()
+        conn.ping()
+        conn.close()
+
+        self.assertEqual(self.imap.commands[-1], ('LOGOUT',))
+
+# ################################################################################################################################
+
+    def _run_idle(self, conn:'GenericIMAPConnection', responses:'anylist', timeout:'float') -> 'tuple[bool, anylist]':
+        """ Runs IDLE against a server that sends responses given on input once IDLE starts.
+        """
+        client_sock, server_sock = socketpair()
+        self.imap.sock = client_sock
+        self.imap._new_tag = lambda: b'A1'
+        self.imap.send = client_sock.sendall
+
+        # Do not let the test hang if the client does not send anything
+        server_sock.settimeout(5)
+
+        received = []
+
+        def server() -> 'None':
+            server_file = server_sock.makefile('rb')
+            received.append(server_file.readline())
+
+            server_sock.sendall(b'+ idling\r\n' + b''.join(responses))
+
+            received.append(server_file.readline())
+            server_sock.sendall(b'* 1 RECENT\r\nA1 OK IDLE terminated\r\n')
+
+        thread = Thread(target=server, daemon=True)
+        thread.start()
+
+        try:
+            has_changes = conn.wait_for_changes(timeout=timeout)
+        finally:
+            thread.join(5)
+            client_sock.close()
+            server_sock.close()
+
+        return has_changes, received
+
+# ################################################################################################################################
+
+    def test_idle_changes(self) -> 'None':
+
+        conn = self._get_connection()
+        has_changes, received = self._run_idle(conn, [b'* 2 EXISTS\r\n'], 10)
+
+        self.assertTrue(has_changes)
+        self.assertListEqual(received, [b'A1 IDLE\r\n', b'DONE\r\n'])
+
+# ################################################################################################################################
+
+    def test_idle_timeout(self) -> 'None':
+
+        conn = self._get_connection()
+
+        start = monotonic()
+        has_changes, received = self._run_idle(conn, [], 0.1)
+
+        # Nothing changed within the timeout and IDLE was ended as expected
+        self.assertFalse(has_changes)
+        self.assertLess(monotonic() - start, 5)
+        self.assertListEqual(received, [b'A1 IDLE\r\n', b'DONE\r\n'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from socket import socket, SHUT_RDWR
+from unittest import main, TestCase
+
+# aiosmtpd
+from aiosmtpd.controller import Controller
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common.api import SMTPMessage
+from zato.server.connection.email import SMTPConnection
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Handler:
+    """ Keeps all the messages received, along with the sessions they were received in.
+    """
+    def __init__(self) -> 'None':
+        self.received = [] # type: list
+
+    async def handle_RCPT(self, server:'any_', session:'any_', envelope:'any_', address:'str', options:'any_') -> 'str':
+        if address.startswith('invalid'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server:'any_', session:'any_', envelope:'any_') -> 'str':
+        self.received.append((session.peer, envelope.rcpt_tos))
+        return '250 OK'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SMTPConnectionTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        # Find a free port for the server
+        with socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+
+        self.handler = _Handler()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+        self.controller.start()
+
+    def tearDown(self) -> 'None':
+        self.controller.stop()
+
+# ################################################################################################################################
+
+    def _get_connection(self, **config:'any_') -> 'SMTPConnection':
+
+        conn_config = Bunch(
+            name='test.smtp',
+            host='127.0.0.1',
+            port=self.port,
+            username=None,
+            password=None,
+            mode_outbox=None,
+            is_debug=False,
+            timeout=5,
+        )
+        conn_config.update(config)
+
+        return SMTPConnection(conn_config, conn_config)
+
+# ################################################################################################################################
+
+    def _get_msg(self, to:'str') -> 'SMTPMessage':
+        return SMTPMessage('user1@example.com', to, 'Subject', 'Body')
+
+# ################################################################################################################################
+
+    def _get_sessions(self) -> 'set[tuple[str, int]]':
+        return {peer for peer, _ in self.handler.received}
+
+# ################################################################################################################################
+
+    def test_session_reused(self) -> 'None':
+
+        conn = self._get_connection()
+
+        for idx in range(5):
+            self.assertTrue(conn.send(self._get_msg('user{}@example.com'.format(idx))))
+
+        conn.close()
+
+        # All the messages were sent through a single session
+        self.assertEqual(len(self.handler.received), 5)
+        self.assertEqual(len(self._get_sessions()), 1)
+
+        self.assertDictEqual(conn.get_counters(), {
+            'sent': 5,
+            'failed': 0,
+            'sessions_created': 1,
+            'sessions_reused': 4,
+            'sessions_closed': 1,
+        })
+
+# ################################################################################################################################
+
+    def test_send_many(self) -> 'None':
+
+        conn = self._get_connection(pool_size=3)
+
+        msg_list = [self._get_msg('user{}@example.com'.format(idx)) for idx in range(10)]
+        result = conn.send_many(msg_list)
+
+        conn.close()
+
+        # Each message was sent, with no more sessions used than the pool allows for
+        self.assertListEqual(result, [True] * 10)
+        self.assertListEqual(sorted(rcpt_tos[0] for _, rcpt_tos in self.handler.received),
+            sorted('user{}@example.com'.format(idx) for idx in range(10)))
+        self.assertLessEqual(len(self._get_sessions()), 3)
+
+# ################################################################################################################################
+
+    def test_message_rejected(self) -> 'None':
+
+        conn = self._get_connection()
+
+        self.assertFalse(conn.send(self._get_msg('invalid@example.com')))
+        self.assertTrue(conn.send(self._get_msg('user1@example.com')))
+
+        # The session could still be used after the server rejected a message
+        counters = conn.get_counters()
+        self.assertEqual(counters['sent'], 1)
+        self.assertEqual(counters['failed'], 1)
+        self.assertEqual(counters['sessions_created'], 1)
+
+# ################################################################################################################################
+
+    def test_session_closed(self) -> 'None':
+
+        conn = self._get_connection()
+        self.assertTrue(conn.send(self._get_msg('user1@example.com')))
+
+        # The session is no longer connected ..
+        conn.pool.idle[0]._conn.sock.shutdown(SHUT_RDWR)
+
+        # .. so the message is sent through a new one.
+        self.assertTrue(conn.send(self._get_msg('user2@example.com')))
+        self.assertEqual(len(self._get_sessions()), 2)
+        self.assertEqual(conn.get_counters()['sessions_created'], 2)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
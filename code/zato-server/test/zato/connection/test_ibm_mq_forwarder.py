@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from logging import getLogger
+from time import monotonic, sleep
+from unittest import main, TestCase
+
+# Zato
+from zato.server.connection.connector.subprocess_.impl.ibm_mq import BatchForwarder, ModuleCtx
+from zato.server.connection.jms_wmq.jms import NoMessageAvailableException
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Message:
+    def __init__(self, text:'str', delivery_count:'int'=0) -> 'None':
+        self.text = text
+        self.JMSXDeliveryCount = delivery_count
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Queue:
+    """ Stands in for a connection to a queue manager with a single queue and a backout queue,
+    received and sent messages being kept under syncpoint.
+    """
+    def __init__(self, messages:'anylist') -> 'None':
+        self.messages = list(messages)
+        self.uncommitted = []
+        self.committed = []
+        self.uncommitted_sent = []
+        self.backout_queue = []
+
+    def receive(self, queue_name:'bytes', wait_interval:'int', connection_closing:'str', syncpoint:'bool') -> 'any_':
+
+        if not syncpoint:
+            raise Exception('Expected syncpoint to be used')
+
+        if not self.messages:
+            sleep(wait_interval / 1000.0)
+            raise NoMessageAvailableException('No message available')
+
+        msg = self.messages.pop(0)
+        self.uncommitted.append(msg)
+
+        return msg
+
+    def send(self, msg:'any_', queue_name:'bytes', syncpoint:'bool') -> 'None':
+
+        if not syncpoint:
+            raise Exception('Expected syncpoint to be used')
+
+        self.uncommitted_sent.append(msg)
+
+    def commit(self) -> 'None':
+        self.committed.extend(self.uncommitted)
+        self.uncommitted[:] = []
+        self.backout_queue.extend(self.uncommitted_sent)
+        self.uncommitted_sent[:] = []
+
+    def backout(self) -> 'None':
+        for msg in self.uncommitted:
+            if isinstance(msg, _Message):
+                msg.JMSXDeliveryCount += 1
+        self.messages[:0] = self.uncommitted
+        self.uncommitted[:] = []
+        self.uncommitted_sent[:] = []
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class BatchForwarderTestCase(TestCase):
+
+    def _get_forwarder(self, queue:'_Queue', forward:'any_', max_batch_size:'int'=3, max_batch_wait:'float'=0.05,
+        backout_threshold:'int'=0, backout_queue_name:'bytes | None'=None):
+        return BatchForwarder(queue, b'QUEUE.1', forward, max_batch_size, max_batch_wait, logger, # type: ignore
+            backout_threshold, backout_queue_name)
+
+# ################################################################################################################################
+
+    def test_batch_size(self) -> 'None':
+
+        queue = _Queue(['msg.{}'.format(idx) for idx in range(7)])
+        batches = []
+
+        def forward(msg_list:'anylist') -> 'bool':
+            batches.append(list(msg_list))
+            return True
+
+        forwarder = self._get_forwarder(queue, forward)
+
+        for _ in range(3):
+            self.assertTrue(forwarder.run_once())
+
+        # Messages are forwarded in batches of up to three ..
+        self.assertListEqual([len(elem) for elem in batches], [3, 3, 1])
+
+        # .. and all of them are committed afterwards.
+        self.assertEqual(len(queue.committed), 7)
+        self.assertListEqual(queue.messages, [])
+
+        # There are no more messages to forward
+        with self.assertRaises(NoMessageAvailableException):
+            _ = forwarder.run_once()
+
+# ################################################################################################################################
+
+    def test_batch_wait(self) -> 'None':
+
+        queue = _Queue(['msg.1'])
+        forwarder = self._get_forwarder(queue, lambda msg_list: True, max_batch_size=100, max_batch_wait=0.05)
+
+        start = monotonic()
+        msg_list = forwarder.receive_batch()
+
+        # A batch that is not full is not kept waiting for more messages for longer than configured
+        self.assertListEqual(msg_list, ['msg.1'])
+        self.assertLess(monotonic() - start, 0.5)
+
+# ################################################################################################################################
+
+    def test_backout_if_not_confirmed(self) -> 'None':
+
+        queue = _Queue(['msg.1', 'msg.2'])
+
+        def forward(msg_list:'anylist') -> 'bool':
+            raise Exception('Server not available')
+
+        forwarder = self._get_forwarder(queue, forward)
+
+        # The server did not confirm the delivery so the messages are still in the queue ..
+        self.assertFalse(forwarder.run_once())
+        self.assertListEqual(queue.messages, ['msg.1', 'msg.2'])
+        self.assertListEqual(queue.committed, [])
+
+        # .. and they are delivered again once the server is back.
+        forwarder.forward = lambda msg_list: True
+        self.assertTrue(forwarder.run_once())
+        self.assertListEqual(queue.committed, ['msg.1', 'msg.2'])
+
+# ################################################################################################################################
+
+    def test_backout_threshold(self) -> 'None':
+
+        msg1 = _Message('msg.1')
+        msg2 = _Message('msg.2')
+        queue = _Queue([msg1, msg2])
+        batches = []
+
+        def forward(msg_list:'anylist') -> 'bool':
+            batches.append([msg.text for msg in msg_list])
+            return msg1 not in msg_list
+
+        forwarder = self._get_forwarder(queue, forward, max_batch_size=1,
+            backout_threshold=2, backout_queue_name=b'QUEUE.1.BACKOUT')
+
+        # The server cannot handle the first message so it is delivered again ..
+        self.assertFalse(forwarder.run_once())
+        self.assertFalse(forwarder.run_once())
+
+        # .. until it is backed out often enough to be moved to the backout queue instead of being forwarded ..
+        self.assertTrue(forwarder.run_once())
+        self.assertListEqual(queue.backout_queue, [msg1])
+
+        # .. and the messages behind it are forwarded as usual.
+        self.assertTrue(forwarder.run_once())
+        self.assertListEqual(batches, [['msg.1'], ['msg.1'], ['msg.2']])
+        self.assertListEqual(queue.committed, [msg1, msg2])
+        self.assertListEqual(queue.messages, [])
+
+# ################################################################################################################################
+
+    def test_backout_threshold_without_backout_queue(self) -> 'None':
+
+        queue = _Queue([_Message('msg.1', delivery_count=5)])
+        batches = []
+
+        def forward(msg_list:'anylist') -> 'bool':
+            batches.append([msg.text for msg in msg_list])
+            return True
+
+        forwarder = self._get_forwarder(queue, forward, backout_threshold=2)
+
+        # Without a backout queue to move it to, a message is forwarded regardless of how many times it was backed out
+        self.assertTrue(forwarder.run_once())
+        self.assertListEqual(batches, [['msg.1']])
+        self.assertListEqual(queue.backout_queue, [])
+
+# ################################################################################################################################
+
+    def test_connection_closing(self) -> 'None':
+
+        queue = _Queue(['msg.1', ModuleCtx.Connection_Closing])
+        batches = []
+
+        def forward(msg_list:'anylist') -> 'bool':
+            batches.append(list(msg_list))
+            return True
+
+        forwarder = self._get_forwarder(queue, forward)
+
+        # Messages received before the connection started to close are still forwarded
+        self.assertEqual(forwarder.run_once(), ModuleCtx.Connection_Closing)
+        self.assertListEqual(batches, [['msg.1']])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from logging import basicConfig, getLogger, INFO
+from tempfile import mkdtemp
+from shutil import rmtree
+from time import monotonic
+from unittest import main, TestCase
+
+# Zato
+from zato.common.api import SFTP
+from zato.server.connection.connector.subprocess_.impl.outconn_sftp import SFTPConnection
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+basicConfig(level=INFO, format='%(asctime)s - %(message)s')
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# Stands in for both sftp and ssh - it returns what it read from stdin and saves the arguments it was invoked with
+fake_command = """#!/bin/sh
+echo "$@" >> {args_path}
+cat
+"""
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_connection(**config:'any_') -> 'SFTPConnection':
+
+    conn_config = {
+        'id': 1,
+        'name': 'test.sftp',
+        'is_active': True,
+        'host': 'localhost',
+        'port': None,
+        'username': 'user1',
+        'sftp_command': SFTP.DEFAULT.COMMAND_SFTP,
+        'ping_command': SFTP.DEFAULT.COMMAND_PING,
+        'identity_file': None,
+        'ssh_config_file': None,
+        'log_level': SFTP.LOG_LEVEL.LEVEL0.id,
+        'should_flush': False,
+        'buffer_size': SFTP.DEFAULT.BUFFER_SIZE,
+        'ssh_options': None,
+        'force_ip_type': None,
+        'should_preserve_meta': False,
+        'is_compression_enabled': False,
+        'bandwidth_limit': SFTP.DEFAULT.BANDWIDTH_LIMIT,
+    }
+    conn_config.update(config)
+
+    return SFTPConnection(logger, **conn_config)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SFTPConnectionTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        self.temp_dir = mkdtemp(prefix='zato-test-sftp-')
+        self.args_path = os.path.join(self.temp_dir, 'args.txt')
+        self.command_path = os.path.join(self.temp_dir, 'command.sh')
+
+        with open(self.command_path, 'w') as f:
+            _ = f.write(fake_command.format(args_path=self.args_path))
+
+        os.chmod(self.command_path, 0o700)
+
+    def tearDown(self) -> 'None':
+        rmtree(self.temp_dir)
+
+# ################################################################################################################################
+
+    def _get_args(self) -> 'list[str]':
+        with open(self.args_path) as f:
+            return f.read().splitlines()
+
+# ################################################################################################################################
+
+    def test_session_reused(self) -> 'None':
+
+        conn = get_connection(sftp_command=self.command_path)
+        self.assertTrue(os.path.isdir(conn.control_dir))
+
+        out = conn.execute('cid.1', 'ls .')
+
+        # The commands are read from stdin rather than from a temporary file ..
+        self.assertTrue(out.is_ok)
+        self.assertEqual(out.stdout, 'ls .')
+
+        # .. and they go through the connection's session.
+        args = self._get_args()[0]
+        self.assertIn('-o ControlMaster=auto', args)
+        self.assertIn('-o ControlPath={}'.format(os.path.join(conn.control_dir, '%C')), args)
+        self.assertIn('-o ControlPersist={}'.format(SFTP.DEFAULT.CONTROL_PERSIST), args)
+        self.assertIn('-b -', args)
+        self.assertTrue(args.endswith('user1@localhost'))
+
+        conn.close()
+
+# ################################################################################################################################
+
+    def test_session_not_reused(self) -> 'None':
+
+        conn = get_connection(sftp_command=self.command_path, should_reuse_session=False)
+        self.assertEqual(conn.control_dir, '')
+
+        out = conn.execute('cid.1', 'ls .')
+        self.assertTrue(out.is_ok)
+        self.assertNotIn('ControlMaster', self._get_args()[0])
+
+# ################################################################################################################################
+
+    def test_close(self) -> 'None':
+
+        conn = get_connection(sftp_command=self.command_path, ssh_command=self.command_path, port=2222)
+        control_dir = conn.control_dir
+
+        conn.close()
+
+        # The session is told to exit and its socket's directory is deleted ..
+        args = self._get_args()[0]
+        self.assertEqual(args, '-o ControlPath={} -O exit -p 2222 user1@localhost'.format(os.path.join(control_dir, '%C')))
+        self.assertFalse(os.path.exists(control_dir))
+
+        # .. until the connection is used again.
+        conn.connect()
+        self.assertTrue(os.path.isdir(conn.control_dir))
+        self.assertNotEqual(conn.control_dir, control_dir)
+
+        conn.close()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SFTPConnectionBenchmarkTestCase(TestCase):
+    """ Executes commands against an OpenSSH server with and without reusing sessions. The server is given on input
+    in Zato_Test_SFTP_Benchmark as user@host, using keys that do not require a password.
+    """
+    def _run_benchmark(self, destination:'str', should_reuse_session:'bool', command_count:'int') -> 'float':
+
+        username, host = destination.split('@')
+        conn = get_connection(username=username, host=host, should_reuse_session=should_reuse_session,
+            identity_file=os.environ.get('Zato_Test_SFTP_Benchmark_Identity_File'))
+
+        conn.connect()
+        start = monotonic()
+
+        try:
+            for idx in range(command_count):
+                out = conn.execute('cid.{}'.format(idx), 'ls .')
+                self.assertTrue(out.is_ok, out.details)
+        finally:
+            conn.close()
+
+        return monotonic() - start
+
+# ################################################################################################################################
+
+    def test_benchmark(self) -> 'None':
+
+        destination = os.environ.get('Zato_Test_SFTP_Benchmark')
+        if not destination:
+            return
+
+        command_count = 50
+
+        for should_reuse_session in (False, True):
+            elapsed = self._run_benchmark(destination, should_reuse_session, command_count)
+            logger.info('SFTP; should_reuse_session:%s; command_count:%s; elapsed:%.3fs; commands/s:%.1f',
+                should_reuse_session, command_count, elapsed, command_count / elapsed)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
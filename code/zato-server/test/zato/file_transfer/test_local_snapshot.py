@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.server.file_transfer.snapshot import DirSnapshotDiff, LocalSnapshotMaker
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Server:
+    def __init__(self, work_dir:'str') -> 'None':
+        self.odb = None
+        self.work_dir = work_dir
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _FileTransferAPI:
+    def __init__(self, work_dir:'str') -> 'None':
+        self.server = _Server(work_dir)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LocalSnapshotTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.work_dir = mkdtemp(prefix='zato-test-work-dir-')
+        self.path = mkdtemp(prefix='zato-test-pickup-')
+
+        os.mkdir(os.path.join(self.path, 'subdir'))
+
+        for name in ('file1.txt', 'file2.txt', os.path.join('subdir', 'file3.txt')):
+            self._write(name, 'abc')
+
+    def tearDown(self) -> 'None':
+        rmtree(self.work_dir)
+        rmtree(self.path)
+
+# ################################################################################################################################
+
+    def _write(self, name:'str', data:'str') -> 'str':
+        full_path = os.path.join(self.path, name)
+        with open(full_path, 'w') as f:
+            _ = f.write(data)
+        return full_path
+
+# ################################################################################################################################
+
+    def _get_snapshot_maker(self) -> 'LocalSnapshotMaker':
+        return LocalSnapshotMaker(_FileTransferAPI(self.work_dir), Bunch(id=1, name='test.channel')) # type: ignore
+
+# ################################################################################################################################
+
+    def test_unchanged_directory(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker()
+
+        snapshot1 = snapshot_maker.get_snapshot(self.path, True, True, True)
+        snapshot2 = snapshot_maker.get_snapshot(self.path, True, False, False)
+
+        self.assertEqual(len(snapshot1.file_data), 4)
+
+        # Nothing changed so the previous snapshot is returned as is ..
+        self.assertIs(snapshot1, snapshot2)
+
+        # .. and there is nothing to report.
+        diff = DirSnapshotDiff(snapshot1, snapshot2)
+        self.assertSetEqual(diff.files_created, set())
+        self.assertSetEqual(diff.files_modified, set())
+
+# ################################################################################################################################
+
+    def test_only_changed_files_reported(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker()
+        snapshot1 = snapshot_maker.get_snapshot(self.path, True, True, True)
+
+        created = self._write('file4.txt', 'abc')
+        modified = self._write('file1.txt', 'abcdef')
+
+        snapshot2 = snapshot_maker.get_snapshot(self.path, True, False, False)
+
+        diff = DirSnapshotDiff(snapshot1, snapshot2)
+        self.assertSetEqual(diff.files_created, {created})
+        self.assertSetEqual(diff.files_modified, {modified})
+
+        # Entries of files that did not change are reused
+        unchanged = os.path.join(self.path, 'file2.txt')
+        self.assertIs(snapshot1.file_data[unchanged], snapshot2.file_data[unchanged])
+
+# ################################################################################################################################
+
+    def test_restart_does_not_report_existing_files(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker()
+        _ = snapshot_maker.get_snapshot(self.path, True, True, True)
+
+        # A file is created while the server is not running ..
+        created = self._write('file5.txt', 'abc')
+
+        # .. and after a restart, only that file is reported.
+        snapshot_maker = self._get_snapshot_maker()
+        snapshot1 = snapshot_maker.get_snapshot(self.path, True, True, True)
+        snapshot2 = snapshot_maker.get_snapshot(self.path, True, False, False)
+
+        diff = DirSnapshotDiff(snapshot1, snapshot2)
+        self.assertSetEqual(diff.files_created, {created})
+        self.assertSetEqual(diff.files_modified, set())
+
+# ################################################################################################################################
+
+    def test_state_stored_at_most_once_per_interval(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker()
+        _ = snapshot_maker.get_snapshot(self.path, True, True, True)
+
+        state_path = snapshot_maker.get_state_path(self.path)
+        stored = snapshot_maker.stored_snapshot[self.path]
+
+        # A change is not stored right after the previous one was ..
+        _ = self._write('file4.txt', 'abc')
+        snapshot = snapshot_maker.get_snapshot(self.path, True, False, True)
+
+        self.assertIs(snapshot_maker.stored_snapshot[self.path], stored)
+        self.assertEqual(len(snapshot_maker.load_snapshot(self.path).file_data), 4) # type: ignore
+
+        # .. but it is once the interval has passed, even if nothing changed in the meantime.
+        snapshot_maker.next_store_time[self.path] = 0
+        snapshot_maker.store_snapshot(snapshot)
+
+        self.assertIs(snapshot_maker.stored_snapshot[self.path], snapshot)
+        self.assertEqual(len(snapshot_maker.load_snapshot(self.path).file_data), 5) # type: ignore
+        self.assertTrue(os.path.exists(state_path))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from datetime import datetime
+from json import loads
+from time import monotonic
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+import gevent
+
+# Zato
+from zato.server.file_transfer.snapshot import BaseRemoteSnapshotMaker, DirSnapshotDiff
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# Remote path -> file name -> size
+remote_files = {} # type: dict[str, dict[str, int]]
+
+# Name -> snapshot stored in the ODB
+odb_data = {} # type: anydict
+
+# How long it takes to list a remote directory
+list_delay = 0.1
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _FileClient:
+    def __init__(self, conn:'any_', config:'any_') -> 'None':
+        self.conn = conn
+
+        self.is_closed = False
+
+    def ping(self) -> 'None':
+        pass
+
+    def close(self) -> 'None':
+        self.is_closed = True
+
+    def get(self, path:'str') -> 'bytes':
+        return path.encode('utf8')
+
+    def list(self, path:'str') -> 'anydict':
+        gevent.sleep(list_delay)
+        file_list = []
+        for name, size in remote_files[path].items():
+            file_list.append({'name': name, 'size': size, 'is_dir': False, 'is_file': True, 'last_modified': datetime(2023, 1, 1)})
+        return {'file_list': file_list}
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _TransferWrapper:
+    def __init__(self, session:'any_', cluster_id:'int') -> 'None':
+        pass
+
+    def get(self, name:'str') -> 'any_':
+        return odb_data.get(name)
+
+    def store(self, name:'str', data:'str') -> 'None':
+        odb_data[name] = loads(data)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _ODB:
+    def session(self) -> 'any_':
+        return Bunch(close=lambda: None)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _SnapshotMaker(BaseRemoteSnapshotMaker):
+    file_client_class = _FileClient
+    transfer_wrapper_class = _TransferWrapper
+
+    def _get_outconn(self) -> 'any_':
+        return object()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class RemoteSnapshotTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        remote_files.clear()
+        odb_data.clear()
+
+        for idx in range(4):
+            remote_files['/dir{}'.format(idx)] = {'file1.txt': 1}
+
+    def _get_snapshot_maker(self, **config:'any_') -> '_SnapshotMaker':
+        server = Bunch(odb=_ODB(), cluster_id=1)
+        channel_config = Bunch(id=1, name='test.channel', source_type='ftp')
+        channel_config.update(config)
+
+        snapshot_maker = _SnapshotMaker(Bunch(server=server), channel_config) # type: ignore
+        snapshot_maker.connect()
+
+        return snapshot_maker
+
+# ################################################################################################################################
+
+    def test_paths_listed_in_parallel(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker(listing_pool_size=4)
+
+        start = monotonic()
+        greenlets = [gevent.spawn(snapshot_maker.get_snapshot, path, False, False, False) for path in remote_files]
+        gevent.joinall(greenlets, raise_error=True)
+
+        # All the paths were listed at the same time, each with a connection of its own
+        self.assertLess(monotonic() - start, list_delay * 2)
+
+# ################################################################################################################################
+
+    def test_snapshot_stored_only_if_changed(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker()
+
+        _ = snapshot_maker.get_snapshot('/dir0', False, False, True)
+        self.assertEqual(len(odb_data), 1)
+
+        # Nothing changed so nothing is stored ..
+        odb_data.clear()
+        _ = snapshot_maker.get_snapshot('/dir0', False, False, True)
+        self.assertEqual(len(odb_data), 0)
+
+        # .. but a new file means that the snapshot is stored again.
+        remote_files['/dir0']['file2.txt'] = 2
+        _ = snapshot_maker.get_snapshot('/dir0', False, False, True)
+        self.assertEqual(len(odb_data), 1)
+
+# ################################################################################################################################
+
+    def test_restart_uses_stored_snapshot(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker()
+        _ = snapshot_maker.get_snapshot('/dir0', False, False, True)
+
+        # A file is added while the server is not running ..
+        remote_files['/dir0']['file2.txt'] = 2
+
+        # .. and after a restart, only that file is reported.
+        snapshot_maker = self._get_snapshot_maker()
+        snapshot1 = snapshot_maker.get_snapshot('/dir0', False, True, True)
+        snapshot2 = snapshot_maker.get_snapshot('/dir0', False, False, False)
+
+        diff = DirSnapshotDiff(snapshot1, snapshot2)
+        self.assertSetEqual(diff.files_created, {'/dir0/file2.txt'})
+        self.assertSetEqual(diff.files_modified, set())
+
+# ################################################################################################################################
+
+    def test_adaptive_poll_interval(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker(max_poll_interval=10)
+        path = '/dir0'
+
+        # A path without changes is checked less and less often ..
+        intervals = []
+
+        for _ in range(5):
+            self.assertTrue(snapshot_maker.start_path_check(path))
+            snapshot_maker.end_path_check(path, False)
+            intervals.append(snapshot_maker.poll_interval[path])
+            snapshot_maker.next_check_time[path] = 0
+
+        self.assertListEqual(intervals, [1.1, 2.2, 4.4, 8.8, 10])
+
+        # .. it is not checked before its time comes ..
+        snapshot_maker.end_path_check(path, False)
+        self.assertFalse(snapshot_maker.start_path_check(path))
+
+        # .. and as soon as it changes, it is checked in each run again.
+        snapshot_maker.end_path_check(path, True)
+        self.assertTrue(snapshot_maker.start_path_check(path))
+
+        # A path that is being checked is not checked again at the same time
+        self.assertFalse(snapshot_maker.start_path_check(path))
+
+# ################################################################################################################################
+
+    def test_get_file_data_uses_pool(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker(listing_pool_size=1)
+
+        # The only client is checked out so no one else can use it at the same time ..
+        with snapshot_maker.get_file_client():
+            greenlet = gevent.spawn(snapshot_maker.get_file_data, '/dir0/file1.txt')
+            gevent.sleep(list_delay)
+            self.assertFalse(greenlet.ready())
+
+        # .. and once it is returned, the file can be read.
+        self.assertEqual(greenlet.get(timeout=1), b'/dir0/file1.txt')
+        self.assertEqual(snapshot_maker.file_client_pool.qsize(), 1)
+
+# ################################################################################################################################
+
+    def test_reconnect_closes_checked_out_clients(self) -> 'None':
+
+        snapshot_maker = self._get_snapshot_maker(listing_pool_size=2)
+
+        with snapshot_maker.get_file_client() as file_client:
+
+            # Reconnecting closes the idle client and creates a new pool ..
+            snapshot_maker.connect()
+            self.assertFalse(file_client.is_closed)
+
+        # .. while the client that was checked out is closed only when it is returned
+        # and it does not become part of the new pool.
+        self.assertTrue(file_client.is_closed)
+        self.assertEqual(snapshot_maker.file_client_pool.qsize(), 2)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
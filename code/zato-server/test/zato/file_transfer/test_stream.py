@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from io import BytesIO
+from json import loads
+from tempfile import NamedTemporaryFile
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# lxml
+from lxml.objectify import fromstring
+
+# Zato
+from zato.server.file_transfer.event import FileTransferEventHandler
+from zato.server.file_transfer.stream import iter_batches, iter_records
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_config(parse_with:'str'='', **kwargs:'any_') -> 'Bunch':
+    config = Bunch(should_parse_on_pickup=bool(parse_with), parse_with=parse_with, data_encoding='utf-8')
+    config.update(kwargs)
+    return config
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _Manager:
+    """ Stands in for FileTransferAPI, collecting the events that callbacks were invoked with and the ones post-handled.
+    """
+    def __init__(self) -> 'None':
+        self.raw_data_list = []
+        self.post_handled = []
+
+    def should_handle(self, name:'str', file_name:'str') -> 'bool':
+        return True
+
+    def build_relative_dir(self, path:'str') -> 'str':
+        return path
+
+    def invoke_callbacks(self, event:'any_', *args:'any_', **kwargs:'any_') -> 'None':
+        self.raw_data_list.append(event.raw_data)
+
+    def post_handle(self, event:'any_', *args:'any_') -> 'None':
+        self.post_handled.append(event.full_path)
+
+# ################################################################################################################################
+
+class _Observer:
+    should_wait_for_deleted_paths = False
+
+    def path_exists(self, path:'str', snapshot_maker:'any_') -> 'bool':
+        return True
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class StreamTestCase(TestCase):
+
+    def _get_batches(self, config:'Bunch', data:'bytes', parser:'any_', batch_size:'int') -> 'anylist':
+        return list(iter_batches(iter_records(config, BytesIO(data), parser), batch_size))
+
+# ################################################################################################################################
+
+    def test_csv(self) -> 'None':
+
+        data = b'a,b\n"c\nd",e\nf,g\n'
+        batches = self._get_batches(get_config('py:csv.reader'), data, None, 2)
+
+        self.assertEqual(len(batches), 2)
+        self.assertListEqual(batches[0].data, [['a', 'b'], ['c\nd', 'e']])
+        self.assertListEqual(batches[1].data, [['f', 'g']])
+
+        # Line numbers are the ones that each record ends on
+        self.assertListEqual(batches[0].line_no_list, [1, 3])
+        self.assertListEqual(batches[1].line_no_list, [4])
+
+        self.assertFalse(batches[0].is_last)
+        self.assertTrue(batches[1].is_last)
+
+# ################################################################################################################################
+
+    def test_json_lines_errors_per_record(self) -> 'None':
+
+        data = b'{"a":1}\n\n{"a":\n{"a":3}\n'
+        batches = self._get_batches(get_config('py:json.loads'), data, loads, 10)
+
+        self.assertEqual(len(batches), 1)
+        batch = batches[0]
+
+        # The invalid record is reported along with its line number and the next one is still parsed
+        self.assertListEqual(batch.data, [{'a': 1}, {'a': 3}])
+        self.assertListEqual(batch.line_no_list, [1, 4])
+        self.assertEqual(len(batch.parse_error_list), 1)
+        self.assertEqual(batch.parse_error_list[0]['line_no'], 3)
+
+# ################################################################################################################################
+
+    def test_xml(self) -> 'None':
+
+        data = b'<root>\n<item><id>1</id></item>\n<item><id>2</id></item>\n<item><id>3</id></item>\n</root>'
+        batches = self._get_batches(get_config('py:lxml.objectify.fromstring'), data, fromstring, 2)
+
+        self.assertEqual(len(batches), 2)
+        self.assertListEqual([elem.id for elem in batches[0].data], [1, 2])
+        self.assertListEqual([elem.id for elem in batches[1].data], [3])
+        self.assertListEqual(batches[0].line_no_list, [2, 3])
+
+# ################################################################################################################################
+
+    def test_xml_not_well_formed(self) -> 'None':
+
+        data = b'<root>\n<item><id>1</id></item>\n<item><id>2</item>\n</root>'
+        batches = self._get_batches(get_config('py:lxml.objectify.fromstring'), data, fromstring, 10)
+
+        batch = batches[0]
+        self.assertEqual(len(batch.data), 1)
+        self.assertEqual(len(batch.parse_error_list), 1)
+        self.assertEqual(batch.parse_error_list[0]['line_no'], 3)
+
+# ################################################################################################################################
+
+    def test_raw_chunks(self) -> 'None':
+
+        data = 'zażółć\n' * 3
+        batches = self._get_batches(get_config(stream_chunk_size=5), data.encode('utf8'), None, 1)
+
+        self.assertEqual(''.join(batch.data[0] for batch in batches), data)
+        self.assertTrue(all(len(batch.data[0]) <= 5 for batch in batches))
+        self.assertTrue(batches[-1].is_last)
+
+    def _handle_file(self, data:'bytes') -> '_Manager':
+
+        with NamedTemporaryFile(delete=False) as f:
+            _ = f.write(data)
+
+        self.addCleanup(os.remove, f.name)
+
+        config = get_config(name='test.channel', should_read_on_pickup=True, is_line_by_line=True, is_hot_deploy=False,
+            stream_chunk_size=5, service_list=[], topic_list=[], outconn_rest_list=[])
+
+        manager = _Manager()
+        handler = FileTransferEventHandler(manager, config.name, config) # type: ignore
+        handler.on_created(Bunch(src_path=f.name, is_directory=False), _Observer()) # type: ignore
+
+        return manager
+
+# ################################################################################################################################
+
+    def test_post_handle_after_stream(self) -> 'None':
+
+        manager = self._handle_file(b'abc\ndef\n')
+
+        self.assertEqual(''.join(manager.raw_data_list), 'abc\ndef\n')
+        self.assertEqual(len(manager.post_handled), 1)
+
+# ################################################################################################################################
+
+    def test_no_post_handle_after_read_error(self) -> 'None':
+
+        # The file cannot be decoded so it must not be deleted or moved, even if some of its data was already delivered
+        manager = self._handle_file(b'abcdefgh\xff\n')
+
+        self.assertListEqual(manager.post_handled, [])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
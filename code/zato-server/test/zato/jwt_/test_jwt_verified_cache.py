@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from logging import basicConfig, getLogger, INFO
+from time import monotonic
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Cryptography
+from cryptography.fernet import Fernet
+
+# Zato
+from zato.server.jwt_ import JWT
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+basicConfig(level=INFO, format='%(asctime)s - %(message)s')
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _VerifiedCache:
+    """ Stands in for a built-in cache - its data is shared by all the backends that use it, as in the case of workers.
+    """
+    def __init__(self) -> 'None':
+        self.data = {}
+
+    def get(self, key:'str', default:'any_'=None) -> 'any_':
+        return self.data.get(key, default)
+
+    def set(self, key:'str', value:'any_', expiry:'int'=0) -> 'None':
+        self.data[key] = value
+
+    def delete(self, key:'str', raise_key_error:'bool'=True) -> 'any_':
+        return self.data.pop(key, None)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _ODBCache:
+    """ Stands in for JWTCache, i.e. for tokens kept in ODB.
+    """
+    def __init__(self) -> 'None':
+        self.data = {}
+        self.total_get = 0
+        self.total_put = 0
+        self.is_async_list = []
+
+    def get(self, key:'str') -> 'any_':
+        self.total_get += 1
+        return self.data.get(key)
+
+    def put(self, key:'str', value:'any_', ttl:'int'=0, is_async:'bool'=True) -> 'None':
+        self.total_put += 1
+        self.is_async_list.append(is_async)
+        self.data[key] = value
+
+    def delete(self, key:'str') -> 'None':
+        _ = self.data.pop(key, None)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class JWTVerifiedCacheTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.secret = Fernet.generate_key()
+        self.verified_cache = _VerifiedCache()
+        self.odb_cache = _ODBCache()
+
+# ################################################################################################################################
+
+    def _get_backend(self, verified_cache:'any_'=True, needs_odb:'bool'=True) -> 'JWT':
+
+        verified_cache = self.verified_cache if verified_cache is True else verified_cache
+        backend = JWT(None, None, self.secret, verified_cache, needs_odb)
+
+        # All the backends share the same caches, as it would be with multiple workers ..
+        backend.cache = self.odb_cache # type: ignore
+
+        # .. and there is only one user in the ODB.
+        backend._lookup_jwt = lambda username, password: Bunch(id=1, username=username, ttl=3600) # type: ignore
+
+        return backend
+
+# ################################################################################################################################
+
+    def test_validate_without_odb(self) -> 'None':
+
+        # The token is created in one worker ..
+        token = self._get_backend().authenticate('user1', 'password1').token
+
+        # .. and validated in another one, without reaching ODB.
+        result = self._get_backend().validate('user1', token)
+
+        self.assertTrue(result.valid)
+        self.assertEqual(result.token.username, 'user1')
+        self.assertEqual(self.odb_cache.total_get, 0)
+
+        # Another user cannot use the same token
+        result = self._get_backend().validate('user2', token)
+        self.assertFalse(result.valid)
+
+# ################################################################################################################################
+
+    def test_odb_fallback(self) -> 'None':
+
+        # The token is created without a verified cache, e.g. by a server that does not use it ..
+        token = self._get_backend(verified_cache=None).authenticate('user1', 'password1').token
+        self.assertDictEqual(self.verified_cache.data, {})
+
+        # .. so the first validation needs ODB ..
+        backend = self._get_backend()
+
+        self.assertTrue(backend.validate('user1', token).valid)
+        self.assertEqual(self.odb_cache.total_get, 1)
+
+        # .. but the next one does not.
+        self.assertTrue(backend.validate('user1', token).valid)
+        self.assertEqual(self.odb_cache.total_get, 1)
+
+# ################################################################################################################################
+
+    def test_verified_cache_not_in_sync(self) -> 'None':
+
+        # The token is stored in ODB before authenticate returns ..
+        token = self._get_backend().authenticate('user1', 'password1').token
+        self.assertListEqual(self.odb_cache.is_async_list, [False])
+
+        # .. so a worker that has not received it through the verified cache yet will find it in ODB.
+        backend = self._get_backend(verified_cache=_VerifiedCache())
+
+        self.assertTrue(backend.validate('user1', token).valid)
+        self.assertEqual(self.odb_cache.total_get, 1)
+
+# ################################################################################################################################
+
+    def test_revocation(self) -> 'None':
+
+        token = self._get_backend().authenticate('user1', 'password1').token
+        self.assertTrue(self._get_backend().validate('user1', token).valid)
+
+        # Deleting the token in one worker revokes it in all of them
+        self._get_backend().delete(token)
+
+        self.assertFalse(self._get_backend().validate('user1', token).valid)
+        self.assertDictEqual(self.odb_cache.data, {})
+
+# ################################################################################################################################
+
+    def test_needs_odb_false(self) -> 'None':
+
+        token = self._get_backend(needs_odb=False).authenticate('user1', 'password1').token
+
+        self.assertEqual(self.odb_cache.total_put, 0)
+        self.assertTrue(self._get_backend(needs_odb=False).validate('user1', token).valid)
+        self.assertEqual(self.odb_cache.total_get, 0)
+
+        # Tokens that are not in the verified cache are not looked up in ODB
+        self.verified_cache.data.clear()
+        self.assertFalse(self._get_backend(needs_odb=False).validate('user1', token).valid)
+        self.assertEqual(self.odb_cache.total_get, 0)
+
+# ################################################################################################################################
+
+    def test_validate_per_second(self) -> 'None':
+
+        if not os.environ.get('Zato_Test_JWT_Benchmark'):
+            return
+
+        max_iters = 20_000
+
+        for verified_cache in (None, True):
+
+            backend = self._get_backend(verified_cache)
+            token = backend.authenticate('user1', 'password1').token
+
+            start = monotonic()
+            for _ in range(max_iters):
+                _ = backend.validate('user1', token)
+            elapsed = monotonic() - start
+
+            logger.info('JWT validate, verified cache: %s -> %d/s', verified_cache is not None, max_iters / elapsed)
+
+# ################################################################################################################################
+# ################################################################################################################################
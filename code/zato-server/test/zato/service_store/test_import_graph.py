@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from logging import basicConfig, getLogger, INFO
+from time import monotonic
+from unittest import TestCase
+
+# Zato
+from zato.server.service.import_graph import get_imported_names, ImportGraph
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+basicConfig(level=INFO, format='%(asctime)s - %(message)s')
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_path(mod_name:'str') -> 'str':
+    return '/src/{}.py'.format(mod_name.replace('.', '/'))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ImportGraphTestCase(TestCase):
+
+    def test_get_imported_names(self) -> 'None':
+
+        source = '\n'.join([
+            'import os',
+            'import my.api as api',
+            'from my.models import User, Account',
+            'from .common import util',
+            'from .. import top',
+            'from ..lib.x import *',
+            '',
+            'def func():',
+            '    import json',
+        ])
+
+        names = get_imported_names('my.pkg.services', source)
+
+        self.assertSetEqual(names, {
+            'os', 'my.api', 'my.models', 'my.models.User', 'my.models.Account', 'my.pkg.common', 'my.pkg.common.util',
+            'my', 'my.top', 'my.lib.x', 'json',
+        })
+
+# ################################################################################################################################
+
+    def test_invalid_source(self) -> 'None':
+        self.assertSetEqual(get_imported_names('my.mod', 'import ('), set())
+
+# ################################################################################################################################
+
+    def test_direct_importers(self) -> 'None':
+
+        graph = ImportGraph()
+
+        graph.update(get_path('my.base'), 'my.base', 'import os')
+        graph.update(get_path('my.a'), 'my.a', 'from my.base import Base')
+        graph.update(get_path('my.b'), 'my.b', 'import my.base')
+
+        # A module that only mentions the name in a comment or a string is not an importer
+        graph.update(get_path('my.c'), 'my.c', '# import my.base\nx = "my.base"')
+
+        self.assertListEqual(graph.get_importers('my.base'), [get_path('my.a'), get_path('my.b')])
+        self.assertListEqual(graph.get_importers('my.a'), [])
+
+# ################################################################################################################################
+
+    def test_incremental_update(self) -> 'None':
+
+        graph = ImportGraph()
+
+        graph.update(get_path('my.base'), 'my.base', '')
+        graph.update(get_path('my.a'), 'my.a', 'from my.base import Base')
+
+        self.assertListEqual(graph.get_importers('my.base'), [get_path('my.a')])
+
+        # The module no longer imports the base one ..
+        graph.update(get_path('my.a'), 'my.a', 'import os')
+        self.assertListEqual(graph.get_importers('my.base'), [])
+        self.assertListEqual(graph.get_importers('os'), [get_path('my.a')])
+
+        # .. and now it is deleted altogether.
+        graph.remove(get_path('my.a'))
+        self.assertListEqual(graph.get_importers('os'), [])
+        self.assertDictEqual(graph.importers, {})
+
+# ################################################################################################################################
+
+    def test_lazy_source(self) -> 'None':
+
+        graph = ImportGraph()
+        calls = []
+
+        def get_source() -> 'str':
+            calls.append(1)
+            return 'from my.base import Base'
+
+        # The source code is not needed until the graph is queried ..
+        graph.update(get_path('my.a'), 'my.a', get_source, 'hash.1')
+        graph.update(get_path('my.a'), 'my.a', get_source, 'hash.1')
+        self.assertListEqual(calls, [])
+
+        # .. and then it is read only once.
+        self.assertListEqual(graph.get_importers('my.base'), [get_path('my.a')])
+        self.assertListEqual(calls, [1])
+
+        # The same hash means that the module has not changed
+        graph.update(get_path('my.a'), 'my.a', get_source, 'hash.1')
+        self.assertListEqual(graph.get_importers('my.base'), [get_path('my.a')])
+        self.assertListEqual(calls, [1])
+
+# ################################################################################################################################
+
+    def test_transitive_importers(self) -> 'None':
+
+        graph = ImportGraph()
+
+        # base <- a <- b <- c, and c imports base too, while d imports c and a.
+        graph.update(get_path('my.base'), 'my.base', '')
+        graph.update(get_path('my.c'), 'my.c', 'import my.b\nimport my.base')
+        graph.update(get_path('my.a'), 'my.a', 'import my.base')
+        graph.update(get_path('my.d'), 'my.d', 'import my.c\nimport my.a')
+        graph.update(get_path('my.b'), 'my.b', 'import my.a')
+        graph.update(get_path('my.other'), 'my.other', 'import os')
+
+        result = graph.get_importers('my.base', transitive=True)
+
+        self.assertSetEqual(set(result), {get_path('my.a'), get_path('my.b'), get_path('my.c'), get_path('my.d')})
+
+        # Each module is redeployed only after all the ones it imports
+        self.assertLess(result.index(get_path('my.a')), result.index(get_path('my.b')))
+        self.assertLess(result.index(get_path('my.b')), result.index(get_path('my.c')))
+        self.assertLess(result.index(get_path('my.c')), result.index(get_path('my.d')))
+
+# ################################################################################################################################
+
+    def test_transitive_importers_cycle(self) -> 'None':
+
+        graph = ImportGraph()
+
+        graph.update(get_path('my.a'), 'my.a', 'import my.b')
+        graph.update(get_path('my.b'), 'my.b', 'import my.a')
+
+        self.assertListEqual(graph.get_importers('my.a', transitive=True), [get_path('my.b')])
+
+# ################################################################################################################################
+
+    def test_lookup_time(self) -> 'None':
+
+        max_modules = 3000
+        graph = ImportGraph()
+
+        graph.update(get_path('my.base'), 'my.base', '')
+
+        for idx in range(max_modules):
+            mod_name = 'my.mod{}'.format(idx)
+            source = 'import os\nimport json\nfrom my.lib{} import x\n'.format(idx)
+
+            # Only one in a hundred modules imports the base one
+            if idx % 100 == 0:
+                source += 'from my.base import Base\n'
+
+            graph.update(get_path(mod_name), mod_name, source)
+
+        # The first lookup indexes all the modules ..
+        start = monotonic()
+        _ = graph.get_importers('my.base')
+        first = monotonic() - start
+
+        # .. and each subsequent one depends only on how many importers there are.
+        start = monotonic()
+        result = graph.get_importers('my.base')
+        second = monotonic() - start
+
+        self.assertEqual(len(result), max_modules // 100)
+
+        logger.info('Import graph of %d modules; first lookup: %.4fs; next lookup: %.6fs', max_modules, first, second)
+
+# ################################################################################################################################
+# ################################################################################################################################
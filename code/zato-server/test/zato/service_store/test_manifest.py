@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+import sys
+from importlib.util import module_from_spec, spec_from_file_location
+from logging import basicConfig, getLogger, INFO
+from tempfile import TemporaryDirectory
+from time import monotonic
+from unittest import TestCase
+from unittest.mock import patch
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.server.service import manifest
+from zato.server.service.manifest import DeploymentManifest, ModuleCtx
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+basicConfig(level=INFO, format='%(asctime)s - %(message)s')
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many modules to generate for each test
+max_modules = 300
+
+# How many classes each module will contain
+classes_per_module = 10
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_module_source(idx:'int') -> 'str':
+
+    out = ['# -*- coding: utf-8 -*-', '']
+
+    for class_idx in range(classes_per_module):
+        out.append('class MyService{}_{}:'.format(idx, class_idx))
+        out.append('    """ A docstring to make the source code a little bit longer.')
+        out.append('    """')
+        out.append('    def handle(self):')
+        out.append('        return {}'.format(class_idx))
+        out.append('')
+
+    return '\n'.join(out)
+
+# ################################################################################################################################
+
+def get_service_module_source(idx:'int') -> 'str':
+
+    out = ['# -*- coding: utf-8 -*-', '', 'from zato.server.service import Service', '']
+
+    for class_idx in range(classes_per_module):
+        out.append('class MyBenchService{}_{}(Service):'.format(idx, class_idx))
+        out.append('    def handle(self):')
+        out.append('        self.response.payload = {}'.format(class_idx))
+        out.append('')
+
+    return '\n'.join(out)
+
+# ################################################################################################################################
+
+def import_module_by_path(path:'str') -> 'any_':
+
+    mod_name = 'zato_test_manifest_' + os.path.basename(path).replace('.py', '')
+
+    spec = spec_from_file_location(mod_name, path)
+    mod = module_from_spec(spec) # type: ignore
+    spec.loader.exec_module(mod) # type: ignore
+
+    sys.modules[mod_name] = mod
+
+    return mod
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DeploymentManifestTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        self.tmp_dir = TemporaryDirectory()
+        self.base_dir = self.tmp_dir.name
+        self.src_dir = os.path.join(self.base_dir, 'src')
+        self.repo_dir = os.path.join(self.base_dir, 'config', 'repo')
+
+        os.makedirs(self.src_dir)
+        os.makedirs(self.repo_dir)
+
+        self.modules = [] # type: list
+
+        for idx in range(max_modules):
+            path = os.path.join(self.src_dir, 'mod{}.py'.format(idx))
+            with open(path, 'w') as f:
+                _ = f.write(get_module_source(idx))
+            self.modules.append(import_module_by_path(path))
+
+# ################################################################################################################################
+
+    def tearDown(self) -> 'None':
+        self.tmp_dir.cleanup()
+
+# ################################################################################################################################
+
+    def _deploy(self, deployment_manifest:'DeploymentManifest') -> 'None':
+        """ Runs the source code analysis that a server runs for each service when it starts.
+        """
+        for mod in self.modules:
+            for class_idx in range(classes_per_module):
+                class_ = getattr(mod, 'MyService{}_{}'.format(mod.__name__.split('mod')[-1], class_idx))
+                _ = deployment_manifest.get_source_code_info(mod, class_)
+
+        deployment_manifest.save()
+        deployment_manifest.end_deployment()
+
+# ################################################################################################################################
+
+    def test_source_code_info(self) -> 'None':
+
+        manifest = DeploymentManifest.from_base_dir(self.base_dir)
+        mod = self.modules[0]
+
+        info = manifest.get_source_code_info(mod, mod.MyService0_2)
+
+        self.assertEqual(info.path, mod.__file__)
+        self.assertEqual(info.hash_method, ModuleCtx.Hash_Method)
+        self.assertEqual(info.len_source, os.stat(mod.__file__).st_size)
+        self.assertEqual(info.line_number, 14)
+        self.assertEqual(len(info.hash), 64)
+
+# ################################################################################################################################
+
+    def test_cold_and_warm_manifest(self) -> 'None':
+
+        # The first deployment has no manifest so everything needs to be analysed ..
+        cold = DeploymentManifest.from_base_dir(self.base_dir)
+        self.assertFalse(cold.is_warm)
+
+        self._deploy(cold)
+
+        self.assertEqual(cold.total_analysed, max_modules)
+        self.assertEqual(cold.total_unchanged, 0)
+        self.assertTrue(os.path.exists(cold.path))
+
+        # .. whereas the next one is able to skip each module that did not change.
+        warm = DeploymentManifest.from_base_dir(self.base_dir)
+        self.assertTrue(warm.is_warm)
+
+        self._deploy(warm)
+
+        self.assertEqual(warm.total_analysed, 0)
+        self.assertEqual(warm.total_unchanged, max_modules)
+
+# ################################################################################################################################
+
+    def test_unchanged_module_is_not_read(self) -> 'None':
+
+        self._deploy(DeploymentManifest.from_base_dir(self.base_dir))
+
+        warm = DeploymentManifest.from_base_dir(self.base_dir)
+        mod = self.modules[0]
+
+        # Everything about an unchanged module is known without reading it ..
+        with patch.object(manifest, 'open', create=True) as open_:
+            info = warm.get_source_code_info(mod, mod.MyService0_2)
+            open_.assert_not_called()
+
+        self.assertEqual(info.len_source, os.stat(mod.__file__).st_size)
+        self.assertEqual(info.line_number, 14)
+        self.assertEqual(len(info.hash), 64)
+
+        # .. but its source code can still be read if it is needed.
+        with open(mod.__file__, 'rb') as f:
+            self.assertEqual(info.source, f.read())
+
+# ################################################################################################################################
+
+    def test_changed_module_is_analysed(self) -> 'None':
+
+        self._deploy(DeploymentManifest.from_base_dir(self.base_dir))
+
+        # Change one of the modules ..
+        path = self.modules[0].__file__
+
+        with open(path, 'a') as f:
+            _ = f.write('\n# A new comment\n')
+
+        # .. and confirm that only this one is analysed anew.
+        warm = DeploymentManifest.from_base_dir(self.base_dir)
+        self._deploy(warm)
+
+        self.assertEqual(warm.total_analysed, 1)
+        self.assertEqual(warm.total_unchanged, max_modules - 1)
+
+# ################################################################################################################################
+
+    def test_manifest_of_another_server(self) -> 'None':
+
+        self._deploy(DeploymentManifest.from_base_dir(self.base_dir, server_id=1))
+
+        manifest = DeploymentManifest.from_base_dir(self.base_dir, server_id=2)
+        self.assertFalse(manifest.is_warm)
+
+# ################################################################################################################################
+
+    def test_deleted_module_is_pruned(self) -> 'None':
+
+        manifest = DeploymentManifest.from_base_dir(self.base_dir)
+        self._deploy(manifest)
+
+        path = self.modules[0].__file__
+        os.remove(path)
+
+        manifest.save()
+
+        manifest = DeploymentManifest.from_base_dir(self.base_dir)
+        self.assertNotIn(path, manifest.modules)
+        self.assertEqual(len(manifest.modules), max_modules - 1)
+
+# ################################################################################################################################
+
+    def test_service_store_cold_and_warm(self) -> 'None':
+
+        if not os.environ.get('Zato_Test_Manifest_Benchmark'):
+            return
+
+        # This is imported here because the service store needs the full server environment
+        # whereas the rest of the tests need the manifest only.
+        from zato.server.service.store import ServiceStore
+
+        bench_dir = os.path.join(self.base_dir, 'bench')
+        os.makedirs(bench_dir)
+
+        mod_names = []
+
+        for idx in range(max_modules):
+            mod_name = 'zato_test_manifest_bench{}'.format(idx)
+            mod_names.append(mod_name)
+            with open(os.path.join(bench_dir, mod_name + '.py'), 'w') as f:
+                _ = f.write(get_service_module_source(idx))
+
+        server = Bunch(cluster_id=None, is_sso_enabled=False, crypto_manager=None, audit_pii=None)
+
+        for label in ('cold', 'warm'):
+
+            # Each run imports all the modules anew, as a server does when it starts
+            for mod_name in mod_names:
+                _ = sys.modules.pop(mod_name, None)
+
+            service_store = ServiceStore(services={}, odb=None, server=server, is_testing=True) # type: ignore
+            to_process = []
+
+            # This is what import_services_from_anywhere does, except for the pauses that it makes between modules
+            # to let other greenlets run, which would take longer than everything else here.
+            start = monotonic()
+
+            _ = service_store.set_up_manifest(self.base_dir)
+
+            for mod_name in mod_names:
+                path = os.path.join(bench_dir, mod_name + '.py')
+                to_process.extend(service_store.import_services_from_file(path, False, self.base_dir))
+
+            service_store.save_manifest(to_process)
+
+            elapsed = monotonic() - start
+
+            self.assertEqual(len(to_process), max_modules * classes_per_module)
+            self.assertEqual(service_store.manifest.is_warm, label == 'warm')
+
+            logger.info('ServiceStore %s import, %s services -> %.3fs', label, len(to_process), elapsed)
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from unittest import main, TestCase
+
+# Zato
+from zato.server.rbac_ import RBAC
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class RBACDecisionTableTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        self.rbac = RBAC()
+
+        self.perm_read = 1
+        self.perm_create = 2
+        self.service1 = 100
+        self.service2 = 200
+
+        self.client1 = 'sec_def:::basic_auth:::client1'
+        self.client2 = 'sec_def:::basic_auth:::client2'
+
+        with self.rbac.bulk_update():
+
+            self.rbac.create_permission(self.perm_read, 'Read')
+            self.rbac.create_permission(self.perm_create, 'Create')
+
+            self.rbac.create_resource(self.service1)
+            self.rbac.create_resource(self.service2)
+
+            # role.child inherits everything from role.parent
+            self.rbac.create_role(10, 'role.parent', None)
+            self.rbac.create_role(11, 'role.child', 10)
+
+            self.rbac.create_client_role(self.client1, 10)
+            self.rbac.create_client_role(self.client2, 11)
+
+            self.rbac.create_role_permission_allow(10, self.perm_read, self.service1)
+            self.rbac.create_role_permission_allow(11, self.perm_create, self.service1)
+
+        self.rbac.set_http_permissions()
+
+# ################################################################################################################################
+
+    def _assert_same_as_registry(self) -> 'None':
+
+        for client_def, role_ids in self.rbac.client_def_to_role_id.items():
+            for perm_id in (self.perm_read, self.perm_create):
+                for resource in (self.service1, self.service2):
+                    expected = bool(self.rbac.registry.is_any_allowed(role_ids, perm_id, resource))
+                    given = self.rbac.is_client_allowed(client_def, perm_id, resource)
+                    self.assertIs(given, expected, (client_def, perm_id, resource))
+
+# ################################################################################################################################
+
+    def test_role_hierarchy(self) -> 'None':
+
+        self.assertTrue(self.rbac.is_http_client_allowed(self.client1, 'GET', self.service1))
+        self.assertFalse(self.rbac.is_http_client_allowed(self.client1, 'POST', self.service1))
+
+        self.assertTrue(self.rbac.is_http_client_allowed(self.client2, 'GET', self.service1))
+        self.assertTrue(self.rbac.is_http_client_allowed(self.client2, 'POST', self.service1))
+
+        self.assertFalse(self.rbac.is_http_client_allowed(self.client2, 'GET', self.service2))
+
+        self.assertTupleEqual(self.rbac.get_allowed_clients(self.perm_read, self.service1), (self.client1, self.client2))
+        self.assertTupleEqual(self.rbac.get_allowed_clients(self.perm_create, self.service1), (self.client2,))
+        self.assertTupleEqual(self.rbac.get_allowed_clients(self.perm_read, self.service2), ())
+
+        self._assert_same_as_registry()
+
+# ################################################################################################################################
+
+    def test_changes_applied(self) -> 'None':
+
+        decisions = self.rbac.decisions
+
+        # A denial overrides what a parent role allows ..
+        self.rbac.create_role_permission_deny(11, self.perm_read, self.service1)
+        self.assertFalse(self.rbac.is_client_allowed(self.client2, self.perm_read, self.service1))
+        self.assertTupleEqual(self.rbac.get_allowed_clients(self.perm_read, self.service1), (self.client1,))
+        self._assert_same_as_registry()
+
+        # .. the table that was in use before is not modified, it is replaced by a new one ..
+        self.assertIsNot(self.rbac.decisions, decisions)
+        self.assertTrue(decisions.allowed[self.client2, self.perm_read, self.service1])
+
+        # .. and permissions are gained and lost along with roles.
+        self.rbac.delete_role_permission_deny(11, self.perm_read, self.service1)
+        self.rbac.create_role_permission_allow(10, self.perm_read, self.service2)
+        self._assert_same_as_registry()
+        self.assertTrue(self.rbac.is_client_allowed(self.client2, self.perm_read, self.service2))
+
+        self.rbac.delete_client_role(self.client2, 11)
+        self.assertFalse(self.rbac.is_client_allowed(self.client2, self.perm_create, self.service1))
+        self.assertTupleEqual(self.rbac.get_allowed_clients(self.perm_create, self.service1), ())
+
+        self.rbac.delete_resource(self.service2)
+        self.assertFalse(self.rbac.is_client_allowed(self.client1, self.perm_read, self.service2))
+        self.assertTrue(self.rbac.is_client_allowed(self.client1, self.perm_read, self.service1))
+
+# ################################################################################################################################
+
+    def test_edit_role(self) -> 'None':
+
+        # role.child no longer has a parent so its client loses what the parent allowed
+        self.rbac.edit_role(11, 'role.child', 'role.child', None)
+
+        self.assertFalse(self.rbac.is_client_allowed(self.client2, self.perm_read, self.service1))
+        self.assertTrue(self.rbac.is_client_allowed(self.client2, self.perm_create, self.service1))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
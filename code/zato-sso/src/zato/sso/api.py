@@ -26,6 +26,7 @@ if 0:
     from bunch import Bunch
     from zato.common.typing_ import callable_, callnone
     from zato.server.base.parallel import ParallelServer
+    from zato.server.connection.cache import Cache
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -41,6 +42,7 @@ class SSOAPI:
     hash_func:        'callable_'
     verify_hash_func: 'callable_'
     new_user_id_func: 'callnone' = None
+    needs_rehash_func: 'callnone' = None
 
     encrypt_email:    'bool'
     encrypt_password: 'bool'
@@ -59,7 +61,8 @@ class SSOAPI:
         decrypt_func,     # type: callable_
         hash_func,        # type: callable_
         verify_hash_func, # type: callable_
-        new_user_id_func=None # type: callnone
+        new_user_id_func=None,  # type: callnone
+        needs_rehash_func=None, # type: callnone
     ) -> 'None':
 
         self.server = server
@@ -70,6 +73,7 @@ class SSOAPI:
         self.hash_func = hash_func
         self.verify_hash_func = verify_hash_func
         self.new_user_id_func = new_user_id_func
+        self.needs_rehash_func = needs_rehash_func
         self.encrypt_email = self.sso_conf.main.encrypt_email
         self.encrypt_password = self.sso_conf.main.encrypt_password
         self.password_expiry = self.sso_conf.password.expiry
@@ -79,16 +83,16 @@ class SSOAPI:
 
         # User management, including passwords
         self.user = UserAPI(server, sso_conf, self.totp, odb_session_func, encrypt_func, decrypt_func,
-            hash_func, verify_hash_func, new_user_id_func)
+            hash_func, verify_hash_func, new_user_id_func, needs_rehash_func)
 
         # Management of Password reset tokens (PRT)
         self.password_reset = PasswordResetAPI(server, sso_conf, odb_session_func, decrypt_func, verify_hash_func)
 
 # ################################################################################################################################
 
-    def post_configure(self, func:'callable_', is_sqlite:'bool') -> 'None':
+    def post_configure(self, func:'callable_', is_sqlite:'bool', session_cache:'Cache | None'=None) -> 'None':
         self.odb_session_func = func
-        self.user.post_configure(func, is_sqlite)
+        self.user.post_configure(func, is_sqlite, session_cache=session_cache)
         self.password_reset.post_configure(func, is_sqlite)
 
 # ################################################################################################################################
@@ -18,7 +18,7 @@ from uuid import uuid4
 from zato.common.api import GENERIC, SEC_DEF_TYPE
 from zato.common.audit import audit_pii
 from zato.common.json_internal import dumps
-from zato.common.odb.model import SSOSession as SessionModel
+from zato.common.odb.model import SSOSession as SessionModel, SSOUser as UserModel
 from zato.common.model.sso import ExpiryHookInput
 from zato.common.typing_ import cast_
 from zato.sso import status_code, Session as SessionEntity, ValidationError
@@ -28,7 +28,8 @@ from zato.sso.odb.query import get_session_by_ext_id, get_session_by_ust, get_se
 from zato.sso.common import insert_sso_session, LoginCtx, SessionInsertCtx, \
      update_session_state_change_list as _update_session_state_change_list, VerifyCtx
 from zato.sso.model import RequestCtx
-from zato.sso.util import new_user_session_token, set_password, UserChecker, validate_password
+from zato.sso.session_cache import ModuleCtx as SessionCacheCtx, SessionCache
+from zato.sso.util import make_password_secret, new_user_session_token, set_password, UserChecker, validate_password
 
 # ################################################################################################################################
 
@@ -36,12 +37,14 @@ if 0:
     from typing import Callable
     from bunch import Bunch
     from zato.common.odb.model import SSOUser
-    from zato.common.typing_ import anylist, anytuple, boolnone, callable_, dtnone, list_, stranydict, strnone
+    from zato.common.typing_ import any_, anylist, anytuple, boolnone, callable_, dtnone, list_, stranydict, strnone
     from zato.server.base.parallel import ParallelServer
+    from zato.server.connection.cache import Cache
     from zato.sso.totp_ import TOTPAPI
     from zato.sso.user import User
 
     Bunch = Bunch
+    Cache = Cache
     Callable = Callable
     SSOUser = SSOUser
     User = User
@@ -59,6 +62,9 @@ SessionModelTable = SessionModel.__table__
 SessionModelUpdate = SessionModelTable.update
 SessionModelDelete = SessionModelTable.delete
 
+UserModelTable = UserModel.__table__
+UserModelUpdate = UserModelTable.update
+
 # ################################################################################################################################
 
 _dummy_password='dummy.{}'.format(uuid4().hex)
@@ -112,6 +118,7 @@ class SessionAPI:
         decrypt_func,     # type: 'callable_'
         hash_func,        # type: 'callable_'
         verify_hash_func, # type: 'callable_'
+        needs_rehash_func=None, # type: 'callable_ | None'
     ) -> 'None':
         self.server = server
         self.sso_conf = sso_conf
@@ -120,17 +127,33 @@ class SessionAPI:
         self.decrypt_func = decrypt_func
         self.hash_func = hash_func
         self.verify_hash_func = verify_hash_func
+        self.needs_rehash_func = needs_rehash_func
         self.odb_session_func = None
         self.is_sqlite = None
         self.interaction_max_len = 100
         self.user_checker = UserChecker(self.decrypt_func, self.verify_hash_func, self.sso_conf)
 
+        # Sessions already verified, shared by all the workers, if enabled in post_configure
+        self.cache = None # type: SessionCache | None
+
 # ################################################################################################################################
 
-    def post_configure(self, func:'callable_', is_sqlite:'bool') -> 'None':
+    def post_configure(self, func:'callable_', is_sqlite:'bool', builtin_cache:'Cache | None'=None) -> 'None':
         self.odb_session_func = func
         self.is_sqlite = is_sqlite
 
+        if builtin_cache:
+            flush_interval = self.sso_conf.session.get('renew_flush_interval', SessionCacheCtx.Default_Flush_Interval)
+            self.cache = SessionCache(builtin_cache, func, float(flush_interval))
+
+# ################################################################################################################################
+
+    def on_user_changed(self, user_id:'strnone') -> 'None':
+        """ Invoked each time a user was changed in a way that may affect the user's sessions.
+        """
+        if self.cache:
+            self.cache.delete_by_user_id(user_id)
+
 # ################################################################################################################################
 
     def _format_ext_session_id(
@@ -247,6 +270,30 @@ class SessionAPI:
         else:
             return user.is_totp_enabled
 
+# ################################################################################################################################
+
+    def _maybe_rehash_password(self, session:'any_', user:'SSOUser', password:'str') -> 'None':
+        """ Hashes a user's password again if the hash stored in the database was computed with parameters
+        other than the current ones, e.g. if the number of rounds changed since then. This is possible only
+        when the user logs in because this is the only time that the password itself is known.
+        """
+        if not self.needs_rehash_func:
+            return
+
+        if not self.needs_rehash_func(self.decrypt_func(user.password)):
+            return
+
+        new_password = make_password_secret(password, self.sso_conf.main.encrypt_password, self.encrypt_func, self.hash_func)
+
+        session.execute(
+            UserModelUpdate().values({
+                'password': new_password,
+            }).where(
+                UserModelTable.c.user_id==user.user_id
+        ))
+
+        logger.info('Password hash updated to current parameters; user_id:`%s`', user.user_id)
+
 # ################################################################################################################################
 
     def login(
@@ -351,6 +398,12 @@ class SessionAPI:
                     else:
                         set_password(self.odb_session_func, self.encrypt_func, self.hash_func, self.sso_conf, user.user_id,
                                 ctx.input['new_password'], False)
+                        self.on_user_changed(user.user_id)
+
+                # The password was checked above so we can hash it again, in case the current hash is outdated,
+                # which will be committed along with the new session.
+                elif not is_logged_in_ext:
+                    self._maybe_rehash_password(session, user, ctx.input['password'])
 
             # All validated, we can create a session object now
             creation_time = _now()
@@ -394,7 +447,19 @@ class SessionAPI:
         """
         # type: (object, str, datetime) -> object
 
-        return get_session_by_ust(session, ust, now)
+        # A warm session does not need the database at all ..
+        if self.cache:
+            if sso_info := self.cache.get(ust, now):
+                return sso_info
+
+        # .. otherwise, we look it up ..
+        sso_info = get_session_by_ust(session, ust, now)
+
+        # .. and make it warm for subsequent calls.
+        if sso_info and self.cache:
+            self.cache.set(ust, sso_info, now)
+
+        return sso_info
 
 # ################################################################################################################################
 
@@ -529,6 +594,13 @@ class SessionAPI:
                 session_expiry = self._get_session_expiry_delta(ctx.current_app, sso_info.username)
                 expiration_time = now + timedelta(minutes=session_expiry)
 
+                # With a cache, the renewal is written to the database in background,
+                # along with all the other renewals that take place in the meantime ..
+                if self.cache:
+                    self.cache.renew(ctx.ust, sso_info, expiration_time, opaque, now)
+                    return expiration_time
+
+                # .. whereas without it, we write it immediately.
                 session.execute(
                     SessionModelUpdate().values({
                         'expiration_time': expiration_time,
@@ -718,4 +790,8 @@ class SessionAPI:
                 )
                 session.commit()
 
+                # .. and delete it from all the workers too.
+                if self.cache:
+                    self.cache.delete(ust)
+
 # ################################################################################################################################
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from contextlib import closing
+from hashlib import sha256
+from logging import getLogger
+from traceback import format_exc
+from uuid import uuid4
+
+# Bunch
+from bunch import bunchify
+
+# gevent
+from gevent import sleep, spawn
+from gevent.lock import RLock
+
+# SQLAlchemy
+from sqlalchemy import bindparam
+
+# Zato
+from zato.common.api import GENERIC
+from zato.common.json_internal import dumps
+from zato.common.odb.model import SSOSession as SessionModel
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from datetime import datetime
+    from bunch import Bunch
+    from zato.common.typing_ import any_, anydict, strnone
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger('zato')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+SessionModelTable = SessionModel.__table__
+
+_opaque_attr = GENERIC.ATTR_NAME
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ModuleCtx:
+
+    Session_Key_Prefix = 'zato.sso.session.'
+    User_Key_Prefix = 'zato.sso.user.'
+
+    # Key under which each cached session keeps the marker of its user
+    User_Marker = '_zato_user_marker'
+
+    # How often, in seconds, pending renewals are written to the database
+    Default_Flush_Interval = 5
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SessionCache:
+    """ Keeps SSO sessions, along with the details of their users, in a built-in cache that all the workers share,
+    which means that verifying a session already in the cache does not need the SQL database. Renewals update the cache
+    immediately and are written to the database by a background greenlet, all the pending ones in a single transaction,
+    so that each session is updated at most once per flush interval no matter how many times it was renewed.
+
+    Deleting a session, or changing its user, is propagated to the other workers through the built-in cache itself.
+    Each cached session refers to a marker of its user and the session is valid only as long as the marker is,
+    so deleting the marker invalidates all the sessions of a user at once, without having to know what their USTs are.
+    """
+    def __init__(
+        self,
+        cache,            # type: any_
+        odb_session_func, # type: any_
+        flush_interval=ModuleCtx.Default_Flush_Interval # type: float
+    ) -> 'None':
+
+        self.cache = cache
+        self.odb_session_func = odb_session_func
+        self.flush_interval = flush_interval
+        self.lock = RLock()
+
+        # UST -> the values that its row will be updated with during the next flush
+        self.pending = {} # type: dict[str, anydict]
+
+        # How many rows the flusher has updated so far
+        self.total_flushed = 0
+
+        self._flusher = None # type: any_
+
+# ################################################################################################################################
+
+    def _get_session_key(self, ust:'str') -> 'str':
+        return ModuleCtx.Session_Key_Prefix + sha256(ust.encode('utf8')).hexdigest()
+
+# ################################################################################################################################
+
+    def _get_user_key(self, user_id:'str') -> 'str':
+        return ModuleCtx.User_Key_Prefix + user_id
+
+# ################################################################################################################################
+
+    def _get_expiry(self, expiration_time:'datetime', now:'datetime') -> 'float':
+        return (expiration_time - now).total_seconds()
+
+# ################################################################################################################################
+
+    def get(self, ust:'str', now:'datetime') -> 'Bunch | None':
+        """ Returns a session by its UST, if it is in the cache and it has not expired.
+        """
+        entry = self.cache.get(self._get_session_key(ust), None) # type: anydict
+        if not entry:
+            return None
+
+        # The session's user was changed since the session was added ..
+        if self.cache.get(self._get_user_key(entry['user_id']), None) != entry[ModuleCtx.User_Marker]:
+            return None
+
+        # .. or the session has already expired.
+        if entry['expiration_time'] <= now:
+            return None
+
+        # Our callers may modify what they receive so they need to have their own copy of it
+        return bunchify(entry)
+
+# ################################################################################################################################
+
+    def _get_user_marker(self, user_id:'str', expiry:'float') -> 'str':
+        key = self._get_user_key(user_id)
+        marker = self.cache.get(key, None)
+
+        if not marker:
+            marker = uuid4().hex
+
+        # Setting it each time extends its expiry to that of the longest-lived session of the user
+        self.cache.set(key, marker, expiry)
+
+        return marker
+
+# ################################################################################################################################
+
+    def set(self, ust:'str', sso_info:'any_', now:'datetime') -> 'None':
+        """ Adds to the cache a session, as it was read from the database.
+        """
+        entry = dict(sso_info._asdict() if hasattr(sso_info, '_asdict') else sso_info)
+        entry[_opaque_attr] = entry.get(_opaque_attr) or {}
+
+        # If we have a renewal of this session that has not been flushed yet, the database is behind us
+        with self.lock:
+            pending = self.pending.get(ust)
+
+        if pending:
+            entry['expiration_time'] = pending['expiration_time']
+            entry[_opaque_attr] = pending['opaque']
+
+        expiry = self._get_expiry(entry['expiration_time'], now)
+        if expiry <= 0:
+            return
+
+        entry[ModuleCtx.User_Marker] = self._get_user_marker(entry['user_id'], expiry)
+        self.cache.set(self._get_session_key(ust), entry, expiry)
+
+# ################################################################################################################################
+
+    def renew(self, ust:'str', sso_info:'any_', expiration_time:'datetime', opaque:'anydict', now:'datetime') -> 'None':
+        """ Renews a session in the cache and schedules for the renewal to be written to the database.
+        """
+        with self.lock:
+            self.pending[ust] = {
+                'ust': ust,
+                'expiration_time': expiration_time,
+                'opaque': opaque,
+            }
+
+        self.set(ust, sso_info, now)
+        self._ensure_flusher()
+
+# ################################################################################################################################
+
+    def delete(self, ust:'str') -> 'None':
+        """ Deletes a session from the cache, in all the workers.
+        """
+        with self.lock:
+            _ = self.pending.pop(ust, None)
+
+        _ = self.cache.delete(self._get_session_key(ust), raise_key_error=False)
+
+# ################################################################################################################################
+
+    def delete_by_user_id(self, user_id:'strnone') -> 'None':
+        """ Deletes from the cache all the sessions of a user, in all the workers.
+        """
+        if user_id:
+            _ = self.cache.delete(self._get_user_key(user_id), raise_key_error=False)
+
+# ################################################################################################################################
+
+    def _ensure_flusher(self) -> 'None':
+        with self.lock:
+            if not self._flusher:
+                self._flusher = spawn(self._run_flusher)
+
+# ################################################################################################################################
+
+    def _run_flusher(self) -> 'None':
+        while True:
+            sleep(self.flush_interval)
+            try:
+                _ = self.flush()
+            except Exception:
+                logger.warning('Could not flush SSO session renewals, e:`%s`', format_exc())
+
+# ################################################################################################################################
+
+    def flush(self) -> 'int':
+        """ Writes all the pending renewals to the database and returns how many there were.
+        """
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+
+        if not pending:
+            return 0
+
+        params = []
+
+        for item in pending.values():
+            params.append({
+                'b_ust': item['ust'],
+                'expiration_time': item['expiration_time'],
+                _opaque_attr: dumps(item['opaque']),
+            })
+
+        query = SessionModelTable.update().\
+            where(SessionModelTable.c.ust==bindparam('b_ust')).\
+            values({
+                'expiration_time': bindparam('expiration_time'),
+                _opaque_attr: bindparam(_opaque_attr),
+            })
+
+        try:
+            with closing(self.odb_session_func()) as session: # type: ignore
+                _ = session.execute(query, params)
+                session.commit()
+
+        # If we could not write them, they will be retried the next time, unless there are newer renewals already
+        except Exception:
+            with self.lock:
+                for ust, item in pending.items():
+                    _ = self.pending.setdefault(ust, item)
+            raise
+
+        self.total_flushed += len(params)
+
+        return len(params)
+
+# ################################################################################################################################
+# ################################################################################################################################
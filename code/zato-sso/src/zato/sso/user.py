@@ -240,6 +240,7 @@ class UserAPI:
         hash_func,        # type: callable_
         verify_hash_func, # type: callable_
         new_user_id_func, # type: callnone
+        needs_rehash_func=None, # type: callnone
         ) -> 'None':
 
         self.server = server
@@ -252,6 +253,7 @@ class UserAPI:
         self.hash_func = hash_func
         self.verify_hash_func = verify_hash_func
         self.new_user_id_func = new_user_id_func
+        self.needs_rehash_func = needs_rehash_func
         self.encrypt_email = self.sso_conf.main.encrypt_email
         self.encrypt_password = self.sso_conf.main.encrypt_password
         self.password_expiry = self.sso_conf.password.expiry
@@ -269,14 +271,14 @@ class UserAPI:
 
         # For convenience, sessions are accessible through user API.
         self.session = SessionAPI(self.server, self.sso_conf, self.totp, self.encrypt_func, self.decrypt_func, self.hash_func,
-            self.verify_hash_func)
+            self.verify_hash_func, self.needs_rehash_func)
 
 # ################################################################################################################################
 
-    def post_configure(self, func, is_sqlite, needs_auth_link=True):
+    def post_configure(self, func, is_sqlite, needs_auth_link=True, session_cache=None):
         self.odb_session_func = func
         self.is_sqlite = is_sqlite
-        self.session.post_configure(func, is_sqlite)
+        self.session.post_configure(func, is_sqlite, session_cache)
 
         if needs_auth_link:
 
@@ -799,6 +801,9 @@ class UserAPI:
             ).rowcount
             session.commit()
 
+            # Sessions of a deleted user cannot be used anymore
+            self.session.on_user_changed(user_id)
+
             if rows_matched != 1:
                 msg = 'Expected for rows_matched to be 1 instead of %d, user_id:`%s`, username:`%s`'
                 logger.warning(msg, rows_matched, user_id, username)
@@ -890,6 +895,8 @@ class UserAPI:
             )
             session.commit()
 
+        self.session.on_user_changed(user_id)
+
 # ################################################################################################################################
 
     def login(self, cid, username, password, current_app, remote_addr, user_agent=None,
@@ -1086,6 +1093,8 @@ class UserAPI:
 
                 session.commit()
 
+            self.session.on_user_changed(_user_id)
+
 # ################################################################################################################################
 
     def update_current_user(self, cid, data, current_ust, current_app, remote_addr):
@@ -1123,6 +1132,8 @@ class UserAPI:
         set_password(self.odb_session_func, self.encrypt_func, self.hash_func, self.sso_conf, user_id, password,
             must_change, password_expiry)
 
+        self.session.on_user_changed(user_id)
+
 # ################################################################################################################################
 
     def reset_totp_key(self, cid, current_ust, user_id, key, key_label, current_app, remote_addr, skip_sec=False):
@@ -1194,6 +1205,8 @@ class UserAPI:
             )
             session.commit()
 
+        self.session.on_user_changed(_user_id)
+
         return key
 
 # ################################################################################################################################
@@ -1470,6 +1483,8 @@ class UserAPI:
 
             session.commit()
 
+        self.session.on_user_changed(user_id)
+
         return auth_id
 
 # ################################################################################################################################
@@ -26,6 +26,7 @@ from zxcvbn import zxcvbn
 
 # Zato
 from zato.common.crypto.api import CryptoManager
+from zato.common.crypto.hash_ import HashPool, HashPoolBusy
 from zato.common.odb.model import SSOUser as UserModel
 from zato.sso import const, status_code, ValidationError
 from zato.sso.common import LoginCtx
@@ -209,12 +210,20 @@ def check_credentials(
     decrypt_func,     # type: callable_
     verify_hash_func, # type: callable_
     stored_password,  # type: str
-    input_password    # type: str
+    input_password,   # type: str
+    limit_keys=None   # type: anylist | None
 ) -> 'bool':
     """ Checks that an incoming password is equal to the one that is stored in the database.
+    If limit_keys are given, e.g. a username and a remote address, and hashes are verified by a HashPool,
+    there may be only a limited number of checks for each of them in progress at a time.
     """
     password_decrypted = decrypt_func(stored_password) # At this point it is decrypted but still hashed
-    return verify_hash_func(input_password, password_decrypted)
+
+    # Only a hash pool can limit checks per key - other functions, e.g. CryptoManager.verify_hash, do not accept limit_keys
+    if limit_keys and isinstance(getattr(verify_hash_func, '__self__', None), HashPool):
+        return verify_hash_func(input_password, password_decrypted, limit_keys=limit_keys)
+    else:
+        return verify_hash_func(input_password, password_decrypted)
 
 # ################################################################################################################################
 
@@ -299,7 +308,22 @@ class UserChecker:
 # ################################################################################################################################
 
     def check_credentials(self, ctx:'LoginCtx', user_password:'str') -> 'bool':
-        return check_credentials(self.decrypt_func, self.verify_hash_func, user_password, ctx.input['password'])
+
+        # Hashing is limited per username and per remote address
+        remote_addr = ctx.remote_addr
+        if isinstance(remote_addr, list):
+            remote_addr = ', '.join(str(elem) for elem in remote_addr)
+
+        limit_keys = [
+            'user.{}'.format(ctx.input.get('username') or ctx.input.get('user_id')),
+            'addr.{}'.format(remote_addr),
+        ]
+
+        try:
+            return check_credentials(self.decrypt_func, self.verify_hash_func, user_password, ctx.input['password'], limit_keys)
+        except HashPoolBusy as e:
+            logger.warning('Rejecting credentials check; cid:`%s`, e:`%s`', ctx.cid, e)
+            return False
 
 # ################################################################################################################################
 
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from datetime import datetime, timedelta
+from unittest import main, TestCase
+from uuid import uuid4
+
+# Bunch
+from bunch import bunchify
+
+# SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common.json_internal import dumps
+from zato.common.odb.model import Base, SSOSession, SSOUser
+from zato.sso import const, ValidationError
+from zato.sso.session import SessionAPI
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+current_app = 'CRM'
+remote_addr = '127.0.0.1'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class _BuiltinCache:
+    """ Stands in for a built-in cache, which all the workers share.
+    """
+    def __init__(self) -> 'None':
+        self.data = {}
+
+    def get(self, key:'str', default:'any_'=None) -> 'any_':
+        return self.data.get(key, default)
+
+    def set(self, key:'str', value:'any_', expiry:'float'=0.0) -> 'None':
+        self.data[key] = value
+
+    def delete(self, key:'str', raise_key_error:'bool'=True) -> 'any_':
+        return self.data.pop(key, None)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SessionCacheTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine, tables=[SSOUser.__table__, SSOSession.__table__]) # type: ignore
+
+        self.odb_session_func = sessionmaker(bind=self.engine)
+        self.builtin_cache = _BuiltinCache()
+
+        self.user_id = 'zusr' + uuid4().hex
+        self.ust = 'zust' + uuid4().hex
+
+        self._insert_user_and_session()
+
+        # Only queries run by the tests themselves are counted, not the ones that set up the fixtures above
+        self.total_queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_query)
+
+# ################################################################################################################################
+
+    def _on_query(self, *ignored_args:'any_') -> 'None':
+        self.total_queries += 1
+
+# ################################################################################################################################
+
+    def _insert_user_and_session(self) -> 'None':
+
+        now = datetime.utcnow()
+
+        with self.engine.begin() as conn:
+            result = conn.execute(SSOUser.__table__.insert().values({
+                'user_id': self.user_id,
+                'is_active': True,
+                'is_internal': False,
+                'is_super_user': False,
+                'is_locked': False,
+                'creation_ctx': '{}',
+                'approval_status': const.approval_status.approved,
+                'approval_status_mod_time': now,
+                'approval_status_mod_by': 'test',
+                'username': 'user1',
+                'password': 'password1',
+                'password_is_set': True,
+                'password_must_change': False,
+                'password_last_set': now,
+                'password_expiry': now + timedelta(days=365),
+                'sign_up_status': const.signup_status.final,
+                'sign_up_time': now,
+                'sign_up_confirm_token': uuid4().hex,
+                'is_totp_enabled': False,
+            }))
+
+            _ = conn.execute(SSOSession.__table__.insert().values({
+                'ust': self.ust,
+                'creation_time': now,
+                'expiration_time': now + timedelta(minutes=60),
+                'remote_addr': remote_addr,
+                'user_agent': 'test',
+                'auth_type': const.auth_type.default,
+                'auth_principal': 'user1',
+                'user_id': result.inserted_primary_key[0],
+                'opaque1': dumps({'session_state_change_list': []}),
+            }))
+
+# ################################################################################################################################
+
+    def _get_session_api(self, needs_cache:'bool'=True) -> 'SessionAPI':
+
+        sso_conf = bunchify({
+            'session': {'expiry': 60, 'renew_flush_interval': 3600},
+            'apps': {'all': [current_app]},
+            'user_address_list': {},
+            'login': {'reject_if_not_listed': False, 'inform_if_locked': True},
+            'password': {'inform_if_expired': True},
+        })
+
+        def _identity(value:'any_') -> 'any_':
+            return value
+
+        api = SessionAPI(None, sso_conf, None, _identity, _identity, _identity, _identity) # type: ignore
+        api.post_configure(self.odb_session_func, True, self.builtin_cache if needs_cache else None)
+
+        return api
+
+# ################################################################################################################################
+
+    def _verify(self, api:'SessionAPI') -> 'any_':
+        return api._get_session(self.ust, current_app, remote_addr, 'verify')
+
+# ################################################################################################################################
+
+    def test_verify_warm_session_without_queries(self) -> 'None':
+
+        # The first worker reads the session from the database ..
+        api1 = self._get_session_api()
+        self.assertEqual(self._verify(api1).username, 'user1')
+        self.assertEqual(self.total_queries, 1)
+
+        # .. and neither it nor any other worker need to do it again.
+        api2 = self._get_session_api()
+
+        for api in (api1, api2):
+            self.total_queries = 0
+            for _ in range(10):
+                self.assertEqual(self._verify(api).username, 'user1')
+            self.assertEqual(self.total_queries, 0)
+
+# ################################################################################################################################
+
+    def test_verify_without_cache(self) -> 'None':
+
+        api = self._get_session_api(needs_cache=False)
+
+        for _ in range(10):
+            _ = self._verify(api)
+
+        self.assertEqual(self.total_queries, 10)
+
+# ################################################################################################################################
+
+    def test_renew_write_behind(self) -> 'None':
+
+        api = self._get_session_api()
+        _ = self._verify(api)
+
+        # Renewals do not reach the database immediately ..
+        self.total_queries = 0
+
+        for _ in range(5):
+            expiration_time = api.renew('cid', self.ust, current_app, remote_addr)
+
+        self.assertEqual(self.total_queries, 0)
+        self.assertEqual(self._verify(api).expiration_time, expiration_time)
+
+        # .. instead, they are coalesced into a single update of the row.
+        self.assertEqual(api.cache.flush(), 1) # type: ignore
+        self.assertEqual(api.cache.flush(), 0) # type: ignore
+
+        with self.engine.connect() as conn:
+            row = conn.execute(SSOSession.__table__.select()).first()
+            self.assertEqual(row.expiration_time, expiration_time)
+
+# ################################################################################################################################
+
+    def test_logout_is_propagated(self) -> 'None':
+
+        api1 = self._get_session_api()
+        api2 = self._get_session_api()
+
+        _ = self._verify(api1)
+        _ = self._verify(api2)
+
+        # Logging out in one worker ..
+        api1.logout(self.ust, current_app, remote_addr)
+
+        # .. means that the session cannot be used in another one either.
+        with self.assertRaises(ValidationError):
+            _ = self._verify(api2)
+
+# ################################################################################################################################
+
+    def test_user_changed_is_propagated(self) -> 'None':
+
+        api1 = self._get_session_api()
+        api2 = self._get_session_api()
+
+        _ = self._verify(api2)
+
+        # The user is locked in the database and one of the workers learns about it ..
+        with self.engine.begin() as conn:
+            _ = conn.execute(SSOUser.__table__.update().values({'is_locked': True}))
+
+        api1.on_user_changed(self.user_id)
+
+        # .. which means that no other worker will use a stale session anymore.
+        self.total_queries = 0
+
+        with self.assertRaises(ValidationError):
+            _ = self._verify(api2)
+
+        self.assertEqual(self.total_queries, 1)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
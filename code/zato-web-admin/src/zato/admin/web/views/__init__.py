@@ -360,7 +360,7 @@ class BaseView:
         else:
             return []
 
-    def set_input(self, req=None, default_attrs=('cur_page', 'query')):
+    def set_input(self, req=None, default_attrs=('cur_page', 'query', 'cursor')):
         req = req or self.req
         self.input.update({
             'cluster_id':self.cluster_id,
@@ -13,12 +13,17 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 from logging import getLogger
+from time import monotonic
+from traceback import format_exc
 
 # gevent
-from gevent import spawn
+from gevent.pool import Pool
+
+# PyZMQ
+import zmq.green as zmq
 
 # Zato
-from zato.common.api import CHANNEL
+from zato.common.api import CHANNEL, ZMQ
 from zato.common.util.api import new_cid
 from zato.zmq_ import Base
 from zato.zmq_.mdp.broker import Broker
@@ -34,29 +39,109 @@ class Simple(Base):
     """
     start_in_greenlet = True
 
+    def __init__(self, *args, **kwargs):
+        super(Simple, self).__init__(*args, **kwargs)
+
+        # How many messages can be processed at a time - once that many are, we stop reading from the socket
+        # and new messages wait in ZeroMQ queues, up to their high-water mark, which lets their senders know about it.
+        self.max_in_flight = int(self.config.get('max_in_flight') or ZMQ.DEFAULT.MAX_IN_FLIGHT)
+
+        # How many messages that are already waiting in the socket to read each time it is readable
+        self.recv_batch_size = int(self.config.get('recv_batch_size') or ZMQ.DEFAULT.RECV_BATCH_SIZE)
+
+        self.pool = Pool(self.max_in_flight)
+
+        # Counters
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.started_at = None
+
+    def get_counters(self):
+        """ Returns throughput and latency of the channel, the latter being the time between reading a message
+        from the socket and the end of its processing, in seconds.
+        """
+        elapsed = monotonic() - self.started_at if self.started_at else 0
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'in_flight': self.max_in_flight - self.pool.free_count(),
+            'avg_batch_size': self.received / self.batches if self.batches else 0,
+            'msg_per_sec': self.processed / elapsed if elapsed else 0,
+            'avg_latency': self.total_latency / self.processed if self.processed else 0,
+            'max_latency': self.max_latency,
+        }
+
+    def _on_message(self, payload, received_at, _callback, _config, _channel_zmq=CHANNEL.ZMQ):
+        """ Invokes a service with data received from the socket on input.
+        """
+        try:
+            _callback({
+                'cid': new_cid(),
+                'service': self.service,
+                'payload': payload,
+                'zato_ctx': {'channel_config': _config}
+            }, _channel_zmq, None)
+        except Exception:
+            self.failed += 1
+            logger.warning('Could not process ZeroMQ message in `%s`, e:`%s`', self.name, format_exc())
+        finally:
+            latency = monotonic() - received_at
+            self.processed += 1
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    def _recv_batch(self):
+        """ Waits for a message and returns it along with any others that can be read without waiting, up to the batch size.
+        """
+        batch = [self.impl.recv()] # This line is blocking waiting for requests
+
+        while len(batch) < self.recv_batch_size:
+            try:
+                batch.append(self.impl.recv(zmq.NOBLOCK))
+            except zmq.Again:
+                break
+
+        return batch
+
     def _start(self):
         super(Simple, self)._start()
         self.init_simple_socket()
 
         # Micro-optimizations to make things faster
-        _spawn = spawn
+        _spawn = self.pool.spawn
+        _on_message = self._on_message
         _callback = self.on_message_callback
-        _new_cid = new_cid
-        _service = self.service
-        _impl_recv = self.impl.recv
         _config = self.config
-        _channel_zmq = CHANNEL.ZMQ
+        _recv_batch = self._recv_batch
+        _monotonic = monotonic
+
+        self.started_at = _monotonic()
 
         # Run the main loop
         while self.keep_running:
 
-            # Spawn a new greenlet for the callback invoking a service with data received from the socket on input
-            _spawn(_callback, {
-                'cid': _new_cid(),
-                'service': _service,
-                'payload': _impl_recv(), # This line is blocking waiting for requests
-                'zato_ctx': {'channel_config': _config}
-            }, _channel_zmq, None)
+            try:
+                batch = _recv_batch()
+            except zmq.ZMQError:
+
+                # The socket was closed because we are stopping
+                if not self.keep_running:
+                    break
+                raise
+
+            received_at = _monotonic()
+            self.received += len(batch)
+            self.batches += 1
+
+            # This blocks if there are already max_in_flight messages being processed
+            for payload in batch:
+                _spawn(_on_message, payload, received_at, _callback, _config)
 
     def _send(self, msg, *args, **kwargs):
         self.impl.send(msg, *args, **kwargs)
@@ -13,6 +13,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
+from collections import deque, OrderedDict
 
 # ZeroMQ
 import zmq.green as zmq
@@ -39,11 +40,11 @@ class const:
         client = b'MDPC01'
         worker = b'MDPW01'
 
-        ready = chr(1)
-        request_to_worker = chr(2)
-        reply_from_worker = chr(3)
-        heartbeat = chr(4)
-        disconnect = chr(5)
+        ready = b'\x01'
+        request_to_worker = b'\x02'
+        reply_from_worker = b'\x03'
+        heartbeat = b'\x04'
+        disconnect = b'\x05'
 
         # Custom types used internally
         request_from_client = 'zato.request_from_client'
@@ -56,14 +57,15 @@ class const:
 class BaseZMQConnection:
     """ A base class for both client and worker ZeroMQ connections.
     """
-    def __init__(self, broker_address='tcp://localhost:47047', linger=0, poll_interval=100, log_details=False):
+    def __init__(self, broker_address='tcp://localhost:47047', linger=0, poll_interval=100, log_details=False, ctx=None):
         self.broker_address = broker_address
         self.linger = linger
         self.poll_interval = poll_interval
         self.keep_running = True
         self.log_details = log_details
 
-        self.ctx = zmq.Context()
+        # An existing context is required for inproc:// addresses
+        self.ctx = ctx or zmq.Context()
         self.connect_client_socket()
 
 # ################################################################################################################################
@@ -91,9 +93,15 @@ class BaseZMQConnection:
 class Service:
     """ A service offered by an MDP broker along with all the workers registered to handle it.
     """
-    def __init__(self, name=None, workers=None):
+    def __init__(self, name=None, max_pending_requests=None):
         self.name = name
-        self.workers = workers or []
+
+        # IDs of workers ready to handle a request, in the order they became ready. A worker may expire
+        # or disconnect while waiting, which is why this is not a plain deque - it needs to be removed in O(1) too.
+        self.workers = OrderedDict()
+
+        # How many requests can be queued up at most before new ones are rejected, None = no limit
+        self.max_pending_requests = max_pending_requests
 
         # How many workers, busy or not, this service has
         self.len_current_workers = 0
@@ -105,7 +113,29 @@ class Service:
         self.has_max_workers = False
 
         # All requests currently queued up, i.e. received from clients but not delivered to workers yet
-        self.pending_requests = []
+        self.pending_requests = deque()
+
+        # How many requests were rejected because there were already too many of them queued up
+        self.len_rejected_requests = 0
+
+    def add_worker(self, worker_id):
+        self.workers[worker_id] = None
+
+    def remove_worker(self, worker_id):
+        self.workers.pop(worker_id, None)
+
+    def pop_worker(self):
+        return self.workers.popitem(last=False)[0]
+
+    def add_request(self, request):
+        """ Queues up a request, unless there are too many of them already, in which case False is returned.
+        """
+        if self.max_pending_requests and len(self.pending_requests) >= self.max_pending_requests:
+            self.len_rejected_requests += 1
+            return False
+
+        self.pending_requests.append(request)
+        return True
 
 # ################################################################################################################################
 
@@ -114,27 +144,38 @@ class WorkerData:
     """
     prefix = 'mdp.worker.'
 
-    def __init__(self, type, id, service_name, last_hb_received=None, last_hb_sent=None, expires_at=None):
+    def __init__(self, type, id, service_name, last_hb_received=None, last_hb_sent=None, expires_at=None, heartbeat_at=None):
         self.type = type
         self.id = self.wrap_id(id) if type == const.worker_type.zmq else id
         self.service_name = service_name
+
+        # All timestamps are in seconds, as returned by time.monotonic
         self.last_hb_received = last_hb_received
         self.last_hb_sent = last_hb_sent
         self.expires_at = expires_at
 
+        # When the next heartbeat to this worker is due, None if heartbeats are not sent to it
+        self.heartbeat_at = heartbeat_at
+
+        # Set to True when a request is sent to this worker and back to False when it is ready for a new one
+        self.is_busy = False
+
+        # When a busy worker is assumed to have crashed if it has not replied by then
+        self.busy_until = None
+
     @staticmethod
     def wrap_worker_id(type, id):
-        return '{}{}.{}'.format(WorkerData.prefix, type, id.encode('hex'))
+        return '{}{}.{}'.format(WorkerData.prefix, type, id.hex())
 
     def wrap_id(self, id):
         return WorkerData.wrap_worker_id(self.type, id)
 
     def unwrap_id(self):
-        return self.id.replace(self.prefix, '').replace(self.type + '.', '').decode('hex')
+        return bytes.fromhex(self.id.replace(self.prefix, '').replace(self.type + '.', ''))
 
     def __repr__(self):
         return '<{} at {}, type:{}, id:{}, srv:{}, exp:{}>'.format(
-            self.__class__.__name__, hex(id(self)), self.type, self.id, self.service_name, self.expires_at.isoformat())
+            self.__class__.__name__, hex(id(self)), self.type, self.id, self.service_name, self.expires_at)
 
 # ################################################################################################################################
 
@@ -245,7 +286,7 @@ class EventWorkerDisconnect:
     type = const.v01.disconnect
 
     def serialize(self):
-        return ['', const.v01.worker, const.v01.disconnect]
+        return [b'', const.v01.worker, const.v01.disconnect]
 
 # ################################################################################################################################
 
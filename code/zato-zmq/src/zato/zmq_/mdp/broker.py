@@ -13,7 +13,9 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import logging
-from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic
 from traceback import format_exc
 
 # Bunch
@@ -44,7 +46,7 @@ logger = logging.getLogger(__name__)
 class Broker:
     """ Implements a broker part of the ZeroMQ Majordomo Protocol 0.1 http://rfc.zeromq.org/spec:7
     """
-    def __init__(self, config, on_message_callback):
+    def __init__(self, config, on_message_callback, ctx=None):
         self.config = config
         self.on_message_callback = on_message_callback
         self.address = config.address
@@ -52,7 +54,15 @@ class Broker:
         self.pool_strategy = config.pool_strategy
         self.service_source = config.service_source
         self.keep_running = True
-        self.tcp_port = int(self.address.split(':')[-1])
+
+        # Only TCP addresses have ports that we need to wait for when closing
+        self.tcp_port = int(self.address.split(':')[-1]) if self.address.startswith('tcp://') else None
+
+        # How many requests to a single service can be queued up before new ones are rejected
+        self.max_pending_requests = config.get('max_pending_requests', ZMQ.DEFAULT.MDP_MAX_PENDING_REQUESTS)
+
+        # How many seconds a ZeroMQ worker may be busy with a single request before it is considered expired
+        self.request_timeout = config.get('request_timeout', ZMQ.DEFAULT.MDP_REQUEST_TIMEOUT)
 
         # A hundred years in seconds, used when creating internal workers
         self.y100 = 60 * 60 * 24 * 365 * 100
@@ -77,16 +87,26 @@ class Broker:
         # Maps service names to workers registered to handle requests to that service
         self.services = {}
 
-        # Details about each worker, mapped by worker_id:Worker object
+        # Details about each worker, busy or not, mapped by worker_id:Worker object
         self.workers = {}
 
+        # Min-heaps of (deadline, seq, WorkerData) tuples - when ZeroMQ workers expire and when heartbeats to them are due.
+        # There is one entry per worker in each heap. If a worker's deadline is extended, its entry is not updated
+        # in place, instead, it is pushed back onto the heap with the new deadline when the old one is reached.
+        self.expiry_heap = []
+        self.heartbeat_heap = []
+
+        # Breaks ties between entries with the same deadlines, so that WorkerData objects are never compared
+        self.heap_seq = count()
+
         # Held upon most operations on sockets
         self.lock = RLock()
 
         # How often, in seconds, to send a heartbeat to workers
         self.heartbeat = config.heartbeat
 
-        self.ctx = zmq.Context()
+        # An existing context is required for inproc:// addresses
+        self.ctx = ctx or zmq.Context()
         self.socket = self.ctx.socket(zmq.ROUTER)
         self.socket.linger = config.linger
         self.poller = zmq.Poller()
@@ -107,7 +127,7 @@ class Broker:
         self.socket.close(linger)
 
         # Wait at most 10 seconds until the port is released
-        if not wait_until_port_free(self.tcp_port, 10):
+        if self.tcp_port and not wait_until_port_free(self.tcp_port, 10):
             logger.warning('Port `%s` was not released within 10s', self.tcp_port)
 
 # ################################################################################################################################
@@ -132,9 +152,9 @@ class Broker:
         while self.keep_running:
 
             try:
-                items = self.poller.poll(self.poll_interval)
+                items = self.poller.poll(self.get_poll_timeout())
 
-                # Periodically send heartbeats to all known workers
+                # Expire workers and send heartbeats to the ones that are due for it
                 self.send_heartbeats()
 
                 if items:
@@ -153,30 +173,82 @@ class Broker:
                 break
 
             except Exception:
+
+                # The socket was closed while we were polling it
+                if not self.keep_running:
+                    break
+
                 logger.warning(format_exc())
 
 # ################################################################################################################################
 
-    def cleanup_workers(self):
-        """ Goes through all the workers and deletes any that are expired in any place they are referred to.
-        Must be called with self.lock held.
+    def get_poll_timeout(self):
+        """ Returns for how long, in milliseconds, to wait for messages - never past the nearest worker deadline.
         """
-        now = datetime.utcnow()
+        deadlines = [heap[0][0] for heap in (self.expiry_heap, self.heartbeat_heap) if heap]
 
-        # All workers that are found to have expired
-        expired = []
+        if not deadlines:
+            return self.poll_interval
 
-        # Find expired workers
-        for worker in self.workers.values():
-            if now >= worker.expires_at:
-                expired.append(worker.id)
+        timeout = (min(deadlines) - monotonic()) * 1000
+        return max(0, min(self.poll_interval, timeout))
 
-        # Remove expired workers from their main dict and any service that may depend on it
-        for item in expired:
-            del self.workers[item]
+# ################################################################################################################################
 
-            for service in self.services.values():
-                service.workers.remove(item)
+    def _push_deadline(self, heap, deadline, worker):
+        heappush(heap, (deadline, next(self.heap_seq), worker))
+
+# ################################################################################################################################
+
+    def _pop_due(self, heap, now):
+        """ Returns all the workers whose deadlines in a given heap are not later than now, skipping the ones
+        that have been already removed. All of them are popped before any is returned, so that entries
+        pushed back onto the heap by our callers are not popped again in the same pass.
+        """
+        out = []
+
+        while heap and heap[0][0] <= now:
+            deadline, _, worker = heappop(heap)
+
+            if self.workers.get(worker.id) is worker:
+                out.append((deadline, worker))
+
+        return out
+
+# ################################################################################################################################
+
+    def _remove_worker(self, worker):
+        """ Deletes a worker from all the places it is referred to. Must be called with self.lock held.
+        """
+        del self.workers[worker.id]
+
+        service = self.services.get(worker.service_name)
+        if service:
+            service.remove_worker(worker.id)
+
+# ################################################################################################################################
+
+    def cleanup_workers(self, now=None):
+        """ Deletes all the workers that have expired in any place they are referred to.
+        Must be called with self.lock held.
+        """
+        now = now or monotonic()
+
+        for deadline, worker in self._pop_due(self.expiry_heap, now):
+
+            # Busy workers do not send heartbeats so they are given more time instead,
+            # but no more than until their request times out, in case they crashed while handling it.
+            if worker.is_busy:
+                worker.expires_at = min(now + const.ttl, worker.busy_until)
+
+            # The worker's deadline was extended since this entry was pushed
+            if worker.expires_at > now:
+                self._push_deadline(self.expiry_heap, worker.expires_at, worker)
+            else:
+                if worker.is_busy:
+                    logger.warning('ZeroMQ MDP worker `%s` did not reply within %ss, deleting it',
+                        worker.id, self.request_timeout)
+                self._remove_worker(worker)
 
 # ################################################################################################################################
 
@@ -194,23 +266,24 @@ class Broker:
 # ################################################################################################################################
 
     def send_heartbeats(self):
-        """ Cleans up expired workers and sends heartbeats to any remaining ones.
+        """ Cleans up expired workers and sends heartbeats to any remaining ones that are due for it.
+        Only ZeroMQ workers are ever in the heap so there is no need to check the type of workers here.
         """
-        now = datetime.utcnow()
+        now = monotonic()
 
         with self.lock:
 
             # Make sure we send heartbeats only to workers that have not expired already
-            self.cleanup_workers()
+            self.cleanup_workers(now)
 
-            for worker in self.workers.values():
+            for _ignored, worker in self._pop_due(self.heartbeat_heap, now):
 
-                # Do not send heart-beats to internal workers, only to actual wire-based ZeroMQ ones
-                if worker.type == const.worker_type.zmq:
+                # Busy workers are not sent heartbeats, we only check them again later on
+                if not worker.is_busy:
+                    self._send_heartbeat(worker, now)
 
-                    # We have never sent a HB to this worker or we have sent a HB at least once so we do it again now
-                    if not worker.last_hb_sent or now >= worker.last_hb_sent + timedelta(seconds=self.heartbeat):
-                        self._send_heartbeat(worker, now)
+                worker.heartbeat_at = now + self.heartbeat
+                self._push_deadline(self.heartbeat_heap, worker.heartbeat_at, worker)
 
 # ################################################################################################################################
 
@@ -279,29 +352,42 @@ class Broker:
         """ Sends all pending requests for that service, assuming there are workers available to handle them,
         or, if pool_strategy is 'single', creates a worker for that service if it does not exist already.
         """
-        # Fetch the service object which at this point must exist
-        service = self.services[service_name]
+        # Requests to internal workers are sent only after the lock is released because each invokes a service
+        to_zato = []
 
-        # Clean up expired workers before attempting to deliver any messages
-        self.cleanup_workers()
+        with self.lock:
 
-        if not service.workers:
+            # Fetch the service object which at this point must exist
+            service = self.services[service_name]
 
-            if service.has_max_workers:
-                msg = 'ZeroMQ MDP channel `%s` cannot add more workers for service `%s` (reached max=%s)'
-                logger.warning(msg, self.config.name, service_name, self.workers_pool_max)
-                return
+            # Clean up expired workers before attempting to deliver any messages
+            self.cleanup_workers()
 
-            self.add_workers(service)
+            # Internal workers are not used at all if workers_pool_max is 0
+            if not service.workers and self.workers_pool_max:
 
-        while service.pending_requests and service.workers:
-            req = service.pending_requests.pop(0)
-            worker = self.workers.pop(service.workers.pop(0))
+                if service.has_max_workers:
+                    msg = 'ZeroMQ MDP channel `%s` cannot add more workers for service `%s` (reached max=%s)'
+                    logger.warning(msg, self.config.name, service_name, self.workers_pool_max)
+                    return
 
-            if worker.type == const.worker_type.zato:
-                self.send_to_worker_zato(req, worker, service_name)
-            else:
-                self.send_to_worker_zmq(req.serialize(worker.unwrap_id()))
+                self.add_workers(service)
+
+            now = monotonic()
+
+            while service.pending_requests and service.workers:
+                req = service.pending_requests.popleft()
+                worker = self.workers[service.pop_worker()]
+                worker.is_busy = True
+                worker.busy_until = now + self.request_timeout
+
+                if worker.type == const.worker_type.zato:
+                    to_zato.append((req, worker))
+                else:
+                    self.send_to_worker_zmq(req.serialize(worker.unwrap_id()))
+
+        for req, worker in to_zato:
+            self.send_to_worker_zato(req, worker, service_name)
 
 # ################################################################################################################################
 
@@ -312,8 +398,13 @@ class Broker:
         # Create the service object if it does not exist - this may be the case
         # if clients connect before workers.
         with self.lock:
-            service = self.services.setdefault(service_name, Service(service_name))
-            service.pending_requests.append(EventWorkerRequest(received_body, sender_id))
+            service = self.get_service(service_name)
+
+            # MDP 0.1 has no means to return errors to clients so they will time out waiting for a reply
+            if not service.add_request(EventWorkerRequest(received_body, sender_id)):
+                logger.warning('ZeroMQ MDP channel `%s` rejected a request to `%s`, too many pending requests (max=%s)',
+                    self.config.name, service_name, service.max_pending_requests)
+                return
 
         # Ok, we can send the request now to a worker
         self.dispatch_requests(service_name)
@@ -384,21 +475,54 @@ class Broker:
         func = self.handle_event_map[event]
         func(worker_id, payload[1:])
 
+# ################################################################################################################################
+
+    def get_service(self, service_name):
+        """ Returns a service by its name, creating it first if it does not exist yet. Must be called with self.lock held.
+        """
+        service = self.services.get(service_name)
+
+        if not service:
+            service = self.services[service_name] = Service(service_name, self.max_pending_requests)
+
+        return service
+
 # ################################################################################################################################
 
     def _add_worker(self, worker_id, service_name, ttl, worker_type, log_added=True):
-        """ Adds worker-related configuration, no matter if it is an internal or a ZeroMQ-based one.
+        """ Adds worker-related configuration, no matter if it is an internal or a ZeroMQ-based one,
+        or marks an existing worker as ready to handle a new request. Must be called with self.lock held.
         """
-        now = datetime.utcnow()
-        expires_at = now + timedelta(seconds=ttl)
-        wd = WorkerData(worker_type, worker_id, service_name, now, None, expires_at)
+        now = monotonic()
+        expires_at = now + ttl
+
+        wrapped_id = WorkerData.wrap_worker_id(worker_type, worker_id) if worker_type == const.worker_type.zmq else worker_id
+        wd = self.workers.get(wrapped_id)
 
-        # Add to details of workers
-        self.workers[wd.id] = wd
+        # This is a worker that we already know about and which has just handled a request ..
+        if wd and wd.service_name == service_name:
+            wd.is_busy = False
+            wd.last_hb_received = now
+            wd.expires_at = expires_at
 
-        # Add to the list of workers for that service (but do not forget that the service may not have a client yet possibly)
-        service = self.services.setdefault(service_name, Service(service_name))
-        service.workers.append(wd.id)
+        # .. otherwise, it is a new one.
+        else:
+            if wd:
+                self._remove_worker(wd)
+
+            wd = WorkerData(worker_type, worker_id, service_name, now, None, expires_at)
+
+            # Add to details of workers
+            self.workers[wd.id] = wd
+
+            # Internal workers never expire and they are not sent heartbeats
+            if worker_type == const.worker_type.zmq:
+                wd.heartbeat_at = now + self.heartbeat
+                self._push_deadline(self.expiry_heap, wd.expires_at, wd)
+                self._push_deadline(self.heartbeat_heap, wd.heartbeat_at, wd)
+
+        # Add to the workers ready for that service (but do not forget that the service may not have a client yet possibly)
+        self.get_service(service_name).add_worker(wd.id)
 
 # ################################################################################################################################
 
@@ -413,8 +537,9 @@ class Broker:
         """
         service_name = service_name[0]
 
-        if self.has_info:
-            logger.info('Worker `%r` ready for `%s`',
+        # Workers send this event after each request they handle, hence debug rather than info
+        if self.has_debug:
+            logger.debug('Worker `%r` ready for `%s`',
                 WorkerData.wrap_worker_id(const.worker_type.zmq, worker_id), service_name)
 
         with self.lock:
@@ -437,11 +562,11 @@ class Broker:
                 logger.warning('No worker found for HB `%s`', wrapped_id)
                 return
 
-            now = datetime.utcnow()
-            expires_at = now + timedelta(seconds=const.ttl)
+            # The worker's entry in the expiry heap will be pushed back with the new deadline once the old one is reached
+            now = monotonic()
 
             worker.last_hb_received = now
-            worker.expires_at = expires_at
+            worker.expires_at = now + const.ttl
 
     def on_event_disconnect(self, worker_id, data):
         """ A worker wishes to disconnect - we need to remove it from all the places that still reference it, if any.
@@ -449,14 +574,11 @@ class Broker:
         with self.lock:
             wrapped_id = WorkerData.wrap_worker_id(const.worker_type.zmq, worker_id)
 
-            # Need 'None' because the worker may not exist
-            self.workers.pop(wrapped_id, None)
-
-            for service in self.services.values():
+            # The worker may not exist - its entries in the heaps will be skipped when their deadlines are reached
+            worker = self.workers.get(wrapped_id)
 
-                # Likewise, this worker may not exist at all
-                if wrapped_id in service.workers:
-                    service.workers.remove(wrapped_id)
+            if worker:
+                self._remove_worker(worker)
 
 # ################################################################################################################################
 
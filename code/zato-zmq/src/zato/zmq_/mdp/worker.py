@@ -32,9 +32,9 @@ class Worker(BaseZMQConnection):
     """ Standalone implementation of a worker for ZeroMQ Majordomo Protocol 0.1 http://rfc.zeromq.org/spec:7
     """
     def __init__(self, service_name, broker_address='tcp://localhost:47047', linger=0, poll_interval=100, log_details=False,
-            heartbeat=3, heartbeat_mult=2, reconnect_sleep=2):
+            heartbeat=3, heartbeat_mult=2, reconnect_sleep=2, ctx=None):
         self.service_name = service_name
-        super(Worker, self).__init__(broker_address, linger, poll_interval, log_details)
+        super(Worker, self).__init__(broker_address, linger, poll_interval, log_details, ctx)
 
         # How often, in seconds, to send a heartbeat to the broker or expect one from the broker
         self.heartbeat = heartbeat
@@ -163,7 +163,7 @@ class Worker(BaseZMQConnection):
 
     def on_event_request_to_worker(self, msg):
         logger.info('In _handle %s', msg)
-        return datetime.utcnow().isoformat()
+        return datetime.utcnow().isoformat().encode('utf8')
 
 # ################################################################################################################################
 
@@ -181,7 +181,9 @@ class Worker(BaseZMQConnection):
 # ################################################################################################################################
 
     def handle(self, msg):
-        logger.info('Handling %s', msg)
+
+        if self.log_details:
+            logger.info('Handling %s', msg)
 
         # Since we received this message, it means the broker is up so the message,
         # no matter what event it is, allows us to update the timestamp of the last HB from broker
@@ -192,9 +194,10 @@ class Worker(BaseZMQConnection):
 
         command = msg[2]
 
+        # Idx 4 is an empty frame between the client's ID and body
         if command == const.v01.request_to_worker:
             sender_id = msg[3]
-            body = msg[4]
+            body = msg[5]
 
         # Hand over the message to an actual implementation and reply if told to
         response = self.handle_event_map[command](body)
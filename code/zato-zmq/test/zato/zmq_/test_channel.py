@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import sleep, spawn
+from gevent.event import Event
+
+# PyZMQ
+import zmq.green as zmq
+
+# Zato
+from zato.common.api import ZMQ
+from zato.zmq_.channel import Simple as ChannelZMQ
+
+# ################################################################################################################################
+
+class TestChannelZMQ(TestCase):
+
+    def setUp(self):
+        self.temp_dir = mkdtemp(prefix='zato-test-zmq-')
+        self.address = 'ipc://{}'.format(os.path.join(self.temp_dir, 'channel.sock'))
+
+        self.ctx = zmq.Context()
+        self.client = self.ctx.socket(zmq.PUSH)
+
+    def tearDown(self):
+        self.client.close(0)
+        self.ctx.term()
+        rmtree(self.temp_dir)
+
+# ################################################################################################################################
+
+    def _get_channel(self, on_message, needs_connect=True, **kwargs):
+
+        config = Bunch()
+        config.id = 1
+        config.is_active = True
+        config.address = self.address
+        config.socket_type = ZMQ.PULL
+        config.socket_method = ZMQ.METHOD_NAME.BIND
+        config.service_name = 'my.service'
+        config.update(kwargs)
+
+        def on_message_callback(msg, channel, action):
+            on_message(msg['payload'])
+
+        channel = ChannelZMQ('abc', ZMQ.CHANNEL[ZMQ.PULL], config, on_message_callback)
+        channel.keep_running = True
+
+        spawn(channel._start)
+        sleep(0.1)
+
+        if needs_connect:
+            self.client.connect(self.address)
+
+        return channel
+
+# ################################################################################################################################
+
+    def _send(self, count):
+        for idx in range(count):
+            self.client.send_string(str(idx))
+
+# ################################################################################################################################
+
+    def _stop(self, channel):
+        channel.keep_running = False
+        channel.impl.close(0)
+        channel.pool.join()
+
+# ################################################################################################################################
+
+    def test_max_in_flight(self):
+
+        received = []
+        in_flight = []
+        max_in_flight = []
+
+        def on_message(payload):
+            in_flight.append(payload)
+            max_in_flight.append(len(in_flight))
+            sleep(0.01)
+            in_flight.remove(payload)
+            received.append(payload)
+
+        channel = self._get_channel(on_message, max_in_flight=3)
+
+        self._send(20)
+        sleep(0.3)
+
+        # All the messages were processed, though not more of them at a time than configured for
+        self.assertEqual(len(received), 20)
+        self.assertEqual(max(max_in_flight), 3)
+
+        counters = channel.get_counters()
+        self.assertEqual(counters['received'], 20)
+        self.assertEqual(counters['processed'], 20)
+        self.assertEqual(counters['failed'], 0)
+        self.assertEqual(counters['in_flight'], 0)
+        self.assertGreater(counters['avg_latency'], 0)
+        self.assertGreaterEqual(counters['max_latency'], counters['avg_latency'])
+
+        self._stop(channel)
+
+# ################################################################################################################################
+
+    def test_stop_reading_when_saturated(self):
+
+        can_process = Event()
+
+        def on_message(payload):
+            can_process.wait()
+
+        channel = self._get_channel(on_message, max_in_flight=2)
+
+        self._send(10)
+        sleep(0.1)
+
+        # Two messages are being processed, one more was read and is waiting for them,
+        # and the others are still in ZeroMQ queues.
+        counters = channel.get_counters()
+        self.assertEqual(counters['received'], 3)
+        self.assertEqual(counters['in_flight'], 2)
+
+        # Once the messages are processed, the rest are read too
+        can_process.set()
+        sleep(0.1)
+
+        counters = channel.get_counters()
+        self.assertEqual(counters['received'], 10)
+        self.assertEqual(counters['processed'], 10)
+
+        self._stop(channel)
+
+# ################################################################################################################################
+
+    def test_recv_batch(self):
+
+        received = []
+
+        def on_message(payload):
+            if payload == b'5':
+                raise Exception('Message cannot be processed')
+            received.append(payload)
+
+        # The client can send messages before the channel is started
+        self.client.connect(self.address)
+        self._send(10)
+
+        channel = self._get_channel(on_message, needs_connect=False, recv_batch_size=100)
+        sleep(0.1)
+
+        # Messages already waiting in the socket were read without waiting for each of them,
+        # and a message that could not be processed did not stop the others.
+        counters = channel.get_counters()
+        self.assertEqual(counters['received'], 10)
+        self.assertEqual(counters['failed'], 1)
+        self.assertGreater(counters['avg_batch_size'], 1)
+        self.assertEqual(len(received), 9)
+
+        self._stop(channel)
+
+# ################################################################################################################################
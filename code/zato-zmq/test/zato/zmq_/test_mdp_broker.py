@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under AGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+import os
+from time import monotonic
+from unittest import TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import joinall, sleep, spawn
+
+# PyZMQ
+import zmq.green as zmq
+
+# Zato
+from zato.common.api import ZMQ
+from zato.zmq_.mdp import const
+from zato.zmq_.mdp.broker import Broker
+from zato.zmq_.mdp.client import Client
+from zato.zmq_.mdp.worker import Worker
+
+# ################################################################################################################################
+
+logger = logging.getLogger(__name__)
+
+# ################################################################################################################################
+
+class EchoWorker(Worker):
+    """ Returns each request it receives as its reply.
+    """
+    def on_event_request_to_worker(self, msg):
+        return msg
+
+# ################################################################################################################################
+
+class TestMDPBroker(TestCase):
+
+    def setUp(self):
+        self.ctx = zmq.Context()
+        self.address = 'inproc://test-mdp-broker'
+        self.service_name = b'my.service'
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.keep_running = False
+        sleep(0.2)
+        self.ctx.destroy(0)
+
+# ################################################################################################################################
+
+    def _get_broker(self, **kwargs):
+
+        config = Bunch()
+        config.name = 'test.mdp'
+        config.address = self.address
+        config.poll_interval = 100
+        config.pool_strategy = 'pool'
+        config.service_source = ZMQ.SERVICE_SOURCE_NAME.ZATO
+        config.service_name = 'my.service'
+        config.heartbeat = 3
+        config.linger = 0
+
+        # Only ZeroMQ workers are used, no internal ones
+        config.workers_pool_initial = 0
+        config.workers_pool_mult = 0
+        config.workers_pool_max = 0
+
+        config.update(kwargs)
+
+        return Broker(config, None, ctx=self.ctx)
+
+# ################################################################################################################################
+
+    def _start(self, len_workers, **kwargs):
+
+        broker = self._get_broker(**kwargs)
+        spawn(broker.serve_forever)
+        sleep(0.1)
+
+        for _ in range(len_workers):
+            worker = EchoWorker(self.service_name, self.address, ctx=self.ctx)
+            worker.connect()
+            spawn(worker.serve_forever)
+            self.workers.append(worker)
+
+        sleep(0.1)
+        return broker
+
+# ################################################################################################################################
+
+    def _get_client(self):
+        client = Client(self.address, ctx=self.ctx)
+        client.connect()
+        return client
+
+# ################################################################################################################################
+
+    def test_request_reply(self):
+
+        broker = self._start(2)
+        client = self._get_client()
+
+        for idx in range(20):
+            body = 'msg.{}'.format(idx).encode('utf8')
+            reply = client.send(self.service_name, body, timeout=2)
+            self.assertEqual(reply.body, body)
+
+        # Both workers are ready again, each with a single entry in each of the heaps
+        service = broker.services[self.service_name]
+        self.assertEqual(len(service.workers), 2)
+        self.assertEqual(len(broker.expiry_heap), 2)
+        self.assertEqual(len(broker.heartbeat_heap), 2)
+
+        broker.keep_running = False
+
+# ################################################################################################################################
+
+    def test_cleanup_workers(self):
+
+        broker = self._get_broker()
+
+        with broker.lock:
+            broker._add_worker(b'worker1', self.service_name, 0, const.worker_type.zmq)
+            broker._add_worker(b'worker2', self.service_name, 1, const.worker_type.zmq)
+
+        service = broker.services[self.service_name]
+        worker1_id, worker2_id = list(service.workers)
+
+        # A heartbeat from a worker pushes its deadline back ..
+        worker2 = broker.workers[worker2_id]
+        expires_at = worker2.expires_at
+        broker.on_event_heartbeat(b'worker2', None)
+        self.assertGreater(worker2.expires_at, expires_at)
+
+        # .. and only the worker whose deadline has passed is deleted, both from the broker and from its service.
+        with broker.lock:
+            broker.cleanup_workers()
+
+        self.assertListEqual(list(broker.workers), [worker2_id])
+        self.assertListEqual(list(service.workers), [worker2_id])
+
+        # A disconnected worker is deleted too and its entries in the heaps are skipped afterwards
+        broker.on_event_disconnect(b'worker2', None)
+        self.assertDictEqual(broker.workers, {})
+        self.assertEqual(len(service.workers), 0)
+
+        with broker.lock:
+            broker.cleanup_workers(monotonic() + 1000)
+
+        self.assertListEqual(broker.expiry_heap, [])
+        broker.socket.close(0)
+
+# ################################################################################################################################
+
+    def test_busy_worker_expires_after_request_timeout(self):
+
+        broker = self._get_broker(request_timeout=30)
+
+        with broker.lock:
+            broker._add_worker(b'worker1', self.service_name, 1, const.worker_type.zmq)
+
+        service = broker.services[self.service_name]
+        worker = broker.workers[list(service.workers)[0]]
+
+        # The worker is given a request ..
+        broker.handle_client_message(b'client1', self.service_name, b'body')
+        self.assertTrue(worker.is_busy)
+
+        # .. it is busy with it so it is kept even though it sends no heartbeats ..
+        now = monotonic()
+
+        with broker.lock:
+            broker.cleanup_workers(now + 10)
+
+        self.assertIn(worker.id, broker.workers)
+
+        # .. but not after the request has timed out, in case the worker crashed while handling it.
+        with broker.lock:
+            broker.cleanup_workers(now + 25)
+            broker.cleanup_workers(now + 40)
+
+        self.assertDictEqual(broker.workers, {})
+        broker.socket.close(0)
+
+# ################################################################################################################################
+
+    def test_heartbeats(self):
+
+        broker = self._get_broker(heartbeat=0)
+
+        with broker.lock:
+            broker._add_worker(b'worker1', self.service_name, 100, const.worker_type.zmq)
+            broker._add_worker(b'worker2', self.service_name, 100, const.worker_type.zmq)
+
+        # Busy workers are not sent heartbeats
+        worker1, worker2 = broker.workers.values()
+        worker2.is_busy = True
+
+        broker.send_heartbeats()
+
+        self.assertIsNotNone(worker1.last_hb_sent)
+        self.assertIsNone(worker2.last_hb_sent)
+
+        # Each worker is scheduled for its next heartbeat
+        self.assertEqual(len(broker.heartbeat_heap), 2)
+        broker.socket.close(0)
+
+# ################################################################################################################################
+
+    def test_max_pending_requests(self):
+
+        broker = self._get_broker(max_pending_requests=2)
+
+        for idx in range(3):
+            broker.handle_client_message('client.{}'.format(idx).encode('utf8'), self.service_name, b'body')
+
+        # There are no workers so the requests are queued up, though no more than allowed to
+        service = broker.services[self.service_name]
+        self.assertEqual(len(service.pending_requests), 2)
+        self.assertEqual(service.len_rejected_requests, 1)
+
+        broker.socket.close(0)
+
+# ################################################################################################################################
+
+    def test_requests_per_second(self):
+
+        if not os.environ.get('Zato_Test_ZMQ_MDP_Benchmark'):
+            return
+
+        len_workers = 20
+        len_clients = 20
+        len_requests = 500
+
+        broker = self._start(len_workers)
+
+        def run_client():
+            client = self._get_client()
+            for _ in range(len_requests):
+                _ = client.send(self.service_name, b'body', timeout=5)
+
+        start = monotonic()
+        joinall([spawn(run_client) for _ in range(len_clients)], raise_error=True)
+        elapsed = monotonic() - start
+
+        logger.info('MDP broker, %d workers, %d clients -> %d req/s',
+            len_workers, len_clients, len_clients * len_requests / elapsed)
+
+        broker.keep_running = False
+
+# ################################################################################################################################